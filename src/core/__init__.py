@@ -12,6 +12,7 @@ from .base import (
     BaseLayer,
     BaseAgent,
     LayerProtocol,
+    AdapterResidency,
     LoRAAdapterManager,
     SystemConfig
 )
@@ -23,6 +24,7 @@ __all__ = [
     "BaseLayer",
     "BaseAgent",
     "LayerProtocol",
+    "AdapterResidency",
     "LoRAAdapterManager",
     "SystemConfig"
 ] 
\ No newline at end of file
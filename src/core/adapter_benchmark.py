@@ -0,0 +1,317 @@
+"""
+Adapter Load/Switch Latency Benchmark
+
+Reproducible, fully offline benchmark for `AdapterLoaderUnloader`. A tiny,
+randomly initialised GPT-2 base model and N LoRA adapters of varying rank are
+generated on CPU, then cold loads, warm cache hits, eviction-triggering loads
+and agent adapter switches through `LoRAAdapterManager` are timed together
+with the process RSS delta.
+
+Usage:
+    python -m src.core.adapter_benchmark --num-adapters 8 --ranks 4,8,16,32 \\
+        --output adapter_bench.json [--baseline previous.json] [--thresholds limits.json]
+
+Results are written as JSON; see `benchmarking`. The process exits non-zero
+when a metric exceeds its threshold, or regresses against a baseline by more
+than `--tolerance`. The loader and manager behaviour it times is tested in
+tests/test_adapter_manager.py.
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from typing import Dict, Any, List, Optional
+
+import psutil
+import torch
+from peft import LoraConfig, get_peft_model
+from transformers import GPT2Config, GPT2LMHeadModel
+
+from .adapter_quantization import quantize_adapter
+from .base import LoRAAdapterManager
+from .benchmarking import benchmark_main, comma_separated, environment
+from .resource_management import AdapterLoaderUnloader
+
+# Absolute ceilings in milliseconds / megabytes. Deliberately generous so they
+# only trip on order-of-magnitude regressions on a shared CPU runner.
+DEFAULT_THRESHOLDS = {
+    "cold_load_ms.p50": 500.0,
+    "warm_hit_ms.p50": 1.0,
+    "eviction_load_ms.p50": 750.0,
+    "switch_ms.p50": 750.0,
+    "rss_delta_mb_per_adapter.mean": 50.0,
+}
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Returns count, mean, min, max, p50, p95 and p99 of a list of samples."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(q: float) -> float:
+        index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[index]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "min": ordered[0],
+        "max": ordered[-1],
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+    }
+
+
+def _rss_mb() -> float:
+    return psutil.Process().memory_info().rss / (1024**2)
+
+
+def build_base_model(n_layer: int, n_embd: int, vocab_size: int, seed: int) -> GPT2LMHeadModel:
+    """Builds a tiny, randomly initialised GPT-2 model on CPU."""
+    torch.manual_seed(seed)
+    config = GPT2Config(
+        n_layer=n_layer,
+        n_embd=n_embd,
+        n_head=4,
+        vocab_size=vocab_size,
+        n_positions=128,
+        bos_token_id=0,
+        eos_token_id=0,
+    )
+    model = GPT2LMHeadModel(config)
+    model.eval()
+    return model
+
+
+def generate_adapters(base_model: GPT2LMHeadModel, output_dir: str, num_adapters: int,
+                      ranks: List[int], seed: int, quant_dtype: Optional[str] = None) -> List[str]:
+    """
+    Saves `num_adapters` LoRA adapters with ranks cycled from `ranks`.
+
+    Returns:
+        List[str]: Adapter directories, in creation order.
+    """
+    paths = []
+    for i in range(num_adapters):
+        torch.manual_seed(seed + i)
+        rank = ranks[i % len(ranks)]
+        lora_model = get_peft_model(
+            copy.deepcopy(base_model),
+            LoraConfig(r=rank, lora_alpha=2 * rank, target_modules=["c_attn", "c_proj"],
+                       fan_in_fan_out=True, task_type="CAUSAL_LM"),
+        )
+        # lora_B is zero-initialised; randomise it so every adapter is distinct.
+        with torch.no_grad():
+            for name, param in lora_model.named_parameters():
+                if "lora_B" in name:
+                    param.normal_(std=0.02)
+        path = os.path.join(output_dir, f"adapter_{i:03d}_r{rank}")
+        lora_model.save_pretrained(path)
+        if quant_dtype:
+            quantize_adapter(path, quant_dtype=quant_dtype)
+        paths.append(path)
+    return paths
+
+
+def run_benchmark(num_adapters: int = 8,
+                  ranks: Optional[List[int]] = None,
+                  n_layer: int = 2,
+                  n_embd: int = 128,
+                  vocab_size: int = 1000,
+                  eviction_cache_size: int = 2,
+                  repeats: int = 3,
+                  seed: int = 0,
+                  quant_dtype: Optional[str] = None,
+                  verbose: bool = False) -> Dict[str, Any]:
+    """
+    Runs the full benchmark and returns the results dictionary.
+
+    Args:
+        num_adapters (int): Number of adapters to generate.
+        ranks (Optional[List[int]]): LoRA ranks, cycled across adapters.
+        n_layer (int): Base model depth.
+        n_embd (int): Base model width.
+        vocab_size (int): Base model vocabulary size.
+        eviction_cache_size (int): Cache size used for the eviction and switch phases.
+        repeats (int): Passes over the adapter set for the warm, eviction and switch phases.
+        seed (int): Seed for model and adapter generation.
+        quant_dtype (Optional[str]): Also store adapters quantized ("int8"/"fp8") and load those.
+        verbose (bool): Keep the loader's progress output.
+
+    Returns:
+        Dict[str, Any]: Configuration, environment and metric summaries.
+    """
+    ranks = ranks or [4, 8, 16, 32]
+    if num_adapters <= eviction_cache_size:
+        raise ValueError("num_adapters must exceed eviction_cache_size, so that switches and loads evict.")
+
+    work_dir = tempfile.mkdtemp(prefix="tanuki_adapter_bench_")
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with quiet, warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            base_model = build_base_model(n_layer, n_embd, vocab_size, seed)
+            adapter_paths = generate_adapters(base_model, work_dir, num_adapters, ranks, seed, quant_dtype)
+
+            # Cold loads and warm hits: the cache holds every adapter.
+            loader = AdapterLoaderUnloader(copy.deepcopy(base_model), None, max_cache_size=num_adapters,
+                                           vram_budget_gb=float("inf"))
+            cold_ms, rss_deltas = [], []
+            for path in adapter_paths:
+                rss_before = _rss_mb()
+                start = time.perf_counter()
+                loader.load_adapter(path)
+                cold_ms.append(1000 * (time.perf_counter() - start))
+                rss_deltas.append(_rss_mb() - rss_before)
+
+            warm_ms = []
+            for _ in range(repeats):
+                for path in adapter_paths:
+                    start = time.perf_counter()
+                    loader.load_adapter(path)
+                    warm_ms.append(1000 * (time.perf_counter() - start))
+
+            # An agent cycling through more adapters than the manager keeps resident: every switch
+            # misses, and once the cache is full the manager evicts through the loader before loading.
+            switch_loader = AdapterLoaderUnloader(copy.deepcopy(base_model), None,
+                                                  max_cache_size=eviction_cache_size,
+                                                  vram_budget_gb=float("inf"))
+            manager = LoRAAdapterManager(work_dir, loader=switch_loader, cache_size=eviction_cache_size)
+            switch_ms = []
+            for _ in range(repeats):
+                for path in adapter_paths:
+                    start = time.perf_counter()
+                    if not manager.switch_adapter("benchmark-agent", os.path.basename(path)):
+                        raise RuntimeError(f"Switching to {path} failed.")
+                    switch_ms.append(1000 * (time.perf_counter() - start))
+            switch_stats = manager.get_residency_stats()
+
+            # Evictions: a small cache forces an LRU unload before every load.
+            evicting_loader = AdapterLoaderUnloader(copy.deepcopy(base_model), None,
+                                                    max_cache_size=eviction_cache_size,
+                                                    vram_budget_gb=float("inf"))
+            eviction_ms = []
+            for _ in range(repeats):
+                for path in adapter_paths:
+                    will_evict = (path not in evicting_loader.adapter_cache
+                                  and len(evicting_loader.adapter_cache) >= eviction_cache_size)
+                    start = time.perf_counter()
+                    evicting_loader.load_adapter(path)
+                    elapsed = 1000 * (time.perf_counter() - start)
+                    if will_evict:
+                        eviction_ms.append(elapsed)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "config": {
+            "num_adapters": num_adapters,
+            "ranks": ranks,
+            "n_layer": n_layer,
+            "n_embd": n_embd,
+            "vocab_size": vocab_size,
+            "eviction_cache_size": eviction_cache_size,
+            "repeats": repeats,
+            "seed": seed,
+            "quant_dtype": quant_dtype,
+        },
+        "environment": environment(torch=torch.__version__),
+        "metrics": {
+            "cold_load_ms": summarize(cold_ms),
+            "warm_hit_ms": summarize(warm_ms),
+            "eviction_load_ms": summarize(eviction_ms),
+            "switch_ms": summarize(switch_ms),
+            "rss_delta_mb_per_adapter": summarize(rss_deltas),
+        },
+        "switches": {key: switch_stats[key] for key in ("switches", "hits", "misses", "evictions")},
+    }
+
+
+def check_regressions(results: Dict[str, Any],
+                      thresholds: Dict[str, float],
+                      baseline: Optional[Dict[str, Any]] = None,
+                      tolerance: float = 0.25) -> List[str]:
+    """
+    Compares results against absolute thresholds and, optionally, a baseline run.
+
+    Args:
+        results (Dict[str, Any]): Output of `run_benchmark`.
+        thresholds (Dict[str, float]): "metric.stat" -> maximum allowed value.
+        baseline (Optional[Dict[str, Any]]): A previous `run_benchmark` result.
+        tolerance (float): Allowed relative slowdown against the baseline.
+
+    Returns:
+        List[str]: Human-readable regression messages; empty if none.
+    """
+    failures = []
+    metrics = results["metrics"]
+    for key, limit in thresholds.items():
+        metric, stat = key.rsplit(".", 1)
+        value = metrics.get(metric, {}).get(stat)
+        if value is not None and value > limit:
+            failures.append(f"{key}={value:.3f} exceeds threshold {limit:.3f}")
+
+    if baseline:
+        for metric, summary in baseline.get("metrics", {}).items():
+            previous = summary.get("p50")
+            current = metrics.get(metric, {}).get("p50")
+            if previous and current is not None and metric.endswith("_ms") and current > previous * (1 + tolerance):
+                failures.append(
+                    f"{metric}.p50={current:.3f} regressed more than {tolerance:.0%} from baseline {previous:.3f}"
+                )
+    return failures
+
+
+def _load_json(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not path:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def check(results: Dict[str, Any], thresholds: Optional[str], baseline: Optional[str], tolerance: float) -> List[str]:
+    """`check_regressions` with the thresholds and baseline read from the given JSON files."""
+    return check_regressions(results, _load_json(thresholds) or DEFAULT_THRESHOLDS, _load_json(baseline), tolerance)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--num-adapters", type=int, default=8)
+    parser.add_argument("--ranks", type=comma_separated(int), default=[4, 8, 16, 32], help="Comma-separated LoRA ranks.")
+    parser.add_argument("--n-layer", type=int, default=2)
+    parser.add_argument("--n-embd", type=int, default=128)
+    parser.add_argument("--eviction-cache-size", type=int, default=2)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quant-dtype", choices=["int8", "fp8"], default=None)
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--thresholds", type=str, default=None, help="JSON file of metric.stat -> max value.")
+    parser.add_argument("--baseline", type=str, default=None, help="Previous results JSON to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p50 slowdown against the baseline.")
+
+
+def report(results: Dict[str, Any]):
+    for metric, summary in results["metrics"].items():
+        if summary.get("count"):
+            print(f"{metric:>26}: p50={summary['p50']:.3f} p95={summary['p95']:.3f} mean={summary['mean']:.3f}")
+    switches = results["switches"]
+    print(f"switches: {switches['switches']} ({switches['misses']} misses, {switches['evictions']} evictions)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return benchmark_main(run_benchmark, argv, "Benchmark LoRA adapter load and switch latency on CPU.",
+                          "adapter_bench.json", add_arguments, report, check,
+                          check_options=("thresholds", "baseline", "tolerance"))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+"""
+Quantized LoRA Adapter Storage
+
+Optional on-disk format for LoRA adapters in which the A/B matrices are stored
+as int8 or fp8 with per-channel (per-row) scales. Adapters saved this way are
+roughly 4x (int8/fp8 vs fp32) smaller on disk and in host RAM, and are
+dequantized back to the base model's dtype when attached by
+`AdapterLoaderUnloader`.
+"""
+
+import json
+import math
+import os
+import shutil
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import torch
+from safetensors import safe_open
+from safetensors.torch import load_file, save_file
+
+QUANTIZED_ADAPTER_FILE = "adapter_model.quantized.safetensors"
+FULL_PRECISION_ADAPTER_FILES = ("adapter_model.safetensors", "adapter_model.bin")
+ADAPTER_CONFIG_FILE = "adapter_config.json"
+QUANTIZED_FORMAT_NAME = "tanuki-lora-quantized"
+QUANTIZED_FORMAT_VERSION = "1"
+
+# Largest representable magnitude for each storage dtype; used to derive scales.
+_QUANT_MAX = {
+    "int8": 127.0,
+    "fp8": 448.0,  # float8_e4m3fn
+}
+
+# Largest logit difference from the full-precision adapter accepted for each
+# format, on the tiny GPT-2 model of the check below (and tests/). Measured:
+# about 5e-3 for int8 and 2.5e-2 for fp8.
+MAX_ABS_LOGIT_DIFF = {
+    "int8": 1e-2,
+    "fp8": 5e-2,
+}
+
+_DTYPE_NAMES = {
+    torch.float32: "float32",
+    torch.float16: "float16",
+    torch.bfloat16: "bfloat16",
+}
+
+
+def _fp8_dtype() -> torch.dtype:
+    """Returns the fp8 storage dtype, or raises if this torch build lacks it."""
+    dtype = getattr(torch, "float8_e4m3fn", None)
+    if dtype is None:
+        raise ValueError("FP8 adapter storage requires torch>=2.1 (torch.float8_e4m3fn).")
+    return dtype
+
+
+def _is_lora_matrix(name: str, tensor: torch.Tensor) -> bool:
+    """Only the 2-D LoRA A/B matrices are quantized; everything else is kept as-is."""
+    return tensor.dim() == 2 and ("lora_A" in name or "lora_B" in name)
+
+
+def quantize_tensor(tensor: torch.Tensor, quant_dtype: str = "int8") -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Symmetric per-channel quantization of a 2-D tensor (one scale per row).
+
+    Args:
+        tensor (torch.Tensor): The 2-D weight matrix to quantize.
+        quant_dtype (str): Storage dtype, "int8" or "fp8".
+
+    Returns:
+        Tuple[torch.Tensor, torch.Tensor]: The quantized tensor and its float32 per-row scales.
+    """
+    if quant_dtype not in _QUANT_MAX:
+        raise ValueError(f"Unsupported quantization dtype: {quant_dtype}. Expected one of {list(_QUANT_MAX)}.")
+
+    weight = tensor.detach().to(torch.float32)
+    absmax = weight.abs().amax(dim=1, keepdim=True)
+    scale = (absmax / _QUANT_MAX[quant_dtype]).clamp(min=1e-12)
+    scaled = weight / scale
+
+    if quant_dtype == "int8":
+        quantized = torch.round(scaled).clamp(-127, 127).to(torch.int8)
+    else:
+        quantized = scaled.to(_fp8_dtype())
+    return quantized.contiguous(), scale.squeeze(1).contiguous()
+
+
+def dequantize_tensor(quantized: torch.Tensor, scale: torch.Tensor, dtype: torch.dtype = torch.float32) -> torch.Tensor:
+    """Reverses `quantize_tensor`, returning a tensor in the requested dtype."""
+    return (quantized.to(torch.float32) * scale.unsqueeze(1)).to(dtype)
+
+
+@dataclass
+class QuantizedAdapter:
+    """
+    A quantized adapter state dict as held in host RAM.
+
+    `tensors` maps "<name>.qweight" / "<name>.scale" pairs for quantized LoRA
+    matrices and plain "<name>" entries for tensors stored at full precision.
+    """
+    tensors: Dict[str, torch.Tensor]
+    quant_dtype: str
+    original_dtypes: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def nbytes(self) -> int:
+        """Host-RAM footprint of the stored tensors in bytes."""
+        return sum(t.numel() * t.element_size() for t in self.tensors.values())
+
+    def dequantized_nbytes(self, dtype: torch.dtype) -> int:
+        """Bytes of the state dict `dequantize(dtype)` rebuilds, i.e. what the adapter takes once loaded."""
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        return sum(tensor.numel() * (itemsize if name.endswith(".qweight") or tensor.is_floating_point()
+                                     else tensor.element_size())
+                   for name, tensor in self.tensors.items() if not name.endswith(".scale"))
+
+    def dequantize(self, dtype: Optional[torch.dtype] = None) -> Dict[str, torch.Tensor]:
+        """
+        Rebuilds a full-precision PEFT state dict.
+
+        Args:
+            dtype (Optional[torch.dtype]): Target dtype. Defaults to each tensor's original dtype.
+
+        Returns:
+            Dict[str, torch.Tensor]: State dict suitable for `set_peft_model_state_dict`.
+        """
+        state_dict = {}
+        for name, tensor in self.tensors.items():
+            if name.endswith(".scale"):
+                continue
+            if name.endswith(".qweight"):
+                base_name = name[:-len(".qweight")]
+                target_dtype = dtype or getattr(torch, self.original_dtypes.get(base_name, "float32"))
+                state_dict[base_name] = dequantize_tensor(tensor, self.tensors[f"{base_name}.scale"], target_dtype)
+            else:
+                state_dict[name] = tensor.to(dtype) if dtype is not None and tensor.is_floating_point() else tensor
+        return state_dict
+
+
+def quantize_state_dict(state_dict: Dict[str, torch.Tensor], quant_dtype: str = "int8") -> QuantizedAdapter:
+    """Quantizes the LoRA A/B matrices of a PEFT adapter state dict."""
+    tensors: Dict[str, torch.Tensor] = {}
+    original_dtypes: Dict[str, str] = {}
+    for name, tensor in state_dict.items():
+        if _is_lora_matrix(name, tensor):
+            quantized, scale = quantize_tensor(tensor, quant_dtype)
+            tensors[f"{name}.qweight"] = quantized
+            tensors[f"{name}.scale"] = scale
+            original_dtypes[name] = _DTYPE_NAMES.get(tensor.dtype, "float32")
+        else:
+            tensors[name] = tensor.detach().contiguous()
+    return QuantizedAdapter(tensors=tensors, quant_dtype=quant_dtype, original_dtypes=original_dtypes)
+
+
+def has_quantized_weights(adapter_path: str) -> bool:
+    """Checks whether an adapter directory contains quantized weights."""
+    return os.path.isfile(os.path.join(adapter_path, QUANTIZED_ADAPTER_FILE))
+
+
+# Element sizes of the non-floating safetensors dtypes; floating tensors are cast on load.
+_SAFETENSORS_ITEMSIZES = {"BOOL": 1, "U8": 1, "I8": 1, "I16": 2, "U16": 2, "I32": 4, "U32": 4, "I64": 8, "U64": 8}
+
+
+def dequantized_nbytes(adapter_path: str, dtype: torch.dtype) -> int:
+    """
+    Bytes an adapter's quantized weights take once dequantized to `dtype`, as
+    `QuantizedAdapter.dequantized_nbytes`, read from the file's header without loading the tensors.
+    """
+    itemsize = torch.empty((), dtype=dtype).element_size()
+    total = 0
+    with safe_open(os.path.join(adapter_path, QUANTIZED_ADAPTER_FILE), framework="pt") as f:
+        for name in f.keys():
+            if name.endswith(".scale"):
+                continue
+            tensor_slice = f.get_slice(name)
+            numel = math.prod(tensor_slice.get_shape())
+            if name.endswith(".qweight"):
+                total += numel * itemsize
+            else:
+                total += numel * _SAFETENSORS_ITEMSIZES.get(tensor_slice.get_dtype(), itemsize)
+    return total
+
+
+def _load_full_precision_state_dict(adapter_path: str) -> Dict[str, torch.Tensor]:
+    """Loads the full-precision weights PEFT wrote with `save_pretrained`."""
+    safetensors_path = os.path.join(adapter_path, FULL_PRECISION_ADAPTER_FILES[0])
+    if os.path.isfile(safetensors_path):
+        return load_file(safetensors_path)
+    bin_path = os.path.join(adapter_path, FULL_PRECISION_ADAPTER_FILES[1])
+    if os.path.isfile(bin_path):
+        return torch.load(bin_path, map_location="cpu")
+    raise FileNotFoundError(f"No adapter weights found in {adapter_path}.")
+
+
+def save_quantized_adapter(quantized: QuantizedAdapter, output_path: str) -> str:
+    """
+    Writes a quantized adapter to `output_path` in the quantized safetensors format.
+
+    Returns:
+        str: Path of the written weights file.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    file_path = os.path.join(output_path, QUANTIZED_ADAPTER_FILE)
+    metadata = {
+        "format": QUANTIZED_FORMAT_NAME,
+        "version": QUANTIZED_FORMAT_VERSION,
+        "quant_dtype": quantized.quant_dtype,
+        "original_dtypes": json.dumps(quantized.original_dtypes),
+    }
+    save_file(quantized.tensors, file_path, metadata=metadata)
+    return file_path
+
+
+def quantize_adapter(adapter_path: str, output_path: Optional[str] = None, quant_dtype: str = "int8") -> str:
+    """
+    Converts a full-precision PEFT adapter directory to the quantized format.
+
+    Args:
+        adapter_path (str): Directory produced by `PeftModel.save_pretrained`.
+        output_path (Optional[str]): Destination directory. Defaults to `adapter_path`,
+                                     writing the quantized file alongside the original.
+        quant_dtype (str): Storage dtype, "int8" or "fp8".
+
+    Returns:
+        str: Path of the written quantized weights file.
+    """
+    output_path = output_path or adapter_path
+    quantized = quantize_state_dict(_load_full_precision_state_dict(adapter_path), quant_dtype)
+    file_path = save_quantized_adapter(quantized, output_path)
+
+    config_src = os.path.join(adapter_path, ADAPTER_CONFIG_FILE)
+    config_dst = os.path.join(output_path, ADAPTER_CONFIG_FILE)
+    if os.path.isfile(config_src) and os.path.abspath(config_src) != os.path.abspath(config_dst):
+        shutil.copyfile(config_src, config_dst)
+
+    print(f"AdapterQuantization: Wrote {quant_dtype} adapter to {file_path}.")
+    return file_path
+
+
+def load_quantized_adapter(adapter_path: str) -> QuantizedAdapter:
+    """Reads a quantized adapter from disk without dequantizing it."""
+    file_path = os.path.join(adapter_path, QUANTIZED_ADAPTER_FILE)
+    with safe_open(file_path, framework="pt") as f:
+        metadata = f.metadata() or {}
+        tensors = {name: f.get_tensor(name) for name in f.keys()}
+
+    if metadata.get("format") != QUANTIZED_FORMAT_NAME:
+        raise ValueError(f"{file_path} is not a {QUANTIZED_FORMAT_NAME} file.")
+    return QuantizedAdapter(
+        tensors=tensors,
+        quant_dtype=metadata.get("quant_dtype", "int8"),
+        original_dtypes=json.loads(metadata.get("original_dtypes", "{}")),
+    )
+
+
+def _directory_size_bytes(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(path)
+        for name in files
+    )
+
+
+if __name__ == "__main__":
+    # Load-latency, memory and logit-accuracy check on a tiny, randomly initialised
+    # CPU model. Runs fully offline.
+    import copy
+    import tempfile
+    import time
+
+    from peft import LoraConfig, get_peft_model, get_peft_model_state_dict, PeftModel
+    from transformers import GPT2Config, GPT2LMHeadModel
+
+    from .resource_management import AdapterLoaderUnloader
+
+    torch.manual_seed(0)
+    base_model = GPT2LMHeadModel(GPT2Config(n_layer=2, n_embd=128, n_head=4, vocab_size=1000, n_positions=128,
+                                            bos_token_id=0, eos_token_id=0))
+    base_model.eval()
+    input_ids = torch.randint(0, 1000, (2, 32))
+
+    work_dir = tempfile.mkdtemp(prefix="tanuki_adapter_quant_")
+    full_path = os.path.join(work_dir, "full")
+
+    lora_model = get_peft_model(
+        copy.deepcopy(base_model),
+        LoraConfig(r=16, lora_alpha=32, target_modules=["c_attn", "c_proj"], fan_in_fan_out=True, task_type="CAUSAL_LM"),
+    )
+    # lora_B is zero-initialised; randomise it so the adapter actually changes the logits.
+    with torch.no_grad():
+        for name, param in lora_model.named_parameters():
+            if "lora_B" in name:
+                param.normal_(std=0.02)
+    lora_model.save_pretrained(full_path)
+    full_state_dict = get_peft_model_state_dict(lora_model)
+    full_bytes = sum(t.numel() * t.element_size() for t in full_state_dict.values())
+
+    with torch.no_grad():
+        reference_logits = PeftModel.from_pretrained(copy.deepcopy(base_model), full_path).eval()(input_ids).logits
+
+    variants = {"full": full_path}
+    for quant_dtype in ("int8", "fp8"):
+        try:
+            variant_path = os.path.join(work_dir, quant_dtype)
+            quantize_adapter(full_path, variant_path, quant_dtype)
+            variants[quant_dtype] = variant_path
+        except ValueError as e:
+            print(f"Skipping {quant_dtype}: {e}")
+
+    print("\n--- Quantized Adapter Benchmark ---")
+    failures = []
+    for label, path in variants.items():
+        latencies = []
+        for _ in range(5):
+            loader = AdapterLoaderUnloader(copy.deepcopy(base_model), None, prefer_quantized=(label != "full"))
+            start = time.perf_counter()
+            adapter_model = loader.load_adapter(path)
+            latencies.append(time.perf_counter() - start)
+        with torch.no_grad():
+            logits = adapter_model.eval()(input_ids).logits
+        max_abs_diff = (logits - reference_logits).abs().max().item()
+        tolerance = MAX_ABS_LOGIT_DIFF.get(label, 0.0)
+        if max_abs_diff > tolerance:
+            failures.append(f"{label}: max_abs_logit_diff={max_abs_diff:.2e} exceeds {tolerance:.0e}")
+        if label == "full":
+            host_bytes = full_bytes
+        else:
+            host_bytes = load_quantized_adapter(path).nbytes
+        print(
+            f"{label:>5}: disk={_directory_size_bytes(path) / 1024:.1f}KB "
+            f"host_ram={host_bytes / 1024:.1f}KB "
+            f"load_p50={sorted(latencies)[len(latencies) // 2] * 1000:.1f}ms "
+            f"max_abs_logit_diff={max_abs_diff:.2e} (tolerance {tolerance:.0e})"
+        )
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    raise SystemExit(1 if failures else 0)
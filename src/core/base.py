@@ -8,7 +8,10 @@ and components in the Tanuki-PyCharm system inherit from.
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional, Union
 from enum import Enum
+from collections import OrderedDict
 import logging
+import threading
+import time
 from dataclasses import dataclass
 
 
@@ -98,7 +101,12 @@ class BaseAgent(ABC):
     
     Each expert agent must implement the execute method and specify
     its capabilities and requirements.
+
+    When an adapter manager is set (see `set_adapter_manager`), adapter
+    loading is delegated to it so all agents share one residency budget.
     """
+
+    adapter_manager: Optional["LoRAAdapterManager"] = None
     
     def __init__(self, agent_name: str, agent_type: AgentType, config: Optional[Dict[str, Any]] = None):
         """Initialize the base agent."""
@@ -143,6 +151,11 @@ class BaseAgent(ABC):
         """
         pass
     
+    @classmethod
+    def set_adapter_manager(cls, manager: Optional["LoRAAdapterManager"]) -> None:
+        """Share one adapter manager across all agents of this class and its subclasses."""
+        cls.adapter_manager = manager
+
     def load_adapter(self, adapter_path: str) -> bool:
         """
         Load LoRA adapter for this agent.
@@ -153,6 +166,9 @@ class BaseAgent(ABC):
         Returns:
             True if loaded successfully
         """
+        if self.adapter_manager is not None and not self.adapter_manager.load_adapter_path(self.agent_name, adapter_path):
+            self.logger.warning(f"Adapter manager refused to load {adapter_path} for {self.agent_name}")
+            return False
         self.lora_adapter_path = adapter_path
         self._is_loaded = True
         self.logger.info(f"Loaded LoRA adapter for {self.agent_name}: {adapter_path}")
@@ -165,6 +181,8 @@ class BaseAgent(ABC):
         Returns:
             True if unloaded successfully
         """
+        if self.adapter_manager is not None:
+            self.adapter_manager.unload_adapter(self.agent_name)
         self.lora_adapter_path = None
         self._is_loaded = False
         self.logger.info(f"Unloaded LoRA adapter for {self.agent_name}")
@@ -172,6 +190,9 @@ class BaseAgent(ABC):
     
     def is_loaded(self) -> bool:
         """Check if agent's LoRA adapter is loaded."""
+        if self.adapter_manager is not None:
+            # The manager's binding is the source of truth; it may have been changed without this agent.
+            return self.agent_name in self.adapter_manager.get_loaded_adapters()
         return self._is_loaded
     
     def get_status(self) -> Dict[str, Any]:
@@ -179,7 +200,7 @@ class BaseAgent(ABC):
         return {
             "agent_name": self.agent_name,
             "agent_type": self.agent_type.value,
-            "is_loaded": self._is_loaded,
+            "is_loaded": self.is_loaded(),
             "adapter_path": self.lora_adapter_path,
             "capabilities": self.get_capabilities(),
             "required_tools": self.get_required_tools()
@@ -202,21 +223,210 @@ class LayerProtocol(ABC):
         pass
 
 
+@dataclass
+class AdapterResidency:
+    """Residency record for one adapter held by the LoRAAdapterManager."""
+    adapter_path: str
+    handle: Any
+    ref_count: int = 0
+    load_time_s: float = 0.0
+    last_used: float = 0.0
+    hits: int = 0
+
+
 class LoRAAdapterManager:
     """
     Manager for LoRA adapter loading, unloading, and switching.
     
     Handles the dynamic switching between the 127 specialized agents
     by managing their LoRA adapters efficiently.
+
+    A single manager is meant to be shared by all agents (see
+    `BaseAgent.set_adapter_manager`). It keeps a thread-safe residency table
+    of at most `cache_size` adapters, reference-counted per agent binding so
+    adapters in use are never evicted. Actual loads and unloads are delegated
+    to an `AdapterLoaderUnloader` when one is supplied; the manager then also
+    decides every eviction the loader's VRAM budget calls for, and the
+    loader's own LRU eviction is turned off.
+
+    Loads and evictions run outside the residency lock, one at a time, so
+    hits and bindings of resident adapters never wait on a load. Concurrent
+    acquirers of an adapter that is being loaded wait for that load instead
+    of repeating it.
     """
     
-    def __init__(self, adapter_base_path: str = "models/adapters"):
-        """Initialize the LoRA adapter manager."""
+    def __init__(self,
+                 adapter_base_path: str = "models/adapters",
+                 loader: Optional[Any] = None,
+                 cache_size: int = 10):
+        """
+        Initialize the LoRA adapter manager.
+
+        Args:
+            adapter_base_path: Directory containing the adapters
+            loader: Optional `AdapterLoaderUnloader` that performs the actual loads
+            cache_size: Maximum number of resident adapters
+        """
         self.adapter_base_path = adapter_base_path
+        self.loader = loader
+        self.cache_size = cache_size
         self.loaded_adapters: Dict[str, str] = {}
-        self.adapter_cache: Dict[str, Any] = {}
+        self.adapter_cache: "OrderedDict[str, AdapterResidency]" = OrderedDict()
         self.logger = logging.getLogger("tanuki.lora_manager")
+        self._lock = threading.RLock()
+        # Serializes loads and evictions, the only calls into the loader; never taken under `_lock`.
+        self._load_lock = threading.Lock()
+        self._loading: Dict[str, threading.Event] = {}  # adapter path -> set when its in-flight load ends
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "switches": 0,
+            "rejected": 0,
+            "total_load_time_s": 0.0,
+            "total_switch_time_s": 0.0,
+        }
+
+        # The loader's own LRU would evict adapters agents hold; evictions go through _evict_one instead.
+        if loader is not None and hasattr(loader, "auto_evict"):
+            loader.auto_evict = False
+
+    @classmethod
+    def from_config(cls, config: "SystemConfig", loader: Optional[Any] = None,
+                    adapter_base_path: str = "models/adapters") -> "LoRAAdapterManager":
+        """Create a manager sized by `system.adapter_cache_size`."""
+        return cls(adapter_base_path=adapter_base_path,
+                   loader=loader,
+                   cache_size=config.get("system.adapter_cache_size", 10))
+
+    def _resolve_path(self, adapter_name: str) -> str:
+        """Map an adapter name to its path under the adapter base path."""
+        return f"{self.adapter_base_path}/{adapter_name}"
+
+    def _evict_one(self) -> bool:
+        """Evict the least recently used unreferenced adapter. Caller holds the load lock."""
+        with self._lock:
+            adapter_path = next((path for path, residency in self.adapter_cache.items()
+                                 if residency.ref_count == 0), None)
+            if adapter_path is None:
+                return False
+            # Gone from the table at once; reloading it has to wait for the load lock, so after the unload.
+            del self.adapter_cache[adapter_path]
+            self._stats["evictions"] += 1
+        if self.loader is not None:
+            self.loader.unload_adapter(adapter_path)
+        self.logger.info(f"Evicted adapter {adapter_path}")
+        return True
+
+    def _vram_shortfall(self, adapter_path: str) -> float:
+        """VRAM the loader needs freed before it can load `adapter_path`. Caller holds the load lock."""
+        if self.loader is None or not hasattr(self.loader, "vram_shortfall_gb"):
+            return 0.0
+        return self.loader.vram_shortfall_gb(adapter_path)
+
+    def _make_room(self, adapter_path: str) -> bool:
+        """Evict until `adapter_path` fits the cache and the loader's budget. Caller holds the load lock."""
+        while True:
+            with self._lock:
+                full = len(self.adapter_cache) >= self.cache_size
+            if not full and self._vram_shortfall(adapter_path) <= 0:
+                return True
+            if not self._evict_one():
+                with self._lock:
+                    self._stats["rejected"] += 1
+                self.logger.warning(
+                    f"Cannot load adapter {adapter_path}: every resident adapter is in use, "
+                    f"and the cache size ({self.cache_size}) or the loader's VRAM budget is reached"
+                )
+                return False
+
+    def _acquire(self, adapter_path: str) -> Optional[AdapterResidency]:
+        """Make an adapter resident and take a reference on it. Caller must not hold the lock."""
+        while True:
+            with self._lock:
+                residency = self.adapter_cache.get(adapter_path)
+                if residency is not None:
+                    self.adapter_cache.move_to_end(adapter_path)
+                    residency.hits += 1
+                    residency.ref_count += 1
+                    residency.last_used = time.time()
+                    self._stats["hits"] += 1
+                    return residency
+                loading = self._loading.get(adapter_path)
+                if loading is None:
+                    loading = self._loading[adapter_path] = threading.Event()
+                    break
+            # Another thread is loading it. If that load fails, this one tries in turn.
+            loading.wait()
+
+        try:
+            with self._load_lock:
+                if not self._make_room(adapter_path):
+                    return None
+                start = time.perf_counter()
+                handle = self.loader.load_adapter(adapter_path) if self.loader is not None else adapter_path
+                load_time = time.perf_counter() - start
+            with self._lock:
+                residency = AdapterResidency(adapter_path=adapter_path, handle=handle, ref_count=1,
+                                             load_time_s=load_time, last_used=time.time())
+                self.adapter_cache[adapter_path] = residency
+                self._stats["misses"] += 1
+                self._stats["total_load_time_s"] += load_time
+            return residency
+        finally:
+            with self._lock:
+                del self._loading[adapter_path]
+            loading.set()
+
+    def _release(self, adapter_path: str) -> None:
+        """Drop one reference on a resident adapter. Caller holds the lock."""
+        residency = self.adapter_cache.get(adapter_path)
+        if residency is not None and residency.ref_count > 0:
+            residency.ref_count -= 1
+
+    def load_adapter_path(self, agent_name: str, adapter_path: str) -> bool:
+        """
+        Bind the adapter at `adapter_path` to the specified agent.
+
+        The adapter stays pinned until the agent unloads or switches it.
         
+        Args:
+            agent_name: Name of the agent
+            adapter_path: Path to the adapter
+            
+        Returns:
+            True if loaded successfully
+        """
+        with self._lock:
+            current = self.loaded_adapters.get(agent_name)
+            if current == adapter_path:
+                residency = self.adapter_cache[adapter_path]
+                self.adapter_cache.move_to_end(adapter_path)
+                residency.hits += 1
+                residency.last_used = time.time()
+                self._stats["hits"] += 1
+                return True
+            if current is not None:
+                self._release(current)
+                self.loaded_adapters.pop(agent_name)
+
+        try:
+            residency = self._acquire(adapter_path)
+        except Exception as e:
+            self.logger.error(f"Failed to load adapter {adapter_path} for agent {agent_name}: {e}")
+            return False
+        if residency is None:
+            return False
+
+        with self._lock:
+            # The agent may have been bound again while the adapter loaded; the latest load wins.
+            previous = self.loaded_adapters.get(agent_name)
+            if previous is not None:
+                self._release(previous)
+            self.loaded_adapters[agent_name] = adapter_path
+        self.logger.info(f"Loaded adapter {adapter_path} for agent {agent_name}")
+        return True
+
     def load_adapter(self, agent_name: str, adapter_name: str) -> bool:
         """
         Load a LoRA adapter for the specified agent.
@@ -228,14 +438,14 @@ class LoRAAdapterManager:
         Returns:
             True if loaded successfully
         """
-        adapter_path = f"{self.adapter_base_path}/{adapter_name}"
-        self.loaded_adapters[agent_name] = adapter_path
-        self.logger.info(f"Loaded adapter {adapter_name} for agent {agent_name}")
-        return True
+        return self.load_adapter_path(agent_name, self._resolve_path(adapter_name))
     
     def unload_adapter(self, agent_name: str) -> bool:
         """
         Unload the LoRA adapter for the specified agent.
+
+        The adapter becomes evictable once no agent references it; it stays
+        resident until the cache needs the slot.
         
         Args:
             agent_name: Name of the agent
@@ -243,11 +453,13 @@ class LoRAAdapterManager:
         Returns:
             True if unloaded successfully
         """
-        if agent_name in self.loaded_adapters:
-            adapter_path = self.loaded_adapters.pop(agent_name)
-            self.logger.info(f"Unloaded adapter for agent {agent_name}: {adapter_path}")
-            return True
-        return False
+        with self._lock:
+            if agent_name in self.loaded_adapters:
+                adapter_path = self.loaded_adapters.pop(agent_name)
+                self._release(adapter_path)
+                self.logger.info(f"Unloaded adapter for agent {agent_name}: {adapter_path}")
+                return True
+            return False
     
     def switch_adapter(self, agent_name: str, new_adapter_name: str) -> bool:
         """
@@ -260,12 +472,57 @@ class LoRAAdapterManager:
         Returns:
             True if switched successfully
         """
+        start = time.perf_counter()
         self.unload_adapter(agent_name)
-        return self.load_adapter(agent_name, new_adapter_name)
+        success = self.load_adapter(agent_name, new_adapter_name)
+        with self._lock:
+            self._stats["switches"] += 1
+            self._stats["total_switch_time_s"] += time.perf_counter() - start
+        return success
+
+    def get_adapter(self, agent_name: str) -> Optional[Any]:
+        """Get the loaded adapter object bound to an agent, if any."""
+        with self._lock:
+            adapter_path = self.loaded_adapters.get(agent_name)
+            residency = self.adapter_cache.get(adapter_path) if adapter_path else None
+            return residency.handle if residency else None
+
+    def is_resident(self, adapter_path: str) -> bool:
+        """Check whether an adapter is currently resident."""
+        with self._lock:
+            return adapter_path in self.adapter_cache
     
     def get_loaded_adapters(self) -> Dict[str, str]:
         """Get dictionary of currently loaded adapters."""
-        return self.loaded_adapters.copy()
+        with self._lock:
+            return self.loaded_adapters.copy()
+
+    def get_residency_stats(self) -> Dict[str, Any]:
+        """
+        Get residency statistics for measuring agent switching costs.
+
+        Returns:
+            Dictionary with capacity, hit/miss/eviction counters, load and
+            switch timings, and the reference count of each resident adapter
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats.update({
+                "capacity": self.cache_size,
+                "resident": len(self.adapter_cache),
+                "pinned": sum(1 for r in self.adapter_cache.values() if r.ref_count > 0),
+                "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+                "avg_load_time_ms": 1000 * stats["total_load_time_s"] / stats["misses"] if stats["misses"] else 0.0,
+                "avg_switch_time_ms": (
+                    1000 * stats["total_switch_time_s"] / stats["switches"] if stats["switches"] else 0.0
+                ),
+                "adapters": {
+                    path: {"ref_count": r.ref_count, "hits": r.hits, "load_time_s": r.load_time_s}
+                    for path, r in self.adapter_cache.items()
+                },
+            })
+            return stats
     
     def preload_adapters(self, agent_adapter_map: Dict[str, str]) -> bool:
         """
@@ -315,6 +572,13 @@ class SystemConfig:
                 "devops": {"count": 15, "base_adapter": "tanuki-devops-base"},
                 "specialized": {"count": 50, "base_adapter": "tanuki-specialized-base"},
             },
+            "sandbox": {
+                "backend": "docker",  # "docker" or "process"
+                "pool_size": 0,
+                "max_concurrency": 8,
+                "per_language_images": False,
+                "result_cache_dir": None,  # Set to a directory to cache deterministic execution results.
+            },
             "pycharm": {
                 "integration_enabled": True,
                 "context_refresh_interval": 30,
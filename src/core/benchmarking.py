@@ -0,0 +1,86 @@
+"""
+Benchmark Harness
+
+The command-line driver shared by the `*_benchmark` modules. A benchmark
+module defines `run_benchmark(**options)`, which measures and returns a
+JSON-serializable results dictionary, the command-line options that feed
+it, and a `report` that prints a summary. `benchmark_main` parses the
+options, runs the benchmark, writes the results as JSON and prints the
+report. A benchmark that guards against performance regressions also passes
+a `check`, which compares the results with thresholds or a baseline run; any
+regression it reports makes the process exit non-zero.
+
+The correctness properties benchmarks exercise are asserted by the tests in
+tests/, at sizes CI can afford.
+"""
+
+import argparse
+import json
+import os
+import platform
+from typing import Callable, Dict, Any, List, Optional, Sequence
+
+
+def environment(**extra: Any) -> Dict[str, Any]:
+    """The interpreter, platform and CPU count a benchmark ran on, plus `extra` (e.g. library versions)."""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        **extra,
+    }
+
+
+def comma_separated(item_type: Callable[[str], Any] = str) -> Callable[[str], List[Any]]:
+    """An argparse type for a comma-separated list, e.g. `--sizes 1000,20000`."""
+    def parse(value: str) -> List[Any]:
+        return [item_type(item) for item in value.split(",") if item]
+    return parse
+
+
+def benchmark_main(run_benchmark: Callable[..., Dict[str, Any]],
+                   argv: Optional[List[str]],
+                   description: str,
+                   default_output: str,
+                   add_arguments: Callable[[argparse.ArgumentParser], None],
+                   report: Optional[Callable[[Dict[str, Any]], None]] = None,
+                   check: Optional[Callable[..., List[str]]] = None,
+                   check_options: Sequence[str] = ()) -> int:
+    """
+    Runs a benchmark from the command line.
+
+    Args:
+        run_benchmark (Callable[..., Dict[str, Any]]): Takes every option `add_arguments` defines,
+                                                       by its `dest`, as a keyword argument.
+        argv (Optional[List[str]]): Command-line arguments; defaults to `sys.argv[1:]`.
+        description (str): The parser's description.
+        default_output (str): Results JSON file used without `--output`.
+        add_arguments (Callable[[argparse.ArgumentParser], None]): Adds the benchmark's options.
+        report (Optional[Callable[[Dict[str, Any]], None]]): Prints a summary of the results.
+        check (Optional[Callable[..., List[str]]]): Takes the results and the `check_options`
+                                                   as keyword arguments; returns regression messages,
+                                                   stored under "regressions".
+        check_options (Sequence[str]): Options (by `dest`) that go to `check`, not `run_benchmark`.
+
+    Returns:
+        int: The process exit code: 1 if `check` reported a regression, else 0.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    add_arguments(parser)
+    parser.add_argument("--output", type=str, default=default_output, help="Results JSON file.")
+    options = vars(parser.parse_args(argv))
+    output = options.pop("output")
+    check_args = {name: options.pop(name) for name in check_options}
+
+    results = run_benchmark(**options)
+    regressions = check(results, **check_args) if check is not None else []
+    if check is not None:
+        results["regressions"] = regressions
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    if report is not None:
+        report(results)
+    print(f"Results written to {output}.")
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions else 0
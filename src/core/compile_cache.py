@@ -0,0 +1,57 @@
+import hashlib
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+from .disk_cache import DiskLRUCache
+
+
+class CompileCache:
+    """
+    Content-addressed cache of compiled sandbox artifacts.
+
+    Entries are keyed by the hash of (language, toolchain identity, source), so
+    the same program is compiled once per toolchain no matter how many inputs
+    it is run against. Artifacts are stored as tar archives of the build
+    directory and re-injected into the container on a hit.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024**2):
+        self.store = DiskLRUCache(cache_dir, max_bytes)
+        self._lock = threading.Lock()
+        self.time_saved_s = 0.0
+        self.compile_time_s = 0.0
+
+    @staticmethod
+    def make_key(language: str, toolchain_id: str, source: str) -> str:
+        """Returns the content address for a program under a given toolchain."""
+        digest = hashlib.sha256()
+        for part in (language, toolchain_id, source):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """Returns (artifact tar, metadata) on a hit, crediting the original compile time as saved."""
+        entry = self.store.get(key)
+        if entry is not None:
+            with self._lock:
+                self.time_saved_s += entry[1].get("compile_time_s", 0.0)
+        return entry
+
+    def put(self, key: str, artifact: bytes, language: str, compile_time_s: float):
+        """Stores the artifact tar of a successful compilation."""
+        with self._lock:
+            self.compile_time_s += compile_time_s
+        self.store.put(key, artifact, {"language": language, "compile_time_s": compile_time_s})
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counts, hit rate, time spent compiling and time saved by hits."""
+        stats = self.store.get_stats()
+        lookups = stats["hits"] + stats["misses"]
+        with self._lock:
+            stats.update({
+                "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+                "compile_time_s": self.compile_time_s,
+                "time_saved_s": self.time_saved_s,
+            })
+        return stats
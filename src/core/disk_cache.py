@@ -0,0 +1,122 @@
+import collections
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+
+class DiskLRUCache:
+    """
+    A size-bounded, on-disk key/value store with least-recently-used eviction.
+
+    Each entry is a `<key>.bin` payload plus a `<key>.json` metadata file.
+    Writes are atomic (temp file + rename), so several processes can share a
+    cache directory; an entry evicted by another process is simply a miss.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 512 * 1024**2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index: "collections.OrderedDict[str, int]" = collections.OrderedDict()  # key -> bytes on disk
+        self._total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._load_index()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.bin", f"{base}.json"
+
+    def _load_index(self):
+        """Rebuilds the LRU order from payload access times left by earlier runs."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".bin"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, name[:-len(".bin")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+    def _write_atomic(self, path: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _remove_entry(self, key: str):
+        """Drops an entry from disk and the index. Caller holds the lock."""
+        self._total_bytes -= self._index.pop(key, 0)
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """
+        Looks up an entry and marks it as recently used.
+
+        Returns:
+            Optional[Tuple[bytes, Dict[str, Any]]]: The payload and its metadata, or None on a miss.
+        """
+        data_path, meta_path = self._paths(key)
+        with self._lock:
+            try:
+                with open(data_path, "rb") as f:
+                    data = f.read()
+                with open(meta_path) as f:
+                    metadata = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._remove_entry(key)
+                self.stats["misses"] += 1
+                return None
+            os.utime(data_path)  # Persist recency for the next process that loads the index.
+            if key not in self._index:
+                self._total_bytes += len(data)
+            self._index[key] = len(data)
+            self._index.move_to_end(key)
+            self.stats["hits"] += 1
+            return data, metadata
+
+    def put(self, key: str, data: bytes, metadata: Optional[Dict[str, Any]] = None):
+        """Stores an entry, evicting least recently used entries to stay within `max_bytes`."""
+        if len(data) > self.max_bytes:
+            return
+        data_path, meta_path = self._paths(key)
+        with self._lock:
+            self._write_atomic(meta_path, json.dumps(metadata or {}).encode("utf-8"))
+            self._write_atomic(data_path, data)
+            self._total_bytes += len(data) - self._index.get(key, 0)
+            self._index[key] = len(data)
+            self._index.move_to_end(key)
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                oldest = next(iter(self._index))
+                self._remove_entry(oldest)
+                self.stats["evictions"] += 1
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self._paths(key)[0])
+
+    def clear(self):
+        """Removes every entry."""
+        with self._lock:
+            for key in list(self._index):
+                self._remove_entry(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns hit/miss/eviction counters with the current entry count and size."""
+        with self._lock:
+            return dict(self.stats, entries=len(self._index), bytes=self._total_bytes, max_bytes=self.max_bytes)
@@ -0,0 +1,194 @@
+"""
+Template process for `PythonForkServer`.
+
+Run as a standalone script (stdlib only, no package imports) so it starts in
+a clean interpreter:
+
+    python forkserver_template.py <socket_path> [module ...]
+
+It imports the given modules once, prints a JSON "ready" line on stdout and
+then serves requests on a Unix socket. Each connection carries one JSON
+request plus the stdout/stderr pipe ends (SCM_RIGHTS). The template forks a
+child per request and replies {"pid"}; the child applies rlimits, redirects
+its standard streams, sends {"started_at"} and runs the code as `__main__`.
+When the child exits the template kills what is left of its process group,
+reaps it and sends {"exit_code"}, always last.
+"""
+
+import importlib
+import json
+import os
+import resource
+import select
+import signal
+import socket
+import sys
+import time
+import traceback
+
+MAX_REQUEST_BYTES = 16 * 1024**2
+MAX_FDS = 2
+
+
+def _send(conn: socket.socket, message: dict):
+    conn.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def _run_child(conn: socket.socket, request: dict, fds: list):
+    """Runs in the forked child. Never returns."""
+    exit_code = 1
+    try:
+        os.setsid()  # Own process group, so the client can kill everything the program starts.
+        for signum in (signal.SIGCHLD, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)
+        signal.set_wakeup_fd(-1)
+
+        limits = request.get("limits", {})
+        if limits.get("cpu_seconds"):
+            resource.setrlimit(resource.RLIMIT_CPU, (limits["cpu_seconds"], limits["cpu_seconds"] + 1))
+        if limits.get("file_size"):
+            resource.setrlimit(resource.RLIMIT_FSIZE, (limits["file_size"], limits["file_size"]))
+        if limits.get("memory_bytes"):
+            # The preloaded modules already occupy address space; the limit applies on top of it.
+            with open("/proc/self/statm") as f:
+                baseline = int(f.read().split()[0]) * resource.getpagesize()
+            address_space = baseline + limits["memory_bytes"]
+            resource.setrlimit(resource.RLIMIT_AS, (address_space, address_space))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+        os.chdir(request["cwd"])
+        stdin_fd = os.open(request.get("stdin_path") or os.devnull, os.O_RDONLY)
+        os.dup2(stdin_fd, 0)
+        os.dup2(fds[0], 1)
+        os.dup2(fds[1], 2)
+        for fd in [stdin_fd] + fds:
+            os.close(fd)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", closefd=False, buffering=1)
+        sys.argv = [request.get("file_name", "script.py")]
+        sys.path[0] = request["cwd"]
+        os.environ.update(request.get("env", {}))
+
+        code = compile(request["code"], sys.argv[0], "exec")
+        _send(conn, {"started_at": time.monotonic()})
+        conn.close()
+        try:
+            exec(code, {"__name__": "__main__", "__file__": sys.argv[0], "__builtins__": __builtins__})
+            exit_code = 0
+        except SystemExit as e:
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except BaseException as e:
+            # Drop this frame so the traceback reads like a plain `python script.py` run.
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+            exit_code = 1
+    except BaseException:
+        try:
+            traceback.print_exc()
+        except BaseException:
+            pass
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def _receive_request(conn: socket.socket):
+    """Reads one newline-terminated JSON request and the file descriptors sent with it."""
+    data, fds = b"", []
+    while not data.endswith(b"\n"):
+        chunk, chunk_fds, _, _ = socket.recv_fds(conn, 65536, MAX_FDS)
+        if not chunk:
+            raise ConnectionError("Client closed the connection before sending a request.")
+        data += chunk
+        fds.extend(chunk_fds)
+        if len(data) > MAX_REQUEST_BYTES:
+            raise ValueError("Request too large.")
+    return json.loads(data), fds
+
+
+def serve(socket_path: str, modules: list):
+    preloaded, failed = [], {}
+    for name in modules:
+        try:
+            importlib.import_module(name)
+            preloaded.append(name)
+        except Exception as e:
+            failed[name] = f"{type(e).__name__}: {e}"
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+
+    # SIGCHLD wakes the select loop through a self-pipe, so exits are reported immediately.
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    print(json.dumps({"ready": True, "pid": os.getpid(), "preloaded": preloaded, "failed": failed}), flush=True)
+
+    children = {}  # pid -> connection awaiting the exit status
+    while True:
+        readable, _, _ = select.select([listener, wakeup_r, sys.stdin], [], [])
+        if sys.stdin in readable and not sys.stdin.buffer.read1(1):
+            break  # The client went away: shut down.
+        if wakeup_r in readable:
+            os.read(wakeup_r, 4096)
+        while children:
+            try:
+                exited = os.waitid(os.P_ALL, 0, os.WEXITED | os.WNOHANG | os.WNOWAIT)
+            except ChildProcessError:
+                break
+            if exited is None:
+                break
+            pid = exited.si_pid
+            # Until it is reaped, the child holds its pid and process group id: nothing else can be hit.
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+            _, status = os.waitpid(pid, 0)
+            conn = children.pop(pid, None)
+            if conn is not None:
+                try:
+                    _send(conn, {"exit_code": os.waitstatus_to_exitcode(status)})
+                except OSError:
+                    pass
+                conn.close()
+        if listener in readable:
+            conn, _ = listener.accept()
+            fds = []
+            try:
+                request, fds = _receive_request(conn)
+                sys.stdout.flush()
+                sys.stderr.flush()
+                pid = os.fork()
+                if pid == 0:
+                    listener.close()
+                    for other in children.values():
+                        other.close()
+                    _run_child(conn, request, fds)
+                children[pid] = conn
+                _send(conn, {"pid": pid})
+            except Exception as e:
+                try:
+                    _send(conn, {"error": f"{type(e).__name__}: {e}"})
+                except OSError:
+                    pass
+                conn.close()
+            finally:
+                for fd in fds:
+                    os.close(fd)
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], sys.argv[2:])
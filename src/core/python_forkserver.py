@@ -0,0 +1,353 @@
+"""
+Pre-warmed Python fork server for sandboxed snippets.
+
+Snippets that import numpy or pandas spend most of their wall time starting
+the interpreter and importing. `PythonForkServer` keeps a long-lived template
+process (`forkserver_template.py`) that has already imported a configurable
+set of modules, and forks it once per execution. A forked child starts in
+about a millisecond with those modules loaded. rlimits, a private working
+directory and stdout/stderr pipes are set up in the child, and every result
+reports its `startup_ms`.
+"""
+
+import json
+import math
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Any, List, Optional, Sequence
+
+from .sandbox import CappedOutput, DEFAULT_MAX_OUTPUT_BYTES, summarize_latencies
+
+TEMPLATE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "forkserver_template.py")
+DEFAULT_PRELOAD_MODULES = ("numpy", "pandas")
+
+
+class PythonForkServer:
+    """
+    Client for a template process that forks one child per Python execution.
+
+    The template is started lazily on the first execution (or by `start`) and
+    restarted if it dies. Children inherit the template's network namespace,
+    so with `network_prefix` (e.g. ["unshare", "--net"]) no execution has
+    network access.
+
+    Args:
+        preload_modules (Sequence[str]): Modules the template imports up front. Missing ones are skipped.
+        python_executable (str): Interpreter for the template.
+        network_prefix (Optional[List[str]]): Command prefix the template is launched under.
+        max_output_bytes (int): Per-stream cap on captured output.
+        file_size_limit (int): Largest file, in bytes, a child may write (RLIMIT_FSIZE).
+        work_root (Optional[str]): Parent directory for per-execution directories.
+        start_timeout (float): Seconds to wait for the template to finish importing.
+    """
+
+    def __init__(self,
+                 preload_modules: Sequence[str] = DEFAULT_PRELOAD_MODULES,
+                 python_executable: str = sys.executable,
+                 network_prefix: Optional[List[str]] = None,
+                 max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+                 file_size_limit: int = 16 * 1024**2,
+                 work_root: Optional[str] = None,
+                 start_timeout: float = 120.0):
+        self.preload_modules = list(preload_modules)
+        self.python_executable = python_executable
+        self.network_prefix = list(network_prefix or [])
+        self.max_output_bytes = max_output_bytes
+        self.file_size_limit = file_size_limit
+        self.work_root = work_root
+        self.start_timeout = start_timeout
+        self.preloaded: List[str] = []
+        self.failed_preloads: Dict[str, str] = {}
+        self._template: Optional[subprocess.Popen] = None
+        self._socket_dir: Optional[str] = None
+        self._socket_path: Optional[str] = None
+        self._start_lock = threading.Lock()
+        self._children: Dict[str, int] = {}  # execution id -> child pid
+        self._cancelled_executions = set()
+        self._lock = threading.Lock()
+        self.startup_times_s: List[float] = []
+        self.template_start_time_s = 0.0
+
+    def start(self):
+        """Starts the template and waits until its modules are imported."""
+        with self._start_lock:
+            if self._template is not None and self._template.poll() is None:
+                return
+            self._shutdown_template()
+            self._socket_dir = tempfile.mkdtemp(prefix="forkserver_")
+            self._socket_path = os.path.join(self._socket_dir, "server.sock")
+            start = time.monotonic()
+            self._template = subprocess.Popen(
+                self.network_prefix + [self.python_executable, TEMPLATE_SCRIPT, self._socket_path]
+                + self.preload_modules,
+                stdin=subprocess.PIPE,  # Closing it tells the template to exit.
+                stdout=subprocess.PIPE,
+                start_new_session=True,
+            )
+            ready = self._read_ready_line()
+            self.template_start_time_s = time.monotonic() - start
+            self.preloaded = ready.get("preloaded", [])
+            self.failed_preloads = ready.get("failed", {})
+            for name, error in self.failed_preloads.items():
+                print(f"PythonForkServer: Could not preload {name}: {error}")
+
+    def _read_ready_line(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {}
+        reader = threading.Thread(target=lambda: result.update(line=self._template.stdout.readline()), daemon=True)
+        reader.start()
+        reader.join(self.start_timeout)
+        line = result.get("line")
+        if not line:
+            self._shutdown_template()
+            raise RuntimeError("Python fork server template failed to start.")
+        return json.loads(line)
+
+    def _shutdown_template(self):
+        if self._template is not None:
+            try:
+                self._template.stdin.close()
+                self._template.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._template.kill()
+                self._template.wait()
+            self._template.stdout.close()
+            self._template = None
+        if self._socket_dir is not None:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
+            self._socket_dir = None
+
+    def close(self):
+        """Stops the template process. Running children are left to finish or time out."""
+        with self._start_lock:
+            self._shutdown_template()
+
+    def _kill(self, pid: int):
+        """Kills a child's process group. Only for children the template has not reaped yet."""
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def cancel(self, execution_id: str) -> bool:
+        """Kills the child running `execution_id`. Returns True if one was running."""
+        with self._lock:
+            self._cancelled_executions.add(execution_id)
+            pid = self._children.get(execution_id)
+        if pid is None:
+            return False
+        self._kill(pid)
+        return True
+
+    def finish(self, execution_id: str) -> bool:
+        """Forgets `execution_id`, e.g. a cancelled id that ran outside the server. Returns True if it was cancelled."""
+        with self._lock:
+            self._children.pop(execution_id, None)
+            if execution_id in self._cancelled_executions:
+                self._cancelled_executions.discard(execution_id)
+                return True
+        return False
+
+    @staticmethod
+    def _drain(fd: int, output: CappedOutput):
+        with os.fdopen(fd, "rb") as stream:
+            for chunk in iter(lambda: stream.read1(65536), b""):
+                output.append(chunk)
+
+    def execute(self,
+                code: str,
+                inputs: Optional[str] = None,
+                cpu_limit: Optional[str] = "0.5",
+                memory_limit: Optional[int] = None,
+                timeout: float = 10,
+                execution_id: Optional[str] = None,
+                max_output_bytes: Optional[int] = None,
+                run_dir: Optional[str] = None,
+                stdin_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Runs a Python snippet in a child forked from the template.
+
+        Args:
+            code (str): The program, run as `__main__`.
+            inputs (Optional[str]): Standard input (ignored when `stdin_path` is given).
+            cpu_limit (Optional[str]): Fraction of a CPU; bounds CPU time to timeout x cpu_limit.
+            memory_limit (Optional[int]): Bytes of address space allowed on top of the preloaded modules.
+            timeout (float): Wall-clock limit in seconds.
+            execution_id (Optional[str]): Handle for `cancel`.
+            max_output_bytes (Optional[int]): Per-stream output cap.
+            run_dir (Optional[str]): Existing working directory to use instead of a fresh private one.
+            stdin_path (Optional[str]): File to use as standard input.
+
+        Returns:
+            Dict[str, Any]: stdout, stderr, exit_code, timeout and truncated flags, and startup_ms,
+                            the time from request to the child starting the program.
+        """
+        self.start()
+        max_output_bytes = max_output_bytes or self.max_output_bytes
+        own_dir = run_dir is None
+        if own_dir:
+            run_dir = tempfile.mkdtemp(prefix="sandbox_run_", dir=self.work_root)
+        if stdin_path is None and inputs:
+            stdin_path = os.path.join(run_dir, "stdin.txt")
+            with open(stdin_path, "w") as f:
+                f.write(inputs)
+
+        stdout, stderr = CappedOutput(max_output_bytes), CappedOutput(max_output_bytes)
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        readers = [
+            threading.Thread(target=self._drain, args=(stdout_r, stdout), daemon=True),
+            threading.Thread(target=self._drain, args=(stderr_r, stderr), daemon=True),
+        ]
+        request = {
+            "code": code,
+            "cwd": run_dir,
+            "stdin_path": stdin_path,
+            "env": {"HOME": run_dir, "TMPDIR": run_dir},
+            "limits": {
+                "cpu_seconds": max(1, math.ceil(timeout * (float(cpu_limit) if cpu_limit else 1.0))),
+                "memory_bytes": memory_limit,
+                "file_size": self.file_size_limit,
+            },
+        }
+
+        pid, started_at, exit_code, error = None, None, None, None
+        timed_out = False
+        requested_at = time.monotonic()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(self._socket_path)
+            socket.send_fds(conn, [json.dumps(request).encode("utf-8") + b"\n"], [stdout_w, stderr_w])
+            os.close(stdout_w)
+            os.close(stderr_w)
+            stdout_w = stderr_w = None
+            for reader in readers:
+                reader.start()
+
+            deadline = requested_at + timeout
+            buffer = b""
+            while exit_code is None and error is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+                conn.settimeout(remaining)
+                try:
+                    chunk = conn.recv(4096)
+                except socket.timeout:
+                    timed_out = True
+                    break
+                if not chunk:
+                    error = "Fork server closed the connection."
+                    break
+                buffer += chunk
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    message = json.loads(line)
+                    if "pid" in message:
+                        pid = message["pid"]
+                        with self._lock:
+                            if execution_id is not None:
+                                self._children[execution_id] = pid
+                            if execution_id in self._cancelled_executions:
+                                self._kill(pid)
+                    started_at = message.get("started_at", started_at)
+                    if "exit_code" in message:
+                        # Reaped: its pid may be reused from here on, so `cancel` must no longer find it.
+                        exit_code = message["exit_code"]
+                        with self._lock:
+                            self._children.pop(execution_id, None)
+                    error = message.get("error", error)
+
+            if pid is not None and exit_code is None:
+                # Not reaped yet, so the pid is still the child's. The template kills what it left running.
+                self._kill(pid)
+            if timed_out and pid is not None:
+                # Wait for the template to reap the child so its pipes are closed.
+                conn.settimeout(5)
+                try:
+                    while conn.recv(4096):
+                        pass
+                except (socket.timeout, OSError):
+                    pass
+        except OSError as e:
+            error = f"Fork server error: {e}"
+        finally:
+            conn.close()
+            for fd in (stdout_w, stderr_w):
+                if fd is not None:
+                    os.close(fd)
+            for fd, reader in ((stdout_r, readers[0]), (stderr_r, readers[1])):
+                if reader.ident is None:
+                    os.close(fd)  # Never handed to a reader.
+                else:
+                    reader.join(timeout=5)
+            cancelled = execution_id is not None and self.finish(execution_id)
+            if own_dir:
+                shutil.rmtree(run_dir, ignore_errors=True)
+
+        if exit_code is None:
+            exit_code = 137 if timed_out else 1
+        elif exit_code < 0:
+            exit_code = 128 - exit_code
+        result = {
+            "stdout": stdout.text(),
+            "stderr": stderr.text(),
+            "exit_code": exit_code,
+            "timeout": timed_out,
+            "truncated": stdout.truncated or stderr.truncated,
+            "startup_ms": (started_at - requested_at) * 1000 if started_at is not None else None,
+        }
+        if error:
+            result["stderr"] += f"\n{error}"
+            result["sandbox_error"] = True
+        if timed_out:
+            result["stderr"] += "\nExecution timed out."
+        elif exit_code == 128 + signal.SIGXCPU:
+            result["timeout"] = True
+            result["stderr"] += "\nCPU time limit exceeded."
+        if cancelled:
+            result["cancelled"] = True
+        if started_at is not None:
+            with self._lock:
+                self.startup_times_s.append(started_at - requested_at)
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns template start-up time, preloaded modules and per-execution startup percentiles."""
+        with self._lock:
+            startup = summarize_latencies(list(self.startup_times_s))
+        return {
+            "template_start_time_s": self.template_start_time_s,
+            "preloaded": self.preloaded,
+            "failed_preloads": self.failed_preloads,
+            "executions": len(self.startup_times_s),
+            "startup_p50_ms": startup["p50_ms"],
+            "startup_p99_ms": startup["p99_ms"],
+        }
+
+
+if __name__ == "__main__":
+    modules = sys.argv[1:] or list(DEFAULT_PRELOAD_MODULES)
+    server = PythonForkServer(preload_modules=modules)
+    server.start()
+    print(f"Template started in {server.template_start_time_s:.2f}s, preloaded {server.preloaded}.")
+
+    snippet = "import " + ", ".join(server.preloaded or ["json"]) + "\nprint('ok')"
+    for _ in range(20):
+        server.execute(snippet)
+    print("Fork server:", server.get_stats())
+
+    cold = []
+    for _ in range(5):
+        start = time.monotonic()
+        subprocess.run([sys.executable, "-c", snippet], capture_output=True)
+        cold.append(time.monotonic() - start)
+    print("Fresh interpreter:", summarize_latencies(cold))
+    server.close()
@@ -1,13 +1,21 @@
+import os
 import psutil
 import collections
 import threading
 import time
 from typing import Dict, Any, Optional, Tuple
-from peft import PeftModel # New import for handling LoRA adapters
+from peft import PeftModel, PeftConfig, set_peft_model_state_dict # New import for handling LoRA adapters
 from transformers import AutoModelForCausalLM, AutoTokenizer # Needed for loading base model if not passed in
 from transformers.utils.quantization_config import BitsAndBytesConfig # For BitsAndBytesConfig in test
 import torch # Needed for device management and data types
 import gc # For garbage collection
+from .adapter_quantization import (
+    FULL_PRECISION_ADAPTER_FILES,
+    QuantizedAdapter,
+    dequantized_nbytes,
+    has_quantized_weights,
+    load_quantized_adapter,
+)
 
 class ResourceMonitor:
     """
@@ -72,12 +80,26 @@ class AdapterLoaderUnloader:
     """
     Dynamically loads and unloads LoRA adapters, integrating with an LRU cache
     and enforcing memory budgets.
+
+    Adapters that ship quantized weights (see `adapter_quantization`) are
+    dequantized on load. With `keep_quantized_in_host_ram` enabled, the
+    quantized tensors of recently used adapters stay in a second LRU tier in
+    host RAM, so reloading an evicted adapter skips disk I/O entirely.
+
+    With `auto_evict` disabled, the loader never evicts on its own: an owner
+    such as `LoRAAdapterManager`, which knows which adapters are in use,
+    frees room first (see `vram_shortfall_gb`), and a load that still does
+    not fit the VRAM budget raises MemoryError.
     """
     def __init__(self,
                  base_model: Any, # Expecting a loaded base model (can be AutoModelForCausalLM or a mock)
                  base_tokenizer: Any, # Expecting a loaded base tokenizer (can be AutoTokenizer or a mock)
                  max_cache_size: int = 5,
-                 vram_budget_gb: float = 10.0):
+                 vram_budget_gb: float = 10.0,
+                 prefer_quantized: bool = True,
+                 keep_quantized_in_host_ram: bool = False,
+                 max_host_cache_size: int = 20,
+                 auto_evict: bool = True):
         self.base_model = base_model
         self.base_tokenizer = base_tokenizer
         self.adapter_cache = collections.OrderedDict() # Stores {adapter_path: PeftModel instance}
@@ -85,16 +107,32 @@ class AdapterLoaderUnloader:
         self.vram_budget_gb = vram_budget_gb
         self.current_vram_usage_gb = 0.0 # Tracks simulated VRAM usage by loaded adapters
         self.lock = threading.Lock() # For thread-safe cache operations
+        self.prefer_quantized = prefer_quantized
+        self.keep_quantized_in_host_ram = keep_quantized_in_host_ram
+        self.max_host_cache_size = max_host_cache_size
+        self.host_ram_cache = collections.OrderedDict() # Stores {adapter_path: QuantizedAdapter}
+        self.auto_evict = auto_evict
 
     def _get_adapter_size_gb(self, adapter_path: str) -> float:
         """
         Estimates the size of an adapter in GB.
-        IMPORTANT: This is a placeholder. In a production system, this method MUST
-        be replaced with an accurate implementation that:
-        1. Reads the actual file size of the adapter on disk.
-        2. Or, uses metadata from the PEFT config to estimate memory footprint.
-        For demonstration, we use a heuristic based on adapter name.
+        Quantized weights are dequantized to the base model's dtype on load, so
+        they are charged at that size, not their size on disk. Otherwise uses
+        the size of the adapter's weight files on disk when present, and
+        (e.g. placeholder adapter directories in demos) falls back to a
+        heuristic based on the adapter name.
         """
+        if self.prefer_quantized:
+            dtype = self._get_base_model_dtype()
+            if adapter_path in self.host_ram_cache:
+                return self.host_ram_cache[adapter_path].dequantized_nbytes(dtype) / (1024**3)
+            if has_quantized_weights(adapter_path):
+                return dequantized_nbytes(adapter_path, dtype) / (1024**3)
+        for file_name in FULL_PRECISION_ADAPTER_FILES:
+            weight_path = os.path.join(adapter_path, file_name)
+            if os.path.isfile(weight_path):
+                return os.path.getsize(weight_path) / (1024**3)
+
         # Simulate varying adapter sizes for testing LRU and budget enforcement
         if "large" in adapter_path:
             return 0.5 # e.g., 500MB
@@ -109,10 +147,53 @@ class AdapterLoaderUnloader:
         else:
             return 0.3 # Default size if no keyword matches (300MB)
 
+    def _get_base_model_dtype(self) -> torch.dtype:
+        """Returns the dtype of the base model's parameters, defaulting to float32."""
+        try:
+            return next(self.base_model.parameters()).dtype
+        except (AttributeError, StopIteration, TypeError):
+            return torch.float32
+
+    def _get_quantized_adapter(self, adapter_path: str) -> QuantizedAdapter:
+        """
+        Returns the quantized tensors for an adapter, from the host-RAM tier if present.
+        Must be called with `self.lock` held.
+        """
+        if adapter_path in self.host_ram_cache:
+            self.host_ram_cache.move_to_end(adapter_path)
+            print(f"AdapterLoaderUnloader: Quantized adapter '{adapter_path}' served from host RAM.")
+            return self.host_ram_cache[adapter_path]
+
+        quantized = load_quantized_adapter(adapter_path)
+        if self.keep_quantized_in_host_ram:
+            self.host_ram_cache[adapter_path] = quantized
+            while len(self.host_ram_cache) > self.max_host_cache_size:
+                evicted_path, _ = self.host_ram_cache.popitem(last=False)
+                print(f"AdapterLoaderUnloader: Dropped quantized adapter '{evicted_path}' from host RAM.")
+        return quantized
+
+    def _load_quantized_adapter(self, adapter_path: str) -> PeftModel:
+        """
+        Attaches a quantized adapter to the base model, dequantizing its LoRA
+        matrices to the base model's dtype.
+        """
+        print(f"AdapterLoaderUnloader: Loading quantized adapter from {adapter_path}...")
+        quantized = self._get_quantized_adapter(adapter_path)
+        self.base_model.eval()
+        config = PeftConfig.from_pretrained(adapter_path)
+        adapter_model = PeftModel(self.base_model, config)
+        set_peft_model_state_dict(adapter_model, quantized.dequantize(self._get_base_model_dtype()))
+        print(f"AdapterLoaderUnloader: Quantized ({quantized.quant_dtype}) adapter loaded from {adapter_path}.")
+        return adapter_model
+
     def _load_adapter_from_disk(self, adapter_path: str) -> PeftModel:
         """
         Loads a LoRA adapter from the specified path and attaches it to the base model.
+        Quantized weights are used when present and `prefer_quantized` is set.
         """
+        if self.prefer_quantized and (adapter_path in self.host_ram_cache or has_quantized_weights(adapter_path)):
+            return self._load_quantized_adapter(adapter_path)
+
         print(f"AdapterLoaderUnloader: Loading adapter from {adapter_path}...")
         # Ensure the base model is in evaluation mode before loading adapter
         self.base_model.eval()
@@ -145,6 +226,10 @@ class AdapterLoaderUnloader:
             estimated_size_gb = self._get_adapter_size_gb(adapter_path)
 
             # Check memory budget before loading
+            if (self.current_vram_usage_gb + estimated_size_gb) > self.vram_budget_gb and not self.auto_evict:
+                raise MemoryError(f"Cannot load adapter '{adapter_path}' without evicting, which is left to the "
+                                  f"loader's owner. Required: {estimated_size_gb:.2f}GB, "
+                                  f"Available: {self.vram_budget_gb - self.current_vram_usage_gb:.2f}GB.")
             if (self.current_vram_usage_gb + estimated_size_gb) > self.vram_budget_gb:
                 print(f"AdapterLoaderUnloader: VRAM budget exceeded ({self.current_vram_usage_gb + estimated_size_gb:.2f}GB > {self.vram_budget_gb:.2f}GB). Attempting to unload LRU adapters.")
                 while (self.current_vram_usage_gb + estimated_size_gb) > self.vram_budget_gb and len(self.adapter_cache) > 0:
@@ -171,7 +256,7 @@ class AdapterLoaderUnloader:
             print(f"AdapterLoaderUnloader: Adapter '{adapter_path}' loaded. Current VRAM usage: {self.current_vram_usage_gb:.2f}GB.")
 
             # Enforce max cache size
-            while len(self.adapter_cache) > self.max_cache_size:
+            while self.auto_evict and len(self.adapter_cache) > self.max_cache_size:
                 lru_adapter_path, _ = self.adapter_cache.popitem(last=False) # Get and remove LRU
                 lru_adapter_size = self._get_adapter_size_gb(lru_adapter_path)
                 self.current_vram_usage_gb -= lru_adapter_size
@@ -203,6 +288,13 @@ class AdapterLoaderUnloader:
             else:
                 print(f"AdapterLoaderUnloader: Adapter '{adapter_path}' not found in cache.")
 
+    def vram_shortfall_gb(self, adapter_path: str) -> float:
+        """Returns the VRAM that must be freed before `adapter_path` fits the budget (0.0 if it fits or is loaded)."""
+        with self.lock:
+            if adapter_path in self.adapter_cache:
+                return 0.0
+            return max(0.0, self.current_vram_usage_gb + self._get_adapter_size_gb(adapter_path) - self.vram_budget_gb)
+
     def get_loaded_adapters(self) -> Dict[str, Any]:
         """Returns the currently loaded adapters in the cache."""
         return dict(self.adapter_cache)
@@ -211,6 +303,11 @@ class AdapterLoaderUnloader:
         """Returns the simulated VRAM usage by loaded adapters."""
         return self.current_vram_usage_gb
 
+    def get_host_ram_usage_by_adapters(self) -> float:
+        """Returns the host RAM held by quantized adapters in the host-RAM tier, in GB."""
+        with self.lock:
+            return sum(q.nbytes for q in self.host_ram_cache.values()) / (1024**3)
+
 # In a real implementation, this could be loaded from a config file
 # or discovered from the filesystem.
 AVAILABLE_LORA_ADAPTERS = [
@@ -229,6 +326,10 @@ def get_adapter_path(adapter_name: str) -> str:
     return f"/app/models/lora_adapters/{adapter_name}"
 
 if __name__ == "__main__":
+    # This demo exercises cache/budget bookkeeping against mocked adapters. For real
+    # load, eviction and switch latencies on generated CPU adapters, run
+    # `python -m src.core.adapter_benchmark`.
+
     # Test ResourceMonitor
     monitor = ResourceMonitor()
     print("--- Resource Monitor Test ---")
@@ -311,7 +412,6 @@ if __name__ == "__main__":
 
         # Create dummy adapter directories for testing
         base_adapter_dir = "models/trained"
-        import os
         os.makedirs(base_adapter_dir, exist_ok=True)
 
         # Simulate a PeftModel.from_pretrained call
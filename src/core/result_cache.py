@@ -0,0 +1,67 @@
+import hashlib
+import json
+from typing import Dict, Any, Optional
+
+from .disk_cache import DiskLRUCache
+
+# Result fields that describe one particular run rather than the program's behaviour.
+_TRANSIENT_FIELDS = ("cancelled", "result_cache", "compile_cache")
+
+
+class ExecutionResultCache:
+    """
+    On-disk cache of sandbox execution results.
+
+    Entries are keyed by the hash of language, code, stdin, resource limits
+    and the execution environment (image digest or backend), so a cached
+    result is only reused for a run that would have been identical. Results
+    that timed out, were killed (e.g. by the OOM killer, which depends on the
+    host's memory pressure), were cancelled or failed inside the sandbox
+    machinery are never stored; callers mark non-deterministic programs so
+    they bypass the cache entirely.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024**2):
+        self.store = DiskLRUCache(cache_dir, max_bytes)
+
+    @staticmethod
+    def make_key(language: str,
+                 code: str,
+                 inputs: Optional[str],
+                 limits: Dict[str, Any],
+                 environment_id: str) -> str:
+        """Returns the content address of an execution."""
+        digest = hashlib.sha256()
+        for part in (language, code, inputs or "", json.dumps(limits, sort_keys=True), environment_id):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def is_cacheable(result: Dict[str, Any]) -> bool:
+        """Only complete runs whose outcome depends on the program alone may be cached."""
+        # Every backend reports a SIGKILL as 128 + 9, whoever sent it.
+        return not (result.get("timeout") or result.get("cancelled") or result.get("sandbox_error")
+                    or result.get("exit_code") == 137)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the cached result dictionary, or None on a miss."""
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        return json.loads(entry[0])
+
+    def put(self, key: str, result: Dict[str, Any]) -> bool:
+        """Stores a result if it is cacheable. Returns whether it was stored."""
+        if not self.is_cacheable(result):
+            return False
+        stored = {k: v for k, v in result.items() if k not in _TRANSIENT_FIELDS}
+        self.store.put(key, json.dumps(stored).encode("utf-8"))
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns hit/miss/eviction counts, hit rate and size."""
+        stats = self.store.get_stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
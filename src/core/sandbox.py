@@ -1,46 +1,817 @@
+import asyncio
+import concurrent.futures
 import docker
 import docker.errors
-import os
+import functools
+import io
+import platform
+import posixpath
+import tarfile
 import threading
 import time
-from typing import Dict, Any, Optional
+import uuid
+import weakref
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .compile_cache import CompileCache
+from .result_cache import ExecutionResultCache
+from .sandbox_images import SandboxImageManager
+from .sandbox_pool import ContainerPool, POOL_WORK_ROOT
+
+if TYPE_CHECKING:
+    from .base import SystemConfig
 
 # For type hinting the container object
 # from docker.models.containers import Container as DockerContainer
 # The above import might cause issues with some linters/environments if not directly exposed.
 # We'll rely on the runtime type or a more general 'Any' if specific type hinting causes problems.
 
+STDIN_FILE = "stdin.txt"
+# Default cap on captured bytes per stream (stdout and stderr separately).
+DEFAULT_MAX_OUTPUT_BYTES = 1024 * 1024
+# Extra time the async API allows beyond `timeout` before killing the container itself.
+ASYNC_TIMEOUT_GRACE_S = 5
+
+
+# Compiled languages write their artifacts here, relative to the working directory.
+BUILD_DIR = "build"
+# Working directory of single-use containers; code is copied in, never bind-mounted.
+DIRECT_WORK_DIR = "/sandbox"
+
+
+@dataclass(frozen=True)
+class LanguageSpec:
+    """How to compile and run a single-file program in the sandbox image."""
+    file_name: str
+    run_command: str
+    compile_command: Optional[str] = None
+    toolchain_command: Optional[str] = None  # Prints the compiler version; part of the compile cache key.
+
+    @property
+    def shell_command(self) -> str:
+        """The full shell command: compile (if any) then run."""
+        if self.compile_command:
+            return f"{self.compile_command} && {self.run_command}"
+        return self.run_command
+
+
+LANGUAGE_SPECS: Dict[str, LanguageSpec] = {
+    "python": LanguageSpec("script.py", "python3 script.py"),
+    "javascript": LanguageSpec("script.js", "node script.js"),
+    # Java requires class name to match file name
+    "java": LanguageSpec("Main.java", f"java -cp {BUILD_DIR} Main",
+                         f"javac -d {BUILD_DIR} Main.java", "javac -version 2>&1"),
+    "cpp": LanguageSpec("main.cpp", f"./{BUILD_DIR}/a.out",
+                        f"mkdir -p {BUILD_DIR} && g++ main.cpp -o {BUILD_DIR}/a.out", "g++ --version"),
+    "go": LanguageSpec("main.go", f"./{BUILD_DIR}/main",
+                       f"mkdir -p {BUILD_DIR} && go build -o {BUILD_DIR}/main main.go", "go version"),
+    "rust": LanguageSpec("main.rs", f"./{BUILD_DIR}/main",
+                         f"mkdir -p {BUILD_DIR} && rustc main.rs -o {BUILD_DIR}/main", "rustc --version"),
+}
+
+
+def build_archive(files: Dict[str, Union[str, bytes]]) -> bytes:
+    """Packs {path: content} into an in-memory tar archive for `put_archive`."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for path, content in files.items():
+            data = content.encode("utf-8") if isinstance(content, str) else content
+            info = tarfile.TarInfo(name=path)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class CappedOutput:
+    """Accumulates a byte stream up to a hard cap, discarding (but counting) the rest."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.chunks: List[bytes] = []
+        self.captured = 0
+        self.dropped = 0
+
+    def append(self, chunk: Optional[bytes]):
+        if not chunk:
+            return
+        room = self.max_bytes - self.captured
+        if room > 0:
+            kept = chunk[:room]
+            self.chunks.append(kept)
+            self.captured += len(kept)
+        self.dropped += max(0, len(chunk) - max(room, 0))
+
+    @property
+    def truncated(self) -> bool:
+        return self.dropped > 0
+
+    def text(self) -> str:
+        """Decoded output, with a truncation marker if anything was dropped."""
+        text = b"".join(self.chunks).decode("utf-8", errors="replace")
+        if self.truncated:
+            text += f"\n[... output truncated: {self.dropped} bytes dropped after {self.max_bytes} bytes ...]"
+        return text
+
+
+def summarize_latencies(latencies_s: List[float], wall_time_s: Optional[float] = None) -> Dict[str, float]:
+    """
+    Summarizes per-execution latencies.
+
+    Args:
+        latencies_s (List[float]): Per-execution latencies in seconds.
+        wall_time_s (Optional[float]): Wall time for the whole run, used for throughput.
+                                       Defaults to the sum of latencies (sequential runs).
+
+    Returns:
+        Dict[str, float]: count, p50_ms, p99_ms, mean_ms and throughput_per_s.
+    """
+    if not latencies_s:
+        return {"count": 0, "p50_ms": 0.0, "p99_ms": 0.0, "mean_ms": 0.0, "throughput_per_s": 0.0}
+    ordered = sorted(latencies_s)
+
+    def percentile(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    wall_time_s = wall_time_s if wall_time_s is not None else sum(ordered)
+    return {
+        "count": len(ordered),
+        "p50_ms": 1000 * percentile(0.50),
+        "p99_ms": 1000 * percentile(0.99),
+        "mean_ms": 1000 * sum(ordered) / len(ordered),
+        "throughput_per_s": len(ordered) / wall_time_s if wall_time_s > 0 else 0.0,
+    }
+
+
 class CodeExecutionSandbox:
     """
     A secure, isolated code execution environment using Docker containers.
     Supports execution of Python, JavaScript, Java, C++, Go, and Rust.
+
+    With `pool_size > 0`, executions run in pre-started containers kept in a
+    per-language `ContainerPool` instead of creating a container per call.
+
+    With `compile_cache_dir` set, Java, C++, Go and Rust programs are compiled
+    in a separate step whose artifacts are cached by the hash of source,
+    language and toolchain, so repeated executions skip compilation.
+
+    `execute_code_async` and `execute_batch` run executions on a dedicated
+    thread pool, at most `max_concurrency` at a time. Cancelling or timing out
+    an async call kills its container.
+
+    Images are tagged with a hash of their Dockerfile and build context and
+    only built when that tag is missing. With `per_language_images`, each
+    language runs in its own slim image (src/sandbox_images), built the first
+    time the language is used.
+
+    With `result_cache_dir` set, `execute_code` results are cached on disk by
+    language, code, stdin, limits and image digest. Callers pass
+    `nondeterministic=True` for programs whose output may change between runs.
+
+    `backend` selects where code runs: "docker" (the default, implemented by
+    this class) or any backend registered in `sandbox_backends`, such as
+    "process" for plain subprocesses without Docker start-up cost.
+    `backend_options` are passed to the backend's constructor.
     """
 
-    def __init__(self, image_name: str = "tanuki-sandbox", dockerfile_path: str = "src/Dockerfile"):
-        self.client = docker.from_env()
+    def __init__(self,
+                 image_name: str = "tanuki-sandbox",
+                 dockerfile_path: str = "src/Dockerfile",
+                 pool_size: int = 0,
+                 pool_max_reuses: int = 50,
+                 pool_isolation_policy: str = "discard_on_error",
+                 compile_cache_dir: Optional[str] = None,
+                 compile_cache_max_bytes: int = 512 * 1024**2,
+                 max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+                 max_concurrency: int = 8,
+                 client: Optional[Any] = None,
+                 backend: str = "docker",
+                 backend_options: Optional[Dict[str, Any]] = None,
+                 per_language_images: bool = False,
+                 result_cache_dir: Optional[str] = None,
+                 result_cache_max_bytes: int = 256 * 1024**2):
+        start = time.monotonic()
+        self.backend_name = backend
+        self.backend = None
+        if backend != "docker":
+            # Imported lazily: the backends module builds on the language table defined here.
+            from .sandbox_backends import create_backend
+            self.backend = create_backend(backend, **dict({"max_output_bytes": max_output_bytes},
+                                                          **(backend_options or {})))
+        self.client = client or (docker.from_env() if self.backend is None else None)
         self.image_name = image_name
         self.dockerfile_path = dockerfile_path
-        self._build_image()
+        self.pool_size = pool_size
+        self.pool_max_reuses = pool_max_reuses
+        self.pool_isolation_policy = pool_isolation_policy
+        self._pools: Dict[Tuple[str, Optional[str], Optional[str]], ContainerPool] = {}
+        self._pools_lock = threading.Lock()
+        self.compile_cache = CompileCache(compile_cache_dir, compile_cache_max_bytes) if compile_cache_dir else None
+        self._toolchain_ids: Dict[str, str] = {}
+        self.result_cache = (ExecutionResultCache(result_cache_dir, result_cache_max_bytes)
+                             if result_cache_dir else None)
+        self._environment_ids: Dict[str, str] = {}
+        self.max_output_bytes = max_output_bytes
+        self.max_concurrency = max_concurrency
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+        self._active_containers: Dict[str, Any] = {}  # execution id -> running container
+        self._cancelled_executions = set()
+        self._active_lock = threading.Lock()
+        self.images: Optional[SandboxImageManager] = None
+        if self.backend is None:
+            self.images = SandboxImageManager(self.client, image_name, dockerfile_path, per_language_images)
+            if not per_language_images:
+                self.images.ensure_base_image()
+        self.startup_time_s = time.monotonic() - start
+
+    @classmethod
+    def from_config(cls, config: "SystemConfig", **kwargs: Any) -> "CodeExecutionSandbox":
+        """Create a sandbox from the `sandbox.*` settings; keyword arguments override them."""
+        settings = {
+            "backend": config.get("sandbox.backend", "docker"),
+            "backend_options": config.get("sandbox.backend_options", None),
+            "pool_size": config.get("sandbox.pool_size", 0),
+            "max_concurrency": config.get("sandbox.max_concurrency", 8),
+            "per_language_images": config.get("sandbox.per_language_images", False),
+            "result_cache_dir": config.get("sandbox.result_cache_dir", None),
+        }
+        settings.update(kwargs)
+        return cls(**settings)
+
+    def _get_image(self, language: str) -> str:
+        """Returns the content-addressed image tag to run `language` in."""
+        return self.images.get_image(language)
+
+    def _get_environment_id(self, language: str) -> str:
+        """Identifies what a program runs on: the image digest, or the backend and host for local backends."""
+        environment_id = self._environment_ids.get(language)
+        if environment_id is None:
+            if self.backend is None:
+                environment_id = self.client.images.get(self._get_image(language)).id
+            else:
+                # Local backends use host toolchains; clear the cache after upgrading them.
+                environment_id = f"{self.backend_name}|{platform.node()}|{platform.platform()}"
+            self._environment_ids[language] = environment_id
+        return environment_id
+
+    def get_startup_metrics(self) -> Dict[str, Any]:
+        """Returns sandbox start-up time and, per image, whether it was built and how long that took."""
+        return {
+            "startup_time_s": self.startup_time_s,
+            "images": self.images.get_metrics() if self.images is not None else {},
+        }
+
+    def _get_pool(self, language: str, cpu_limit: Optional[str], memory_limit: Optional[str]) -> ContainerPool:
+        """Returns the pool for a language and resource profile, creating and warming it on first use."""
+        key = (language, cpu_limit, memory_limit)
+        with self._pools_lock:
+            pool = self._pools.get(key)
+        if pool is not None:
+            return pool
+        # Resolving the image may build it; other languages' executions must not wait on that lock meanwhile.
+        image = self._get_image(language)
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = ContainerPool(
+                    self.client,
+                    image,
+                    size=self.pool_size,
+                    max_reuses=self.pool_max_reuses,
+                    isolation_policy=self.pool_isolation_policy,
+                    cpu_limit=cpu_limit,
+                    memory_limit=memory_limit,
+                    labels={"tanuki.sandbox.language": language},
+                )
+                self._pools[key] = pool
+                pool.warm(block=False)
+        return pool
+
+    def warm_pools(self,
+                   languages: Optional[List[str]] = None,
+                   cpu_limit: Optional[str] = "0.5",
+                   memory_limit: Optional[str] = "128m"):
+        """
+        Pre-starts pooled containers so the first executions are already warm.
+
+        Args:
+            languages (Optional[List[str]]): Languages to warm. Defaults to all supported languages.
+            cpu_limit (Optional[str]): CPU limit the pooled containers are created with.
+            memory_limit (Optional[str]): Memory limit the pooled containers are created with.
+        """
+        if self.backend is not None or self.pool_size <= 0:
+            return
+        for language in languages or list(LANGUAGE_SPECS):
+            self._get_pool(language.lower(), cpu_limit, memory_limit).warm()
+
+    def get_pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Returns per-pool creation/reuse counters keyed by "language/cpu/memory"."""
+        with self._pools_lock:
+            pools = dict(self._pools)
+        return {f"{lang}/{cpu}/{mem}": pool.get_stats() for (lang, cpu, mem), pool in pools.items()}
+
+    def close(self):
+        """Removes all pooled containers and stops the async worker threads."""
+        with self._pools_lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close()
+        if self.backend is not None:
+            self.backend.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _track_execution(self, execution_id: Optional[str], container: Any):
+        """Records the container running an execution, killing it at once if already cancelled."""
+        if execution_id is None:
+            return
+        with self._active_lock:
+            self._active_containers[execution_id] = container
+            cancelled = execution_id in self._cancelled_executions
+        if cancelled:
+            self._kill_container(container)
+
+    def _untrack_execution(self, execution_id: Optional[str]) -> bool:
+        """Forgets an execution. Returns True if it was cancelled."""
+        if execution_id is None:
+            return False
+        with self._active_lock:
+            self._active_containers.pop(execution_id, None)
+            if execution_id in self._cancelled_executions:
+                self._cancelled_executions.discard(execution_id)
+                return True
+        return False
+
+    def _kill_container(self, container: Any):
+        try:
+            container.kill()
+        except docker.errors.APIError as e:
+            print(f"Warning: Could not kill container {getattr(container, 'id', '?')}: {e}")
+
+    def cancel_execution(self, execution_id: str) -> bool:
+        """
+        Kills the container running an execution started with `execution_id`.
+
+        Returns:
+            bool: True if a running container was killed. An execution that has not
+                  started its container yet is killed as soon as it does.
+        """
+        if self.backend is not None:
+            return self.backend.cancel(execution_id)
+        with self._active_lock:
+            self._cancelled_executions.add(execution_id)
+            container = self._active_containers.get(execution_id)
+        if container is None:
+            return False
+        self._kill_container(container)
+        return True
+
+    def _exec(self,
+              container: Any,
+              shell_command: str,
+              workdir: str,
+              timeout: float,
+              max_output_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Runs a shell command in a running container under a wall-clock limit.
+        Output is streamed and captured up to `max_output_bytes` per stream.
+
+        Returns:
+            Dict[str, Any]: stdout, stderr, exit_code, timeout and truncated flags, and elapsed_s.
+        """
+        max_output_bytes = max_output_bytes or self.max_output_bytes
+        command = ["timeout", "-s", "KILL", f"{timeout:g}", "sh", "-c", shell_command]
+        stdout, stderr = CappedOutput(max_output_bytes), CappedOutput(max_output_bytes)
+
+        start = time.monotonic()
+        exec_id = self.client.api.exec_create(container.id, command, workdir=workdir, stdout=True, stderr=True)["Id"]
+        for stdout_chunk, stderr_chunk in self.client.api.exec_start(exec_id, stream=True, demux=True):
+            stdout.append(stdout_chunk)
+            stderr.append(stderr_chunk)
+        exit_code = self.client.api.exec_inspect(exec_id).get("ExitCode")
+        elapsed = time.monotonic() - start
+
+        result = {
+            "stdout": stdout.text(),
+            "stderr": stderr.text(),
+            "exit_code": exit_code if exit_code is not None else 1,
+            "timeout": False,
+            "truncated": stdout.truncated or stderr.truncated,
+            "elapsed_s": elapsed,
+        }
+        # `timeout -s KILL` exits with 128 + SIGKILL when it fires.
+        if exit_code == 137 and elapsed >= timeout:
+            result["timeout"] = True
+            result["stderr"] += "\nExecution timed out."
+        return result
+
+    def _get_toolchain_id(self, container: Any, language: str, spec: LanguageSpec) -> str:
+        """Identifies the image and compiler version, so cache entries never cross toolchains."""
+        toolchain_id = self._toolchain_ids.get(language)
+        if toolchain_id is None:
+            _, version = container.exec_run(["sh", "-c", spec.toolchain_command])
+            image_id = getattr(getattr(container, "image", None), "id", None) or self.image_name
+            toolchain_id = f"{image_id}|{(version or b'').decode('utf-8', errors='replace').strip()}"
+            self._toolchain_ids[language] = toolchain_id
+        return toolchain_id
+
+    def _compile(self,
+                 container: Any,
+                 language: str,
+                 spec: LanguageSpec,
+                 code: str,
+                 run_dir: str,
+                 timeout: float) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Leaves the compiled artifacts in `run_dir`, from the compile cache when possible.
+
+        Returns:
+            Tuple[Optional[Dict[str, Any]], Dict[str, Any]]: The failed compile result
+            (None if compilation succeeded) and compile cache info for the result dict.
+        """
+        key = CompileCache.make_key(language, self._get_toolchain_id(container, language, spec), code)
+        cached = self.compile_cache.get(key)
+        if cached is not None:
+            artifact, metadata = cached
+            container.put_archive(run_dir, artifact)
+            return None, {"hit": True, "compile_time_s": 0.0, "time_saved_s": metadata.get("compile_time_s", 0.0)}
+
+        compile_result = self._exec(container, spec.compile_command, run_dir, timeout)
+        cache_info = {"hit": False, "compile_time_s": compile_result["elapsed_s"], "time_saved_s": 0.0}
+        if compile_result["exit_code"] != 0:
+            return compile_result, cache_info
+
+        stream, _ = container.get_archive(posixpath.join(run_dir, BUILD_DIR))
+        self.compile_cache.put(key, b"".join(stream), language, compile_result["elapsed_s"])
+        return None, cache_info
+
+    def _execute_in_pool(self,
+                         language: str,
+                         spec: LanguageSpec,
+                         code: str,
+                         inputs: Optional[str],
+                         cpu_limit: Optional[str],
+                         memory_limit: Optional[str],
+                         timeout: int,
+                         execution_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Executes code in a warm pooled container, in a fresh working directory.
+        The wall-clock limit is enforced inside the container with `timeout`.
+        """
+        pool = self._get_pool(language, cpu_limit, memory_limit)
+        container = pool.acquire()
+        self._track_execution(execution_id, container)
+        run_name = f"run_{uuid.uuid4().hex}"
+        run_dir = posixpath.join(POOL_WORK_ROOT, run_name)
+        result = {"stdout": "", "stderr": "", "exit_code": 1, "timeout": False}
+        failed = True
+        cancelled = False
+
+        try:
+            container.put_archive(POOL_WORK_ROOT, build_archive({
+                posixpath.join(run_name, spec.file_name): code,
+                posixpath.join(run_name, STDIN_FILE): inputs or "",
+            }))
+
+            compile_failure, cache_info = None, None
+            run_command = spec.shell_command
+            remaining = float(timeout)
+            if spec.compile_command and self.compile_cache is not None:
+                compile_failure, cache_info = self._compile(container, language, spec, code, run_dir, timeout)
+                run_command = spec.run_command
+                remaining = max(0.1, timeout - cache_info["compile_time_s"])
+
+            exec_result = compile_failure or self._exec(container, f"{run_command} < {STDIN_FILE}", run_dir, remaining)
+            exec_result.pop("elapsed_s")
+            result.update(exec_result)
+            if cache_info is not None:
+                stats = self.compile_cache.get_stats()
+                result["compile_cache"] = dict(cache_info,
+                                               hits=stats["hits"],
+                                               misses=stats["misses"],
+                                               hit_rate=stats["hit_rate"],
+                                               total_time_saved_s=stats["time_saved_s"])
+            failed = result["exit_code"] != 0
+
+            cancelled = self._untrack_execution(execution_id)
+            if cancelled:
+                result["cancelled"] = True
+            elif pool.should_recycle(container, failed=failed, timed_out=result["timeout"]):
+                # Kill anything the program left running and drop its working directory.
+                container.exec_run(["sh", "-c", f"kill -9 -1 2>/dev/null; rm -rf {run_dir}"])
+        except docker.errors.APIError as e:
+            result["stderr"] = f"Docker API Error: {e}"
+            result["exit_code"] = 1
+            result["sandbox_error"] = True
+            cancelled = self._untrack_execution(execution_id)
+        finally:
+            # A killed container cannot be reused; report it like a timeout so the pool discards it.
+            pool.release(container, failed=failed, timed_out=result["timeout"] or cancelled)
+
+        result["stdout"] = str(result["stdout"]).strip()
+        result["stderr"] = str(result["stderr"]).strip()
+        return result
 
-    def _build_image(self):
-        """Builds the Docker image for the sandbox."""
-        print(f"Building Docker image: {self.image_name} from {self.dockerfile_path}...")
+    def _sample_stats(self, container: Any, usage: Dict[str, float]):
+        """Follows the container's stats stream, keeping peak memory and the latest CPU time."""
         try:
-            # Get the directory of the Dockerfile
-            docker_context_path = os.path.dirname(self.dockerfile_path)
-            if not docker_context_path:
-                docker_context_path = '.' # Assume current directory if path is just a filename
-
-            self.client.images.build(
-                path=docker_context_path,
-                dockerfile=os.path.basename(self.dockerfile_path),
-                tag=self.image_name,
-                rm=True  # Remove intermediate containers
+            for snapshot in container.stats(stream=True, decode=True):
+                memory = snapshot.get("memory_stats") or {}
+                peak = max(memory.get("max_usage", 0), memory.get("usage", 0))
+                usage["peak_memory_bytes"] = max(usage["peak_memory_bytes"], peak)
+                cpu_ns = ((snapshot.get("cpu_stats") or {}).get("cpu_usage") or {}).get("total_usage", 0)
+                usage["cpu_time_s"] = max(usage["cpu_time_s"], cpu_ns / 1e9)
+        except (docker.errors.APIError, ValueError, OSError):
+            pass  # The container went away; keep what was sampled.
+
+    def _execute_direct(self,
+                        language: str,
+                        spec: LanguageSpec,
+                        code: str,
+                        inputs: Optional[str],
+                        cpu_limit: Optional[str],
+                        memory_limit: Optional[str],
+                        timeout: int,
+                        execution_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Executes code in a fresh container.
+
+        The source and stdin are streamed in as a tar archive before start, so
+        nothing is shared with the host filesystem. stdout and stderr are read
+        from one demultiplexed attach stream under the `max_output_bytes` cap.
+        Wall time, CPU time and peak memory come from the container stats
+        stream; short runs may finish before the first stats sample.
+        """
+        result = {"stdout": "", "stderr": "", "exit_code": 1, "timeout": False}
+        stdout, stderr = CappedOutput(self.max_output_bytes), CappedOutput(self.max_output_bytes)
+        usage = {"cpu_time_s": 0.0, "peak_memory_bytes": 0}
+        container: Optional[Any] = None
+        watchdog: Optional[threading.Timer] = None
+        start = time.monotonic()
+        try:
+            container = self.client.containers.create(
+                self._get_image(language),
+                command=["timeout", "-s", "KILL", f"{timeout:g}", "sh", "-c", f"{spec.shell_command} < {STDIN_FILE}"],
+                network_disabled=True, # Isolate from network
+                mem_limit=memory_limit,
+                cpu_period=100000, # 100ms
+                cpu_quota=int(float(cpu_limit) * 100000) if cpu_limit else -1,
+                working_dir=DIRECT_WORK_DIR,
+            )
+            self._track_execution(execution_id, container)
+            container.put_archive("/", build_archive({
+                posixpath.join(DIRECT_WORK_DIR.lstrip("/"), spec.file_name): code,
+                posixpath.join(DIRECT_WORK_DIR.lstrip("/"), STDIN_FILE): inputs or "",
+            }))
+
+            # Attach before start so no output is missed.
+            output = self.client.api.attach(container.id, stdout=True, stderr=True, stream=True, demux=True)
+            container.start()
+            start = time.monotonic()
+            sampler = threading.Thread(target=self._sample_stats, args=(container, usage), daemon=True)
+            sampler.start()
+            # Backstop for the in-container `timeout`, e.g. if the runtime stalls.
+            watchdog = threading.Timer(timeout + ASYNC_TIMEOUT_GRACE_S, self._kill_container, args=(container,))
+            watchdog.start()
+
+            for stdout_chunk, stderr_chunk in output:
+                stdout.append(stdout_chunk)
+                stderr.append(stderr_chunk)
+            result["exit_code"] = container.wait(timeout=ASYNC_TIMEOUT_GRACE_S)["StatusCode"]
+            result["wall_time_s"] = time.monotonic() - start
+            sampler.join(timeout=1)
+
+            result["stdout"] = stdout.text()
+            result["stderr"] = stderr.text()
+            # `timeout -s KILL` exits with 128 + SIGKILL when it fires.
+            if result["exit_code"] == 137 and result["wall_time_s"] >= timeout:
+                result["timeout"] = True
+                result["stderr"] += "\nExecution timed out."
+        except docker.errors.APIError as e:
+            result["stderr"] = f"Docker API Error: {e}"
+            result["exit_code"] = 1
+            result["sandbox_error"] = True
+        except Exception as e:
+            result["stderr"] = f"An unexpected error occurred: {e}"
+            result["exit_code"] = 1
+            result["sandbox_error"] = True
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+            if self._untrack_execution(execution_id):
+                result["cancelled"] = True
+            if container is not None:
+                try:
+                    container.remove(force=True)
+                except docker.errors.APIError as e:
+                    print(f"Warning: Could not remove container {container.id}: {e}")
+
+        result.setdefault("wall_time_s", time.monotonic() - start)
+        result.update(usage, truncated=stdout.truncated or stderr.truncated)
+        result["stdout"] = str(result["stdout"]).strip()
+        result["stderr"] = str(result["stderr"]).strip()
+        return result
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_concurrency, thread_name_prefix="sandbox")
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """One concurrency limiter per event loop, since asyncio primitives are loop-bound."""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def execute_code_async(self,
+                                 language: str,
+                                 code: str,
+                                 inputs: Optional[str] = None,
+                                 cpu_limit: Optional[str] = "0.5",
+                                 memory_limit: Optional[str] = "128m",
+                                 timeout: int = 10,
+                                 nondeterministic: bool = False) -> Dict[str, Any]:
+        """
+        Awaitable `execute_code`, limited to `max_concurrency` concurrent executions.
+
+        The container is killed if the call is cancelled, or if it has not
+        finished `ASYNC_TIMEOUT_GRACE_S` seconds after `timeout`.
+
+        Returns:
+            Dict[str, Any]: The same result dictionary as `execute_code`.
+        """
+        async with self._get_semaphore():
+            execution_id = uuid.uuid4().hex
+            future = asyncio.get_running_loop().run_in_executor(
+                self._get_executor(),
+                functools.partial(self.execute_code, language, code, inputs, cpu_limit, memory_limit, timeout,
+                                  execution_id=execution_id, nondeterministic=nondeterministic),
             )
-            print(f"Docker image {self.image_name} built successfully.")
-        except docker.errors.BuildError as e:
-            print(f"Error building Docker image: {e}")
-            raise
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout + ASYNC_TIMEOUT_GRACE_S)
+            except asyncio.TimeoutError:
+                self.cancel_execution(execution_id)
+                return {"stdout": "", "stderr": "Execution timed out.", "exit_code": 1, "timeout": True,
+                        "cancelled": True}
+            except asyncio.CancelledError:
+                self.cancel_execution(execution_id)
+                raise
+
+    async def execute_batch(self,
+                            requests: Iterable[Dict[str, Any]],
+                            concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Runs many executions with bounded concurrency.
+
+        Requests are pulled from `requests` only as slots free up, so a lazy
+        iterable is never materialized ahead of the workers (backpressure).
+        If the batch is cancelled, every in-flight container is killed.
+
+        Args:
+            requests (Iterable[Dict[str, Any]]): Keyword arguments for `execute_code_async`,
+                                                 e.g. {"language": "python", "code": "print(1)"}.
+            concurrency (Optional[int]): Maximum in-flight executions. Defaults to `max_concurrency`.
+
+        Returns:
+            List[Dict[str, Any]]: Results in request order.
+        """
+        concurrency = concurrency or self.max_concurrency
+        results: Dict[int, Dict[str, Any]] = {}
+        pending = set()
+
+        async def run(index: int, request: Dict[str, Any]):
+            results[index] = await self.execute_code_async(**request)
+
+        try:
+            for index, request in enumerate(requests):
+                if len(pending) >= concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                pending.add(asyncio.ensure_future(run(index, request)))
+            if pending:
+                done, pending = await asyncio.wait(pending)
+                for task in done:
+                    task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        return [results[index] for index in sorted(results)]
+
+    def execute_many(self,
+                     language: str,
+                     code: str,
+                     inputs_list: List[Optional[str]],
+                     stop_on_first_failure: bool = False,
+                     expected_outputs: Optional[List[Optional[str]]] = None,
+                     cpu_limit: Optional[str] = "0.5",
+                     memory_limit: Optional[str] = "128m",
+                     timeout: int = 10,
+                     max_output_bytes: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Runs one program against many inputs inside a single sandbox container.
+
+        The program is compiled once (through the compile cache when configured),
+        then each input runs as its own process with its own timeout and output
+        cap. Results are yielded as each case finishes.
+
+        Args:
+            language (str): The programming language (see `LANGUAGE_SPECS`).
+            code (str): The program to execute.
+            inputs_list (List[Optional[str]]): Standard input for each test case.
+            stop_on_first_failure (bool): Stop after the first failing case.
+            expected_outputs (Optional[List[Optional[str]]]): Expected stdout per case. When given,
+                                                              each result carries a "passed" flag and
+                                                              a mismatch counts as a failure.
+            cpu_limit (Optional[str]): CPU limit for the container.
+            memory_limit (Optional[str]): Memory limit for the container.
+            timeout (int): Maximum execution time per case in seconds (compilation has its own).
+            max_output_bytes (Optional[int]): Per-stream output cap per case.
+
+        Yields:
+            Dict[str, Any]: The `execute_code` result fields plus "index", "elapsed_s" and,
+                            if expected outputs were given, "passed".
+        """
+        if self.backend is not None:
+            yield from self.backend.execute_many(language, code, inputs_list, stop_on_first_failure,
+                                                 expected_outputs, cpu_limit, memory_limit, timeout,
+                                                 max_output_bytes)
+            return
+
+        spec = LANGUAGE_SPECS.get(language.lower())
+        if spec is None:
+            raise ValueError(f"Unsupported language: {language}")
+        language = language.lower()
+
+        pool = self._get_pool(language, cpu_limit, memory_limit)
+        container = pool.acquire()
+        run_name = f"run_{uuid.uuid4().hex}"
+        run_dir = posixpath.join(POOL_WORK_ROOT, run_name)
+        failed = False
+        timed_out = False
+
+        try:
+            files = {posixpath.join(run_name, spec.file_name): code}
+            for index, inputs in enumerate(inputs_list):
+                files[posixpath.join(run_name, f"stdin_{index}.txt")] = inputs or ""
+            container.put_archive(POOL_WORK_ROOT, build_archive(files))
+
+            compile_failure, cache_info = None, None
+            if spec.compile_command:
+                if self.compile_cache is not None:
+                    compile_failure, cache_info = self._compile(container, language, spec, code, run_dir, timeout)
+                else:
+                    compile_result = self._exec(container, spec.compile_command, run_dir, timeout)
+                    if compile_result["exit_code"] != 0:
+                        compile_failure = compile_result
+            if compile_failure is not None:
+                failed = True
+                for index in range(len(inputs_list)):
+                    yield dict(compile_failure, index=index, compile_error=True, passed=False)
+                return
+
+            for index in range(len(inputs_list)):
+                case = self._exec(container, f"{spec.run_command} < stdin_{index}.txt", run_dir, timeout,
+                                  max_output_bytes)
+                case["index"] = index
+                case["stdout"] = case["stdout"].strip()
+                case["stderr"] = case["stderr"].strip()
+                if cache_info is not None and index == 0:
+                    case["compile_cache"] = cache_info
+                case_failed = case["exit_code"] != 0
+                if expected_outputs is not None and index < len(expected_outputs):
+                    expected = expected_outputs[index]
+                    case["passed"] = not case_failed and (expected is None or case["stdout"] == expected.strip())
+                    case_failed = not case["passed"]
+                failed = failed or case_failed
+                timed_out = timed_out or case["timeout"]
+                yield case
+                if case_failed and stop_on_first_failure:
+                    break
+        except docker.errors.APIError as e:
+            failed = True
+            yield {"index": None, "stdout": "", "stderr": f"Docker API Error: {e}", "exit_code": 1, "timeout": False}
+        finally:
+            # Also runs when the caller stops iterating early.
+            try:
+                if pool.should_recycle(container, failed=failed, timed_out=timed_out):
+                    container.exec_run(["sh", "-c", f"kill -9 -1 2>/dev/null; rm -rf {run_dir}"])
+            except docker.errors.APIError:
+                failed = True
+            pool.release(container, failed=failed, timed_out=timed_out)
 
     def execute_code(self,
                      language: str,
@@ -48,10 +819,12 @@ class CodeExecutionSandbox:
                      inputs: Optional[str] = None,
                      cpu_limit: Optional[str] = "0.5",  # e.g., "0.5" for 50% of one CPU
                      memory_limit: Optional[str] = "128m", # e.g., "128m" for 128MB
-                     timeout: int = 10 # seconds
+                     timeout: int = 10, # seconds
+                     execution_id: Optional[str] = None,
+                     nondeterministic: bool = False
                     ) -> Dict[str, Any]:
         """
-        Executes code in an isolated Docker container.
+        Executes code in an isolated Docker container, or through the configured backend.
 
         Args:
             language (str): The programming language (e.g., "python", "javascript", "java", "cpp", "go", "rust").
@@ -60,152 +833,59 @@ class CodeExecutionSandbox:
             cpu_limit (Optional[str]): CPU limit (e.g., "0.5" for 50% of one CPU).
             memory_limit (Optional[str]): Memory limit (e.g., "128m", "1g").
             timeout (int): Maximum execution time in seconds.
+            execution_id (Optional[str]): Handle for `cancel_execution`. A cancelled run
+                                          reports "cancelled": True.
+            nondeterministic (bool): The program's output may differ between runs (randomness,
+                                     time, ...); bypass the result cache.
 
         Returns:
             Dict[str, Any]: A dictionary containing stdout, stderr, exit_code, and a timeout flag.
+                            Runs in a fresh container also report wall_time_s, cpu_time_s,
+                            peak_memory_bytes and whether output was truncated.
+                            When the compile cache is used, a "compile_cache" entry reports whether
+                            this run hit, its compile time, time saved, and cumulative hit/miss stats.
+                            When the result cache is used, a "result_cache" entry reports whether
+                            this result was served from it, with cumulative hit/miss stats.
         """
-        temp_file_name = ""
-        command = []
-        file_extension = ""
-
-        if language.lower() == "python":
-            file_extension = "py"
-            temp_file_name = "script.py"
-            command = ["python3", temp_file_name]
-        elif language.lower() == "javascript":
-            file_extension = "js"
-            temp_file_name = "script.js"
-            command = ["node", temp_file_name]
-        elif language.lower() == "java":
-            file_extension = "java"
-            temp_file_name = "Main.java" # Java requires class name to match file name
-            command = ["sh", "-c", f"javac {temp_file_name} && java Main"]
-        elif language.lower() == "cpp":
-            file_extension = "cpp"
-            temp_file_name = "main.cpp"
-            command = ["sh", "-c", f"g++ {temp_file_name} -o a.out && ./a.out"]
-        elif language.lower() == "go":
-            file_extension = "go"
-            temp_file_name = "main.go"
-            command = ["sh", "-c", f"go run {temp_file_name}"]
-        elif language.lower() == "rust":
-            file_extension = "rs"
-            temp_file_name = "main.rs"
-            command = ["sh", "-c", f"rustc {temp_file_name} && ./main"]
-        else:
-            return {"stdout": "", "stderr": f"Unsupported language: {language}", "exit_code": 1, "timeout": False}
+        cache_key = None
+        if self.result_cache is not None and not nondeterministic and language.lower() in LANGUAGE_SPECS:
+            limits = {"cpu": cpu_limit, "memory": memory_limit, "timeout": timeout,
+                      "max_output_bytes": self.max_output_bytes}
+            cache_key = ExecutionResultCache.make_key(language.lower(), code, inputs, limits,
+                                                      self._get_environment_id(language.lower()))
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                cached["result_cache"] = dict(self.result_cache.get_stats(), hit=True)
+                return cached
 
-        # Create a temporary directory for the code file
-        temp_dir = f"/tmp/sandbox_code_{os.getpid()}_{threading.get_ident()}"
-        os.makedirs(temp_dir, exist_ok=True)
-        code_file_path = os.path.join(temp_dir, temp_file_name)
+        result = self._run_code(language, code, inputs, cpu_limit, memory_limit, timeout, execution_id)
+        if cache_key is not None:
+            self.result_cache.put(cache_key, result)
+            result["result_cache"] = dict(self.result_cache.get_stats(), hit=False)
+        return result
 
-        try:
-            with open(code_file_path, "w") as f:
-                f.write(code)
-
-            container: Optional[Any] = None # Use Any for now to avoid complex type hinting issues
-            result = {"stdout": "", "stderr": "", "exit_code": 1, "timeout": False}
-            
-            def run_container():
-                nonlocal container
-                try:
-                    container = self.client.containers.run(
-                        self.image_name,
-                        command=command,
-                        detach=True,
-                        auto_remove=False, # We'll remove it manually after getting logs
-                        network_disabled=True, # Isolate from network
-                        mem_limit=memory_limit,
-                        cpu_period=100000, # 100ms
-                        cpu_quota=int(float(cpu_limit) * 100000) if cpu_limit else -1,
-                        volumes={
-                            os.path.abspath(temp_dir): {
-                                'bind': '/app',
-                                'mode': 'ro' # Read-only mount for the code
-                            }
-                        },
-                        working_dir="/app",
-                        stdin_open=True # Enable stdin for input
-                    )
-
-                    # Provide input if any
-                    if inputs and container: # Ensure container is not None before attaching socket
-                        sock = container.attach_socket(params={'stdin': 1, 'stream': 1})
-                        sock._sock.sendall(inputs.encode('utf-8'))
-                        sock.close()
-
-                    if container: # Ensure container is not None before waiting
-                        container.wait(timeout=timeout)
-                except docker.errors.ContainerError as e:
-                    result["stderr"] = e.stderr.decode('utf-8')
-                    result["exit_code"] = e.exit_status
-                except docker.errors.APIError as e:
-                    result["stderr"] = f"Docker API Error: {e}"
-                    result["exit_code"] = 1
-                except Exception as e:
-                    result["stderr"] = f"An unexpected error occurred: {e}"
-                    result["exit_code"] = 1
-                finally:
-                    if container:
-                        # Get logs before removing
-                        stdout_logs_raw = container.logs(stdout=True, stderr=False)
-                        stderr_logs_raw = container.logs(stdout=False, stderr=True)
-
-                        # Decode stdout
-                        if stdout_logs_raw is None:
-                            result["stdout"] = ""
-                        elif isinstance(stdout_logs_raw, bytes):
-                            result["stdout"] = stdout_logs_raw.decode('utf-8')
-                        else: # Assume it's already a string if not bytes or None
-                            result["stdout"] = str(stdout_logs_raw)
-
-                        # Decode stderr
-                        decoded_stderr = ""
-                        if stderr_logs_raw is None:
-                            decoded_stderr = ""
-                        elif isinstance(stderr_logs_raw, bytes):
-                            decoded_stderr = stderr_logs_raw.decode('utf-8')
-                        else: # Assume it's already a string if not bytes or None
-                            decoded_stderr = str(stderr_logs_raw)
-                        result["stderr"] += decoded_stderr
-                        try:
-                            # Get exit code if not already set by ContainerError
-                            if "exit_code" not in result or result["exit_code"] is None:
-                                # Ensure container.id is not None before calling get
-                                if container.id:
-                                    inspect_result = self.client.containers.get(container.id).wait()
-                                    result["exit_code"] = inspect_result["StatusCode"]
-                        except Exception as e:
-                            print(f"Warning: Could not get final exit code: {e}")
-                        container.remove()
-
-            thread = threading.Thread(target=run_container)
-            thread.start()
-            thread.join(timeout=timeout + 5) # Give a little extra time for Docker cleanup
-
-            if thread.is_alive():
-                result["timeout"] = True
-                result["stderr"] += "\nExecution timed out."
-                if container:
-                    try:
-                        container.kill()
-                        container.remove()
-                    except docker.errors.APIError as e:
-                        result["stderr"] += f"\nFailed to kill/remove container after timeout: {e}"
-            
-            # Ensure stdout/stderr are strings
-            result["stdout"] = str(result["stdout"]).strip()
-            result["stderr"] = str(result["stderr"]).strip()
-
-            return result
+    def _run_code(self,
+                  language: str,
+                  code: str,
+                  inputs: Optional[str],
+                  cpu_limit: Optional[str],
+                  memory_limit: Optional[str],
+                  timeout: int,
+                  execution_id: Optional[str]) -> Dict[str, Any]:
+        """Dispatches one execution to the configured backend, a pooled container or a fresh container."""
+        if self.backend is not None:
+            return self.backend.execute(language, code, inputs, cpu_limit, memory_limit, timeout,
+                                        execution_id=execution_id)
 
-        finally:
-            # Clean up the temporary code file and directory
-            if os.path.exists(code_file_path):
-                os.remove(code_file_path)
-            if os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
+        spec = LANGUAGE_SPECS.get(language.lower())
+        if spec is None:
+            return {"stdout": "", "stderr": f"Unsupported language: {language}", "exit_code": 1, "timeout": False}
+
+        if self.pool_size > 0 or (spec.compile_command and self.compile_cache is not None):
+            return self._execute_in_pool(language.lower(), spec, code, inputs, cpu_limit, memory_limit, timeout,
+                                         execution_id)
+
+        return self._execute_direct(language.lower(), spec, code, inputs, cpu_limit, memory_limit, timeout, execution_id)
 
 if __name__ == "__main__":
     sandbox = CodeExecutionSandbox()
@@ -374,3 +1054,20 @@ print("Hello"
     print(f"Error Stderr:\n{error_result['stderr']}")
     print(f"Error Exit Code: {error_result['exit_code']}")
     print(f"Error Timeout: {error_result['timeout']}")
+
+    print("\n--- Pooled vs Direct Execution Latency ---")
+    latency_code = 'print("ok")'
+    pooled_sandbox = CodeExecutionSandbox(pool_size=2)
+    pooled_sandbox.warm_pools(["python"])
+    for label, bench_sandbox in (("direct", sandbox), ("pooled", pooled_sandbox)):
+        latencies = []
+        run_start = time.perf_counter()
+        for _ in range(20):
+            start = time.perf_counter()
+            bench_sandbox.execute_code("python", latency_code, timeout=5)
+            latencies.append(time.perf_counter() - start)
+        summary = summarize_latencies(latencies, time.perf_counter() - run_start)
+        print(f"{label:>6}: p50={summary['p50_ms']:.1f}ms p99={summary['p99_ms']:.1f}ms "
+              f"throughput={summary['throughput_per_s']:.2f}/s")
+    print(f"Pool stats: {pooled_sandbox.get_pool_stats()}")
+    pooled_sandbox.close()
@@ -0,0 +1,473 @@
+"""
+Execution backends for `CodeExecutionSandbox` other than Docker.
+
+A backend runs one program per call (`execute`) or one program against many
+inputs (`execute_many`) and returns the same result dictionaries as the
+Docker implementation, so callers can switch backends through configuration.
+"""
+
+import abc
+import math
+import os
+import resource
+import select
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, Any, Iterator, List, Optional, Sequence, Type
+
+from .python_forkserver import DEFAULT_PRELOAD_MODULES, PythonForkServer
+from .sandbox import BUILD_DIR, CappedOutput, DEFAULT_MAX_OUTPUT_BYTES, LANGUAGE_SPECS, LanguageSpec
+
+# Runtimes that reserve far more virtual memory than they use; an address-space
+# rlimit would stop them from starting, so memory_limit is not applied to them.
+ADDRESS_SPACE_EXEMPT_LANGUAGES = ("java", "javascript", "go")
+# How long a finished program's output pipes may stay open, e.g. held by a descendant that left its process group.
+OUTPUT_DRAIN_GRACE_S = 1.0
+
+_MEMORY_UNITS = {"b": 1, "k": 1024, "m": 1024**2, "g": 1024**3}
+
+
+def parse_memory_limit(memory_limit: Optional[str]) -> Optional[int]:
+    """Converts a Docker-style memory limit ("128m", "1g", "65536") to bytes."""
+    if not memory_limit:
+        return None
+    value = str(memory_limit).strip().lower()
+    if value[-1] in _MEMORY_UNITS:
+        return int(float(value[:-1]) * _MEMORY_UNITS[value[-1]])
+    return int(value)
+
+
+def mark_passed(case: Dict[str, Any], expected: Optional[str]) -> bool:
+    """Sets case["passed"] from its exit code and expected stdout. Returns whether the case failed."""
+    case["passed"] = case["exit_code"] == 0 and (expected is None or case["stdout"] == expected.strip())
+    return not case["passed"]
+
+
+class SandboxBackend(abc.ABC):
+    """Interface every sandbox execution backend implements."""
+
+    name = "base"
+
+    @abc.abstractmethod
+    def execute(self,
+                language: str,
+                code: str,
+                inputs: Optional[str] = None,
+                cpu_limit: Optional[str] = "0.5",
+                memory_limit: Optional[str] = "128m",
+                timeout: int = 10,
+                execution_id: Optional[str] = None) -> Dict[str, Any]:
+        """Runs a program once. Same arguments and result as `CodeExecutionSandbox.execute_code`."""
+
+    def execute_many(self,
+                     language: str,
+                     code: str,
+                     inputs_list: List[Optional[str]],
+                     stop_on_first_failure: bool = False,
+                     expected_outputs: Optional[List[Optional[str]]] = None,
+                     cpu_limit: Optional[str] = "0.5",
+                     memory_limit: Optional[str] = "128m",
+                     timeout: int = 10,
+                     max_output_bytes: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Runs one program against many inputs. Same contract as `CodeExecutionSandbox.execute_many`.
+        This default implementation simply calls `execute` once per input.
+        """
+        if language.lower() not in LANGUAGE_SPECS:
+            raise ValueError(f"Unsupported language: {language}")
+        for index, inputs in enumerate(inputs_list):
+            case = self.execute(language, code, inputs, cpu_limit, memory_limit, timeout)
+            case["index"] = index
+            case_failed = case["exit_code"] != 0
+            if expected_outputs is not None and index < len(expected_outputs):
+                case_failed = mark_passed(case, expected_outputs[index])
+            yield case
+            if case_failed and stop_on_first_failure:
+                break
+
+    def cancel(self, execution_id: str) -> bool:
+        """Kills the execution started with `execution_id`. Returns True if one was running."""
+        return False
+
+    def close(self):
+        """Releases any resources held by the backend."""
+
+
+class LocalProcessBackend(SandboxBackend):
+    """
+    Runs programs as local subprocesses instead of containers.
+
+    Each execution gets a private temporary directory as its working directory
+    and home, a minimal environment, and rlimits on CPU time, address space,
+    written file size, process count and core dumps. When `unshare` can create
+    a network namespace, programs run without network access. A wall-clock
+    timer kills the whole process group.
+
+    This trades Docker's filesystem isolation for near-zero start-up cost, so
+    it is meant for developer machines and CI, not for untrusted code in
+    production. The language toolchains must be installed on the host.
+
+    With `python_forkserver=True`, Python programs are forked from a template
+    process that has already imported `preload_modules` (see
+    `PythonForkServer`) instead of starting a fresh interpreter, and their
+    results report `startup_ms`.
+
+    Args:
+        work_root (Optional[str]): Parent directory for per-execution directories. Defaults to the system temp dir.
+        use_network_namespace (bool): Isolate the network with `unshare --net` when available.
+        max_output_bytes (int): Per-stream cap on captured output.
+        file_size_limit (int): Largest file, in bytes, a program may write (RLIMIT_FSIZE).
+        nproc_limit (int): Processes a program may start on top of those its user already runs (RLIMIT_NPROC).
+        python_forkserver (bool): Run Python through a pre-warmed fork server.
+        preload_modules (Sequence[str]): Modules the fork server imports up front.
+    """
+
+    name = "process"
+
+    def __init__(self,
+                 work_root: Optional[str] = None,
+                 use_network_namespace: bool = True,
+                 max_output_bytes: int = DEFAULT_MAX_OUTPUT_BYTES,
+                 file_size_limit: int = 16 * 1024**2,
+                 nproc_limit: int = 64,
+                 python_forkserver: bool = False,
+                 preload_modules: Sequence[str] = DEFAULT_PRELOAD_MODULES):
+        self.work_root = work_root
+        self.max_output_bytes = max_output_bytes
+        self.file_size_limit = file_size_limit
+        self.nproc_limit = nproc_limit
+        self._network_prefix = self._probe_network_namespace() if use_network_namespace else []
+        self.forkserver = None
+        if python_forkserver:
+            self.forkserver = PythonForkServer(preload_modules=preload_modules,
+                                               network_prefix=self._network_prefix,
+                                               max_output_bytes=max_output_bytes,
+                                               file_size_limit=file_size_limit,
+                                               work_root=work_root)
+        self._processes: Dict[str, subprocess.Popen] = {}  # execution id -> running process
+        self._cancelled_executions = set()
+        self._lock = threading.Lock()
+
+    @property
+    def network_isolated(self) -> bool:
+        return bool(self._network_prefix)
+
+    def _probe_network_namespace(self) -> List[str]:
+        """Returns the command prefix that runs a program in a fresh network namespace, or [] if unavailable."""
+        unshare = shutil.which("unshare")
+        if unshare is not None:
+            for prefix in ([unshare, "--net"], [unshare, "--net", "--map-root-user"]):
+                try:
+                    if subprocess.run(prefix + ["true"], capture_output=True, timeout=5).returncode == 0:
+                        return prefix
+                except (OSError, subprocess.SubprocessError):
+                    continue
+        print("LocalProcessBackend: Network namespaces are unavailable; programs will have network access.")
+        return []
+
+    def _count_user_processes(self) -> int:
+        uid = os.getuid()
+        count = 0
+        try:
+            for entry in os.scandir("/proc"):
+                if entry.name.isdigit():
+                    try:
+                        count += entry.stat().st_uid == uid
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return count
+
+    def _limit_setter(self, cpu_seconds: int, address_space: Optional[int]) -> Callable[[], None]:
+        """Builds the function the child runs before exec to apply its rlimits."""
+        nproc = self._count_user_processes() + self.nproc_limit
+        file_size = self.file_size_limit
+
+        def apply_limits():
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+            resource.setrlimit(resource.RLIMIT_FSIZE, (file_size, file_size))
+            resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+            resource.setrlimit(resource.RLIMIT_NPROC, (nproc, nproc))
+            if address_space is not None:
+                resource.setrlimit(resource.RLIMIT_AS, (address_space, address_space))
+
+        return apply_limits
+
+    def _environment(self, run_dir: str) -> Dict[str, str]:
+        env = {
+            "PATH": os.environ.get("PATH", "/usr/local/bin:/usr/bin:/bin"),
+            "HOME": run_dir,
+            "TMPDIR": run_dir,
+            "LANG": "C.UTF-8",
+        }
+        # Toolchains installed per-user (rustup, pyenv, ...) need their homes to stay reachable.
+        for name in ("RUSTUP_HOME", "CARGO_HOME", "GOROOT", "PYENV_ROOT", "JAVA_HOME"):
+            if name in os.environ:
+                env[name] = os.environ[name]
+        if "RUSTUP_HOME" not in env and os.path.isdir(os.path.expanduser("~/.rustup")):
+            env["RUSTUP_HOME"] = os.path.expanduser("~/.rustup")
+        return env
+
+    def _kill(self, process: subprocess.Popen):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _run(self,
+             shell_command: str,
+             run_dir: str,
+             stdin_path: Optional[str],
+             cpu_limit: Optional[str],
+             address_space: Optional[int],
+             timeout: float,
+             execution_id: Optional[str] = None,
+             max_output_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Runs a shell command in `run_dir` under rlimits and a wall-clock limit.
+
+        Returns:
+            Dict[str, Any]: stdout, stderr, exit_code, timeout and truncated flags, and elapsed_s.
+        """
+        max_output_bytes = max_output_bytes or self.max_output_bytes
+        stdout, stderr = CappedOutput(max_output_bytes), CappedOutput(max_output_bytes)
+        # A fractional CPU limit over the wall-clock budget bounds total CPU time, as Docker's quota does.
+        cpu_seconds = max(1, math.ceil(timeout * (float(cpu_limit) if cpu_limit else 1.0)))
+
+        start = time.monotonic()
+        with open(stdin_path or os.devnull, "rb") as stdin:
+            process = subprocess.Popen(
+                self._network_prefix + ["sh", "-c", shell_command],
+                cwd=run_dir,
+                stdin=stdin,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env=self._environment(run_dir),
+                start_new_session=True,  # Own process group, so the timeout kills every descendant.
+                preexec_fn=self._limit_setter(cpu_seconds, address_space),
+            )
+        if execution_id is not None:
+            with self._lock:
+                self._processes[execution_id] = process
+                if execution_id in self._cancelled_executions:
+                    self._kill(process)
+
+        stop_reading = threading.Event()
+        readers = [
+            threading.Thread(target=self._drain, args=(process.stdout, stdout, stop_reading), daemon=True),
+            threading.Thread(target=self._drain, args=(process.stderr, stderr, stop_reading), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+        timed_out = False
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+        # Kills the program on timeout, and otherwise anything it left running in its process group.
+        self._kill(process)
+        process.wait()
+        # A descendant that called setsid() escapes the kill and can hold the pipes open indefinitely.
+        deadline = time.monotonic() + OUTPUT_DRAIN_GRACE_S
+        for reader in readers:
+            reader.join(max(0.0, deadline - time.monotonic()))
+        stop_reading.set()
+        for reader in readers:
+            reader.join()
+        elapsed = time.monotonic() - start
+
+        if execution_id is not None:
+            with self._lock:
+                self._processes.pop(execution_id, None)
+
+        # The shell either execs the program (negative return code) or reports 128 + signal.
+        exit_code = process.returncode if process.returncode >= 0 else 128 - process.returncode
+        result = {
+            "stdout": stdout.text(),
+            "stderr": stderr.text(),
+            "exit_code": exit_code,
+            "timeout": timed_out,
+            "truncated": stdout.truncated or stderr.truncated,
+            "elapsed_s": elapsed,
+        }
+        if timed_out:
+            result["stderr"] += "\nExecution timed out."
+        elif exit_code == 128 + signal.SIGXCPU:
+            result["timeout"] = True
+            result["stderr"] += "\nCPU time limit exceeded."
+        return result
+
+    @staticmethod
+    def _drain(stream, output: CappedOutput, stop: threading.Event):
+        """Reads `stream` into `output` until end of file or until `stop` is set, then closes it."""
+        poller = select.poll()
+        poller.register(stream.fileno(), select.POLLIN)
+        try:
+            while not stop.is_set():
+                if not poller.poll(50):
+                    continue
+                chunk = os.read(stream.fileno(), 65536)
+                if not chunk:
+                    break
+                output.append(chunk)
+        finally:
+            stream.close()
+
+    def _address_space(self, language: str, memory_limit: Optional[str]) -> Optional[int]:
+        if language in ADDRESS_SPACE_EXEMPT_LANGUAGES:
+            return None
+        return parse_memory_limit(memory_limit)
+
+    def _prepare(self, spec: LanguageSpec, code: str, inputs_list: List[Optional[str]]) -> str:
+        """Creates the private working directory holding the source and one stdin file per input."""
+        run_dir = tempfile.mkdtemp(prefix="sandbox_run_", dir=self.work_root)
+        with open(os.path.join(run_dir, spec.file_name), "w") as f:
+            f.write(code)
+        for index, inputs in enumerate(inputs_list):
+            with open(os.path.join(run_dir, f"stdin_{index}.txt"), "w") as f:
+                f.write(inputs or "")
+        return run_dir
+
+    def _compile(self, spec: LanguageSpec, run_dir: str, cpu_limit: Optional[str], timeout: float,
+                 execution_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Compiles in `run_dir`. Returns the compile result, or None for interpreted languages."""
+        if not spec.compile_command:
+            return None
+        os.makedirs(os.path.join(run_dir, BUILD_DIR), exist_ok=True)
+        # Compilers are trusted toolchain binaries: bound their time, not their address space.
+        return self._run(spec.compile_command, run_dir, None, cpu_limit, None, timeout, execution_id)
+
+    def _finish_execution(self, execution_id: Optional[str]) -> bool:
+        """Forgets an execution id, here and in the fork server. Returns True if it was cancelled."""
+        if execution_id is None:
+            return False
+        # `cancel` cannot tell which of the two runs an id, so either may have recorded it.
+        cancelled = self.forkserver is not None and self.forkserver.finish(execution_id)
+        with self._lock:
+            if execution_id in self._cancelled_executions:
+                self._cancelled_executions.discard(execution_id)
+                return True
+        return cancelled
+
+    def execute(self,
+                language: str,
+                code: str,
+                inputs: Optional[str] = None,
+                cpu_limit: Optional[str] = "0.5",
+                memory_limit: Optional[str] = "128m",
+                timeout: int = 10,
+                execution_id: Optional[str] = None) -> Dict[str, Any]:
+        spec = LANGUAGE_SPECS.get(language.lower())
+        if spec is None:
+            return {"stdout": "", "stderr": f"Unsupported language: {language}", "exit_code": 1, "timeout": False}
+        language = language.lower()
+
+        if language == "python" and self.forkserver is not None:
+            try:
+                result = self.forkserver.execute(code, inputs, cpu_limit, parse_memory_limit(memory_limit), timeout,
+                                                 execution_id=execution_id)
+            finally:
+                cancelled = self._finish_execution(execution_id)
+            result["stdout"] = result["stdout"].strip()
+            result["stderr"] = result["stderr"].strip()
+            if cancelled:
+                result["cancelled"] = True
+            return result
+
+        run_dir = self._prepare(spec, code, [inputs])
+        try:
+            result = self._compile(spec, run_dir, cpu_limit, timeout, execution_id)
+            if result is None or result["exit_code"] == 0:
+                remaining = timeout - (result["elapsed_s"] if result else 0.0)
+                result = self._run(spec.run_command, run_dir, os.path.join(run_dir, "stdin_0.txt"), cpu_limit,
+                                   self._address_space(language, memory_limit), max(0.1, remaining), execution_id)
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+            cancelled = self._finish_execution(execution_id)
+
+        result.pop("elapsed_s")
+        result["stdout"] = result["stdout"].strip()
+        result["stderr"] = result["stderr"].strip()
+        if cancelled:
+            result["cancelled"] = True
+        return result
+
+    def execute_many(self,
+                     language: str,
+                     code: str,
+                     inputs_list: List[Optional[str]],
+                     stop_on_first_failure: bool = False,
+                     expected_outputs: Optional[List[Optional[str]]] = None,
+                     cpu_limit: Optional[str] = "0.5",
+                     memory_limit: Optional[str] = "128m",
+                     timeout: int = 10,
+                     max_output_bytes: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Compiles once in a private directory, then runs each input as its own process."""
+        spec = LANGUAGE_SPECS.get(language.lower())
+        if spec is None:
+            raise ValueError(f"Unsupported language: {language}")
+        language = language.lower()
+
+        run_dir = self._prepare(spec, code, inputs_list)
+        try:
+            compile_result = self._compile(spec, run_dir, cpu_limit, timeout)
+            if compile_result is not None and compile_result["exit_code"] != 0:
+                for index in range(len(inputs_list)):
+                    yield dict(compile_result, index=index, compile_error=True, passed=False)
+                return
+
+            address_space = self._address_space(language, memory_limit)
+            forked = language == "python" and self.forkserver is not None
+            for index in range(len(inputs_list)):
+                stdin_path = os.path.join(run_dir, f"stdin_{index}.txt")
+                if forked:
+                    case = self.forkserver.execute(code, None, cpu_limit, parse_memory_limit(memory_limit), timeout,
+                                                   max_output_bytes=max_output_bytes, run_dir=run_dir,
+                                                   stdin_path=stdin_path)
+                else:
+                    case = self._run(spec.run_command, run_dir, stdin_path, cpu_limit, address_space, timeout,
+                                     max_output_bytes=max_output_bytes)
+                case["index"] = index
+                case["stdout"] = case["stdout"].strip()
+                case["stderr"] = case["stderr"].strip()
+                case_failed = case["exit_code"] != 0
+                if expected_outputs is not None and index < len(expected_outputs):
+                    case_failed = mark_passed(case, expected_outputs[index])
+                yield case
+                if case_failed and stop_on_first_failure:
+                    break
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    def cancel(self, execution_id: str) -> bool:
+        if self.forkserver is not None and self.forkserver.cancel(execution_id):
+            return True
+        with self._lock:
+            self._cancelled_executions.add(execution_id)
+            process = self._processes.get(execution_id)
+        if process is None:
+            return False
+        self._kill(process)
+        return True
+
+    def close(self):
+        if self.forkserver is not None:
+            self.forkserver.close()
+
+
+SANDBOX_BACKENDS: Dict[str, Type[SandboxBackend]] = {
+    LocalProcessBackend.name: LocalProcessBackend,
+}
+
+
+def create_backend(name: str, **options: Any) -> SandboxBackend:
+    """Instantiates a registered backend by name, e.g. create_backend("process", max_output_bytes=65536)."""
+    backend_cls = SANDBOX_BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(f"Unknown sandbox backend: {name}. Expected one of {sorted(SANDBOX_BACKENDS)} or 'docker'.")
+    return backend_cls(**options)
@@ -0,0 +1,384 @@
+"""
+Sandbox Throughput and Latency Benchmark Suite
+
+Runs the same workloads on every selected `CodeExecutionSandbox` backend:
+
+    fake        Docker implementation against `FakeDockerClient` (no daemon needed);
+                isolates the sandbox's own orchestration overhead.
+    docker      Docker implementation against the real daemon.
+    process     `LocalProcessBackend` subprocesses.
+    forkserver  `LocalProcessBackend` with Python forked from a pre-warmed template.
+
+Scenarios per backend:
+
+    startup       Sandbox construction (image check/build, backend set-up).
+    cold          First execution of each language right after start-up.
+    warm          Repeated small executions per language.
+    stdin_heavy   A program that reads `--stdin-bytes` of input.
+    output_heavy  A program that writes `--output-bytes` of output (exercises the output cap).
+    fanout        `execute_batch` at each `--concurrency` level.
+
+`--backends auto` selects every backend usable on this machine. Languages
+whose toolchain a local backend cannot find are skipped and the languages
+actually run are listed in the results.
+
+Usage:
+    python -m src.core.sandbox_benchmark --backends auto --languages python,cpp \
+        --repeats 10 --concurrency 1,4,16 --output sandbox_bench.json [--pool-size 4]
+
+Results are written as JSON; see `benchmarking`. A backend that fails records
+its error. The sandbox behaviour the workloads exercise is tested in
+tests/test_sandbox.py.
+"""
+
+import argparse
+import asyncio
+import re
+import shutil
+import sys
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import docker
+import docker.errors
+
+from .benchmarking import benchmark_main, comma_separated, environment
+from .sandbox import CodeExecutionSandbox, LANGUAGE_SPECS, summarize_latencies
+from .sandbox_fakes import FakeDockerClient, Responder
+
+ALL_BACKENDS = ("fake", "docker", "process", "forkserver")
+LOCAL_BACKENDS = ("process", "forkserver")
+
+# Two programs per language: one prints the length of its stdin, one writes N bytes of "x".
+# The "bench:" marker comment lets the fake client imitate them without running anything.
+WORKLOADS: Dict[str, Dict[str, str]] = {
+    "python": {
+        "count_stdin": "# bench:count_stdin\nimport sys\nprint(len(sys.stdin.buffer.read()))\n",
+        "emit": "# bench:emit:{n}\nimport sys\nsys.stdout.write('x' * {n})\n",
+    },
+    "javascript": {
+        "count_stdin": ("// bench:count_stdin\nlet n = 0;\nprocess.stdin.on('data', c => n += c.length);\n"
+                        "process.stdin.on('end', () => console.log(n));\n"),
+        "emit": "// bench:emit:{n}\nprocess.stdout.write('x'.repeat({n}));\n",
+    },
+    "java": {
+        "count_stdin": ("// bench:count_stdin\npublic class Main {\n"
+                        "    public static void main(String[] args) throws Exception {\n"
+                        "        System.out.println(System.in.readAllBytes().length);\n    }\n}\n"),
+        "emit": ("// bench:emit:{n}\npublic class Main {{\n"
+                 "    public static void main(String[] args) {{\n"
+                 "        System.out.print(\"x\".repeat({n}));\n    }}\n}}\n"),
+    },
+    "cpp": {
+        "count_stdin": ("// bench:count_stdin\n#include <iostream>\n#include <iterator>\n#include <string>\n"
+                        "int main() {\n    std::string s((std::istreambuf_iterator<char>(std::cin)), "
+                        "std::istreambuf_iterator<char>());\n    std::cout << s.size() << std::endl;\n}\n"),
+        "emit": ("// bench:emit:{n}\n#include <iostream>\n#include <string>\n"
+                 "int main() {{ std::cout << std::string({n}, 'x'); }}\n"),
+    },
+    "go": {
+        "count_stdin": ("// bench:count_stdin\npackage main\n\nimport (\n\t\"fmt\"\n\t\"io\"\n\t\"os\"\n)\n\n"
+                        "func main() {\n\tdata, _ := io.ReadAll(os.Stdin)\n\tfmt.Println(len(data))\n}\n"),
+        "emit": ("// bench:emit:{n}\npackage main\n\nimport (\n\t\"os\"\n\t\"strings\"\n)\n\n"
+                 "func main() {{\n\tos.Stdout.WriteString(strings.Repeat(\"x\", {n}))\n}}\n"),
+    },
+    "rust": {
+        "count_stdin": ("// bench:count_stdin\nuse std::io::Read;\n\nfn main() {\n    let mut data = Vec::new();\n"
+                        "    std::io::stdin().read_to_end(&mut data).unwrap();\n    println!(\"{}\", data.len());\n}\n"),
+        "emit": "// bench:emit:{n}\nfn main() {{\n    print!(\"{{}}\", \"x\".repeat({n}));\n}}\n",
+    },
+}
+
+_EMIT_MARKER = re.compile(rb"bench:emit:(\d+)")
+
+
+def workload(language: str, name: str, n: int = 0) -> str:
+    """Returns the source of a benchmark program ("count_stdin", or "emit" writing `n` bytes)."""
+    template = WORKLOADS[language][name]
+    return template.format(n=n) if name == "emit" else template
+
+
+def bench_responder(exec_latency_s: float) -> Responder:
+    """A `FakeDockerClient` responder that imitates the benchmark workloads."""
+    def respond(command: str, files: Dict[str, bytes], stdin: bytes) -> Tuple[bytes, bytes, int, float]:
+        for content in files.values():
+            head = content[:64]
+            match = _EMIT_MARKER.search(head)
+            if match:
+                return b"x" * int(match.group(1)), b"", 0, exec_latency_s
+            if b"bench:count_stdin" in head:
+                return f"{len(stdin)}\n".encode(), b"", 0, exec_latency_s
+        return b"ok\n", b"", 0, exec_latency_s
+    return respond
+
+
+def docker_available() -> bool:
+    try:
+        docker.from_env().ping()
+        return True
+    except docker.errors.DockerException:
+        return False
+
+
+def available_backends() -> List[str]:
+    """Returns the backends usable on this machine."""
+    backends = ["fake"]
+    if docker_available():
+        backends.append("docker")
+    if sys.platform.startswith("linux"):
+        backends.extend(LOCAL_BACKENDS)
+    return backends
+
+
+def supported_languages(backend: str, languages: List[str]) -> List[str]:
+    """Drops languages whose toolchain a local backend cannot find on PATH."""
+    if backend not in LOCAL_BACKENDS:
+        return list(languages)
+    supported = []
+    for language in languages:
+        spec = LANGUAGE_SPECS[language]
+        tool = (spec.compile_command or spec.run_command).split("&&")[-1].split()[0]
+        if shutil.which(tool):
+            supported.append(language)
+    return supported
+
+
+def make_sandbox(backend: str,
+                 pool_size: int = 0,
+                 max_concurrency: int = 8,
+                 container_start_latency_s: float = 0.05,
+                 exec_latency_s: float = 0.01,
+                 per_language_images: bool = False) -> CodeExecutionSandbox:
+    """Builds a sandbox for one of `ALL_BACKENDS`. Pools only apply to the Docker-based ones."""
+    if backend == "fake":
+        client = FakeDockerClient(container_start_latency_s=container_start_latency_s,
+                                  exec_latency_s=exec_latency_s,
+                                  responder=bench_responder(exec_latency_s))
+        return CodeExecutionSandbox(pool_size=pool_size, max_concurrency=max_concurrency, client=client,
+                                    per_language_images=per_language_images)
+    if backend == "docker":
+        return CodeExecutionSandbox(pool_size=pool_size, max_concurrency=max_concurrency,
+                                    per_language_images=per_language_images)
+    if backend == "forkserver":
+        return CodeExecutionSandbox(max_concurrency=max_concurrency, backend="process",
+                                    backend_options={"python_forkserver": True})
+    return CodeExecutionSandbox(max_concurrency=max_concurrency, backend=backend)
+
+
+def run_sequential(execute: Callable[[], Dict[str, Any]],
+                   repeats: int,
+                   check: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Dict[str, Any]:
+    """Calls `execute` `repeats` times, timing each call and counting failed or wrong results."""
+    latencies = []
+    failures = 0
+    truncated = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        result = execute()
+        latencies.append(time.perf_counter() - t0)
+        failures += result["exit_code"] != 0 or (check is not None and not check(result))
+        truncated += bool(result.get("truncated"))
+    summary = summarize_latencies(latencies, time.perf_counter() - start)
+    summary["failures"] = failures
+    summary["truncated"] = truncated
+    return summary
+
+
+async def _timed(execute, latencies: List[float], request: Dict[str, Any]) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    result = await execute(**request)
+    latencies.append(time.perf_counter() - t0)
+    return result
+
+
+async def run_batch(sandbox: CodeExecutionSandbox,
+                    num_requests: int,
+                    language: str,
+                    concurrency: int,
+                    timeout: int = 10) -> Dict[str, Any]:
+    """Runs `num_requests` executions through `execute_batch` with at most `concurrency` in flight."""
+    latencies: List[float] = []
+    code = workload(language, "count_stdin")
+    # Time each execution as execute_batch issues it by shadowing the bound method on the instance.
+    execute = sandbox.execute_code_async
+    sandbox.execute_code_async = lambda **request: _timed(execute, latencies, request)
+    try:
+        start = time.perf_counter()
+        results = await sandbox.execute_batch(
+            ({"language": language, "code": code, "inputs": str(i), "timeout": timeout}
+             for i in range(num_requests)),
+            concurrency=concurrency,
+        )
+        wall_time = time.perf_counter() - start
+    finally:
+        del sandbox.execute_code_async
+
+    summary = summarize_latencies(latencies, wall_time)
+    summary["failures"] = sum(result["exit_code"] != 0 or result["stdout"].strip() != str(len(str(i)))
+                              for i, result in enumerate(results))
+    return summary
+
+
+def benchmark_backend(backend: str,
+                      languages: List[str],
+                      repeats: int,
+                      concurrency_levels: List[int],
+                      fanout_requests: int,
+                      stdin_bytes: int,
+                      output_bytes: int,
+                      pool_size: int = 0,
+                      timeout: int = 30,
+                      **sandbox_options: Any) -> Dict[str, Any]:
+    """
+    Runs every scenario on one backend.
+
+    The cold run of each language comes first, straight after construction, so
+    it includes image pulls, pool warm-up misses and the first compile; every
+    later scenario reuses the same sandbox.
+
+    Returns:
+        Dict[str, Any]: Scenario name -> latency summary (nested per language or concurrency level).
+    """
+    languages = supported_languages(backend, languages)
+    results: Dict[str, Any] = {"languages": languages, "cold": {}, "warm": {}}
+
+    start = time.perf_counter()
+    sandbox = make_sandbox(backend, pool_size=pool_size, max_concurrency=max(concurrency_levels),
+                           **sandbox_options)
+    results["startup"] = dict(sandbox.get_startup_metrics(), constructor_s=time.perf_counter() - start)
+    try:
+        def count_stdin(language: str, inputs: str) -> Callable[[], Dict[str, Any]]:
+            code = workload(language, "count_stdin")
+            return lambda: sandbox.execute_code(language, code, inputs=inputs, timeout=timeout)
+
+        def prints(expected: int) -> Callable[[Dict[str, Any]], bool]:
+            return lambda result: result["stdout"].strip() == str(expected)
+
+        for language in languages:
+            results["cold"][language] = run_sequential(count_stdin(language, "cold"), 1, prints(4))
+        if pool_size:
+            warm_start = time.perf_counter()
+            sandbox.warm_pools(languages)
+            results["startup"]["pool_warm_s"] = time.perf_counter() - warm_start
+        for language in languages:
+            results["warm"][language] = run_sequential(count_stdin(language, "warm"), repeats, prints(4))
+
+        if not languages:
+            return results
+        language = "python" if "python" in languages else languages[0]
+        results["stdin_heavy"] = dict(
+            run_sequential(count_stdin(language, "x" * stdin_bytes), repeats, prints(stdin_bytes)),
+            language=language, stdin_bytes=stdin_bytes)
+        emit = workload(language, "emit", output_bytes)
+        results["output_heavy"] = dict(
+            run_sequential(lambda: sandbox.execute_code(language, emit, timeout=timeout), repeats),
+            language=language, output_bytes=output_bytes, max_output_bytes=sandbox.max_output_bytes)
+        results["fanout"] = {
+            str(concurrency): dict(asyncio.run(run_batch(sandbox, fanout_requests, language, concurrency,
+                                                         timeout)), language=language)
+            for concurrency in concurrency_levels
+        }
+    finally:
+        sandbox.close()
+    return results
+
+
+def run_benchmark(backends: Optional[List[str]] = None,
+                  languages: Optional[List[str]] = None,
+                  repeats: int = 10,
+                  concurrency_levels: Optional[List[int]] = None,
+                  fanout_requests: int = 32,
+                  stdin_bytes: int = 1024 * 1024,
+                  output_bytes: int = 4 * 1024 * 1024,
+                  pool_size: int = 0,
+                  timeout: int = 30,
+                  container_start_latency_s: float = 0.05,
+                  exec_latency_s: float = 0.01,
+                  per_language_images: bool = False) -> Dict[str, Any]:
+    """
+    Runs the suite on each backend. A backend that fails records its error and the suite moves on.
+
+    Returns:
+        Dict[str, Any]: Environment info, the configuration, and per-backend scenario results.
+    """
+    backends = available_backends() if not backends or backends == ["auto"] else backends
+    languages = languages or list(LANGUAGE_SPECS)
+    concurrency_levels = concurrency_levels or [1, 4, 16]
+    results: Dict[str, Any] = {
+        "environment": environment(),
+        "config": {
+            "backends": backends,
+            "languages": languages,
+            "repeats": repeats,
+            "concurrency_levels": concurrency_levels,
+            "fanout_requests": fanout_requests,
+            "stdin_bytes": stdin_bytes,
+            "output_bytes": output_bytes,
+            "pool_size": pool_size,
+            "timeout": timeout,
+            "container_start_latency_s": container_start_latency_s,
+            "exec_latency_s": exec_latency_s,
+            "per_language_images": per_language_images,
+        },
+        "backends": {},
+    }
+
+    for backend in backends:
+        options: Dict[str, Any] = {}
+        if backend == "fake":
+            options = {"container_start_latency_s": container_start_latency_s, "exec_latency_s": exec_latency_s,
+                       "per_language_images": per_language_images}
+        elif backend == "docker":
+            options = {"per_language_images": per_language_images}
+        print(f"Benchmarking backend: {backend}")
+        try:
+            results["backends"][backend] = benchmark_backend(
+                backend, languages, repeats, concurrency_levels, fanout_requests, stdin_bytes, output_bytes,
+                pool_size=0 if backend in LOCAL_BACKENDS else pool_size, timeout=timeout, **options)
+        except Exception as e:
+            print(f"Backend {backend} failed: {e}")
+            results["backends"][backend] = {"error": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--backends", type=comma_separated(), default=["auto"],
+                        help=f"Comma-separated subset of {', '.join(ALL_BACKENDS)}, or 'auto'.")
+    parser.add_argument("--languages", type=comma_separated(), default=list(LANGUAGE_SPECS))
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--concurrency", dest="concurrency_levels", type=comma_separated(int), default=[1, 4, 16],
+                        help="Comma-separated fan-out levels.")
+    parser.add_argument("--fanout-requests", type=int, default=32)
+    parser.add_argument("--stdin-bytes", type=int, default=1024 * 1024)
+    parser.add_argument("--output-bytes", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("--pool-size", type=int, default=0, help="Warm container pool size (Docker backends).")
+    parser.add_argument("--timeout", type=int, default=30)
+    parser.add_argument("--per-language-images", action="store_true")
+    parser.add_argument("--container-start-latency", dest="container_start_latency_s", type=float, default=0.05)
+    parser.add_argument("--exec-latency", dest="exec_latency_s", type=float, default=0.01)
+
+
+def report(results: Dict[str, Any]):
+    for backend, scenarios in results["backends"].items():
+        if "error" in scenarios:
+            print(f"{backend}: error: {scenarios['error']}")
+            continue
+        print(f"{backend}: startup={scenarios['startup']['constructor_s'] * 1000:.1f}ms "
+              f"languages={','.join(scenarios['languages'])}")
+        rows = [(f"cold/{language}", summary) for language, summary in scenarios["cold"].items()]
+        rows += [(f"warm/{language}", summary) for language, summary in scenarios["warm"].items()]
+        rows += [(name, scenarios[name]) for name in ("stdin_heavy", "output_heavy") if name in scenarios]
+        rows += [(f"fanout_c{c}", summary) for c, summary in scenarios.get("fanout", {}).items()]
+        for name, summary in rows:
+            print(f"  {name:>18}: p50={summary['p50_ms']:.1f}ms p99={summary['p99_ms']:.1f}ms "
+                  f"throughput={summary['throughput_per_s']:.1f}/s failures={summary['failures']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return benchmark_main(run_benchmark, argv, "Benchmark sandbox latency and throughput across backends.",
+                          "sandbox_bench.json", add_arguments, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+"""
+In-memory stand-in for the Docker SDK client used by `CodeExecutionSandbox`.
+
+`FakeDockerClient` implements the subset of `docker.DockerClient` the sandbox
+calls (image build/lookup, `containers.run`, container exec/archive/log
+methods and the low-level exec API) without a daemon. Programs are not
+actually run: each execution sleeps for a configurable latency and returns
+whatever the `responder` produces. This makes the sandbox's own
+orchestration overhead measurable on machines without Docker.
+"""
+
+import io
+import itertools
+import posixpath
+import tarfile
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import docker.errors
+import requests.exceptions
+
+# responder(command, files, stdin) -> (stdout, stderr, exit_code, duration_s)
+Responder = Callable[[str, Dict[str, bytes], bytes], Tuple[bytes, bytes, int, float]]
+
+
+def default_responder(exec_latency_s: float) -> Responder:
+    """Echoes nothing interesting: prints "ok" and exits 0 after `exec_latency_s`."""
+    def respond(command: str, files: Dict[str, bytes], stdin: bytes) -> Tuple[bytes, bytes, int, float]:
+        return b"ok\n", b"", 0, exec_latency_s
+    return respond
+
+
+class FakeImage:
+    def __init__(self, tag: str, image_id: str):
+        self.id = image_id
+        self.tags = [tag]
+        self.attrs = {"Id": image_id, "RepoTags": [tag]}
+
+
+class FakeImages:
+    def __init__(self, client: "FakeDockerClient"):
+        self._client = client
+        self._images: Dict[str, FakeImage] = {}
+        self.build_count = 0
+
+    def build(self, tag: str, **kwargs) -> Tuple[FakeImage, List[Dict[str, Any]]]:
+        time.sleep(self._client.build_latency_s)
+        self.build_count += 1
+        image = FakeImage(tag, f"sha256:{next(self._client._ids):064x}")
+        self._images[tag] = image
+        return image, []
+
+    def get(self, name: str) -> FakeImage:
+        if name not in self._images:
+            raise docker.errors.ImageNotFound(f"No such image: {name}")
+        return self._images[name]
+
+
+class FakeContainer:
+    """A container that 'runs' its command through the client's responder."""
+
+    def __init__(self, client: "FakeDockerClient", image: FakeImage, command: Any, **kwargs):
+        self.client = client
+        self.id = f"{next(client._ids):012x}"
+        self.image = image
+        self.command = command
+        self.kwargs = kwargs
+        self.files: Dict[str, bytes] = {}
+        self.stdin = b""
+        self.status = "created"
+        self.killed = threading.Event()
+        self.done = threading.Event()
+        self._result: Optional[Tuple[bytes, bytes, int]] = None
+        self._started_at = time.monotonic()
+
+    def _command_string(self, command: Any) -> str:
+        return command if isinstance(command, str) else " ".join(str(part) for part in command)
+
+    def _run(self,
+             command: Any,
+             workdir: Optional[str] = None,
+             stdin: bytes = b"",
+             limit: Optional[float] = None) -> Tuple[bytes, bytes, int, bool]:
+        """
+        Simulates one program run, honouring a `timeout -s KILL N` wrapper, an
+        explicit `limit` and kills.
+
+        Returns:
+            Tuple[bytes, bytes, int, bool]: stdout, stderr, exit code and whether the limit was hit.
+        """
+        command_str = self._command_string(command)
+        files = self.files
+        if workdir:
+            # A pooled container holds earlier runs' directories too; the program only sees its own.
+            prefix = workdir.rstrip("/") + "/"
+            files = {name: content for name, content in self.files.items() if name.startswith(prefix)}
+            if "<" in command_str:
+                stdin_name = command_str.rsplit("<", 1)[1].strip().split()[0]
+                stdin = files.get(prefix + stdin_name, stdin)
+        stdout, stderr, exit_code, duration = self.client.responder(command_str, files, stdin)
+
+        if isinstance(command, list) and command[:3] == ["timeout", "-s", "KILL"]:
+            limit = float(command[3]) if limit is None else min(limit, float(command[3]))
+        if self.killed.wait(duration if limit is None else min(duration, limit)):
+            return stdout, stderr, 137, False
+        if limit is not None and duration > limit:
+            return stdout, stderr, 137, True
+        return stdout, stderr, exit_code, False
+
+    # --- high-level container API -------------------------------------------------
+
+    def exec_run(self, cmd: Any, workdir: Optional[str] = None, demux: bool = False, **kwargs):
+        time.sleep(self.client.exec_overhead_s)
+        if isinstance(cmd, list) and cmd[:2] == ["sh", "-c"] and ("kill -9 -1" in cmd[2] or "version" in cmd[2]):
+            return 0, ((b"fake-toolchain 1.0\n", None) if demux else b"fake-toolchain 1.0\n")
+        stdout, stderr, exit_code, _ = self._run(cmd, workdir)
+        return exit_code, ((stdout, stderr) if demux else stdout + stderr)
+
+    def put_archive(self, path: str, data: bytes) -> bool:
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            for member in tar.getmembers():
+                if member.isfile():
+                    self.files[posixpath.join(path, member.name)] = tar.extractfile(member).read()
+        return True
+
+    def get_archive(self, path: str):
+        buffer = io.BytesIO()
+        parent = posixpath.dirname(path.rstrip("/"))
+        with tarfile.open(fileobj=buffer, mode="w") as tar:
+            for name, content in self.files.items():
+                if name == path or name.startswith(path.rstrip("/") + "/"):
+                    info = tarfile.TarInfo(posixpath.relpath(name, parent))
+                    info.size = len(content)
+                    tar.addfile(info, io.BytesIO(content))
+        return iter([buffer.getvalue()]), {"name": posixpath.basename(path)}
+
+    def _main(self):
+        stdout, stderr, exit_code, _ = self._run(self.command, self.kwargs.get("working_dir"), self.stdin)
+        self._result = (stdout, stderr, exit_code)
+        self.status = "exited"
+        self.done.set()
+
+    def start(self):
+        self._started_at = time.monotonic()
+        self.status = "running"
+        # Idle pool containers only serve execs; everything else runs its command.
+        if self._command_string(self.command or "") != "sleep infinity":
+            threading.Thread(target=self._main, daemon=True).start()
+
+    def wait(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        if not self.done.wait(timeout):
+            # Mirror docker-py, whose wait() raises when the HTTP read times out.
+            raise requests.exceptions.ReadTimeout("Fake container wait timed out.")
+        return {"StatusCode": self._result[2], "Error": None}
+
+    def logs(self, stdout: bool = True, stderr: bool = True, **kwargs) -> bytes:
+        if self._result is None:
+            return b""
+        return (self._result[0] if stdout else b"") + (self._result[1] if stderr else b"")
+
+    def _stats_snapshot(self) -> Dict[str, Any]:
+        return {
+            "memory_stats": {"usage": 8 * 1024**2, "max_usage": 8 * 1024**2},
+            "cpu_stats": {"cpu_usage": {"total_usage": int(1e9 * (time.monotonic() - self._started_at))}},
+        }
+
+    def _stats_stream(self, interval_s: float):
+        yield self._stats_snapshot()
+        while not self.done.wait(interval_s):
+            yield self._stats_snapshot()
+
+    def stats(self, stream: bool = False, decode: bool = False):
+        return self._stats_stream(self.client.stats_interval_s) if stream else self._stats_snapshot()
+
+    def kill(self, signal: Optional[str] = None):
+        self.killed.set()
+
+    def remove(self, force: bool = False, **kwargs):
+        self.killed.set()
+        self.client.containers._containers.pop(self.id, None)
+
+
+class FakeContainers:
+    def __init__(self, client: "FakeDockerClient"):
+        self._client = client
+        self._containers: Dict[str, FakeContainer] = {}
+        self.run_count = 0
+
+    def create(self, image: str, command: Any = None, **kwargs) -> FakeContainer:
+        time.sleep(self._client.container_start_latency_s)
+        try:
+            image_obj = self._client.images.get(image)
+        except docker.errors.ImageNotFound:
+            image_obj = FakeImage(image, f"sha256:{0:064x}")
+        container = FakeContainer(self._client, image_obj, command, **kwargs)
+        self._containers[container.id] = container
+        self.run_count += 1
+        return container
+
+    def run(self, image: str, command: Any = None, detach: bool = False, **kwargs) -> FakeContainer:
+        container = self.create(image, command, **kwargs)
+        container.start()
+        return container
+
+    def get(self, container_id: str) -> FakeContainer:
+        if container_id not in self._containers:
+            raise docker.errors.NotFound(f"No such container: {container_id}")
+        return self._containers[container_id]
+
+    def list(self, **kwargs) -> List[FakeContainer]:
+        return list(self._containers.values())
+
+
+class FakeAPIClient:
+    """The low-level exec API subset used for streamed, capped output."""
+
+    def __init__(self, client: "FakeDockerClient"):
+        self._client = client
+        self._execs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def exec_create(self, container: str, cmd: Any, workdir: Optional[str] = None, **kwargs) -> Dict[str, str]:
+        exec_id = f"{next(self._client._ids):016x}"
+        with self._lock:
+            self._execs[exec_id] = {"container": container, "cmd": cmd, "workdir": workdir, "exit_code": None}
+        return {"Id": exec_id}
+
+    def exec_start(self, exec_id: str, stream: bool = False, demux: bool = False, **kwargs):
+        time.sleep(self._client.exec_overhead_s)
+        record = self._execs[exec_id]
+        container = self._client.containers.get(record["container"])
+        stdout, stderr, exit_code, _ = container._run(record["cmd"], record["workdir"])
+        record["exit_code"] = exit_code
+        if stream:
+            return iter([(stdout or None, stderr or None)])
+        return (stdout, stderr) if demux else stdout + stderr
+
+    def attach(self, container: str, stdout: bool = True, stderr: bool = True, stream: bool = False,
+               demux: bool = False, **kwargs):
+        target = self._client.containers.get(container)
+
+        def frames():
+            target.done.wait()
+            yield (target._result[0] or None, target._result[1] or None)
+
+        if stream:
+            return frames()
+        target.done.wait()
+        return (target._result[0], target._result[1]) if demux else target._result[0] + target._result[1]
+
+    def exec_inspect(self, exec_id: str) -> Dict[str, Any]:
+        record = self._execs[exec_id]
+        return {"ExitCode": record["exit_code"], "Running": record["exit_code"] is None}
+
+
+class FakeDockerClient:
+    """
+    A daemon-free Docker client with configurable latencies.
+
+    Args:
+        container_start_latency_s (float): Simulated `containers.run` cost.
+        exec_latency_s (float): Simulated program run time (default responder).
+        exec_overhead_s (float): Simulated per-exec API round trip.
+        build_latency_s (float): Simulated image build cost.
+        stats_interval_s (float): Interval between snapshots of a streamed `stats` call.
+        responder (Optional[Responder]): Produces (stdout, stderr, exit_code, duration_s) per run.
+    """
+
+    def __init__(self,
+                 container_start_latency_s: float = 0.05,
+                 exec_latency_s: float = 0.01,
+                 exec_overhead_s: float = 0.002,
+                 build_latency_s: float = 0.0,
+                 stats_interval_s: float = 0.05,
+                 responder: Optional[Responder] = None):
+        self._ids = itertools.count(1)
+        self.container_start_latency_s = container_start_latency_s
+        self.exec_latency_s = exec_latency_s
+        self.exec_overhead_s = exec_overhead_s
+        self.build_latency_s = build_latency_s
+        self.stats_interval_s = stats_interval_s
+        self.responder = responder or default_responder(exec_latency_s)
+        self.images = FakeImages(self)
+        self.containers = FakeContainers(self)
+        self.api = FakeAPIClient(self)
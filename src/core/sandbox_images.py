@@ -0,0 +1,170 @@
+import fnmatch
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+import docker.errors
+
+# Per-language slim Dockerfiles, named "<language>.Dockerfile".
+LANGUAGE_DOCKERFILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sandbox_images")
+# Always left out of the context hash, in addition to .dockerignore patterns.
+DEFAULT_IGNORE_PATTERNS = ["__pycache__", "*.pyc", ".git"]
+
+
+def _read_dockerignore(context_path: str) -> List[str]:
+    patterns = list(DEFAULT_IGNORE_PATTERNS)
+    try:
+        with open(os.path.join(context_path, ".dockerignore")) as f:
+            for line in f:
+                line = line.strip()
+                # Exceptions ("!pattern") are not supported; ignoring them only makes the hash stricter.
+                if line and not line.startswith("#") and not line.startswith("!"):
+                    patterns.append(line.rstrip("/"))
+    except FileNotFoundError:
+        pass
+    return patterns
+
+
+def _is_ignored(rel_path: str, patterns: List[str]) -> bool:
+    """Matches a path, or any directory above it, against .dockerignore-style patterns."""
+    parts = rel_path.split("/")
+    for i in range(1, len(parts) + 1):
+        prefix = "/".join(parts[:i])
+        for pattern in patterns:
+            # Patterns without a slash, like "*.pyc" or "__pycache__", match at any depth.
+            if fnmatch.fnmatch(prefix, pattern) or ("/" not in pattern and fnmatch.fnmatch(parts[i - 1], pattern)):
+                return True
+    return False
+
+
+def hash_build_context(context_path: str, dockerfile_path: str, include_context: bool = True) -> str:
+    """
+    Hashes a Dockerfile and, optionally, every file of its build context.
+
+    Files excluded by `.dockerignore` (and `__pycache__`, `*.pyc`, `.git`) do
+    not contribute, so the hash only changes when the built image would.
+
+    Returns:
+        str: A hex sha256 digest.
+    """
+    digest = hashlib.sha256()
+    with open(dockerfile_path, "rb") as f:
+        digest.update(f.read())
+    if include_context:
+        patterns = _read_dockerignore(context_path)
+        for root, dirs, files in os.walk(context_path):
+            rel_root = os.path.relpath(root, context_path).replace(os.sep, "/")
+            rel_root = "" if rel_root == "." else rel_root + "/"
+            dirs[:] = sorted(d for d in dirs if not _is_ignored(rel_root + d, patterns))
+            for name in sorted(files):
+                rel_path = rel_root + name
+                if _is_ignored(rel_path, patterns):
+                    continue
+                path = os.path.join(root, name)
+                digest.update(rel_path.encode("utf-8") + b"\0")
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b""):
+                        digest.update(block)
+                digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SandboxImageManager:
+    """
+    Builds sandbox images only when their content changed.
+
+    Each image is tagged with a hash of its Dockerfile and build context, and
+    the build is skipped when the daemon already has that tag. With
+    `per_language_images`, each language gets its own slim image from
+    `LANGUAGE_DOCKERFILE_DIR`, built on first use of that language; otherwise
+    every language shares the base image.
+    """
+
+    def __init__(self,
+                 client: Any,
+                 image_name: str,
+                 dockerfile_path: str,
+                 per_language_images: bool = False,
+                 language_dockerfile_dir: str = LANGUAGE_DOCKERFILE_DIR):
+        self.client = client
+        self.image_name = image_name
+        self.dockerfile_path = dockerfile_path
+        self.per_language_images = per_language_images
+        self.language_dockerfile_dir = language_dockerfile_dir
+        self.base_image: Optional[str] = None
+        self._language_images: Dict[str, str] = {}
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Dict[str, Any]] = {}  # image key -> hash/lookup/build timings
+
+    def _ensure(self, key: str, repository: str, context_path: str, dockerfile_path: str,
+                include_context: bool) -> str:
+        """Returns the content-addressed tag for an image, building it only if the daemon lacks it."""
+        start = time.monotonic()
+        content_hash = hash_build_context(context_path, dockerfile_path, include_context)
+        tag = f"{repository}:{content_hash[:16]}"
+        hashed = time.monotonic()
+
+        built = False
+        try:
+            self.client.images.get(tag)
+        except docker.errors.ImageNotFound:
+            print(f"Building Docker image: {tag} from {dockerfile_path}...")
+            try:
+                self.client.images.build(
+                    path=context_path,
+                    dockerfile=os.path.relpath(dockerfile_path, context_path),
+                    tag=tag,
+                    rm=True  # Remove intermediate containers
+                )
+            except docker.errors.BuildError as e:
+                print(f"Error building Docker image: {e}")
+                raise
+            print(f"Docker image {tag} built successfully.")
+            built = True
+        finished = time.monotonic()
+
+        with self._lock:
+            self.metrics[key] = {
+                "tag": tag,
+                "built": built,
+                "hash_time_s": hashed - start,
+                "build_time_s": finished - hashed if built else 0.0,
+                "total_time_s": finished - start,
+            }
+        return tag
+
+    def ensure_base_image(self) -> str:
+        """Makes sure the base image exists and returns its tag."""
+        if self.base_image is None:
+            context_path = os.path.dirname(self.dockerfile_path) or "."
+            self.base_image = self._ensure("base", self.image_name, context_path, self.dockerfile_path, True)
+        return self.base_image
+
+    def get_image(self, language: str) -> str:
+        """Returns the image to run `language` in, building its slim image on first use."""
+        if not self.per_language_images:
+            return self.ensure_base_image()
+        image = self._language_images.get(language)
+        if image is not None:
+            return image
+        with self._lock:
+            build_lock = self._build_locks.setdefault(language, threading.Lock())
+        with build_lock:  # Concurrent first uses of a language wait for one build.
+            image = self._language_images.get(language)
+            if image is None:
+                dockerfile_path = os.path.join(self.language_dockerfile_dir, f"{language}.Dockerfile")
+                if not os.path.exists(dockerfile_path):
+                    return self.ensure_base_image()
+                # Slim Dockerfiles copy nothing in, so only the Dockerfile itself is hashed.
+                image = self._ensure(language, f"{self.image_name}-{language}", self.language_dockerfile_dir,
+                                     dockerfile_path, include_context=False)
+                self._language_images[language] = image
+        return image
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Returns per-image tag, whether it was built, and hashing/build times."""
+        with self._lock:
+            return {key: dict(value) for key, value in self.metrics.items()}
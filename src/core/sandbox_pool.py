@@ -0,0 +1,187 @@
+import collections
+import threading
+from typing import Dict, Any, Optional
+
+import docker.errors
+
+# Containers idle on this command until code is exec'd into them.
+IDLE_COMMAND = ["sleep", "infinity"]
+# Each execution gets a fresh directory under this root inside the container.
+POOL_WORK_ROOT = "/tmp"
+
+ISOLATION_POLICIES = (
+    "recycle",           # Reuse until max_reuses, whatever the outcome (timeouts still discard).
+    "discard_on_error",  # Reuse after clean runs; discard after a non-zero exit or timeout.
+    "single_use",        # Never reuse; the pool only hides container start-up latency.
+)
+
+
+class ContainerPool:
+    """
+    A pool of pre-started, network-disabled sandbox containers sharing one
+    image and one resource profile.
+
+    Containers idle on `sleep infinity`; code is injected per execution and run
+    with `exec`. After each execution the container is returned to the pool or
+    discarded according to `isolation_policy` and `max_reuses`. Discarded
+    containers are replaced in the background so the pool stays warm.
+    """
+
+    def __init__(self,
+                 client: Any,
+                 image_name: str,
+                 size: int = 2,
+                 max_reuses: int = 50,
+                 isolation_policy: str = "discard_on_error",
+                 cpu_limit: Optional[str] = "0.5",
+                 memory_limit: Optional[str] = "128m",
+                 pids_limit: int = 64,
+                 labels: Optional[Dict[str, str]] = None):
+        if isolation_policy not in ISOLATION_POLICIES:
+            raise ValueError(f"Unknown isolation policy: {isolation_policy}. Expected one of {ISOLATION_POLICIES}.")
+        self.client = client
+        self.image_name = image_name
+        self.size = size
+        self.max_reuses = max_reuses
+        self.isolation_policy = isolation_policy
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.pids_limit = pids_limit
+        self.labels = dict(labels or {}, **{"tanuki.sandbox.pool": image_name})
+        self._idle = collections.deque()
+        self._uses: Dict[str, int] = {}  # container id -> completed executions
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"created": 0, "reused": 0, "discarded": 0, "acquired": 0}
+
+    def _start_container(self) -> Any:
+        """Starts one idle, network-disabled container with the pool's resource limits."""
+        container = self.client.containers.run(
+            self.image_name,
+            command=IDLE_COMMAND,
+            detach=True,
+            network_disabled=True,
+            mem_limit=self.memory_limit,
+            cpu_period=100000,
+            cpu_quota=int(float(self.cpu_limit) * 100000) if self.cpu_limit else -1,
+            pids_limit=self.pids_limit,
+            working_dir=POOL_WORK_ROOT,
+            labels=self.labels,
+        )
+        with self._lock:
+            self._uses[container.id] = 0
+            self.stats["created"] += 1
+        return container
+
+    def _remove_container(self, container: Any):
+        try:
+            container.remove(force=True)
+        except docker.errors.APIError as e:
+            print(f"ContainerPool: Failed to remove container {container.id}: {e}")
+
+    def _replenish(self):
+        """Tops the pool back up to `size` idle containers."""
+        while True:
+            with self._lock:
+                if self._closed or len(self._idle) >= self.size:
+                    return
+            try:
+                container = self._start_container()
+            except docker.errors.APIError as e:
+                print(f"ContainerPool: Failed to start replacement container: {e}")
+                return
+            with self._lock:
+                if self._closed:
+                    self._uses.pop(container.id, None)
+                    closed = True
+                else:
+                    self._idle.append(container)
+                    closed = False
+            if closed:
+                self._remove_container(container)
+                return
+
+    def _replenish_async(self):
+        threading.Thread(target=self._replenish, daemon=True).start()
+
+    def warm(self, block: bool = True):
+        """
+        Starts containers until `size` are idle.
+
+        Args:
+            block (bool): Wait until the containers are running; otherwise start them in the background.
+        """
+        if block:
+            self._replenish()
+        else:
+            self._replenish_async()
+
+    def acquire(self) -> Any:
+        """
+        Takes an idle container from the pool, starting a new one if none is idle.
+
+        Returns:
+            The container to execute in. Must be handed back with `release`.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ContainerPool is closed.")
+            container = self._idle.popleft() if self._idle else None
+            self.stats["acquired"] += 1
+        if container is None:
+            container = self._start_container()
+        return container
+
+    def _should_recycle_locked(self, container: Any, failed: bool, timed_out: bool) -> bool:
+        return not (
+            self._closed
+            or timed_out
+            or self.isolation_policy == "single_use"
+            or (self.isolation_policy == "discard_on_error" and failed)
+            or self._uses.get(container.id, 0) + 1 >= self.max_reuses
+            or len(self._idle) >= self.size
+        )
+
+    def should_recycle(self, container: Any, failed: bool = False, timed_out: bool = False) -> bool:
+        """Tells whether `release` would return this container to the pool after the given outcome."""
+        with self._lock:
+            return self._should_recycle_locked(container, failed, timed_out)
+
+    def release(self, container: Any, failed: bool = False, timed_out: bool = False):
+        """
+        Returns a container after an execution, recycling or discarding it.
+
+        Args:
+            container: A container obtained from `acquire`.
+            failed (bool): The execution exited non-zero or hit a Docker error.
+            timed_out (bool): The execution was killed for exceeding its timeout.
+        """
+        with self._lock:
+            recycle = self._should_recycle_locked(container, failed, timed_out)
+            if recycle:
+                self._uses[container.id] = self._uses.get(container.id, 0) + 1
+                self._idle.append(container)
+                self.stats["reused"] += 1
+            else:
+                self._uses.pop(container.id, None)
+                self.stats["discarded"] += 1
+
+        if not recycle:
+            self._remove_container(container)
+            self._replenish_async()
+
+    def close(self):
+        """Removes every idle container. Containers still in use are removed on release."""
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            for container in idle:
+                self._uses.pop(container.id, None)
+        for container in idle:
+            self._remove_container(container)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns creation/reuse counters and the current idle count."""
+        with self._lock:
+            return dict(self.stats, idle=len(self._idle), size=self.size)
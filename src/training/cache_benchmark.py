@@ -0,0 +1,132 @@
+"""
+Dataset Cache Replay Benchmark
+
+Generates a synthetic local copy of `bigcode/the-stack-v2` records and compares
+reading a slice of it through `load_dataset(..., streaming=True)`, a local
+stand-in for Hub streaming that is faster than the network, with replaying the
+same slice from the memory-mapped Arrow cache. Also times a synthesis run that
+materializes the slice against one that replays it offline.
+
+Usage:
+    python -m src.training.cache_benchmark --records 50000 --num-samples 40000 --output cache_bench.json
+
+Results are written as JSON; see `benchmarking`. That replayed records equal
+streamed ones, and offline mode, are tested in tests/test_dataset_cache.py.
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, Any, Iterable, List, Optional
+
+from ..core.benchmarking import benchmark_main, environment
+from .data_synthesis import DataSynthesisPipeline
+from .dataset_cache import DatasetCache, matches_filters, stream_dataset
+from .synthesis_benchmark import SOURCE_DATASET, write_synthetic_stack
+
+
+def _timed_read(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    count = sum(1 for _ in records)
+    seconds = time.perf_counter() - start
+    return {"records": count, "seconds": seconds, "records_per_s": count / seconds if seconds > 0 else 0.0}
+
+
+def _timed_synthesis(pipeline: DataSynthesisPipeline, num_samples: int, data_file: str,
+                     filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        stored = pipeline.generate_and_store_react_data(SOURCE_DATASET, "tanuki-coder", num_samples=num_samples,
+                                                        data_files=data_file, filters=filters)
+    return {"stored": stored, "seconds": time.perf_counter() - start}
+
+
+def run_benchmark(num_records: int = 50000,
+                  num_samples: int = 40000,
+                  mean_content_bytes: int = 2048,
+                  filters: Optional[Dict[str, Any]] = None,
+                  work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Streams, materializes and replays one slice, then runs synthesis against it online and offline.
+
+    Returns:
+        Dict[str, Any]: Environment info, the configuration and per-phase timings.
+    """
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="cache_bench_")
+    try:
+        data_file = os.path.join(work_dir, "the-stack-v2.jsonl")
+        dataset_bytes = write_synthetic_stack(data_file, num_records, mean_content_bytes)
+        cache = DatasetCache(os.path.join(work_dir, "cache"))
+
+        def streamed() -> Iterable[Dict[str, Any]]:
+            records = (record for record in stream_dataset(SOURCE_DATASET, "train", data_file)
+                       if matches_filters(record, filters))
+            return itertools.islice(records, num_samples) if num_samples != -1 else records
+
+        stream = _timed_read(streamed())
+        start = time.perf_counter()
+        manifest = cache.materialize(stream_dataset(SOURCE_DATASET, "train", data_file), SOURCE_DATASET, "train",
+                                     num_samples, filters, data_file)
+        materialize_s = time.perf_counter() - start
+        replay = _timed_read(cache.replay(manifest, num_samples))
+
+        pipeline_cache = DatasetCache(os.path.join(work_dir, "pipeline_cache"))
+        online_run = _timed_synthesis(DataSynthesisPipeline(os.path.join(work_dir, "out_online"),
+                                                            dataset_cache=pipeline_cache), num_samples, data_file, filters)
+        offline_cache = DatasetCache(pipeline_cache.cache_dir, offline=True)
+        offline_run = _timed_synthesis(DataSynthesisPipeline(os.path.join(work_dir, "out_offline"),
+                                                             dataset_cache=offline_cache), num_samples, data_file, filters)
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    cache_mb = manifest["total_bytes"] / 1024**2
+    return {
+        "environment": environment(),
+        "config": {
+            "num_records": num_records,
+            "num_samples": num_samples,
+            "mean_content_bytes": mean_content_bytes,
+            "filters": filters,
+            "dataset_mb": dataset_bytes / 1024**2,
+        },
+        "stream": stream,
+        "materialize": {"seconds": materialize_s, "records": manifest["total_records"], "cache_mb": cache_mb,
+                        "shards": len(manifest["shards"])},
+        "replay": dict(replay, mb_per_s=cache_mb / replay["seconds"] if replay["seconds"] > 0 else 0.0),
+        "replay_speedup": stream["seconds"] / replay["seconds"] if replay["seconds"] > 0 else 0.0,
+        "synthesis": {"materializing": online_run, "offline_replay": offline_run},
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--records", type=int, default=50000, dest="num_records",
+                        help="Records in the synthetic dataset.")
+    parser.add_argument("--num-samples", type=int, default=40000, help="Records in the cached slice.")
+    parser.add_argument("--mean-content-bytes", type=int, default=2048)
+    parser.add_argument("--work-dir", type=str, default=None, help="Keep the dataset, cache and outputs here.")
+
+
+def report(results: Dict[str, Any]):
+    print(f"Stream: {results['stream']['records_per_s']:.0f} records/s; "
+          f"replay: {results['replay']['records_per_s']:.0f} records/s ({results['replay']['mb_per_s']:.0f}MB/s), "
+          f"{results['replay_speedup']:.1f}x; materialized in {results['materialize']['seconds']:.1f}s")
+    synthesis = results["synthesis"]
+    print(f"Synthesis: {synthesis['materializing']['seconds']:.1f}s materializing, "
+          f"{synthesis['offline_replay']['seconds']:.1f}s replaying offline")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return benchmark_main(run_benchmark, argv, "Benchmark dataset cache replay against streaming.",
+                          "cache_bench.json", add_arguments, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
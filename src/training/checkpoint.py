@@ -0,0 +1,93 @@
+import collections
+import itertools
+import json
+import os
+import time
+from typing import Dict, Any, Iterable, Iterator, Optional
+
+CHECKPOINT_FILE = "checkpoint.json"
+DEDUP_STATE_DIR = "dedup"
+
+
+class SynthesisCheckpoint:
+    """
+    The progress of a resumable synthesis run, kept in `checkpoint_dir`.
+
+    A checkpoint records how many source records were consumed, the dataset
+    stream's own resume state, the output shards completed so far, the
+    deduplicator state and any statistics sketches. It is replaced atomically, and only after the shards
+    and dedup state it refers to are on disk, so anything an interrupted run
+    wrote after its last checkpoint is discarded on resume.
+    """
+
+    def __init__(self, checkpoint_dir: str, config: Dict[str, Any]):
+        """
+        Args:
+            checkpoint_dir (str): Directory for the checkpoint file and dedup state.
+            config (Dict[str, Any]): The run's parameters. Resuming with different ones is refused.
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.path = os.path.join(checkpoint_dir, CHECKPOINT_FILE)
+        self.dedup_dir = os.path.join(checkpoint_dir, DEDUP_STATE_DIR)
+        # Round-trip so that e.g. tuples compare equal to the lists read back from disk.
+        self.config = json.loads(json.dumps(config))
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Returns the last checkpoint, or None if the run has not checkpointed yet."""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            state = json.load(f)
+        if state["config"] != self.config:
+            raise ValueError(f"Checkpoint {self.path} belongs to a different run ({state['config']}). "
+                             f"Remove it to start over.")
+        return state
+
+    def new_state(self) -> Dict[str, Any]:
+        return {
+            "config": self.config,
+            "position": 0,
+            "stream_state": None,
+            "shards": [],
+            "total_examples": 0,
+            "dedup": None,
+            "sketches": None,
+            "complete": False,
+        }
+
+    def save(self, state: Dict[str, Any]):
+        """Atomically replaces the checkpoint with `state`."""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        state["updated_at"] = time.time()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def stream_state(dataset: Any) -> Optional[Dict[str, Any]]:
+    """The resume state of a streaming dataset, where the `datasets` version supports it."""
+    return dataset.state_dict() if hasattr(dataset, "state_dict") else None
+
+
+def resume_stream(dataset: Iterable[Any], position: int, state: Optional[Dict[str, Any]]) -> Iterator[Any]:
+    """
+    Iterates `dataset` from the record after the first `position`.
+
+    With a stream state the dataset seeks there directly; without one the
+    consumed records are read again and skipped, but not processed.
+    """
+    if state is not None and hasattr(dataset, "load_state_dict"):
+        dataset.load_state_dict(state)
+        return iter(dataset)
+    iterator = iter(dataset)
+    collections.deque(itertools.islice(iterator, position), maxlen=0)
+    return iterator
+
+
+def fsync_file(path: str):
+    """Flushes a closed file to disk before a checkpoint refers to it."""
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
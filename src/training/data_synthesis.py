@@ -1,10 +1,34 @@
 import os
-import json
+import contextlib
+import copy
+import functools
+import hashlib
 import itertools
-from typing import List, Dict, Any, Callable, Optional
+import json
+import shutil
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Union
 from datasets import load_dataset
 from tqdm import tqdm
-import re
+
+from .checkpoint import SynthesisCheckpoint, fsync_file, resume_stream, stream_state
+from .dataset_cache import DatasetCache, matches_filters, stream_dataset
+from .dedup import Deduplicator
+from .function_mining import FunctionMiner, first_docstring, sample_source
+from .parallel_synthesis import MANIFEST_FILE, SynthesisWorkerPool, shard_name
+from .sketches import SynthesisSketches
+from .token_lengths import TokenLengthAnnotator
+from .validation import ExampleValidator
+from .writers import WRITERS, RecordWriter, VersionedOutput, create_writer, file_sha256, store_records, temporary_path
+
+
+class DatasetStreamError(RuntimeError):
+    """Reading a dataset stream failed. `position` is the number of records read before the failure."""
+
+    def __init__(self, dataset_name: str, position: int, cause: Exception):
+        super().__init__(f"Streaming {dataset_name} failed after {position} records: {cause}")
+        self.dataset_name = dataset_name
+        self.position = position
+
 
 class DataSynthesisPipeline:
     """
@@ -12,79 +36,256 @@ class DataSynthesisPipeline:
     transforming, and storing datasets for LLM training.
     """
 
-    def __init__(self, output_dir: str = "data/synthesized"):
+    def __init__(self,
+                 output_dir: str = "data/synthesized",
+                 output_format: str = "jsonl",
+                 versioned: bool = False,
+                 writer_options: Optional[Dict[str, Any]] = None,
+                 deduplicator: Optional[Deduplicator] = None,
+                 dataset_cache: Optional[DatasetCache] = None,
+                 validator: Optional[ExampleValidator] = None,
+                 collect_stats: bool = False,
+                 token_counter: Optional[Callable[[str], int]] = None,
+                 token_lengths: Optional[TokenLengthAnnotator] = None,
+                 function_miner: Optional[FunctionMiner] = None):
+        """
+        Args:
+            output_dir (str): Directory for synthesized datasets.
+            output_format (str): One of `WRITERS`: "jsonl", "jsonl.zst", "parquet" or "arrow".
+            versioned (bool): Write each dataset into a content-addressed version directory
+                              instead of replacing the previous file.
+            writer_options (Optional[Dict[str, Any]]): Extra arguments for the writer, e.g. row_group_size.
+            deduplicator (Optional[Deduplicator]): Drops exact and near-duplicate source samples before
+                                                   synthesis. Its state spans every run of this pipeline.
+            dataset_cache (Optional[DatasetCache]): Serves raw dataset slices from local Arrow shards,
+                                                    materializing each slice on first use.
+            validator (Optional[ExampleValidator]): Drops synthesized examples whose code does not
+                                                    compile (or run) before they are stored.
+            collect_stats (bool): Sketch distinct counts, length quantiles and language counts of the
+                                  stored examples while a run goes, and write them to a JSON report.
+            token_counter (Optional[Callable[[str], int]]): Token count of a text for the length
+                                                            statistics, e.g. a tokenizer's `encode`
+                                                            length. Approximated without one.
+            token_lengths (Optional[TokenLengthAnnotator]): Stores each example's token count and
+                                                            length bucket under the training tokenizer,
+                                                            splitting or dropping overlong examples.
+            function_miner (Optional[FunctionMiner]): Mines the functions the python development strategy
+                                                      builds examples from. Defaults to documented functions
+                                                      of files within the default size limit.
+        """
+        if output_format not in WRITERS:
+            raise ValueError(f"Unknown output format '{output_format}'. Available: {', '.join(WRITERS)}")
         self.output_dir = output_dir
+        self.output_format = output_format
+        self.versioned = versioned
+        self.writer_options = writer_options or {}
+        self.deduplicator = deduplicator
+        self.dataset_cache = dataset_cache
+        self.validator = validator
+        self.collect_stats = collect_stats
+        self.token_counter = token_counter
+        self.token_lengths = token_lengths
+        self.function_miner = function_miner or FunctionMiner(require_docstring=True, source_fn=python_dev_source)
         os.makedirs(self.output_dir, exist_ok=True)
         print(f"DataSynthesisPipeline initialized. Output directory: {self.output_dir}")
 
+    def _output_file(self, agent_type: str, split: str) -> str:
+        """The dataset file for an agent type and split, with the output format's extension."""
+        return os.path.join(self.output_dir, f"{agent_type}_{split}_react_data{WRITERS[self.output_format].extension}")
+
     def _extract_docstring(self, python_code: str) -> str:
         """
-        Extracts the docstring from a Python function.
-        This is a simplified implementation.
+        Extracts the docstring of the first documented function in `python_code`,
+        falling back to the module docstring. Returns "" for undocumented code,
+        which callers skip.
+        """
+        return first_docstring(python_code)
+
+    def _process_item(self, dataset_name: str, index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Maps one raw dataset record to the pipeline's sample format."""
+        if dataset_name == "bigcode/the-stack-v2":
+            return {
+                "id": item.get("hexsha", f"synthetic_id_{index}"),
+                "content": item.get("content", ""),
+                "language": item.get("lang", "unknown"),
+                "path": item.get("path", "")
+            }
+        if dataset_name == "microsoft/CodeXGLUE":
+            # Assuming "code-to-text" sub-dataset for CodeXGLUE
+            return {
+                "id": f"codexglue_id_{index}",
+                "code": item.get("code", ""),
+                "text": item.get("text", "")
+            }
+        return {"id": f"generic_id_{index}", "data": item}
+
+    def _deduplicate(self, samples: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+        """Passes samples through the deduplicator, if one is configured."""
+        return self.deduplicator.filter(samples) if self.deduplicator is not None else samples
+
+    def _report_dedup(self):
+        if self.deduplicator is not None:
+            stats = self.deduplicator.get_stats()
+            print(f"Dedup: kept {stats['kept']} of {stats['seen']} samples ({stats['exact_ratio']:.1%} exact, "
+                  f"{stats['near_ratio']:.1%} near duplicates, {stats['samples_per_s']:.0f} samples/s).")
+
+    def _validate(self, react_examples: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+        """Passes synthesized examples through the validator, if one is configured."""
+        return self.validator.validate(react_examples) if self.validator is not None else react_examples
+
+    def _report_validation(self):
+        if self.validator is not None:
+            stats = self.validator.get_stats()
+            reasons = ", ".join(f"{count} {reason}" for reason, count in sorted(stats["reasons"].items()))
+            print(f"Validation: accepted {stats['accepted']} of {stats['seen']} examples "
+                  f"({stats['rejection_rate']:.1%} of checked rejected{': ' + reasons if reasons else ''}; "
+                  f"{stats['examples_per_s']:.0f} examples/s).")
+
+    def _report_function_mining(self):
+        stats = self.function_miner.get_stats()
+        if stats["files"]:
+            print(f"Function mining: {stats['examples']} documented functions from {stats['files']} samples "
+                  f"({stats['skipped_language']} not Python, {stats['too_large']} too large, "
+                  f"{stats['tokenize']} read without parsing; {stats['examples_per_mb']:.0f} per MB).")
+
+    def _annotate_lengths(self, react_examples: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+        """Passes synthesized examples through the token-length annotator, if one is configured."""
+        return self.token_lengths.annotate(react_examples) if self.token_lengths is not None else react_examples
+
+    def _report_token_lengths(self):
+        if self.token_lengths is not None:
+            stats = self.token_lengths.get_stats()
+            print(f"Token lengths: stored {stats['stored']} examples from {stats['seen']} "
+                  f"({stats['overlong']} over max_length {self.token_lengths.max_length}: {stats['split']} split "
+                  f"into {stats['parts']} parts, {stats['dropped']} dropped; mean {stats['mean_tokens']:.0f} tokens, "
+                  f"{stats['cache_hit_rate']:.1%} cached, {stats['examples_per_s']:.0f} examples/s).")
+
+    def _stats_token_counter(self) -> Optional[Callable[[str], int]]:
+        if self.token_counter is None and self.token_lengths is not None:
+            return self.token_lengths.count_tokens
+        return self.token_counter
+
+    def _new_sketches(self) -> Optional[SynthesisSketches]:
+        return SynthesisSketches(self._stats_token_counter()) if self.collect_stats else None
+
+    def _stats_file(self, agent_type: str, split: str) -> str:
+        return os.path.join(self.output_dir, f"{agent_type}_{split}_react_data.stats.json")
+
+    def _write_stats(self, sketches: Optional[SynthesisSketches], agent_type: str, split: str,
+                     metadata: Dict[str, Any]):
+        """Writes a run's statistics report next to its dataset and prints the headline numbers."""
+        if sketches is None:
+            return
+        path = self._stats_file(agent_type, split)
+        summary = sketches.write_report(path, metadata)["agents"].get(agent_type)
+        if summary is not None:
+            print(f"Stats: {summary['examples']} examples (~{summary['distinct_examples']} distinct), "
+                  f"tokens p50={summary['tokens']['p50']} p99={summary['tokens']['p99']}, "
+                  f"suggested max_length={summary['suggested_max_length']}. Report: '{path}'.")
+
+    def _load_stream(self,
+                     dataset_name: str,
+                     split: str,
+                     data_files: Optional[Union[str, List[str]]] = None,
+                     num_samples: int = -1,
+                     filters: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Opens the raw records of a dataset (or local files in its schema) that pass `filters`:
+        replayed from the dataset cache if there is one, otherwise as a streaming `IterableDataset`.
         """
+        if self.dataset_cache is not None:
+            return self.dataset_cache.load(dataset_name, split, num_samples, filters, data_files)
+        dataset = stream_dataset(dataset_name, split, data_files)
+        return dataset.filter(functools.partial(matches_filters, filters=filters)) if filters else dataset
+
+    def _process_stream(self, dataset_name: str, records: Iterable[Dict[str, Any]],
+                        start: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Maps raw records to samples; `start` is the stream position of the first record.
+        Failures are raised as `DatasetStreamError` carrying the position reached.
+        """
+        position = start
         try:
-            # Find the first triple-quoted string
-            match = re.search(r'"""(.*?)"""', python_code, re.DOTALL)
-            if match:
-                return match.group(1).strip()
-            match = re.search(r"'''(.*?)'''", python_code, re.DOTALL)
-            if match:
-                return match.group(1).strip()
-        except Exception:
-            pass
-        return "No docstring found."
-
-    def download_and_process_dataset(self, dataset_name: str, split: str = "train", num_samples: int = -1) -> List[Dict[str, Any]]:
+            for item in records:
+                yield self._process_item(dataset_name, position, item)
+                position += 1
+        except Exception as e:
+            raise DatasetStreamError(dataset_name, position, e) from e
+
+    def iter_dataset(self,
+                     dataset_name: str,
+                     split: str = "train",
+                     num_samples: int = -1,
+                     data_files: Optional[Union[str, List[str]]] = None,
+                     filters: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Streams processed samples from a dataset, one at a time.
+
+        Args:
+            dataset_name (str): Name of the dataset on Hugging Face (e.g., "bigcode/the-stack-v2").
+                                Selects how records are mapped, also for local files.
+            split (str): The dataset split to stream (e.g., "train", "test").
+            num_samples (int): Number of samples to yield. Use -1 for all available.
+            data_files (Optional[Union[str, List[str]]]): Local JSON/JSONL files holding records in
+                                                          `dataset_name`'s schema. Read instead of the Hub.
+            filters (Optional[Dict[str, Any]]): Raw record field -> accepted value (or list of values),
+                                                e.g. {"lang": "Python"}. Applied before `num_samples`.
+
+        Yields:
+            Dict[str, Any]: Processed data samples.
+
+        Raises:
+            DatasetStreamError: If reading the stream fails part-way.
+        """
+        print(f"Streaming dataset: {dataset_name}, split: {split}...")
+        dataset = self._load_stream(dataset_name, split, data_files, num_samples, filters)
+
+        # Use itertools.islice for streaming datasets to limit samples
+        data_iterator = itertools.islice(dataset, num_samples) if num_samples != -1 else dataset
+
+        count = 0
+        for sample in self._process_stream(dataset_name, data_iterator):
+            yield sample
+            count += 1
+        print(f"Finished streaming {count} samples from {dataset_name}.")
+
+    def download_and_process_dataset(self,
+                                     dataset_name: str,
+                                     split: str = "train",
+                                     num_samples: int = -1,
+                                     data_files: Optional[Union[str, List[str]]] = None,
+                                     filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """
         Downloads and performs initial processing of a dataset from Hugging Face.
+        Materializes the whole stream; prefer `iter_dataset` for large datasets.
 
         Args:
             dataset_name (str): Name of the dataset on Hugging Face (e.g., "bigcode/the-stack-v2").
             split (str): The dataset split to download (e.g., "train", "test").
             num_samples (int): Number of samples to retrieve. Use -1 for all available.
+            data_files (Optional[Union[str, List[str]]]): Local files to read instead of the Hub.
+            filters (Optional[Dict[str, Any]]): Raw record filters; see `iter_dataset`.
 
         Returns:
             List[Dict[str, Any]]: A list of processed data samples.
-        """
-        print(f"Downloading and processing dataset: {dataset_name}, split: {split}...")
-        try:
-            dataset = load_dataset(dataset_name, split=split, streaming=True)
-
-            processed_data = []
-            # Use itertools.islice for streaming datasets to limit samples
-            data_iterator = itertools.islice(dataset, num_samples) if num_samples != -1 else dataset
-
-            for i, item in enumerate(tqdm(data_iterator, desc=f"Processing {dataset_name}")):
-                if dataset_name == "bigcode/the-stack-v2":
-                    processed_data.append({
-                        "id": item.get("hexsha", f"synthetic_id_{i}"),
-                        "content": item.get("content", ""),
-                        "language": item.get("lang", "unknown"),
-                        "path": item.get("path", "")
-                    })
-                elif dataset_name == "microsoft/CodeXGLUE":
-                    # Assuming "code-to-text" sub-dataset for CodeXGLUE
-                    processed_data.append({
-                        "id": f"codexglue_id_{i}",
-                        "code": item.get("code", ""),
-                        "text": item.get("text", "")
-                    })
-                else:
-                    processed_data.append({"id": f"generic_id_{i}", "data": item})
 
-            print(f"Finished processing {len(processed_data)} samples from {dataset_name}.")
-            return processed_data
-        except Exception as e:
-            print(f"Error downloading or processing dataset {dataset_name}: {e}")
-            return []
-
-    def transform_to_react_example(self,
-                                   data_sample: Dict[str, Any],
-                                   agent_type: str,
-                                   synthesis_strategy: Callable[[Dict[str, Any]], Dict[str, Any]]
-                                  ) -> Optional[Dict[str, Any]]:
+        Raises:
+            DatasetStreamError: If reading the stream fails part-way. Use
+                                `generate_and_store_react_data` with checkpoints to survive that.
         """
-        Transforms a raw data sample into a ReAct-style training example.
+        return list(tqdm(self.iter_dataset(dataset_name, split, num_samples, data_files, filters),
+                         desc=f"Processing {dataset_name}"))
+
+    def transform_to_react_examples(self,
+                                    data_sample: Dict[str, Any],
+                                    agent_type: str,
+                                    synthesis_strategy: Callable[[Dict[str, Any]], Any]
+                                   ) -> List[Dict[str, Any]]:
+        """
+        Transforms a raw data sample into ReAct-style training examples.
+
+        A strategy returns one example, a list of them (e.g. one per function
+        mined from a file), or None when the sample yields no example.
 
         Args:
             data_sample (Dict[str, Any]): The raw data sample.
@@ -93,15 +294,19 @@ class DataSynthesisPipeline:
                                            for the given agent type.
 
         Returns:
-            Optional[Dict[str, Any]]: A ReAct-style example, or None if transformation fails.
+            List[Dict[str, Any]]: The ReAct-style examples; empty if there are none or transformation fails.
         """
         try:
-            react_example = synthesis_strategy(data_sample)
-            react_example["agent_type"] = agent_type
-            return react_example
+            result = synthesis_strategy(data_sample)
         except Exception as e:
             print(f"Error transforming data sample for {agent_type}: {e}")
-            return None
+            return []
+        react_examples = result if isinstance(result, list) else [result] if result else []
+        for react_example in react_examples:
+            react_example["agent_type"] = agent_type
+            if data_sample.get("language"):
+                react_example.setdefault("language", data_sample["language"])
+        return react_examples
 
     def synthesize_coder_example(self, data_sample: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -166,112 +371,484 @@ class DataSynthesisPipeline:
             "completion": f"Thought: {thought}\nAction: {action}\nObservation: {observation}\nThought: {thought_final}\nAction: {action_final}"
         }
 
-    def synthesize_python_dev_example(self, data_sample: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def synthesize_python_dev_example(self, data_sample: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
         """
         Synthesis strategy for python development examples.
+        Yields one example per documented function in the sample, asking for
+        the function's implementation from its signature and docstring.
         """
-        python_code = data_sample.get("content") or data_sample.get("text")
-        if not python_code:
+        functions = list(self.function_miner.mine([data_sample]))
+        if not functions:
             return None
+        return [python_dev_example(function, data_sample.get("path")) for function in functions]
 
-        docstring = self._extract_docstring(python_code)
-        instruction = f"Implement the following Python function: {docstring}"
-        
+    def get_synthesis_strategies(self) -> Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]]:
+        """Returns every registered synthesis strategy, keyed by agent type."""
         return {
-            "instruction": instruction,
-            "thought": "I need to analyze the Python requirements, write clean code, and validate it using Python tools.",
-            "tool_calls": [
-                {"tool": "write_file", "content": python_code, "path": "src/solution.py"},
-                {"tool": "run_terminal_cmd", "command": "python -m py_compile src/solution.py"},
-            ],
-            "final_answer": python_code
-        }
-
-    def get_synthesis_strategy(self, agent_type: str) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
-        """Returns the appropriate synthesis strategy function for a given agent type."""
-        strategies = {
             "tanuki-coder": self.synthesize_coder_example,
             "tanuki-debugger": self.synthesize_debugger_example,
             "tanuki-reviewer": self.synthesize_reviewer_example,
             "tanuki-python-dev": self.synthesize_python_dev_example,
         }
-        strategy = strategies.get(agent_type)
+
+    def get_synthesis_strategy(self, agent_type: str) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+        """Returns the appropriate synthesis strategy function for a given agent type."""
+        strategy = self.get_synthesis_strategies().get(agent_type)
         if not strategy:
             raise ValueError(f"No synthesis strategy found for agent type: {agent_type}")
         return strategy
 
+    def iter_react_examples(self,
+                            samples: Iterable[Dict[str, Any]],
+                            agent_type: str) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily transforms samples into ReAct-style examples, skipping failed transformations.
+
+        Args:
+            samples (Iterable[Dict[str, Any]]): Processed data samples, e.g. from `iter_dataset`.
+            agent_type (str): The target agent type (e.g., "tanuki-coder").
+
+        Yields:
+            Dict[str, Any]: ReAct-style examples.
+        """
+        synthesis_strategy = self.get_synthesis_strategy(agent_type)
+        for sample in samples:
+            yield from self.transform_to_react_examples(sample, agent_type, synthesis_strategy)
+
     def generate_and_store_react_data(self,
                                       dataset_name: str,
                                       agent_type: str,
                                       split: str = "train",
-                                      num_samples: int = 1000):
+                                      num_samples: int = 1000,
+                                      data_files: Optional[Union[str, List[str]]] = None,
+                                      num_workers: int = 0,
+                                      chunk_size: int = 256,
+                                      ordered: bool = False,
+                                      checkpoint_every: int = 0,
+                                      checkpoint_dir: Optional[str] = None,
+                                      filters: Optional[Dict[str, Any]] = None) -> int:
         """
         Generates ReAct-style training data for a specific agent type and stores it.
 
+        Download, transformation and storage form one generator pipeline: each
+        example is written as soon as it is produced, so memory use does not
+        grow with `num_samples`. With `num_workers`, strategies run in a process
+        pool and the output becomes a directory of shards with a manifest.
+        With `checkpoint_every`, the run becomes resumable; see `_generate_checkpointed`.
+        With a validator, examples are validated in this process before they are stored,
+        and with `token_lengths`, annotated with their token counts there.
+        With `collect_stats`, statistics of the stored examples are written to
+        `{agent_type}_{split}_react_data.stats.json` in `output_dir`.
+
         Args:
             dataset_name (str): The source dataset name (e.g., "bigcode/the-stack-v2").
             agent_type (str): The target agent type (e.g., "tanuki-coder").
             split (str): The dataset split to use.
-            num_samples (int): Number of samples to process from the raw dataset.
+            num_samples (int): Number of samples to process from the raw dataset. Use -1 for all.
+            data_files (Optional[Union[str, List[str]]]): Local files to read instead of the Hub.
+            num_workers (int): Worker processes applying the strategy. 0 runs it in this process.
+            chunk_size (int): Samples per work item handed to a worker.
+            ordered (bool): Keep parallel output in source order, in a single shard.
+            checkpoint_every (int): Source records per checkpoint. 0 disables checkpointing.
+            checkpoint_dir (Optional[str]): Where checkpoints are kept. Defaults to
+                                            `output_dir/.checkpoints/{agent_type}_{split}_react_data`.
+            filters (Optional[Dict[str, Any]]): Raw record filters; see `iter_dataset`.
+
+        Returns:
+            int: Number of examples stored.
         """
         print(f"Generating ReAct data for agent '{agent_type}' from '{dataset_name}'...")
-        raw_data = self.download_and_process_dataset(dataset_name, split, num_samples)
-        
-        if not raw_data:
-            print(f"No raw data to process for {dataset_name}.")
-            return
+        if checkpoint_every > 0:
+            if num_workers > 0:
+                raise ValueError("Checkpointed runs synthesize in this process; use num_workers=0.")
+            return self._generate_checkpointed(dataset_name, agent_type, split, num_samples, data_files,
+                                               checkpoint_every, checkpoint_dir, filters)
+        if num_workers > 0 and (self.validator is not None or self.token_lengths is not None):
+            raise ValueError("Validated and token-length annotated runs synthesize in this process; use num_workers=0.")
+        if num_workers > 0 and (self.output_format != "jsonl" or self.versioned):
+            raise ValueError("Parallel runs write unversioned JSONL shards; use output_format='jsonl' without "
+                             "versioning, or num_workers=0.")
+        samples = self._deduplicate(self.iter_dataset(dataset_name, split, num_samples, data_files, filters))
+        sketches = self._new_sketches()
+        metadata = {"dataset_name": dataset_name, "split": split, "num_samples": num_samples, "filters": filters}
+        if num_workers > 0:
+            shard_dir = os.path.join(self.output_dir, f"{agent_type}_{split}_react_data")
+            # Pool workers are daemonic and cannot start a mining pool of their own.
+            function_miner = copy.copy(self.function_miner)
+            function_miner.num_workers = 0
+            workers = SynthesisWorkerPool(type(self), self.output_dir, num_workers=num_workers, chunk_size=chunk_size,
+                                          pipeline_options={"function_miner": function_miner})
+            manifest = workers.run(samples, agent_type, shard_dir, ordered=ordered, metadata=metadata,
+                                   sketches=sketches)
+            print(f"Stored {manifest['total_examples']} ReAct examples for '{agent_type}' in "
+                  f"{len(manifest['shards'])} shards under '{shard_dir}' ({manifest['samples_per_s']:.1f} samples/s).")
+            self._report_dedup()
+            self._write_stats(sketches, agent_type, split, metadata)
+            return manifest["total_examples"]
+
+        total = num_samples if num_samples != -1 else None
+        react_examples = self.iter_react_examples(
+            tqdm(samples, total=total, desc=f"Transforming to ReAct for {agent_type}"), agent_type)
+
+        output_file = self._output_file(agent_type, split)
+        react_examples = self._annotate_lengths(self._validate(react_examples))
+        if sketches is not None:
+            react_examples = sketches.observe_all(react_examples)
+        count = self._store_data(react_examples, output_file)
+        if count == 0:
+            print(f"No ReAct examples produced from {dataset_name}.")
+        else:
+            print(f"Successfully generated and stored {count} ReAct examples for '{agent_type}' in '{output_file}'.")
+        self._report_dedup()
+        self._report_validation()
+        self._report_function_mining()
+        self._report_token_lengths()
+        self._write_stats(sketches, agent_type, split, metadata)
+        return count
+
+    def _generate_checkpointed(self,
+                               dataset_name: str,
+                               agent_type: str,
+                               split: str,
+                               num_samples: int,
+                               data_files: Optional[Union[str, List[str]]],
+                               checkpoint_every: int,
+                               checkpoint_dir: Optional[str],
+                               filters: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Synthesizes in segments of `checkpoint_every` source records, each
+        stored as its own shard and followed by a checkpoint of the stream
+        position, the completed shards and the dedup state. If a checkpoint
+        exists, the run resumes after its last segment: a partly written shard
+        and any dedup state beyond the checkpoint are discarded, the stream
+        seeks to the checkpointed position, and no earlier record is
+        processed again. Once complete, the shards and a manifest make up the
+        `{agent_type}_{split}_react_data` directory (or its new version).
 
-        synthesis_strategy = self.get_synthesis_strategy(agent_type)
-        
-        react_examples = []
-        for sample in tqdm(raw_data, desc=f"Transforming to ReAct for {agent_type}"):
-            react_example = self.transform_to_react_example(sample, agent_type, synthesis_strategy)
-            if react_example:
-                react_examples.append(react_example)
+        Returns:
+            int: Number of examples stored.
+        """
+        name = f"{agent_type}_{split}_react_data"
+        checkpoint = SynthesisCheckpoint(
+            checkpoint_dir or os.path.join(self.output_dir, ".checkpoints", name),
+            {"dataset_name": dataset_name, "agent_type": agent_type, "split": split, "num_samples": num_samples,
+             "data_files": data_files, "filters": filters, "output_format": self.output_format, "versioned": self.versioned,
+             "deduplicate": self.deduplicator is not None, "cached": self.dataset_cache is not None,
+             "validated": self.validator is not None, "collect_stats": self.collect_stats,
+             "token_lengths": self.token_lengths.config() if self.token_lengths is not None else None,
+             "checkpoint_every": checkpoint_every})
+        # Versioned runs stage their shards with the checkpoint and publish them once complete.
+        shard_dir = (os.path.join(checkpoint.checkpoint_dir, "shards") if self.versioned
+                     else os.path.join(self.output_dir, name))
+
+        state = checkpoint.load()
+        if state is not None and state["complete"]:
+            print(f"Checkpointed run for '{agent_type}' already completed with {state['total_examples']} examples "
+                  f"in '{state['output']}'.")
+            return state["total_examples"]
+        if state is None:
+            state = checkpoint.new_state()
+        else:
+            print(f"Resuming '{agent_type}' at record {state['position']} with {len(state['shards'])} shards done.")
+
+        os.makedirs(shard_dir, exist_ok=True)
+        completed = {shard["path"] for shard in state["shards"]}
+        for file_name in os.listdir(shard_dir):
+            if file_name not in completed and (file_name.startswith("shard-") or file_name == MANIFEST_FILE):
+                os.remove(os.path.join(shard_dir, file_name))
+        if self.deduplicator is not None:
+            self.deduplicator.restore_state(checkpoint.dedup_dir, state["dedup"])
+        sketches = self._new_sketches()
+        if sketches is not None and state["sketches"] is not None:
+            sketches = SynthesisSketches.from_dict(state["sketches"], self._stats_token_counter())
+
+        dataset = self._load_stream(dataset_name, split, data_files, num_samples, filters)
+        records = resume_stream(dataset, state["position"], state["stream_state"])
+        extension = WRITERS[self.output_format].extension
+        progress = tqdm(initial=state["position"], total=num_samples if num_samples != -1 else None,
+                        desc=f"Transforming to ReAct for {agent_type}")
+        try:
+            while num_samples == -1 or state["position"] < num_samples:
+                size = checkpoint_every if num_samples == -1 else min(checkpoint_every, num_samples - state["position"])
+                # zip stops at the segment's end before advancing the counter, which then holds the segment length.
+                counter = itertools.count()
+                segment = (record for record, _ in zip(itertools.islice(records, size), counter))
+                samples = self._process_stream(dataset_name, segment, state["position"])
+                shard = shard_name(len(state["shards"]), extension)
+                shard_path = os.path.join(shard_dir, shard)
+                react_examples = self._annotate_lengths(
+                    self._validate(self.iter_react_examples(self._deduplicate(samples), agent_type)))
+                with create_writer(self.output_format, shard_path, **self.writer_options) as writer:
+                    writer.write_many(sketches.observe_all(react_examples) if sketches is not None else react_examples)
+                consumed = next(counter)
+                if consumed == 0:
+                    os.remove(shard_path)
+                    break
+
+                fsync_file(shard_path)
+                state["shards"].append({"path": shard, "count": writer.count, "bytes": os.path.getsize(shard_path),
+                                        "sha256": file_sha256(shard_path)})
+                state["position"] += consumed
+                state["total_examples"] += writer.count
+                state["stream_state"] = stream_state(dataset)
+                if self.deduplicator is not None:
+                    state["dedup"] = self.deduplicator.save_state(checkpoint.dedup_dir)
+                if sketches is not None:
+                    state["sketches"] = sketches.to_dict()
+                checkpoint.save(state)
+                progress.update(consumed)
+                if consumed < size:
+                    break
+        except DatasetStreamError:
+            print(f"Run interrupted; rerun to resume '{agent_type}' from record {state['position']}.")
+            raise
+        finally:
+            progress.close()
+
+        manifest = {
+            "dataset_name": dataset_name,
+            "split": split,
+            "agent_type": agent_type,
+            "format": self.output_format,
+            "total_samples": state["position"],
+            "total_examples": state["total_examples"],
+            "checkpoint_every": checkpoint_every,
+        }
+        if self.versioned:
+            with VersionedOutput(self.output_dir, name) as version:
+                for shard in state["shards"]:
+                    # Link rather than move, so a crash before the final checkpoint can publish again.
+                    os.link(os.path.join(shard_dir, shard["path"]), version.path_for(shard["path"]))
+                    version.record_count(shard["path"], shard["count"])
+                state["output"] = version.commit(manifest)
+        else:
+            with open(os.path.join(shard_dir, MANIFEST_FILE), "w") as f:
+                json.dump(dict(manifest, shards=state["shards"]), f, indent=2)
+            state["output"] = shard_dir
+        state["complete"] = True
+        checkpoint.save(state)
+        if self.versioned:
+            shutil.rmtree(shard_dir)
+
+        print(f"Stored {state['total_examples']} ReAct examples for '{agent_type}' in {len(state['shards'])} shards "
+              f"under '{state['output']}'.")
+        self._report_dedup()
+        self._report_validation()
+        self._report_function_mining()
+        self._report_token_lengths()
+        self._write_stats(sketches, agent_type, split, manifest)
+        return state["total_examples"]
+
+    def generate_fanout_react_data(self,
+                                   dataset_name: str,
+                                   agent_types: Optional[List[str]] = None,
+                                   split: str = "train",
+                                   num_samples: int = 1000,
+                                   data_files: Optional[Union[str, List[str]]] = None,
+                                   quotas: Optional[Dict[str, int]] = None,
+                                   sampling_rates: Optional[Dict[str, float]] = None,
+                                   seed: int = 0,
+                                   filters: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Reads a dataset stream once and applies every agent's strategy to each record.
+
+        Each agent writes to its own `{agent_type}_{split}_react_data` dataset.
+        Sampling is a deterministic hash of (seed, agent type, sample id), so
+        a rerun selects the same records, and agents sample independently. An
+        agent stops once it has stored its quota; the stream stops once every
+        agent has; a record whose examples would exceed the quota stores only
+        as many as fit. With a validator, each agent's examples are held back
+        until it has a full batch (`batch_size`), or as many as its quota
+        still needs, and validated together before they are written; with
+        `token_lengths`, they are also annotated with their token counts. With `collect_stats`, each agent gets its own
+        statistics report. Unversioned datasets are written to temporary files
+        and renamed into place once complete, like `store_records` does.
 
-        output_file = os.path.join(self.output_dir, f"{agent_type}_{split}_react_data.jsonl")
-        self._store_data(react_examples, output_file)
-        print(f"Successfully generated and stored {len(react_examples)} ReAct examples for '{agent_type}' in '{output_file}'.")
+        Args:
+            dataset_name (str): The source dataset name (e.g., "bigcode/the-stack-v2").
+            agent_types (Optional[List[str]]): Agents to synthesize for. Defaults to every registered strategy.
+            split (str): The dataset split to use.
+            num_samples (int): Number of samples to read from the raw dataset. Use -1 for all.
+            data_files (Optional[Union[str, List[str]]]): Local files to read instead of the Hub.
+            quotas (Optional[Dict[str, int]]): Maximum examples to store per agent type.
+            sampling_rates (Optional[Dict[str, float]]): Fraction of records each agent type sees (default 1.0).
+            seed (int): Seed for the sampling hash.
+            filters (Optional[Dict[str, Any]]): Raw record filters; see `iter_dataset`.
 
-    def _store_data(self, data: List[Dict[str, Any]], file_path: str):
+        Returns:
+            Dict[str, Dict[str, int]]: Per agent type, the number of records sampled and failed,
+                                       and of examples stored and rejected by validation.
         """
-        Stores the synthesized data in a JSONL format.
-        Implements basic data versioning by overwriting or appending.
-        For robust versioning, DVC or similar tools would be used.
+        strategies = self.get_synthesis_strategies()
+        agent_types = agent_types or list(strategies)
+        for agent_type in agent_types:
+            if agent_type not in strategies:
+                raise ValueError(f"No synthesis strategy found for agent type: {agent_type}")
+        quotas = quotas or {}
+        sampling_rates = sampling_rates or {}
+        stats = {agent_type: {"sampled": 0, "stored": 0, "failed": 0, "rejected": 0} for agent_type in agent_types}
+        active = [agent_type for agent_type in agent_types if quotas.get(agent_type, 1) > 0]
+
+        sketches = {agent_type: self._new_sketches() for agent_type in active}
+        print(f"Fanning out '{dataset_name}' to agents: {', '.join(agent_types)}...")
+        with contextlib.ExitStack() as stack:
+            sinks: Dict[str, RecordWriter] = {}
+            versions: Dict[str, VersionedOutput] = {}
+            final_paths: Dict[str, str] = {}
+            for agent_type in active:
+                output_file = self._output_file(agent_type, split)
+                if self.versioned:
+                    version = stack.enter_context(VersionedOutput(self.output_dir, f"{agent_type}_{split}_react_data"))
+                    versions[agent_type] = version
+                    output_file = version.path_for(os.path.basename(output_file))
+                else:
+                    final_paths[agent_type] = output_file
+                    output_file = temporary_path(output_file)
+                    # Runs after the writer closes; a completed file has been renamed away by then.
+                    stack.callback(_remove_if_exists, output_file)
+                sinks[agent_type] = stack.enter_context(
+                    create_writer(self.output_format, output_file, **self.writer_options))
+
+            # Examples held back per agent, so validation and annotation run on whole batches.
+            pending: Dict[str, List[Dict[str, Any]]] = {agent_type: [] for agent_type in active}
+            batch_size = self.validator.batch_size if self.validator is not None else 1
+
+            def flush(agent_type: str):
+                react_examples, pending[agent_type] = pending[agent_type], []
+                agent_stats = stats[agent_type]
+                if self.validator is not None:
+                    candidates = len(react_examples)
+                    react_examples = self.validator.validate_batch(react_examples)
+                    agent_stats["rejected"] += candidates - len(react_examples)
+                if self.token_lengths is not None:
+                    react_examples = self.token_lengths.annotate_batch(react_examples)
+                if agent_type in quotas:
+                    react_examples = react_examples[:quotas[agent_type] - agent_stats["stored"]]
+                sinks[agent_type].write_many(react_examples)
+                if sketches[agent_type] is not None:
+                    for react_example in react_examples:
+                        sketches[agent_type].observe(react_example)
+                agent_stats["stored"] += len(react_examples)
+
+            samples = self.iter_dataset(dataset_name, split, num_samples, data_files, filters)
+            total = num_samples if num_samples != -1 else None
+            stream = self._deduplicate(samples)
+            for sample in tqdm(stream, total=total, desc=f"Fanning out {dataset_name}"):
+                sample_id = str(sample.get("id", ""))
+                for agent_type in active:
+                    if not _sampled(sample_id, agent_type, sampling_rates.get(agent_type, 1.0), seed):
+                        continue
+                    agent_stats = stats[agent_type]
+                    agent_stats["sampled"] += 1
+                    react_examples = self.transform_to_react_examples(sample, agent_type, strategies[agent_type])
+                    if not react_examples:
+                        agent_stats["failed"] += 1
+                        continue
+                    pending[agent_type].extend(react_examples)
+                    if (len(pending[agent_type]) >= batch_size or agent_type in quotas
+                            and agent_stats["stored"] + len(pending[agent_type]) >= quotas[agent_type]):
+                        flush(agent_type)
+                active = [agent_type for agent_type in active
+                          if agent_type not in quotas or stats[agent_type]["stored"] < quotas[agent_type]]
+                if not active:
+                    break
+            # Release the dataset stream (and any dedup workers) now if the quotas ended the loop early.
+            stream.close()
+            samples.close()
+            for agent_type in pending:
+                if pending[agent_type]:
+                    flush(agent_type)
+
+            for agent_type, writer in sinks.items():
+                writer.close()
+                if agent_type in versions:
+                    versions[agent_type].record_count(os.path.basename(writer.path), writer.count)
+                    print(f"{agent_type}: published {versions[agent_type].commit({'format': self.output_format})}")
+                else:
+                    os.replace(writer.path, final_paths[agent_type])
+
+        for agent_type, agent_stats in stats.items():
+            print(f"{agent_type}: stored {agent_stats['stored']} of {agent_stats['sampled']} sampled records.")
+        self._report_dedup()
+        self._report_validation()
+        self._report_function_mining()
+        self._report_token_lengths()
+        metadata = {"dataset_name": dataset_name, "split": split, "num_samples": num_samples, "filters": filters}
+        for agent_type, agent_sketches in sketches.items():
+            self._write_stats(agent_sketches, agent_type, split, metadata)
+        return stats
+
+    def _store_data(self, data: Iterable[Dict[str, Any]], file_path: str) -> int:
+        """
+        Stores the synthesized data with the configured writer, consuming `data` lazily.
+        Unversioned output replaces `file_path` atomically; versioned output is
+        published as a new content-addressed version next to it.
+
+        Returns:
+            int: Number of entries written.
         """
         print(f"Storing data to {file_path}...")
-        with open(file_path, "w") as f:
-            for entry in data:
-                f.write(json.dumps(entry) + "\n")
-        print("Data storage complete.")
+        stored = store_records(data, file_path, self.output_format, self.versioned, **self.writer_options)
+        print(f"Data storage complete: {stored['path']}")
+        return stored["count"]
+
+
+def _remove_if_exists(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _sampled(sample_id: str, agent_type: str, rate: float, seed: int) -> bool:
+    """Deterministically keeps a `rate` fraction of sample ids, independently per agent type."""
+    if rate >= 1.0:
+        return True
+    digest = hashlib.blake2b(f"{seed}:{agent_type}:{sample_id}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") < rate * 2**64
+
+
+def python_dev_source(sample: Dict[str, Any]) -> str:
+    """The Python source the python development strategy mines: the sample's code, else its text."""
+    return sample_source(sample) or sample.get("text") or ""
+
+
+def python_dev_example(function: Dict[str, Any], path: Optional[str] = None) -> Dict[str, Any]:
+    """Builds a python development example from one function mined by a `FunctionMiner`."""
+    return {
+        "instruction": f"Implement the following Python function:\n{function['signature']}\n{function['docstring']}",
+        "thought": "I need to analyze the Python requirements, write clean code, and validate it using Python tools.",
+        "tool_calls": [
+            {"tool": "write_file", "content": function["source"], "path": "src/solution.py"},
+            {"tool": "run_terminal_cmd", "command": "python -m py_compile src/solution.py"},
+        ],
+        "final_answer": function["source"],
+        "function": function["qualname"],
+        "source_path": path,
+    }
+
 
 def extract_docstring(python_code: str) -> str:
     """
-    Extracts the docstring from a Python function.
-    This is a simplified implementation.
+    Extracts the docstring of the first documented function in `python_code`,
+    falling back to the module docstring. Returns "" for undocumented code,
+    which callers skip.
     """
-    try:
-        # Find the first triple-quoted string
-        match = re.search(r'\"\"\"(.*?)\"\"\"', python_code, re.DOTALL)
-        if match:
-            return match.group(1).strip()
-        match = re.search(r"'''(.*?)'''", python_code, re.DOTALL)
-        if match:
-            return match.group(1).strip()
-    except Exception:
-        pass
-    return "No docstring found."
+    return first_docstring(python_code)
 
 
 def synthesize_python_development_data(example):
     """
     Synthesizes a single training example from a Python code snippet.
+    Returns None for snippets without a docstring to build the instruction from.
     """
     python_code = example.get("content") or example.get("text")
     if not python_code:
         return None
 
-    docstring = extract_docstring(python_code)
+    docstring = first_docstring(python_code)
+    if not docstring:
+        return None
     instruction = f"Implement the following Python function: {docstring}"
     
     return {
@@ -306,12 +883,14 @@ def process_dataset(dataset_name: str, split: str, output_dir: str):
 if __name__ == "__main__":
     pipeline = DataSynthesisPipeline()
 
-    # Generate data for tanuki-coder
-    print("\n--- Generating Data for tanuki-coder ---")
-    pipeline.generate_and_store_react_data(
+    # One pass over the-stack-v2 feeds tanuki-coder, tanuki-reviewer and tanuki-python-dev
+    print("\n--- Generating Data for tanuki-coder, tanuki-reviewer and tanuki-python-dev ---")
+    pipeline.generate_fanout_react_data(
         dataset_name="bigcode/the-stack-v2",
-        agent_type="tanuki-coder",
-        num_samples=50 # Small number for quick test
+        agent_types=["tanuki-coder", "tanuki-reviewer", "tanuki-python-dev"],
+        split="train",
+        num_samples=100, # small number for demonstration
+        quotas={"tanuki-coder": 50, "tanuki-reviewer": 50, "tanuki-python-dev": 100}
     )
 
     # Generate data for tanuki-debugger
@@ -322,22 +901,6 @@ if __name__ == "__main__":
         num_samples=50 # Small number for quick test
     )
 
-    # Generate data for tanuki-reviewer
-    print("\n--- Generating Data for tanuki-reviewer ---")
-    pipeline.generate_and_store_react_data(
-        dataset_name="bigcode/the-stack-v2",
-        agent_type="tanuki-reviewer",
-        num_samples=50 # Small number for quick test
-    )
-
-    # Example for generating data for the 'tanuki-python-dev' agent
-    pipeline.generate_and_store_react_data(
-        dataset_name="bigcode/the-stack-v2",
-        agent_type="tanuki-python-dev",
-        split="train",
-        num_samples=100 # small number for demonstration
-    )
-
     print("\nData synthesis pipeline demonstration complete.")
 
     # Example usage:
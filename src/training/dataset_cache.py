@@ -0,0 +1,321 @@
+"""
+Local Raw-Dataset Cache
+
+Materializes a slice of a dataset stream (dataset name, split, record filters
+and sample count) once into Arrow IPC shards, then replays it memory-mapped
+from disk instead of streaming it from the Hub again. In offline mode the Hub
+is never contacted and a slice that is not cached is an error.
+
+Usage:
+    # Warm the cache for later offline runs, or list what is cached.
+    python -m src.training.dataset_cache --dataset bigcode/the-stack-v2 --split train --num-samples 100000 \\
+        --filter lang=Python --cache-dir data/cache
+    python -m src.training.dataset_cache --list --cache-dir data/cache
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Union
+
+from .writers import DEFAULT_ROW_GROUP_SIZE, ArrowWriter, open_arrow
+
+DEFAULT_CACHE_DIR = "data/cache"
+DEFAULT_SHARD_SIZE = 100000
+CACHE_MANIFEST_FILE = "manifest.json"
+
+DataFiles = Optional[Union[str, List[str]]]
+
+
+def stream_dataset(dataset_name: str, split: str, data_files: DataFiles = None) -> Any:
+    """Opens a dataset on the Hub (or local JSON files in its schema) as a streaming `IterableDataset`."""
+    from datasets import load_dataset
+    if data_files is not None:
+        return load_dataset("json", data_files=data_files, split=split, streaming=True)
+    return load_dataset(dataset_name, split=split, streaming=True)
+
+
+def matches_filters(record: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> bool:
+    """
+    True if `record` passes every filter. A filter maps a field to the value
+    it must equal, or to a list of accepted values.
+    """
+    for field, accepted in (filters or {}).items():
+        value = record.get(field)
+        if isinstance(accepted, (list, tuple, set)):
+            if value not in accepted:
+                return False
+        elif value != accepted:
+            return False
+    return True
+
+
+def _slice_params(filters: Optional[Dict[str, Any]], data_files: DataFiles) -> Dict[str, Any]:
+    """Canonical filters and data files, so equal slices compare (and hash) equal however they were spelled."""
+    if isinstance(data_files, str):
+        data_files = [data_files]
+    # Accepted-value lists are sets.
+    filters = {field: sorted(accepted, key=repr) if isinstance(accepted, (list, tuple, set)) else accepted
+               for field, accepted in (filters or {}).items()}
+    return {
+        "filters": json.loads(json.dumps(filters, sort_keys=True)),
+        "data_files": [os.path.abspath(path) for path in data_files] if data_files is not None else None,
+    }
+
+
+def cache_key(dataset_name: str, split: str, num_samples: int, filters: Optional[Dict[str, Any]] = None,
+              data_files: DataFiles = None) -> str:
+    """The 16-hex-digit key of a dataset slice."""
+    fields = dict(_slice_params(filters, data_files), dataset_name=dataset_name, split=split, num_samples=num_samples)
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+class CachedDataset:
+    """
+    Replays the Arrow shards of a cache entry as a stream of dict records.
+
+    Shards are memory-mapped, so replay runs at disk (or page cache) speed
+    without loading the slice into memory. Like a streaming `IterableDataset`
+    it supports `state_dict` and `load_state_dict`, letting checkpointed runs
+    seek straight to their position.
+    """
+
+    def __init__(self, shard_paths: List[str], shard_counts: List[int], limit: int = -1,
+                 batch_size: int = DEFAULT_ROW_GROUP_SIZE):
+        self.shard_paths = shard_paths
+        self.shard_counts = shard_counts
+        self.limit = limit
+        self.batch_size = batch_size
+        self._start = 0
+        self._position = 0
+
+    def __len__(self) -> int:
+        total = sum(self.shard_counts)
+        return total if self.limit == -1 else min(total, self.limit)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        end = len(self)
+        self._position = self._start
+        shard_start = 0
+        for path, count in zip(self.shard_paths, self.shard_counts):
+            if self._position >= end:
+                return
+            if self._position < shard_start + count:
+                table = open_arrow(path).slice(self._position - shard_start, end - self._position)
+                for batch in table.to_batches(max_chunksize=self.batch_size):
+                    for record in batch.to_pylist():
+                        self._position += 1
+                        yield record
+            shard_start += count
+
+    def state_dict(self) -> Dict[str, int]:
+        """The number of records the latest iteration has yielded, counted from the start of the slice."""
+        return {"position": self._position}
+
+    def load_state_dict(self, state: Dict[str, int]):
+        """Makes the next iteration start after `state['position']` records."""
+        self._start = state["position"]
+
+
+class DatasetCache:
+    """
+    Materialized dataset slices under `cache_dir/<dataset>/<split>/<key>/`.
+
+    An entry holds Arrow shards of up to `shard_size` raw records and a
+    manifest of the slice's parameters and shard counts. Entries are written
+    into a staging directory and renamed into place, so an interrupted
+    materialization never leaves a partial entry behind. A slice can also be
+    served by a larger cached slice with the same filters, or by one that
+    holds the whole (filtered) split.
+    """
+
+    def __init__(self,
+                 cache_dir: str = DEFAULT_CACHE_DIR,
+                 offline: bool = False,
+                 shard_size: int = DEFAULT_SHARD_SIZE,
+                 batch_size: int = DEFAULT_ROW_GROUP_SIZE):
+        """
+        Args:
+            cache_dir (str): Root directory of the cache.
+            offline (bool): Never stream from the source; a missing slice raises FileNotFoundError.
+            shard_size (int): Records per Arrow shard.
+            batch_size (int): Records per Arrow record batch, written and replayed.
+        """
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+
+    def _split_dir(self, dataset_name: str, split: str) -> str:
+        return os.path.join(self.cache_dir, dataset_name.replace("/", "__"), split)
+
+    def entries(self, dataset_name: Optional[str] = None, split: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Manifests of the cached slices, optionally of one dataset and split, with their `path`."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        if dataset_name is not None and split is not None:
+            split_dirs = [self._split_dir(dataset_name, split)]
+        else:
+            split_dirs = [os.path.join(self.cache_dir, name, split_name)
+                          for name in sorted(os.listdir(self.cache_dir)) if os.path.isdir(os.path.join(self.cache_dir, name))
+                          for split_name in sorted(os.listdir(os.path.join(self.cache_dir, name)))]
+        manifests = []
+        for split_dir in split_dirs:
+            if not os.path.isdir(split_dir):
+                continue
+            for key in sorted(os.listdir(split_dir)):
+                manifest_path = os.path.join(split_dir, key, CACHE_MANIFEST_FILE)
+                if os.path.exists(manifest_path):
+                    with open(manifest_path) as f:
+                        manifests.append(dict(json.load(f), path=os.path.join(split_dir, key)))
+        return manifests
+
+    def lookup(self, dataset_name: str, split: str, num_samples: int = -1, filters: Optional[Dict[str, Any]] = None,
+               data_files: DataFiles = None) -> Optional[Dict[str, Any]]:
+        """Returns the manifest of a cached slice that covers the requested one, or None."""
+        key = cache_key(dataset_name, split, num_samples, filters, data_files)
+        params = _slice_params(filters, data_files)
+        candidates = []
+        for manifest in self.entries(dataset_name, split):
+            if manifest["key"] == key:
+                return manifest
+            if manifest["filters"] != params["filters"] or manifest["data_files"] != params["data_files"]:
+                continue
+            # A slice that ran out of records holds the whole filtered split.
+            if manifest["exhausted"] or (num_samples != -1 and manifest["num_samples"] >= num_samples):
+                candidates.append(manifest)
+        return min(candidates, key=lambda manifest: manifest["total_records"]) if candidates else None
+
+    def materialize(self, records: Iterable[Dict[str, Any]], dataset_name: str, split: str, num_samples: int = -1,
+                    filters: Optional[Dict[str, Any]] = None, data_files: DataFiles = None) -> Dict[str, Any]:
+        """
+        Writes the first `num_samples` records passing `filters` into a new entry.
+
+        Args:
+            records (Iterable[Dict[str, Any]]): The raw, unfiltered record stream.
+            dataset_name (str), split (str), num_samples (int), filters, data_files: The slice's parameters.
+
+        Returns:
+            Dict[str, Any]: The entry's manifest, with its `path`.
+        """
+        key = cache_key(dataset_name, split, num_samples, filters, data_files)
+        entry_dir = os.path.join(self._split_dir(dataset_name, split), key)
+        staging_dir = f"{entry_dir}.staging-{uuid.uuid4().hex}"
+        os.makedirs(staging_dir)
+        selected = (record for record in records if matches_filters(record, filters))
+        if num_samples != -1:
+            selected = itertools.islice(selected, num_samples)
+
+        start = time.perf_counter()
+        shards = []
+        try:
+            while True:
+                name = f"shard-{len(shards):05d}{ArrowWriter.extension}"
+                batch = itertools.islice(selected, self.shard_size)
+                with ArrowWriter(os.path.join(staging_dir, name), self.batch_size, encode_nested=False) as writer:
+                    writer.write_many(batch)
+                if writer.count == 0:
+                    os.remove(writer.path)
+                    break
+                shards.append({"path": name, "count": writer.count, "bytes": os.path.getsize(writer.path)})
+                if writer.count < self.shard_size:
+                    break
+            total = sum(shard["count"] for shard in shards)
+            manifest = dict(_slice_params(filters, data_files))
+            manifest.update({
+                "key": key,
+                "dataset_name": dataset_name,
+                "split": split,
+                "num_samples": num_samples,
+                "total_records": total,
+                "exhausted": num_samples == -1 or total < num_samples,
+                "total_bytes": sum(shard["bytes"] for shard in shards),
+                "shards": shards,
+                "created_at": time.time(),
+                "materialize_s": time.perf_counter() - start,
+            })
+            with open(os.path.join(staging_dir, CACHE_MANIFEST_FILE), "w") as f:
+                json.dump(manifest, f, indent=2)
+            if os.path.isdir(entry_dir):
+                shutil.rmtree(staging_dir)  # Materialized concurrently by another run.
+            else:
+                os.rename(staging_dir, entry_dir)
+        except BaseException:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        return dict(manifest, path=entry_dir)
+
+    def replay(self, manifest: Dict[str, Any], num_samples: int = -1) -> CachedDataset:
+        """Opens a cached slice, limited to its first `num_samples` records."""
+        return CachedDataset([os.path.join(manifest["path"], shard["path"]) for shard in manifest["shards"]],
+                             [shard["count"] for shard in manifest["shards"]], num_samples, self.batch_size)
+
+    def load(self,
+             dataset_name: str,
+             split: str = "train",
+             num_samples: int = -1,
+             filters: Optional[Dict[str, Any]] = None,
+             data_files: DataFiles = None,
+             stream_fn: Callable[[str, str, DataFiles], Iterable[Dict[str, Any]]] = stream_dataset) -> CachedDataset:
+        """
+        Returns a slice from the cache, materializing it from `stream_fn` first on a miss.
+
+        Raises:
+            FileNotFoundError: On a miss in offline mode.
+        """
+        manifest = self.lookup(dataset_name, split, num_samples, filters, data_files)
+        if manifest is None:
+            if self.offline:
+                raise FileNotFoundError(
+                    f"{dataset_name} ({split}, {num_samples} samples, filters {filters or {}}) is not in the cache "
+                    f"at {self.cache_dir}. Materialize it once without offline mode.")
+            print(f"Caching {dataset_name} ({split}, {num_samples} samples) in {self.cache_dir}...")
+            manifest = self.materialize(stream_fn(dataset_name, split, data_files), dataset_name, split, num_samples,
+                                        filters, data_files)
+            print(f"Cached {manifest['total_records']} records ({manifest['total_bytes'] / 1024**2:.1f}MB) "
+                  f"in {manifest['materialize_s']:.1f}s.")
+        return self.replay(manifest, num_samples)
+
+
+def _parse_filter(text: str) -> Dict[str, Any]:
+    field, _, values = text.partition("=")
+    accepted = values.split(",")
+    return {field: accepted if len(accepted) > 1 else accepted[0]}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Materialize dataset slices into the local cache, or list them.")
+    parser.add_argument("--dataset", type=str, default="bigcode/the-stack-v2")
+    parser.add_argument("--split", type=str, default="train")
+    parser.add_argument("--num-samples", type=int, default=-1)
+    parser.add_argument("--filter", action="append", default=[], help="field=value[,value...]; repeatable.")
+    parser.add_argument("--data-files", type=str, nargs="*", default=None, help="Local files instead of the Hub.")
+    parser.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--list", action="store_true", help="List cached slices and exit.")
+    args = parser.parse_args(argv)
+
+    cache = DatasetCache(args.cache_dir, shard_size=args.shard_size)
+    if args.list:
+        for manifest in cache.entries():
+            print(f"{manifest['key']}  {manifest['dataset_name']} ({manifest['split']})  "
+                  f"{manifest['total_records']} records, {manifest['total_bytes'] / 1024**2:.1f}MB  "
+                  f"filters={manifest['filters']}  num_samples={manifest['num_samples']}")
+        return 0
+
+    filters = {}
+    for text in args.filter:
+        filters.update(_parse_filter(text))
+    dataset = cache.load(args.dataset, args.split, args.num_samples, filters or None, args.data_files)
+    print(f"{len(dataset)} records available offline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,446 @@
+import collections
+import hashlib
+import multiprocessing
+import os
+import re
+import sqlite3
+import time
+import zlib
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .parallel_synthesis import chunked
+
+# Shingle hashes combine token hashes polynomially; all uint64 arithmetic wraps mod 2**64.
+_SHINGLE_BASE = np.uint64(1000003)
+_MAX_HASH = np.uint32(0xFFFFFFFF)
+# Shingles hashed per block, bounding the (shingles x permutations) matrix for huge files.
+_SHINGLE_BLOCK = 4096
+
+# One file per checkpoint, holding what the indexes gained since the previous one.
+_DELTA_FILE = re.compile(r"dedup-(\d{5})\.npz")
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace runs so re-indented or re-wrapped copies hash alike."""
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def content_digest(text: str) -> bytes:
+    """16-byte digest of the normalized text, the key for exact deduplication."""
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).digest()
+
+
+def sample_text(sample: Dict[str, Any]) -> str:
+    """The text a raw or synthesized sample is deduplicated on."""
+    for key in ("content", "code", "final_answer", "completion", "text"):
+        value = sample.get(key)
+        if isinstance(value, str) and value:
+            return value
+    return ""
+
+
+class ExactDedupIndex:
+    """
+    Set of content digests, in memory or in a sqlite file for runs whose
+    digests do not fit in RAM.
+
+    For checkpointing, the index is split into generations. The memory backend
+    journals the digests added in the current generation; sqlite rows carry
+    their generation, so rows added after the last checkpoint can be deleted.
+    """
+
+    def __init__(self, backend: str = "memory", path: Optional[str] = None, commit_every: int = 10000):
+        if backend not in ("memory", "sqlite"):
+            raise ValueError(f"Unknown exact dedup backend '{backend}'. Available: memory, sqlite")
+        self.backend = backend
+        self.commit_every = commit_every
+        self.generation = 0
+        self._pending = 0
+        self._seen: set = set()
+        self._journal: Optional[List[bytes]] = None
+        self._db: Optional[sqlite3.Connection] = None
+        if backend == "sqlite":
+            if not path:
+                raise ValueError("The sqlite backend needs a path.")
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=OFF")
+            self._db.execute("CREATE TABLE IF NOT EXISTS digests "
+                             "(digest BLOB PRIMARY KEY, generation INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID")
+
+    def add(self, digest: bytes) -> bool:
+        """Adds a digest. Returns True if it had not been seen before."""
+        if self._db is None:
+            if digest in self._seen:
+                return False
+            self._seen.add(digest)
+            if self._journal is not None:
+                self._journal.append(digest)
+            return True
+        inserted = self._db.execute("INSERT OR IGNORE INTO digests VALUES (?, ?)",
+                                    (digest, self.generation)).rowcount == 1
+        self._pending += inserted
+        if self._pending >= self.commit_every:
+            self.flush()
+        return inserted
+
+    def flush(self):
+        if self._db is not None:
+            self._db.commit()
+            self._pending = 0
+
+    def start_journal(self, generation: int):
+        """
+        Starts checkpointing at `generation`. Sqlite rows of that or a later
+        generation, left by an interrupted run, are deleted.
+        """
+        self.generation = generation
+        if self._db is None:
+            self._journal = []
+            return
+        self._db.execute("DELETE FROM digests WHERE generation >= ?", (generation,))
+        self._db.commit()
+        self._pending = 0
+
+    def take_journal(self) -> np.ndarray:
+        """
+        Ends the current generation. Returns its digests as a (n, 16) uint8
+        array for the memory backend; sqlite rows are committed in place and
+        an empty array is returned.
+        """
+        self.flush()
+        self.generation += 1
+        journal = self._journal or []
+        if self._journal is not None:
+            self._journal = []
+        return np.frombuffer(b"".join(journal), dtype=np.uint8).reshape(-1, 16)
+
+    def apply_journal(self, digests: np.ndarray):
+        """Re-adds the digests of a journal returned by `take_journal`."""
+        data = digests.tobytes()
+        self._seen.update(data[i:i + 16] for i in range(0, len(data), 16))
+
+    def __len__(self) -> int:
+        if self._db is None:
+            return len(self._seen)
+        return self._db.execute("SELECT COUNT(*) FROM digests").fetchone()[0]
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+
+class MinHasher:
+    """MinHash signatures over token n-gram shingles, with seeded, process-independent permutations."""
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        # Multiply-shift hashing: ((a * x + b) mod 2**64) >> 32 with odd a is a universal family.
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(0, 2**64, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.randint(0, 2**64, size=num_perm, dtype=np.uint64)
+
+    def shingle_hashes(self, text: str) -> np.ndarray:
+        """
+        Distinct 64-bit hashes of the token n-grams (the whole token sequence if
+        it is shorter than one), combined from per-token crc32s in numpy.
+        """
+        tokens = _TOKEN.findall(text)
+        if not tokens:
+            return np.empty(0, dtype=np.uint64)
+        token_hashes = np.fromiter((zlib.crc32(token.encode("utf-8")) for token in tokens), dtype=np.uint64,
+                                   count=len(tokens))
+        n = min(self.shingle_size, len(tokens))
+        windows = len(tokens) - n + 1
+        shingles = np.zeros(windows, dtype=np.uint64)
+        for k in range(n):
+            shingles = shingles * _SHINGLE_BASE + token_hashes[k:k + windows]
+        return np.unique(shingles)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """Returns the uint32 signature, or None for text without tokens."""
+        hashes = self.shingle_hashes(text)
+        if hashes.size == 0:
+            return None
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        for start in range(0, hashes.size, _SHINGLE_BLOCK):
+            block = hashes[start:start + _SHINGLE_BLOCK, None]
+            permuted = (block * self._a + self._b) >> np.uint64(32)
+            np.minimum(signature, permuted.min(axis=0).astype(np.uint32), out=signature)
+        return signature
+
+
+class LSHIndex:
+    """
+    Banded locality-sensitive hashing over MinHash signatures.
+
+    Signatures are split into `bands` bands; two documents become candidates
+    when any band matches exactly. With `verify`, a candidate only counts as a
+    duplicate if the signatures' estimated Jaccard similarity reaches
+    `threshold`, which costs keeping every indexed signature in memory.
+    Once `start_journal` is called, inserted documents are also journaled
+    until `take_journal`, for checkpointing.
+    """
+
+    def __init__(self, num_perm: int = 128, bands: int = 16, threshold: float = 0.8, verify: bool = True):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands}).")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.verify = verify
+        self._buckets: List[Dict[bytes, int]] = [{} for _ in range(bands)]
+        self._signatures: Dict[int, np.ndarray] = {}
+        self._next_id = 0
+        self._journal: Optional[List[Tuple[List[bytes], np.ndarray]]] = None
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [hashlib.blake2b(signature[i * self.rows:(i + 1) * self.rows].tobytes(), digest_size=8).digest()
+                for i in range(self.bands)]
+
+    def query_and_insert(self, signature: np.ndarray) -> bool:
+        """Returns True if `signature` is a near-duplicate of an indexed one; otherwise indexes it."""
+        keys = self._band_keys(signature)
+        checked = set()
+        for band, key in enumerate(keys):
+            candidate = self._buckets[band].get(key)
+            if candidate is None or candidate in checked:
+                continue
+            if not self.verify:
+                return True
+            checked.add(candidate)
+            if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                return True
+        self._insert(keys, signature)
+        if self._journal is not None:
+            self._journal.append((keys, signature))
+        return False
+
+    def _insert(self, keys: List[bytes], signature: Optional[np.ndarray]):
+        doc_id = self._next_id
+        self._next_id += 1
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, doc_id)
+        if self.verify:
+            self._signatures[doc_id] = signature
+
+    def start_journal(self):
+        self._journal = []
+
+    def take_journal(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the band keys, as a (n, bands * 8) uint8 array, and the
+        signatures (only kept with `verify`) of the documents inserted since
+        the last call.
+        """
+        journal, self._journal = (self._journal or []), []
+        band_keys = np.frombuffer(b"".join(b"".join(keys) for keys, _ in journal), dtype=np.uint8)
+        if self.verify and journal:
+            signatures = np.stack([signature for _, signature in journal])
+        else:
+            signatures = np.empty((0, 0), dtype=np.uint32)
+        return band_keys.reshape(-1, self.bands * 8), signatures
+
+    def apply_journal(self, band_keys: np.ndarray, signatures: np.ndarray):
+        """Re-inserts the documents of a journal returned by `take_journal`, in their original order."""
+        for i, row in enumerate(band_keys):
+            data = row.tobytes()
+            self._insert([data[band * 8:(band + 1) * 8] for band in range(self.bands)],
+                         signatures[i] if self.verify else None)
+
+    def __len__(self) -> int:
+        return self._next_id
+
+
+# Per-process MinHasher of a signature worker, set up once by `_init_signature_worker`.
+_hasher: Optional[MinHasher] = None
+
+
+def _init_signature_worker(hasher_args: Optional[Tuple[int, int, int]]):
+    global _hasher
+    _hasher = MinHasher(*hasher_args) if hasher_args else None
+
+
+def _fingerprint_chunk(texts: List[str]) -> List[Tuple[bytes, Optional[np.ndarray]]]:
+    return [(content_digest(text), _hasher.signature(text) if _hasher else None) for text in texts]
+
+
+class Deduplicator:
+    """
+    Streaming exact and near-duplicate filter; the first occurrence is kept.
+
+    Exact duplicates are detected by a digest of the whitespace-normalized
+    text, near-duplicates by MinHash signatures and LSH banding. Digests and
+    signatures are pure functions of the text, so with `num_workers` they are
+    computed in a process pool while the parent consults the indexes in
+    stream order, keeping results identical to a single-process run.
+    """
+
+    def __init__(self,
+                 exact: bool = True,
+                 near: bool = True,
+                 exact_backend: str = "memory",
+                 exact_path: Optional[str] = None,
+                 num_perm: int = 128,
+                 bands: int = 16,
+                 shingle_size: int = 5,
+                 threshold: float = 0.8,
+                 verify: bool = True,
+                 seed: int = 1,
+                 num_workers: int = 0,
+                 chunk_size: int = 256,
+                 text_fn: Callable[[Dict[str, Any]], str] = sample_text):
+        self.exact_index = ExactDedupIndex(exact_backend, exact_path) if exact else None
+        self.lsh = LSHIndex(num_perm, bands, threshold, verify) if near else None
+        self.hasher_args = (num_perm, shingle_size, seed) if near else None
+        self.hasher = MinHasher(*self.hasher_args) if near else None
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.text_fn = text_fn
+        self.stats = {"seen": 0, "kept": 0, "exact_duplicates": 0, "near_duplicates": 0, "elapsed_s": 0.0}
+        self._generation = 0
+
+    def _is_duplicate(self, digest: bytes, signature: Optional[np.ndarray]) -> bool:
+        self.stats["seen"] += 1
+        if self.exact_index is not None and not self.exact_index.add(digest):
+            self.stats["exact_duplicates"] += 1
+            return True
+        if self.lsh is not None and signature is not None and self.lsh.query_and_insert(signature):
+            self.stats["near_duplicates"] += 1
+            return True
+        self.stats["kept"] += 1
+        return False
+
+    def _fingerprints(self, chunks: Iterable[List[Dict[str, Any]]]
+                      ) -> Iterator[Tuple[List[Dict[str, Any]], List[Tuple[bytes, Optional[np.ndarray]]]]]:
+        """
+        Yields each chunk with its fingerprints, computed in a bounded window of pool tasks.
+        Time spent computing (or waiting for) fingerprints is added to the elapsed time.
+        """
+        if self.num_workers <= 0:
+            for chunk in chunks:
+                start = time.perf_counter()
+                fingerprints = [(content_digest(text), self.hasher.signature(text) if self.hasher else None)
+                                for text in map(self.text_fn, chunk)]
+                self.stats["elapsed_s"] += time.perf_counter() - start
+                yield chunk, fingerprints
+            return
+
+        def collect(pending: collections.deque):
+            chunk, result = pending.popleft()
+            start = time.perf_counter()
+            fingerprints = result.get()
+            self.stats["elapsed_s"] += time.perf_counter() - start
+            return chunk, fingerprints
+
+        with multiprocessing.Pool(self.num_workers, initializer=_init_signature_worker,
+                                  initargs=(self.hasher_args,)) as pool:
+            pending: collections.deque = collections.deque()
+            for chunk in chunks:
+                texts = [self.text_fn(sample) for sample in chunk]
+                pending.append((chunk, pool.apply_async(_fingerprint_chunk, (texts,))))
+                if len(pending) >= 2 * self.num_workers:
+                    yield collect(pending)
+            while pending:
+                yield collect(pending)
+
+    def filter(self, samples: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yields the samples that are not duplicates of an earlier sample, in stream order."""
+        try:
+            for chunk, fingerprints in self._fingerprints(chunked(samples, self.chunk_size)):
+                start = time.perf_counter()
+                kept = [sample for sample, (digest, signature) in zip(chunk, fingerprints)
+                        if not self._is_duplicate(digest, signature)]
+                self.stats["elapsed_s"] += time.perf_counter() - start
+                yield from kept
+        finally:
+            if self.exact_index is not None:
+                self.exact_index.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns counts, exact/near/total dedup ratios and throughput (over time spent deduplicating)."""
+        stats = dict(self.stats)
+        seen = stats["seen"]
+        stats["exact_ratio"] = stats["exact_duplicates"] / seen if seen else 0.0
+        stats["near_ratio"] = stats["near_duplicates"] / seen if seen else 0.0
+        stats["dedup_ratio"] = (seen - stats["kept"]) / seen if seen else 0.0
+        stats["samples_per_s"] = seen / stats["elapsed_s"] if stats["elapsed_s"] else 0.0
+        return stats
+
+    def _is_empty(self) -> bool:
+        return (not self.stats["seen"] and (self.exact_index is None or not len(self.exact_index))
+                and (self.lsh is None or not len(self.lsh)))
+
+    def restore_state(self, state_dir: str, state: Optional[Dict[str, Any]] = None):
+        """
+        Prepares the indexes for checkpoints in `state_dir`, resuming from
+        `state` as returned by `save_state` if given. Anything indexed after
+        that checkpoint by an interrupted run is discarded.
+
+        Args:
+            state_dir (str): Directory for the per-checkpoint delta files.
+            state (Optional[Dict[str, Any]]): The state to resume from; None starts a new run,
+                                              which needs an empty deduplicator.
+        """
+        if state is None and not self._is_empty():
+            raise ValueError("A new checkpointed run needs a deduplicator without indexed samples.")
+        os.makedirs(state_dir, exist_ok=True)
+        self._generation = state["generation"] if state else 0
+        applied = 0
+        for name in sorted(os.listdir(state_dir)):
+            match = _DELTA_FILE.fullmatch(name)
+            if not match:
+                continue
+            path = os.path.join(state_dir, name)
+            if int(match.group(1)) >= self._generation:
+                os.remove(path)
+                continue
+            with np.load(path) as delta:
+                if self.exact_index is not None and self.exact_index.backend == "memory":
+                    self.exact_index.apply_journal(delta["exact"])
+                if self.lsh is not None:
+                    self.lsh.apply_journal(delta["band_keys"], delta["signatures"])
+            applied += 1
+        if applied != self._generation:
+            raise ValueError(f"Dedup state in {state_dir} has {applied} of {self._generation} checkpoints.")
+
+        if self.exact_index is not None:
+            self.exact_index.start_journal(self._generation)
+        if self.lsh is not None:
+            self.lsh.start_journal()
+        if state is not None:
+            self.stats = dict(state["stats"])
+
+    def save_state(self, state_dir: str) -> Dict[str, Any]:
+        """
+        Writes what the indexes gained since the previous checkpoint to a new
+        delta file, so a checkpoint costs time proportional to the samples
+        since the last one rather than to the whole index.
+
+        Returns:
+            Dict[str, Any]: The small state to store with the checkpoint and pass to `restore_state`.
+        """
+        exact = self.exact_index.take_journal() if self.exact_index is not None else np.empty((0, 16), np.uint8)
+        band_keys, signatures = self.lsh.take_journal() if self.lsh is not None else (np.empty(0), np.empty(0))
+        path = os.path.join(state_dir, f"dedup-{self._generation:05d}.npz")
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, exact=exact, band_keys=band_keys, signatures=signatures)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self._generation += 1
+        return {"generation": self._generation, "stats": dict(self.stats)}
+
+    def close(self):
+        if self.exact_index is not None:
+            self.exact_index.close()
@@ -0,0 +1,404 @@
+import ast
+import collections
+import inspect
+import io
+import multiprocessing
+import re
+import textwrap
+import time
+import tokenize
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from .parallel_synthesis import chunked
+
+# Larger files are mostly generated or minified code, and dominate parse time.
+DEFAULT_MAX_FILE_BYTES = 1024 * 1024
+DEFAULT_MAX_FUNCTION_LINES = 400
+
+PYTHON_LANGUAGES = {"python", "py", "python3"}
+PYTHON_EXTENSIONS = (".py", ".pyi", ".pyw")
+
+_NEWLINE = re.compile(rb"\n")
+# Statement-list fields, in source order; functions can only be defined inside these.
+_BLOCK_FIELDS = ("body", "handlers", "orelse", "finalbody", "cases")
+_STRING_PREFIX = re.compile(r"^[rRbBuUfF]*")
+
+
+def _function_record(name: str, qualname: str, signature: str, docstring: str, body: str, source: str,
+                     lineno: int, end_lineno: int, parser: str) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "qualname": qualname,
+        "signature": signature,
+        "docstring": docstring,
+        "body": body,
+        "source": source,
+        "lineno": lineno,
+        "end_lineno": end_lineno,
+        "parser": parser,
+    }
+
+
+def _header_length(header: str) -> int:
+    """Length of a def header up to its closing colon, leaving out comments between it and the body."""
+    parens = 0
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(header).readline):
+            if token.type == tokenize.OP and token.string in "([{":
+                parens += 1
+            elif token.type == tokenize.OP and token.string in ")]}":
+                parens -= 1
+            elif token.type == tokenize.OP and token.string == ":" and parens == 0:
+                lines = header.splitlines(keepends=True)
+                return sum(map(len, lines[:token.end[0] - 1])) + token.end[1]
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass
+    return len(header.rstrip())
+
+
+def _first_line(node: ast.stmt) -> int:
+    """The first line of a statement, including the decorators of a decorated definition."""
+    return min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", ())])
+
+
+def _mine_ast(tree: ast.Module, data: bytes, max_function_lines: int) -> List[Dict[str, Any]]:
+    """One example per function definition, in source order. Columns are UTF-8 byte offsets, as `ast` reports them."""
+    line_starts = [0] + [match.end() for match in _NEWLINE.finditer(data)]
+
+    def offset(lineno: int, col: int) -> int:
+        return line_starts[lineno - 1] + col
+
+    def text(start: int, end: int) -> str:
+        return data[start:end].decode("utf-8", errors="replace")
+
+    functions = []
+    # Depth-first, in source order, over statement lists only: expressions cannot contain a def.
+    stack: List[Tuple[Any, str]] = [(tree, "")]
+    while stack:
+        node, prefix = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            child_prefix = f"{prefix}{node.name}.<locals>."
+        elif isinstance(node, ast.ClassDef):
+            child_prefix = f"{prefix}{node.name}."
+        else:
+            child_prefix = prefix
+        children = [child for field in _BLOCK_FIELDS for child in getattr(node, field, None) or []]
+        stack.extend((child, child_prefix) for child in reversed(children) if isinstance(child, ast.AST))
+
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        if node.end_lineno - node.lineno + 1 > max_function_lines:
+            continue
+        docstring = ast.get_docstring(node)
+        statements = node.body[1:] if docstring is not None else node.body
+        first = node.body[0]
+        # Through the end of the last line, keeping a trailing comment as the token fallback does.
+        end = line_starts[node.end_lineno] - 1 if node.end_lineno < len(line_starts) else len(data)
+        header = text(offset(node.lineno, node.col_offset), offset(first.lineno, first.col_offset))
+        signature = header[:_header_length(header)]
+        if not statements:
+            body = ""
+        elif statements[0].lineno == node.lineno:
+            body = text(offset(node.lineno, statements[0].col_offset), end)
+        else:
+            # Whole lines from the first statement's decorators, so dedent sees the body's own indentation.
+            body = textwrap.dedent(text(line_starts[_first_line(statements[0]) - 1], end))
+        source_line = _first_line(node)
+        functions.append(_function_record(node.name, prefix + node.name, signature, docstring or "", body,
+                                          textwrap.dedent(text(line_starts[source_line - 1], end)),
+                                          node.lineno, node.end_lineno, "ast"))
+    return functions
+
+
+def _string_value(token: str) -> str:
+    """The value of a string literal token, tolerating prefixes Python 3 rejects (e.g. ur"...")."""
+    try:
+        value = ast.literal_eval(token)
+        return value.decode("utf-8", errors="replace") if isinstance(value, bytes) else value
+    except (ValueError, SyntaxError):
+        body = _STRING_PREFIX.sub("", token)
+        quote = body[:3] if body[:3] in ('"""', "'''") else body[:1]
+        return body[len(quote):len(body) - len(quote)]
+
+
+def _mine_tokens(source: str, max_function_lines: int) -> List[Dict[str, Any]]:
+    """
+    Token-level fallback for files `ast` rejects, such as Python 2 code or
+    files with a syntax error. `def` and `class` headers are recognized at
+    the start of logical lines and a block ends where indentation returns to
+    its header's level. Mining stops quietly where tokenizing fails, keeping
+    the functions found so far.
+    """
+    lines = io.StringIO(source).readlines()
+
+    def text(start: Tuple[int, int], end: Tuple[int, int]) -> str:
+        if start[0] == end[0]:
+            return lines[start[0] - 1][start[1]:end[1]]
+        return "".join([lines[start[0] - 1][start[1]:]] + lines[start[0]:end[0] - 1] + [lines[end[0] - 1][:end[1]]])
+
+    functions: List[Dict[str, Any]] = []
+    blocks: List[Dict[str, Any]] = []  # Open def and class blocks, outermost first.
+    header: Optional[Dict[str, Any]] = None  # A def or class whose header is being read.
+    depth = 0
+    at_line_start = True
+    decorator_line: Optional[int] = None
+    async_start: Optional[Tuple[int, int]] = None
+    last_line = 0
+
+    def close(block: Dict[str, Any]):
+        if block["kind"] != "def":
+            return
+        end_line = max(last_line, block["header_end"][0])
+        if end_line - block["start"][0] + 1 > max_function_lines:
+            return
+        end = (end_line, len(lines[end_line - 1].rstrip("\n")))
+        body_start = block.get("body_start")
+        if body_start is None:
+            body = ""
+        elif body_start[0] == block["start"][0]:
+            body = text(body_start, end)
+        else:
+            body = textwrap.dedent(text((body_start[0], 0), end))
+        qualname = "".join(outer["name"] + (".<locals>." if outer["kind"] == "def" else ".") for outer in blocks)
+        functions.append(_function_record(
+            block["name"], qualname + block["name"], text(block["start"], block["header_end"]),
+            block.get("docstring", ""), body, textwrap.dedent(text((block["source_line"], 0), end)),
+            block["start"][0], end_line, "tokenize"))
+
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(source).readline):
+            kind, string, start = token.type, token.string, token.start
+            if kind in (tokenize.COMMENT, tokenize.NL):
+                continue
+            if kind == tokenize.INDENT:
+                depth += 1
+                continue
+            if kind in (tokenize.DEDENT, tokenize.ENDMARKER):
+                depth -= kind == tokenize.DEDENT
+                while blocks and (kind == tokenize.ENDMARKER or depth <= blocks[-1]["depth"]):
+                    close(blocks.pop())
+                continue
+            if kind == tokenize.NEWLINE:
+                last_line = start[0]
+                at_line_start = True
+                if header is not None and "header_end" in header:
+                    blocks.append(header)
+                    if "body_start" in header:  # One-line block, e.g. `def f(): return 1`.
+                        close(blocks.pop())
+                    header = None
+                continue
+
+            if header is not None:
+                if "header_end" in header:
+                    header.setdefault("body_start", start)
+                elif kind == tokenize.NAME and "name" not in header:
+                    header["name"] = string
+                elif kind == tokenize.OP and string in "([{":
+                    header["parens"] += 1
+                elif kind == tokenize.OP and string in ")]}":
+                    header["parens"] -= 1
+                elif kind == tokenize.OP and string == ":" and header["parens"] == 0:
+                    header["header_end"] = token.end
+                continue
+
+            if at_line_start:
+                innermost = blocks[-1] if blocks else None
+                if (innermost is not None and innermost["kind"] == "def" and "body_start" not in innermost
+                        and kind == tokenize.STRING and "docstring" not in innermost):
+                    innermost["docstring"] = inspect.cleandoc(_string_value(string))
+                elif innermost is not None and "body_start" not in innermost:
+                    innermost["body_start"] = start
+                if kind == tokenize.NAME and string == "async" and async_start is None:
+                    async_start = start  # `async def`, or `async with` / `async for`.
+                    continue
+                if kind == tokenize.OP and string == "@":
+                    decorator_line = decorator_line or start[0]
+                elif kind == tokenize.NAME and string in ("def", "class"):
+                    header = {"kind": string, "start": async_start or start, "depth": depth,
+                              "source_line": decorator_line or (async_start or start)[0], "parens": 0}
+                    decorator_line = None
+                else:
+                    decorator_line = None
+                async_start = None
+            at_line_start = False
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        pass
+    while blocks:
+        close(blocks.pop())
+    functions.sort(key=lambda function: function["lineno"])
+    return functions
+
+
+def mine_source(source: str,
+                max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                max_function_lines: int = DEFAULT_MAX_FUNCTION_LINES) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Mines every function of one Python file in a single pass.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], str]: The functions (name, qualname, signature,
+            docstring, body, source, line range) and how the file was read:
+            "ast", "tokenize" (it does not parse) or "too_large".
+    """
+    data = source.encode("utf-8", errors="replace")
+    if len(data) > max_file_bytes:
+        return [], "too_large"
+    if "\r" in source:
+        source = source.replace("\r\n", "\n").replace("\r", "\n")
+        data = source.encode("utf-8", errors="replace")
+    try:
+        tree = ast.parse(data)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        return _mine_tokens(source, max_function_lines), "tokenize"
+    return _mine_ast(tree, data, max_function_lines), "ast"
+
+
+def mine_functions(source: str,
+                   max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                   max_function_lines: int = DEFAULT_MAX_FUNCTION_LINES) -> List[Dict[str, Any]]:
+    """Mines every function of one Python file; see `mine_source`."""
+    return mine_source(source, max_file_bytes, max_function_lines)[0]
+
+
+def first_docstring(source: str) -> str:
+    """
+    The docstring of the first function in `source` that has one, else the
+    module docstring, else "".
+    """
+    for function in mine_functions(source):
+        if function["docstring"]:
+            return function["docstring"]
+    try:
+        return ast.get_docstring(ast.parse(source)) or ""
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        return ""
+
+
+def is_python_sample(sample: Dict[str, Any]) -> bool:
+    """True for samples labelled as Python, or unlabelled ones with a Python path or none at all."""
+    language = sample.get("language")
+    if language and language != "unknown":
+        return str(language).lower() in PYTHON_LANGUAGES
+    path = sample.get("path")
+    return not path or str(path).endswith(PYTHON_EXTENSIONS)
+
+
+def sample_source(sample: Dict[str, Any]) -> str:
+    """The Python source of a processed sample."""
+    for key in ("content", "code"):
+        value = sample.get(key)
+        if isinstance(value, str) and value:
+            return value
+    return ""
+
+
+# Mining limits of a pool worker, set up once by `_init_mining_worker`.
+_limits: Dict[str, Any] = {}
+
+
+def _init_mining_worker(limits: Dict[str, Any]):
+    _limits.update(limits)
+
+
+def _mine_chunk(files: List[Tuple[Any, Any, str]]) -> Tuple[List[Dict[str, Any]], Dict[str, int], float]:
+    """Mines (id, path, source) files. Returns their functions, file counts by how they were read, and seconds."""
+    start = time.perf_counter()
+    examples = []
+    counts: Dict[str, int] = collections.Counter()
+    for source_id, path, source in files:
+        functions, status = mine_source(source, _limits["max_file_bytes"], _limits["max_function_lines"])
+        counts[status] += 1
+        if status == "too_large":
+            continue
+        counts["bytes"] += len(source.encode("utf-8", errors="replace"))
+        for function in functions:
+            if _limits["require_docstring"] and not function["docstring"]:
+                continue
+            function["source_id"] = source_id
+            function["path"] = path
+            examples.append(function)
+    return examples, counts, time.perf_counter() - start
+
+
+class FunctionMiner:
+    """
+    Mines function-level (signature, docstring, body) examples from a stream
+    of source samples, one pass per file.
+
+    Files over `max_file_bytes` are skipped, as are functions longer than
+    `max_function_lines`. With `num_workers`, files are mined in a process
+    pool over a bounded window of chunks, and the output keeps stream order.
+    Throughput is reported in examples per MB of mined source.
+    """
+
+    def __init__(self,
+                 num_workers: int = 0,
+                 chunk_size: int = 64,
+                 max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+                 max_function_lines: int = DEFAULT_MAX_FUNCTION_LINES,
+                 require_docstring: bool = False,
+                 source_fn: Callable[[Dict[str, Any]], str] = sample_source):
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.limits = {"max_file_bytes": max_file_bytes, "max_function_lines": max_function_lines,
+                       "require_docstring": require_docstring}
+        self.source_fn = source_fn
+        self.stats = {"files": 0, "skipped_language": 0, "too_large": 0, "ast": 0, "tokenize": 0,
+                      "bytes": 0, "examples": 0, "elapsed_s": 0.0}
+
+    def _files(self, samples: Iterable[Dict[str, Any]]) -> Iterator[Tuple[Any, Any, str]]:
+        for sample in samples:
+            self.stats["files"] += 1
+            source = self.source_fn(sample)
+            if not source or not is_python_sample(sample):
+                self.stats["skipped_language"] += 1
+                continue
+            # Every character is at least one UTF-8 byte: skip these without shipping them to a worker.
+            if len(source) > self.limits["max_file_bytes"]:
+                self.stats["too_large"] += 1
+                continue
+            yield sample.get("id"), sample.get("path"), source
+
+    def _collect(self, result: Tuple[List[Dict[str, Any]], Dict[str, int], float]) -> List[Dict[str, Any]]:
+        examples, counts, _ = result
+        for key, value in counts.items():
+            self.stats[key] += value
+        self.stats["examples"] += len(examples)
+        return examples
+
+    def mine(self, samples: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yields one example per mined function, tagged with its sample's `source_id` and `path`."""
+        chunks = chunked(self._files(samples), self.chunk_size)
+        if self.num_workers <= 0:
+            _init_mining_worker(self.limits)
+            for chunk in chunks:
+                start = time.perf_counter()
+                examples = self._collect(_mine_chunk(chunk))
+                self.stats["elapsed_s"] += time.perf_counter() - start
+                yield from examples
+            return
+
+        with multiprocessing.Pool(self.num_workers, initializer=_init_mining_worker, initargs=(self.limits,)) as pool:
+            pending: collections.deque = collections.deque()
+
+            def collect() -> List[Dict[str, Any]]:
+                start = time.perf_counter()
+                examples = self._collect(pending.popleft().get())
+                self.stats["elapsed_s"] += time.perf_counter() - start
+                return examples
+
+            for chunk in chunks:
+                pending.append(pool.apply_async(_mine_chunk, (chunk,)))
+                if len(pending) >= 2 * self.num_workers:
+                    yield from collect()
+            while pending:
+                yield from collect()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns file and example counts, examples per MB of mined source, and throughput."""
+        stats = dict(self.stats)
+        megabytes = stats["bytes"] / 1024**2
+        stats["examples_per_mb"] = stats["examples"] / megabytes if megabytes else 0.0
+        stats["mb_per_s"] = megabytes / stats["elapsed_s"] if stats["elapsed_s"] else 0.0
+        stats["examples_per_s"] = stats["examples"] / stats["elapsed_s"] if stats["elapsed_s"] else 0.0
+        return stats
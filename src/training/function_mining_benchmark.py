@@ -0,0 +1,238 @@
+"""
+Function Mining Benchmark
+
+Generates a synthetic `bigcode/the-stack-v2`-style corpus whose function
+counts are known: Python 3 files with top-level functions, methods, nested,
+async and decorated functions, Python 2 files that only the tokenize fallback
+can read, oversized files and non-Python records. Mines it with
+`FunctionMiner` in-process and with a worker pool, and compares the yield and
+throughput with the old whole-file regex, which finds at most one docstring
+per file, and times the tanuki-python-dev strategy, which mines with a
+pipeline's `function_miner`.
+
+Usage:
+    python -m src.training.function_mining_benchmark --files 5000 --workers 4 --output mining_bench.json
+
+Results are written as JSON; see `benchmarking`. That the miners find the
+functions the corpus holds, with or without a pool, is tested in
+tests/test_function_mining.py.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Optional
+
+from ..core.benchmarking import benchmark_main, environment
+from .data_synthesis import DataSynthesisPipeline, python_dev_source
+from .function_mining import FunctionMiner
+from .synthesis_benchmark import SOURCE_DATASET
+
+
+def _function(rng: random.Random, name: str, indent: str, counts: Dict[str, int], py2: bool = False,
+              nested: bool = True) -> str:
+    """One function definition; adds it (and any nested function) to `counts`."""
+    documented = rng.random() < 0.7
+    counts["functions"] += 1
+    counts["documented"] += documented
+    prefix = "async " if not py2 and rng.random() < 0.1 else ""
+    lines = []
+    if rng.random() < 0.15:
+        lines.append(f"{indent}@functools.lru_cache(maxsize=None)\n")
+    lines.append(f"{indent}{prefix}def {name}(x, y=1):\n")
+    if documented:
+        lines.append(f'{indent}    """Combines x and y for {name}.\n\n'
+                     f'{indent}    Returns the combined value.\n'
+                     f'{indent}    """\n')
+    for i in range(rng.randint(1, 12)):
+        lines.append(f"{indent}    print \"step {i}\", x\n" if py2 and i == 0 else
+                     f"{indent}    x = x * {rng.randint(1, 9)} + y  # step {i}\n")
+    if nested and rng.random() < 0.2:
+        lines.append(_function(rng, f"{name}_inner", indent + "    ", counts, py2, nested=False))
+    lines.append(f"{indent}    return x\n")
+    return "".join(lines)
+
+
+def _python_file(rng: random.Random, index: int, counts: Dict[str, int], py2: bool = False) -> str:
+    parts = [f'"""Module {index}, with a module docstring the regex picks up first."""\n',
+             "import functools\n\n"]
+    if py2:
+        parts.append(f'print "loading module {index}"\n\n')
+    for j in range(rng.randint(0, 6)):
+        parts.append(_function(rng, f"function_{index}_{j}", "", counts, py2) + "\n\n")
+    if rng.random() < 0.4:
+        parts.append(f"class Model{index}(object):\n    \"\"\"A model.\"\"\"\n\n")
+        for j in range(rng.randint(1, 4)):
+            parts.append(_function(rng, f"method_{j}", "    ", counts, py2) + "\n")
+    return "".join(parts)
+
+
+def write_function_corpus(path: str, num_files: int, max_file_bytes: int, seed: int = 0) -> Dict[str, int]:
+    """
+    Writes the-stack-v2-style records (hexsha, content, lang, path) as JSONL.
+
+    Returns:
+        Dict[str, int]: Record and byte counts, and the functions (all and documented)
+                        a miner should find in files within `max_file_bytes`.
+    """
+    rng = random.Random(seed)
+    expected = {"files": 0, "python3": 0, "python2": 0, "too_large": 0, "other_language": 0,
+                "functions": 0, "documented": 0, "bytes": 0}
+    with open(path, "w") as f:
+        for i in range(num_files):
+            kind = rng.random()
+            if kind < 0.8:
+                content, lang, file_path = _python_file(rng, i, expected), "Python", f"pkg/module_{i}.py"
+                expected["python3"] += 1
+            elif kind < 0.88:
+                content, lang, file_path = _python_file(rng, i, expected, py2=True), "Python", f"legacy/module_{i}.py"
+                expected["python2"] += 1
+            elif kind < 0.9:
+                # Generated code: counted in nothing but the bytes read.
+                discard = {"functions": 0, "documented": 0}
+                functions = []
+                while sum(map(len, functions)) <= max_file_bytes:
+                    functions.append(_function(rng, f"generated_{i}_{len(functions)}", "", discard))
+                content = "\n".join(functions)
+                lang, file_path = "Python", f"generated/module_{i}.py"
+                expected["too_large"] += 1
+            else:
+                content = f"/** Module {i}. */\nfunction f{i}(x) {{\n  return x + 1;\n}}\n"
+                lang, file_path = "JavaScript", f"web/module_{i}.js"
+                expected["other_language"] += 1
+            if lang == "Python" and len(content.encode("utf-8")) <= max_file_bytes:
+                expected["bytes"] += len(content.encode("utf-8"))
+            f.write(json.dumps({"hexsha": f"{rng.getrandbits(160):040x}", "content": content, "lang": lang,
+                                "path": file_path}) + "\n")
+            expected["files"] += 1
+    return expected
+
+
+def _regex_docstring(python_code: str) -> Optional[str]:
+    """The whole-file regex `extract_docstring` used before function mining."""
+    match = re.search(r'"""(.*?)"""', python_code, re.DOTALL) or re.search(r"'''(.*?)'''", python_code, re.DOTALL)
+    return match.group(1).strip() if match else None
+
+
+def _regex_baseline(samples: List[Dict[str, Any]], max_file_bytes: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    examples = 0
+    source_bytes = 0
+    for sample in samples:
+        if sample["language"] != "Python" or len(sample["content"].encode("utf-8")) > max_file_bytes:
+            continue
+        source_bytes += len(sample["content"].encode("utf-8"))
+        examples += _regex_docstring(sample["content"]) is not None
+    seconds = time.perf_counter() - start
+    megabytes = source_bytes / 1024**2
+    return {"examples": examples, "seconds": seconds, "examples_per_mb": examples / megabytes if megabytes else 0.0,
+            "mb_per_s": megabytes / seconds if seconds > 0 else 0.0}
+
+
+def _mine(samples: List[Dict[str, Any]], num_workers: int, max_file_bytes: int,
+          require_docstring: bool) -> Dict[str, Any]:
+    miner = FunctionMiner(num_workers=num_workers, max_file_bytes=max_file_bytes, require_docstring=require_docstring)
+    start = time.perf_counter()
+    examples = list(miner.mine(samples))
+    wall_s = time.perf_counter() - start
+    stats = miner.get_stats()
+    megabytes = stats["bytes"] / 1024**2
+    return dict(stats, wall_s=wall_s, wall_mb_per_s=megabytes / wall_s if wall_s > 0 else 0.0,
+                order=[(example["source_id"], example["qualname"], example["lineno"]) for example in examples])
+
+
+def run_benchmark(num_files: int = 5000,
+                  num_workers: int = 4,
+                  max_file_bytes: int = 256 * 1024,
+                  seed: int = 0,
+                  work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Mines the synthetic corpus in-process, with `num_workers` processes and
+    through the tanuki-python-dev strategy, and runs the regex baseline.
+
+    Returns:
+        Dict[str, Any]: Environment info, the corpus and per-run mining stats.
+    """
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="mining_bench_")
+    try:
+        data_file = os.path.join(work_dir, "the-stack-v2.jsonl")
+        expected = write_function_corpus(data_file, num_files, max_file_bytes, seed)
+        with open(data_file) as f:
+            samples = [{"id": record["hexsha"], "content": record["content"], "language": record["lang"],
+                        "path": record["path"]} for record in map(json.loads, f)]
+
+        serial = _mine(samples, 0, max_file_bytes, require_docstring=False)
+        pooled = _mine(samples, num_workers, max_file_bytes, require_docstring=False)
+        documented = _mine(samples, num_workers, max_file_bytes, require_docstring=True)
+        baseline = _regex_baseline(samples, max_file_bytes)
+
+        pipeline = DataSynthesisPipeline(os.path.join(work_dir, "out"))
+        pipeline.function_miner = FunctionMiner(max_file_bytes=max_file_bytes, require_docstring=True,
+                                                source_fn=python_dev_source)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            stored = pipeline.generate_and_store_react_data(SOURCE_DATASET, "tanuki-python-dev", num_samples=-1,
+                                                            data_files=data_file)
+        synthesis_s = time.perf_counter() - start
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    for run in (serial, pooled, documented):
+        run.pop("order")
+    return {
+        "environment": environment(),
+        "config": {
+            "num_files": num_files,
+            "num_workers": num_workers,
+            "max_file_bytes": max_file_bytes,
+            "seed": seed,
+        },
+        "corpus": expected,
+        "regex_baseline": baseline,
+        "mining": {"serial": serial, "pooled": pooled, "documented_only": documented},
+        "pool_speedup": serial["wall_s"] / pooled["wall_s"] if pooled["wall_s"] > 0 else 0.0,
+        "yield_vs_regex": documented["examples"] / baseline["examples"] if baseline["examples"] else 0.0,
+        "synthesis": {"stored": stored, "seconds": synthesis_s,
+                      "examples_per_s": stored / synthesis_s if synthesis_s > 0 else 0.0},
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--files", type=int, default=5000, dest="num_files", help="Records in the synthetic corpus.")
+    parser.add_argument("--workers", type=int, default=4, dest="num_workers")
+    parser.add_argument("--max-file-kb", type=lambda value: int(value) * 1024, default=256 * 1024,
+                        dest="max_file_bytes", help="Skip files larger than this.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", type=str, default=None, help="Keep the corpus and outputs here.")
+
+
+def report(results: Dict[str, Any]):
+    mining, baseline = results["mining"], results["regex_baseline"]
+    print(f"Corpus: {results['corpus']['files']} files, {results['corpus']['functions']} functions "
+          f"({results['corpus']['documented']} documented)")
+    print(f"Regex: {baseline['examples']} examples, {baseline['examples_per_mb']:.0f} examples/MB; "
+          f"mining: {mining['documented_only']['examples']} examples, "
+          f"{mining['documented_only']['examples_per_mb']:.0f} examples/MB ({results['yield_vs_regex']:.1f}x)")
+    print(f"Mining: {mining['serial']['mb_per_s']:.1f}MB/s in-process, {mining['pooled']['wall_mb_per_s']:.1f}MB/s "
+          f"with {results['config']['num_workers']} workers ({results['pool_speedup']:.1f}x)")
+    print(f"Synthesis: {results['synthesis']['stored']} python-dev examples, "
+          f"{results['synthesis']['examples_per_s']:.0f} examples/s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return benchmark_main(run_benchmark, argv, "Benchmark function-level example mining.", "mining_bench.json",
+                          add_arguments, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+import argparse
+import hashlib
+import itertools
+import os
+import random
+import sys
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+
+from .writers import WRITERS, dataset_files, iter_records, store_records
+
+STOPPING_STRATEGIES = ("first_exhausted", "all_exhausted")
+DEFAULT_SHUFFLE_BUFFER = 10000
+DEFAULT_READ_BATCH_SIZE = 1024
+
+
+def _derived_seed(seed: int, *parts: Any) -> int:
+    """A seed for one stream of a mixture, e.g. (seed, epoch, source, pass)."""
+    key = ":".join(str(part) for part in (seed,) + parts)
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def shuffle_buffer(records: Iterable[Dict[str, Any]], buffer_size: int,
+                   rng: random.Random) -> Iterator[Dict[str, Any]]:
+    """
+    Shuffles a stream with a buffer of `buffer_size` records: each incoming
+    record replaces a random buffered one, which is yielded. Records move at
+    most about `buffer_size` positions, in exchange for bounded memory.
+    """
+    buffer: List[Dict[str, Any]] = []
+    for record in records:
+        if len(buffer) < buffer_size:
+            buffer.append(record)
+            continue
+        index = rng.randrange(buffer_size)
+        yield buffer[index]
+        buffer[index] = record
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+def agent_dataset_path(output_dir: str, agent_type: str, split: str = "train") -> str:
+    """
+    The stored dataset of an agent type in a pipeline's output directory: its
+    shard or versioned directory if there is one, otherwise its file.
+    """
+    name = f"{agent_type}_{split}_react_data"
+    if os.path.isdir(os.path.join(output_dir, name)):
+        return os.path.join(output_dir, name)
+    for writer_cls in WRITERS.values():
+        path = os.path.join(output_dir, name + writer_cls.extension)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No '{split}' dataset for '{agent_type}' in '{output_dir}'.")
+
+
+class WeightedMixtureReader:
+    """
+    Streams a training mixture of several stored datasets, e.g. one per agent type.
+
+    Each record is drawn from a source chosen at random in proportion to the
+    source weights, so the mixture follows the weights throughout rather than
+    only on average over the whole run. Sources are read file by file with
+    `iter_records`, in a file order shuffled per pass, and the interleaved
+    stream goes through a bounded shuffle buffer, so memory use does not
+    depend on dataset sizes.
+
+    With "first_exhausted", the mixture ends when any source runs out, so
+    every record appears at most once. With "all_exhausted", a source that
+    runs out starts a new, reshuffled pass (it is oversampled) until every
+    source has been read in full. With `num_examples`, sources are resampled
+    as often as needed and the mixture ends after that many records.
+
+    The order depends only on `seed` and the epoch: iterating again gives the
+    same records in the same order, and `set_epoch` gives each epoch its own.
+    """
+
+    def __init__(self,
+                 sources: Dict[str, str],
+                 weights: Optional[Dict[str, float]] = None,
+                 shuffle_buffer_size: int = DEFAULT_SHUFFLE_BUFFER,
+                 seed: int = 0,
+                 stopping_strategy: str = "first_exhausted",
+                 num_examples: Optional[int] = None,
+                 read_batch_size: int = DEFAULT_READ_BATCH_SIZE):
+        """
+        Args:
+            sources (Dict[str, str]): Source name -> stored dataset: a file, or a shard or version directory.
+            weights (Optional[Dict[str, float]]): Source name -> relative sampling weight. Defaults to equal
+                                                  weights; sources missing from it get weight 0.
+            shuffle_buffer_size (int): Records held back for shuffling. 0 or 1 disables shuffling.
+            seed (int): Seed for source selection, file order and shuffling.
+            stopping_strategy (str): "first_exhausted" or "all_exhausted"; see above.
+            num_examples (Optional[int]): Records per epoch, resampling sources as needed.
+            read_batch_size (int): Records decoded at a time from a Parquet or Arrow source.
+        """
+        if stopping_strategy not in STOPPING_STRATEGIES:
+            raise ValueError(f"Unknown stopping strategy '{stopping_strategy}'. "
+                             f"Available: {', '.join(STOPPING_STRATEGIES)}")
+        weights = weights if weights is not None else {name: 1.0 for name in sources}
+        unknown = set(weights) - set(sources)
+        if unknown:
+            raise ValueError(f"Weights for unknown sources: {', '.join(sorted(unknown))}")
+        if any(weight < 0 for weight in weights.values()) or not sum(weights.values()) > 0:
+            raise ValueError("Weights must be non-negative with a positive sum.")
+        # Sources with weight 0 are never drawn, so they cannot end the mixture either.
+        self.sources = {name: path for name, path in sources.items() if weights.get(name, 0) > 0}
+        self.files = {name: dataset_files(path) for name, path in self.sources.items()}
+        total = sum(weights.values())
+        self.weights = {name: weights[name] / total for name in self.sources}
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.seed = seed
+        self.stopping_strategy = stopping_strategy
+        self.num_examples = num_examples
+        self.read_batch_size = read_batch_size
+        self.epoch = 0
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_output_dir(cls, output_dir: str, weights: Dict[str, float], split: str = "train",
+                        **options: Any) -> "WeightedMixtureReader":
+        """A mixture of the agent datasets a `DataSynthesisPipeline` stored in `output_dir`, by agent type."""
+        sources = {agent_type: agent_dataset_path(output_dir, agent_type, split) for agent_type in weights}
+        return cls(sources, weights, **options)
+
+    def set_epoch(self, epoch: int):
+        """Selects the epoch whose order the next iteration yields."""
+        self.epoch = epoch
+
+    def _source_pass(self, name: str, pass_index: int) -> Iterator[Dict[str, Any]]:
+        files = list(self.files[name])
+        random.Random(_derived_seed(self.seed, self.epoch, name, pass_index)).shuffle(files)
+        for path in files:
+            yield from iter_records(path, self.read_batch_size)
+
+    def _interleave(self, rng: random.Random) -> Iterator[Dict[str, Any]]:
+        names = list(self.weights)
+        cumulative = list(itertools.accumulate(self.weights[name] for name in names))
+        streams = {name: self._source_pass(name, 0) for name in names}
+        self.stats = {name: {"records": 0, "passes": 0, "pass_records": 0} for name in names}
+        exhausted = set()
+        while True:
+            name = rng.choices(names, cum_weights=cumulative)[0]
+            stats = self.stats[name]
+            record = next(streams[name], None)
+            if record is None:
+                if stats["pass_records"] == 0:
+                    raise ValueError(f"Mixture source '{name}' ({self.sources[name]}) has no records.")
+                exhausted.add(name)
+                stats["passes"] += 1
+                if self.num_examples is None and (self.stopping_strategy == "first_exhausted"
+                                                  or len(exhausted) == len(names)):
+                    return
+                stats["pass_records"] = 0
+                streams[name] = self._source_pass(name, stats["passes"])
+                record = next(streams[name])
+            stats["records"] += 1
+            stats["pass_records"] += 1
+            yield record
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        rng = random.Random(_derived_seed(self.seed, self.epoch))
+        records = self._interleave(rng)
+        if self.shuffle_buffer_size > 1:
+            records = shuffle_buffer(records, self.shuffle_buffer_size, rng)
+        if self.num_examples is not None:
+            records = itertools.islice(records, self.num_examples)
+        return records
+
+    def write(self, path: str, output_format: Optional[str] = None, **writer_options: Any) -> Dict[str, Any]:
+        """Streams the current epoch's mixture into a dataset file. Returns `store_records`' result."""
+        return store_records(self, path, output_format, **writer_options)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per source, of the last iteration: records drawn, their share, and completed passes."""
+        drawn = sum(stats["records"] for stats in self.stats.values())
+        return {name: {"records": stats["records"], "share": stats["records"] / drawn if drawn else 0.0,
+                       "weight": self.weights[name], "passes": stats["passes"]}
+                for name, stats in self.stats.items()}
+
+
+def _parse_assignments(values: List[str], flag: str) -> Dict[str, str]:
+    assignments = {}
+    for value in values:
+        name, sep, rest = value.partition("=")
+        if not sep or not name or not rest:
+            raise ValueError(f"Expected {flag} NAME=VALUE, got '{value}'.")
+        assignments[name] = rest
+    return assignments
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Write a weighted, shuffled mixture of synthesized datasets.")
+    parser.add_argument("--source", action="append", default=[], metavar="NAME=PATH",
+                        help="A dataset to mix: a file, or a shard or version directory.")
+    parser.add_argument("--output-dir", type=str, default=None,
+                        help="Mix the agent datasets stored here, named by agent type in --weight.")
+    parser.add_argument("--split", type=str, default="train")
+    parser.add_argument("--weight", action="append", default=[], metavar="NAME=WEIGHT")
+    parser.add_argument("--shuffle-buffer", type=int, default=DEFAULT_SHUFFLE_BUFFER)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--epoch", type=int, default=0)
+    parser.add_argument("--stopping-strategy", choices=STOPPING_STRATEGIES, default="first_exhausted")
+    parser.add_argument("--num-examples", type=int, default=None)
+    parser.add_argument("--output", type=str, required=True, help="Mixture file; the extension sets the format.")
+    args = parser.parse_args(argv)
+
+    weights = {name: float(weight) for name, weight in _parse_assignments(args.weight, "--weight").items()}
+    options = {"shuffle_buffer_size": args.shuffle_buffer, "seed": args.seed,
+               "stopping_strategy": args.stopping_strategy, "num_examples": args.num_examples}
+    if args.output_dir:
+        mixture = WeightedMixtureReader.from_output_dir(args.output_dir, weights, args.split, **options)
+    else:
+        mixture = WeightedMixtureReader(_parse_assignments(args.source, "--source"), weights or None, **options)
+    mixture.set_epoch(args.epoch)
+    result = mixture.write(args.output)
+    print(f"Wrote {result['count']} records to {result['path']}.")
+    for name, stats in mixture.get_stats().items():
+        print(f"  {name}: {stats['records']} records ({stats['share']:.1%} for weight {stats['weight']:.1%}), "
+              f"{stats['passes']} complete passes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+Training Mixture Benchmark
+
+Writes synthetic agent datasets of different sizes and formats (a shard
+directory, a Parquet file and a zstd-compressed JSONL file) and builds a
+weighted mixture of them two ways: concatenating and shuffling everything in
+memory, and streaming with `WeightedMixtureReader`. Compares peak Python
+memory, throughput, and how closely the source shares follow the weights,
+over the whole mixture and within windows of it.
+
+Usage:
+    python -m src.training.mixture_benchmark --records 20000 --shuffle-buffer 1000 --output mixture_bench.json
+
+Results are written as JSON; see `benchmarking`. That the streaming mixture
+is reproducible, follows the weights without repeating or missing records,
+and stays within a fraction of the baseline's memory is tested in
+tests/test_mixture.py.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, Any, Iterable, List, Optional
+
+from ..core.benchmarking import benchmark_main, environment
+from .mixture import WeightedMixtureReader
+from .parallel_synthesis import MANIFEST_FILE, shard_name
+from .writers import create_writer, dataset_files, iter_records
+
+_WORDS = ("def", "return", "self", "value", "items", "for", "in", "if", "None", "result", "config", "path")
+# Source sizes relative to --records, and their formats.
+_SOURCES = (("tanuki-coder", 0.5, "shards"), ("tanuki-debugger", 0.3, "parquet"), ("tanuki-reviewer", 0.2, "jsonl.zst"))
+_NUM_SHARDS = 4
+
+
+def _record(rng: random.Random, agent_type: str, index: int, record_bytes: int) -> Dict[str, Any]:
+    words = []
+    size = 0
+    while size < record_bytes:
+        words.append(rng.choice(_WORDS))
+        size += len(words[-1]) + 1
+    return {"id": f"{agent_type}-{index}", "agent_type": agent_type, "prompt": f"Task {index}",
+            "completion": " ".join(words)}
+
+
+def write_sources(work_dir: str, num_records: int, record_bytes: int = 1024, seed: int = 0) -> Dict[str, str]:
+    """Writes one dataset per agent type in `_SOURCES`. Returns agent type -> dataset path."""
+    rng = random.Random(seed)
+    sources = {}
+    for agent_type, share, layout in _SOURCES:
+        count = int(num_records * share)
+        records = (_record(rng, agent_type, index, record_bytes) for index in range(count))
+        if layout == "shards":
+            shard_dir = os.path.join(work_dir, f"{agent_type}_train_react_data")
+            os.makedirs(shard_dir)
+            shards = []
+            for shard in range(_NUM_SHARDS):
+                with create_writer("jsonl", os.path.join(shard_dir, shard_name(shard))) as writer:
+                    writer.write_many(record for _, record in zip(range(count // _NUM_SHARDS), records))
+                shards.append({"path": shard_name(shard), "count": writer.count})
+            with open(os.path.join(shard_dir, MANIFEST_FILE), "w") as f:
+                json.dump({"agent_type": agent_type, "shards": shards}, f)
+            sources[agent_type] = shard_dir
+        else:
+            path = os.path.join(work_dir, f"{agent_type}_train_react_data.{layout}")
+            with create_writer(layout, path) as writer:
+                writer.write_many(records)
+            sources[agent_type] = path
+    return sources
+
+
+def in_memory_mixture(sources: Dict[str, str], seed: int = 0) -> List[Dict[str, Any]]:
+    """The baseline: every record of every source loaded, concatenated and shuffled."""
+    records = [record for path in sources.values() for file_path in dataset_files(path)
+               for record in iter_records(file_path)]
+    random.Random(seed).shuffle(records)
+    return records
+
+
+def _measure(build: Callable[[], Iterable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """Consumes a mixture, keeping only each record's source and id. Reports time and peak traced memory."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    order = [(record["agent_type"], record["id"]) for record in build()]
+    wall_s = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"order": order, "records": len(order), "wall_s": wall_s, "peak_bytes": peak,
+            "records_per_s": len(order) / wall_s if wall_s > 0 else 0.0}
+
+
+def share_deviation(order: List[Any], weights: Dict[str, float], window: Optional[int] = None) -> float:
+    """
+    The largest difference between a source's share and its weight, over
+    the whole order or, with `window`, over any full window of that many records.
+    """
+    windows = ([order] if window is None else
+               [order[start:start + window] for start in range(0, len(order) - window + 1, window)])
+    deviation = 0.0
+    for records in windows:
+        for name, weight in weights.items():
+            share = sum(source == name for source, _ in records) / len(records)
+            deviation = max(deviation, abs(share - weight))
+    return deviation
+
+
+def run_benchmark(num_records: int = 20000,
+                  record_bytes: int = 1024,
+                  shuffle_buffer: int = 1000,
+                  window: int = 1000,
+                  seed: int = 0,
+                  work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Builds the baseline mixture and streaming mixtures with each stopping
+    strategy, with weights that undersample the largest source.
+
+    Returns:
+        Dict[str, Any]: Environment info, the configuration and per-run measurements.
+    """
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="mixture_bench_")
+    try:
+        sources = write_sources(work_dir, num_records, record_bytes, seed)
+        sizes = {name: sum(1 for path in dataset_files(source) for _ in iter_records(path))
+                 for name, source in sources.items()}
+        weights = {"tanuki-coder": 0.4, "tanuki-debugger": 0.3, "tanuki-reviewer": 0.3}
+
+        def mixture(**options: Any) -> WeightedMixtureReader:
+            return WeightedMixtureReader(sources, weights, shuffle_buffer_size=shuffle_buffer, seed=seed, **options)
+
+        first = mixture()
+        runs = {
+            "in_memory": _measure(lambda: in_memory_mixture(sources, seed)),
+            "first_exhausted": _measure(lambda: first),
+            "first_exhausted_again": _measure(lambda: first),
+            "all_exhausted": _measure(lambda: mixture(stopping_strategy="all_exhausted")),
+            "num_examples": _measure(lambda: mixture(num_examples=num_records)),
+        }
+        first.set_epoch(1)
+        runs["first_exhausted_epoch_1"] = _measure(lambda: first)
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    total = sum(weights.values())
+    shares = {name: weight / total for name, weight in weights.items()}
+    for name, run in runs.items():
+        run["share_deviation"] = share_deviation(run["order"], shares)
+        run["window_share_deviation"] = share_deviation(run["order"], shares, window)
+        run["peak_vs_in_memory"] = run["peak_bytes"] / runs["in_memory"]["peak_bytes"]
+    return {
+        "environment": environment(),
+        "config": {
+            "num_records": num_records,
+            "record_bytes": record_bytes,
+            "shuffle_buffer": shuffle_buffer,
+            "window": window,
+            "seed": seed,
+            "weights": weights,
+            "source_sizes": sizes,
+        },
+        "runs": {name: {key: value for key, value in run.items() if key != "order"} for name, run in runs.items()},
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--records", type=int, default=20000, dest="num_records", help="Records across all sources.")
+    parser.add_argument("--record-bytes", type=int, default=1024)
+    parser.add_argument("--shuffle-buffer", type=int, default=1000)
+    parser.add_argument("--window", type=int, default=1000, help="Window for the windowed share deviation.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", type=str, default=None, help="Keep the source datasets here.")
+
+
+def report(results: Dict[str, Any]):
+    for name, run in results["runs"].items():
+        print(f"{name}: {run['records']} records, {run['records_per_s']:.0f} records/s, "
+              f"peak {run['peak_bytes'] / 2**20:.1f} MiB ({run['peak_vs_in_memory']:.1%} of in-memory), "
+              f"share deviation {run['share_deviation']:.3f} overall, {run['window_share_deviation']:.3f} per window")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return benchmark_main(run_benchmark, argv, "Benchmark streaming weighted mixtures of agent datasets.",
+                          "mixture_bench.json", add_arguments, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
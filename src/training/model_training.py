@@ -1,20 +1,76 @@
 import os
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoModelForCausalLM, AutoTokenizer, DataCollatorForLanguageModeling
 from transformers.training_args import TrainingArguments
 from transformers.trainer import Trainer
 from peft import LoraConfig, get_peft_model
-from datasets import load_dataset
+from datasets import Dataset, load_dataset
+
+from .sketches import example_text
+from .writers import dataset_files, iter_records
+
+
+def _training_records(data_files):
+    for path in data_files:
+        for record in iter_records(path):
+            yield {"text": example_text(record), "token_count": record.get("token_count")}
+
+
+def _load_train_dataset(dataset_path: str):
+    """
+    Loads a plain text file (one example per line) or a synthesized dataset,
+    whose examples' text fields are joined into "text". Keeps "token_count"
+    if every example has one.
+    """
+    if dataset_path.endswith(".txt"):
+        return load_dataset("text", data_files={"train": dataset_path})["train"]
+    dataset = Dataset.from_generator(_training_records, gen_kwargs={"data_files": dataset_files(dataset_path)})
+    if any(count is None for count in dataset["token_count"]):
+        dataset = dataset.remove_columns("token_count")
+    return dataset
+
+
+class _TokenizingCollator:
+    """
+    Tokenizes a batch of "text" examples when the data loader draws it, and
+    pads it to its longest example for causal LM training. Other columns,
+    such as the "token_count" used to group batches, are dropped.
+    """
+
+    def __init__(self, tokenizer, max_length: int):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.collator = DataCollatorForLanguageModeling(tokenizer, mlm=False)
+
+    def __call__(self, examples):
+        encoded = self.tokenizer([example["text"] for example in examples], truncation=True,
+                                 max_length=self.max_length)
+        return self.collator([{key: values[index] for key, values in encoded.items()}
+                              for index in range(len(examples))])
+
 
 def train_lora_adapter(
     base_model_id: str,
     dataset_path: str,
     adapter_name: str,
     output_dir: str = "models/lora_adapters",
-    training_output_dir: str = "models/trained"
+    training_output_dir: str = "models/trained",
+    max_length: int = 512,
+    group_by_length: bool = True
 ):
     """
     Fine-tunes a LoRA adapter for a given base model and dataset.
+
+    `dataset_path` is a text file or a synthesized dataset (a file, or a
+    shard or version directory). Batches are padded to their longest example
+    rather than to `max_length`. With `group_by_length`, batches are drawn
+    from examples of similar length.
+
+    Where every example has the "token_count" a `TokenLengthAnnotator`
+    stored, the dataset is not tokenized up front: each batch is tokenized
+    as it is drawn, and length grouping reads the stored counts. Without
+    them, every example is tokenized before training starts, and the
+    sampler measures each one's `input_ids` to group them.
     """
     print(f"Loading base model: {base_model_id}")
     model = AutoModelForCausalLM.from_pretrained(
@@ -27,14 +83,24 @@ def train_lora_adapter(
         tokenizer.pad_token = tokenizer.eos_token
 
     print("Loading and preparing dataset...")
-    dataset = load_dataset("text", data_files={"train": dataset_path})
-    train_dataset = dataset["train"]
-
-    def tokenize_function(examples):
-        return tokenizer(examples["text"], truncation=True, padding="max_length", max_length=512)
-
-    tokenized_dataset = train_dataset.map(tokenize_function, batched=True, remove_columns=["text"])
+    train_dataset = _load_train_dataset(dataset_path)
+    has_counts = "token_count" in train_dataset.column_names
+    if has_counts:
+        overlong = sum(count is not None and count > max_length for count in train_dataset["token_count"])
+        if overlong:
+            print(f"Warning: {overlong} examples exceed max_length={max_length} tokens and will be truncated.")
+        # The Trainer drops columns the model does not take before the sampler reads token_count,
+        # so columns are kept and the collator tokenizes "text" and drops the rest.
+        data_collator = _TokenizingCollator(tokenizer, max_length)
+        column_handling = {"remove_unused_columns": False}
+    else:
+        def tokenize_function(examples):
+            return tokenizer(examples["text"], truncation=True, max_length=max_length)
 
+        # Padding happens per batch in the collator.
+        train_dataset = train_dataset.map(tokenize_function, batched=True, remove_columns=train_dataset.column_names)
+        data_collator = DataCollatorForLanguageModeling(tokenizer, mlm=False)
+        column_handling = {}
 
     lora_config = LoraConfig(
         r=64,
@@ -48,6 +114,16 @@ def train_lora_adapter(
     peft_model = get_peft_model(model, lora_config)
     peft_model.print_trainable_parameters()
 
+    length_grouping = {}
+    if group_by_length:
+        if has_counts:
+            length_grouping["length_column_name"] = "token_count"
+        # Newer transformers releases replaced the group_by_length flag with a sampling strategy.
+        if "train_sampling_strategy" in TrainingArguments.__dataclass_fields__:
+            length_grouping["train_sampling_strategy"] = "group_by_length"
+        else:
+            length_grouping["group_by_length"] = True
+
     training_args = TrainingArguments(
         output_dir=os.path.join(training_output_dir, adapter_name),
         per_device_train_batch_size=1,
@@ -56,12 +132,15 @@ def train_lora_adapter(
         save_steps=100,
         gradient_accumulation_steps=4,
         report_to="none",
+        **length_grouping,
+        **column_handling,
     )
 
     trainer = Trainer(
         model=peft_model,
         args=training_args,
-        train_dataset=tokenized_dataset,
+        train_dataset=train_dataset,
+        data_collator=data_collator,
     )
 
     print(f"Starting training for adapter: {adapter_name}")
@@ -0,0 +1,207 @@
+import collections
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from .sketches import SynthesisSketches
+from .writers import encode_json, file_sha256
+
+MANIFEST_FILE = "manifest.json"
+
+# Per-process state of a pool worker, set up once by `_init_worker`.
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(pipeline_cls: type, output_dir: str, agent_type: str, shard_dir: str, ordered: bool,
+                 next_worker_id: Any, sketch_template: Optional[SynthesisSketches] = None,
+                 pipeline_options: Optional[Dict[str, Any]] = None):
+    with next_worker_id.get_lock():
+        worker_id = next_worker_id.value
+        next_worker_id.value += 1
+    pipeline = pipeline_cls(output_dir=output_dir, **(pipeline_options or {}))
+    _worker.update(
+        id=worker_id,
+        pipeline=pipeline,
+        agent_type=agent_type,
+        strategy=pipeline.get_synthesis_strategy(agent_type),
+        # Unordered workers append to their own shard; ordered workers hand examples back to the parent.
+        shard=None if ordered else open(os.path.join(shard_dir, shard_name(worker_id)), "ab"),
+        sketch_template=sketch_template,
+    )
+
+
+def _synthesize_chunk(chunk: List[Dict[str, Any]]) -> Tuple[int, int, int, float, Optional[List[Dict[str, Any]]],
+                                                              Optional[SynthesisSketches]]:
+    """
+    Applies the worker's strategy to one chunk.
+
+    Returns:
+        Tuple: worker id, sample count, example count, seconds, the examples
+               unless the worker wrote them to its own shard, and the chunk's
+               sketches if the run collects them.
+    """
+    start = time.perf_counter()
+    pipeline, agent_type, strategy = _worker["pipeline"], _worker["agent_type"], _worker["strategy"]
+    examples = []
+    for sample in chunk:
+        examples.extend(pipeline.transform_to_react_examples(sample, agent_type, strategy))
+    sketches = _worker["sketch_template"].empty_copy() if _worker["sketch_template"] is not None else None
+    if sketches is not None:
+        for example in examples:
+            sketches.observe(example)
+    shard = _worker["shard"]
+    if shard is not None:
+        shard.write(b"".join(encode_json(example) + b"\n" for example in examples))
+        shard.flush()  # Pool workers exit without running finalizers; never leave a chunk buffered.
+        return _worker["id"], len(chunk), len(examples), time.perf_counter() - start, None, sketches
+    return _worker["id"], len(chunk), len(examples), time.perf_counter() - start, examples, sketches
+
+
+def shard_name(index: int, extension: str = ".jsonl") -> str:
+    return f"shard-{index:05d}{extension}"
+
+
+def chunked(items: Iterable[Any], chunk_size: int) -> Iterator[List[Any]]:
+    """Groups an iterable into lists of up to `chunk_size` items without materializing it."""
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class SynthesisWorkerPool:
+    """
+    Applies a synthesis strategy over a sample stream with a pool of worker processes.
+
+    The stream is cut into chunks of `chunk_size` samples and at most
+    `max_pending_chunks` chunks are in flight, so memory stays bounded however
+    long the stream is. Unordered runs let every worker append to its own
+    shard and only statistics travel back to the parent; ordered runs send the
+    examples back and the parent writes them to a single shard in source
+    order. Either way a manifest records each shard's example count and
+    checksum plus per-worker throughput. Given `sketches`, each chunk's
+    statistics are sketched in its worker and merged into them. Each worker
+    builds its own `pipeline_cls(output_dir, **pipeline_options)`.
+    """
+
+    def __init__(self,
+                 pipeline_cls: type,
+                 output_dir: str,
+                 num_workers: int = 4,
+                 chunk_size: int = 256,
+                 max_pending_chunks: Optional[int] = None,
+                 start_method: Optional[str] = None,
+                 pipeline_options: Optional[Dict[str, Any]] = None):
+        if num_workers < 1:
+            raise ValueError("num_workers must be at least 1.")
+        self.pipeline_cls = pipeline_cls
+        self.output_dir = output_dir
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.max_pending_chunks = max_pending_chunks or 2 * num_workers
+        self.pipeline_options = pipeline_options or {}
+        self.context = multiprocessing.get_context(start_method)
+
+    def run(self,
+            samples: Iterable[Dict[str, Any]],
+            agent_type: str,
+            shard_dir: str,
+            ordered: bool = False,
+            metadata: Optional[Dict[str, Any]] = None,
+            sketches: Optional[SynthesisSketches] = None) -> Dict[str, Any]:
+        """
+        Synthesizes examples for `agent_type` from `samples` into shards under `shard_dir`.
+
+        Args:
+            samples (Iterable[Dict[str, Any]]): Processed samples; consumed lazily.
+            agent_type (str): The target agent type (e.g., "tanuki-coder").
+            shard_dir (str): Directory for the shards and manifest. Existing shards are replaced.
+            ordered (bool): Keep examples in source order (single shard written by the parent).
+            metadata (Optional[Dict[str, Any]]): Extra fields recorded in the manifest.
+            sketches (Optional[SynthesisSketches]): Sketches to merge the examples' statistics into.
+
+        Returns:
+            Dict[str, Any]: The manifest, also written to `shard_dir/manifest.json`.
+        """
+        os.makedirs(shard_dir, exist_ok=True)
+        for name in os.listdir(shard_dir):
+            if name.startswith("shard-") or name == MANIFEST_FILE:
+                os.remove(os.path.join(shard_dir, name))
+
+        workers: Dict[int, Dict[str, Any]] = collections.defaultdict(
+            lambda: {"chunks": 0, "samples": 0, "examples": 0, "busy_s": 0.0})
+        total_samples = 0
+        total_examples = 0
+        ordered_shard = open(os.path.join(shard_dir, shard_name(0)), "wb") if ordered else None
+        next_worker_id = self.context.Value("i", 0)
+
+        def collect(result: Tuple[int, int, int, float, Optional[List[Dict[str, Any]]], Optional[SynthesisSketches]]):
+            nonlocal total_samples, total_examples
+            worker_id, num_samples, num_examples, seconds, examples, chunk_sketches = result
+            if chunk_sketches is not None:
+                sketches.merge(chunk_sketches)
+            stats = workers[worker_id]
+            stats["chunks"] += 1
+            stats["samples"] += num_samples
+            stats["examples"] += num_examples
+            stats["busy_s"] += seconds
+            total_samples += num_samples
+            total_examples += num_examples
+            if examples is not None:
+                ordered_shard.write(b"".join(encode_json(example) + b"\n" for example in examples))
+
+        start = time.perf_counter()
+        try:
+            with self.context.Pool(self.num_workers, initializer=_init_worker,
+                                   initargs=(self.pipeline_cls, self.output_dir, agent_type, shard_dir, ordered,
+                                             next_worker_id,
+                                             sketches.empty_copy() if sketches is not None else None,
+                                             self.pipeline_options)) as pool:
+                # Pool.imap would drain the whole stream into its task queue; keep a bounded window instead.
+                pending: collections.deque = collections.deque()
+                for chunk in chunked(samples, self.chunk_size):
+                    pending.append(pool.apply_async(_synthesize_chunk, (chunk,)))
+                    if len(pending) >= self.max_pending_chunks:
+                        collect(pending.popleft().get())
+                while pending:
+                    collect(pending.popleft().get())
+                pool.close()
+                pool.join()
+        finally:
+            if ordered_shard is not None:
+                ordered_shard.close()
+        elapsed = time.perf_counter() - start
+
+        shards = []
+        for name in sorted(os.listdir(shard_dir)):
+            if not name.startswith("shard-"):
+                continue
+            path = os.path.join(shard_dir, name)
+            with open(path, "rb") as f:
+                count = sum(1 for _ in f)
+            shards.append({"path": name, "count": count, "bytes": os.path.getsize(path), "sha256": file_sha256(path)})
+
+        manifest = dict(metadata or {})
+        manifest.update({
+            "agent_type": agent_type,
+            "ordered": ordered,
+            "num_workers": self.num_workers,
+            "chunk_size": self.chunk_size,
+            "total_samples": total_samples,
+            "total_examples": total_examples,
+            "elapsed_s": elapsed,
+            "samples_per_s": total_samples / elapsed if elapsed > 0 else 0.0,
+            "shards": shards,
+            "workers": {
+                str(worker_id): dict(stats, samples_per_s=stats["samples"] / stats["busy_s"] if stats["busy_s"] else 0.0)
+                for worker_id, stats in sorted(workers.items())
+            },
+        })
+        with open(os.path.join(shard_dir, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
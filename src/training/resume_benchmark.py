@@ -0,0 +1,255 @@
+"""
+Checkpointed Synthesis Resume Benchmark
+
+Generates a synthetic local copy of `bigcode/the-stack-v2` records with
+re-emitted duplicates, and synthesizes it once without interruption as the
+reference. A checkpointed run over the same data is then started in a child
+process and SIGKILLed part-way through a segment, `--kills` times, each time
+restarted from its checkpoint, until a final restart completes it. The
+concatenated shards are compared with the reference example for example.
+
+Usage:
+    python -m src.training.resume_benchmark --samples 20000 --checkpoint-every 1000 --kills 3 \\
+        --output resume_bench.json [--no-dedup] [--output-format jsonl]
+
+Results are written as JSON; see `benchmarking`. tests/test_resume.py asserts
+that the resumed output is identical to the reference.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..core.benchmarking import benchmark_main, environment
+from .checkpoint import CHECKPOINT_FILE
+from .data_synthesis import DataSynthesisPipeline
+from .dedup import Deduplicator
+from .parallel_synthesis import MANIFEST_FILE
+from .synthesis_benchmark import SOURCE_DATASET, write_synthetic_stack
+from .writers import WRITERS, iter_records
+
+
+def add_duplicates(path: str, duplicate_rate: float = 0.1, seed: int = 0) -> int:
+    """
+    Rewrites a the-stack-v2-style JSONL file, re-emitting an earlier record's
+    content under a new hexsha and path after a `duplicate_rate` fraction of records.
+
+    Returns:
+        int: Records in the rewritten file.
+    """
+    rng = random.Random(seed)
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    count = 0
+    with open(path, "w") as f:
+        for i, record in enumerate(records):
+            f.write(json.dumps(record) + "\n")
+            count += 1
+            if i and rng.random() < duplicate_rate:
+                copy = dict(records[rng.randrange(i)], hexsha=f"{rng.getrandbits(160):040x}", path=f"vendor/copy_{i}.py")
+                f.write(json.dumps(copy) + "\n")
+                count += 1
+    return count
+
+
+def _run_child(data_file: str, output_dir: str, agent_type: str, num_samples: int, checkpoint_every: int,
+               dedup: bool, output_format: str, results: "multiprocessing.Queue"):
+    """Runs one (possibly checkpointed) pipeline pass; puts a result dict on `results`."""
+    try:
+        pipeline = DataSynthesisPipeline(output_dir=output_dir, output_format=output_format,
+                                         deduplicator=Deduplicator() if dedup else None)
+        start = time.perf_counter()
+        # tqdm and the pipeline's progress prints would drown the report.
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            count = pipeline.generate_and_store_react_data(SOURCE_DATASET, agent_type, num_samples=num_samples,
+                                                           data_files=data_file, checkpoint_every=checkpoint_every)
+        results.put({"stored": count, "seconds": time.perf_counter() - start})
+    except Exception as e:
+        results.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def _read_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class ResumeHarness:
+    """Starts, kills and restarts checkpointed pipeline runs in child processes."""
+
+    def __init__(self, data_file: str, agent_type: str, num_samples: int, checkpoint_every: int,
+                 dedup: bool, output_format: str):
+        self.data_file = data_file
+        self.agent_type = agent_type
+        self.num_samples = num_samples
+        self.checkpoint_every = checkpoint_every
+        self.dedup = dedup
+        self.output_format = output_format
+        self.context = multiprocessing.get_context("fork" if sys.platform.startswith("linux") else "spawn")
+
+    def start(self, output_dir: str, checkpoint_every: int) -> Tuple[Any, Any]:
+        """Starts a run in a child process. Returns the process and the queue its result arrives on."""
+        results = self.context.Queue()
+        child = self.context.Process(target=_run_child, args=(
+            self.data_file, output_dir, self.agent_type, self.num_samples, checkpoint_every, self.dedup,
+            self.output_format, results))
+        child.start()
+        return child, results
+
+    def run_to_completion(self, output_dir: str, checkpoint_every: int) -> Dict[str, Any]:
+        child, results = self.start(output_dir, checkpoint_every)
+        result = results.get()
+        child.join()
+        return result
+
+    def kill_after(self, output_dir: str, checkpoint_path: str, position: int, fraction: float) -> Dict[str, Any]:
+        """
+        Starts a run, waits until its checkpoint passes `position`, lets it
+        work `fraction` of a segment longer, and SIGKILLs it. The segment's
+        duration is taken from the run's own last two checkpoints, so start-up
+        time does not skew it.
+        """
+        child, _ = self.start(output_dir, self.checkpoint_every)
+        changes: List[Tuple[float, Optional[int]]] = []  # (time, position) whenever the checkpoint moves
+        while child.is_alive():
+            state = _read_checkpoint(checkpoint_path)
+            current = state["position"] if state is not None else None
+            if not changes or changes[-1][1] != current:
+                changes.append((time.perf_counter(), current))
+            # The first change may span start-up (or be the checkpoint an earlier run left); it is not timed.
+            if current is not None and current >= position and len(changes) >= 3:
+                break
+            time.sleep(0.002)
+        segment_s = changes[-1][0] - changes[-2][0] if len(changes) >= 3 else 0.0
+        time.sleep(fraction * segment_s)
+        interrupted = child.is_alive()
+        child.kill()
+        child.join()
+        state = _read_checkpoint(checkpoint_path) or {}
+        return {
+            "target_position": position,
+            "interrupted": interrupted,
+            "checkpoint_position": state.get("position", 0),
+            "shards_done": len(state.get("shards", [])),
+            "complete": state.get("complete", False),
+        }
+
+
+def read_shards(shard_dir: str) -> List[Dict[str, Any]]:
+    """Reads a checkpointed run's output: every shard in manifest order."""
+    with open(os.path.join(shard_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    return [record for shard in manifest["shards"] for record in iter_records(os.path.join(shard_dir, shard["path"]))]
+
+
+def run_benchmark(num_samples: int = 20000,
+                  checkpoint_every: int = 1000,
+                  kills: int = 3,
+                  agent_type: str = "tanuki-coder",
+                  dedup: bool = True,
+                  output_format: str = "jsonl",
+                  duplicate_rate: float = 0.1,
+                  seed: int = 0,
+                  work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Runs the reference pass, then the killed and resumed checkpointed pass, and compares their output.
+
+    Returns:
+        Dict[str, Any]: Environment info, the configuration, per-kill checkpoints,
+                        timings and the comparison.
+    """
+    rng = random.Random(seed)
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="resume_bench_")
+    try:
+        data_file = os.path.join(work_dir, "the-stack-v2.jsonl")
+        write_synthetic_stack(data_file, num_samples, mean_content_bytes=512, seed=seed)
+        records = add_duplicates(data_file, duplicate_rate, seed)
+        harness = ResumeHarness(data_file, agent_type, num_samples, checkpoint_every, dedup, output_format)
+
+        name = f"{agent_type}_train_react_data"
+        reference_dir = os.path.join(work_dir, "reference")
+        reference = harness.run_to_completion(reference_dir, checkpoint_every=0)
+        if "error" in reference:
+            raise RuntimeError(f"Reference run failed: {reference['error']}")
+        expected = list(iter_records(os.path.join(reference_dir, name + WRITERS[output_format].extension)))
+
+        resumed_dir = os.path.join(work_dir, "resumed")
+        checkpoint_path = os.path.join(resumed_dir, ".checkpoints", name, CHECKPOINT_FILE)
+        interruptions = []
+        for i in range(kills):
+            # Kill somewhere inside the segment after the target, not on a checkpoint boundary.
+            target = (i + 1) * num_samples // (kills + 1)
+            interruptions.append(harness.kill_after(resumed_dir, checkpoint_path, target, rng.uniform(0.2, 0.8)))
+        final = harness.run_to_completion(resumed_dir, checkpoint_every)
+        if "error" in final:
+            raise RuntimeError(f"Resumed run failed: {final['error']}")
+        actual = read_shards(os.path.join(resumed_dir, name))
+        state = _read_checkpoint(checkpoint_path)
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    mismatch = next((i for i, (a, b) in enumerate(zip(expected, actual)) if a != b), None)
+    return {
+        "environment": environment(),
+        "config": {
+            "num_samples": num_samples,
+            "dataset_records": records,
+            "checkpoint_every": checkpoint_every,
+            "kills": kills,
+            "agent_type": agent_type,
+            "dedup": dedup,
+            "output_format": output_format,
+        },
+        "reference": dict(reference, examples=len(expected)),
+        "interruptions": interruptions,
+        "final_run": dict(final, resumed_from=interruptions[-1]["checkpoint_position"] if interruptions else 0,
+                          shards=len(state["shards"]), dedup_stats=(state["dedup"] or {}).get("stats")),
+        "resumed_examples": len(actual),
+        "first_mismatch": mismatch,
+        "identical": mismatch is None and len(expected) == len(actual),
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--samples", dest="num_samples", type=int, default=20000)
+    parser.add_argument("--checkpoint-every", type=int, default=1000)
+    parser.add_argument("--kills", type=int, default=3)
+    parser.add_argument("--agent-type", type=str, default="tanuki-coder")
+    parser.add_argument("--no-dedup", dest="dedup", action="store_false", help="Run without the deduplicator.")
+    parser.add_argument("--output-format", type=str, default="jsonl", choices=list(WRITERS))
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", type=str, default=None, help="Keep the dataset and outputs here.")
+
+
+def report(results: Dict[str, Any]):
+    for interruption in results["interruptions"]:
+        state = "after the run ended" if not interruption["interrupted"] else \
+            f"with the checkpoint at record {interruption['checkpoint_position']}"
+        print(f"Killed {state} ({interruption['shards_done']} shards done, "
+              f"waited for record {interruption['target_position']})")
+    print(f"Reference: {results['reference']['examples']} examples in {results['reference']['seconds']:.1f}s; "
+          f"resumed run: {results['resumed_examples']} examples, final restart took "
+          f"{results['final_run']['seconds']:.1f}s; identical: {results['identical']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return benchmark_main(run_benchmark, argv, "Kill and resume a checkpointed synthesis run.",
+                          "resume_bench.json", add_arguments, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
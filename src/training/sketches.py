@@ -0,0 +1,379 @@
+import argparse
+import base64
+import collections
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import zlib
+from typing import Callable, Dict, Any, Iterable, List, Optional, Union
+
+import numpy as np
+
+DEFAULT_HLL_PRECISION = 12
+DEFAULT_KLL_K = 200
+REPORT_QUANTILES = (0.5, 0.9, 0.95, 0.99, 0.999)
+# Suggested max_length values are rounded up to a multiple of this.
+MAX_LENGTH_MULTIPLE = 64
+UNKNOWN_LANGUAGE = "unknown"
+
+# Word pieces and single punctuation marks: a tokenizer-free stand-in for BPE token counts.
+_APPROX_TOKEN = re.compile(r"\w+|[^\w\s]")
+# Text fields of the example formats the strategies produce, in training order. Examples
+# split into token windows carry their text in "text".
+TEXT_FIELDS = ("text", "prompt", "instruction", "thought", "completion", "final_answer")
+
+
+def example_text(example: Dict[str, Any]) -> str:
+    """The text an example contributes to training: its prompt/instruction and response fields."""
+    return "\n".join(example[field] for field in TEXT_FIELDS if isinstance(example.get(field), str))
+
+
+def approximate_token_count(text: str) -> int:
+    """Counts word pieces and punctuation marks; close to, and usually below, a code BPE's count."""
+    return sum(1 for _ in _APPROX_TOKEN.finditer(text))
+
+
+class HyperLogLog:
+    """
+    Approximate distinct counter using 2**precision one-byte registers
+    (relative error about 1.04 / sqrt(2**precision)). Sketches with the same
+    precision merge by taking the register-wise maximum.
+    """
+
+    def __init__(self, precision: int = DEFAULT_HLL_PRECISION):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"HyperLogLog precision must be between 4 and 18, got {precision}.")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, value: Union[str, bytes]):
+        data = value.encode("utf-8") if isinstance(value, str) else value
+        hashed = int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+        index = hashed >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rank = rest_bits - (hashed & ((1 << rest_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}.")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)  # Linear counting is more accurate for small cardinalities.
+        return raw
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"precision": self.precision,
+                "registers": base64.b64encode(zlib.compress(self.registers.tobytes())).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "HyperLogLog":
+        sketch = cls(state["precision"])
+        sketch.registers = np.frombuffer(zlib.decompress(base64.b64decode(state["registers"])), dtype=np.uint8).copy()
+        return sketch
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang and Liberty). Keeps a hierarchy of
+    compactors whose capacities shrink geometrically below the top level;
+    a full compactor sorts itself and promotes every other item, at twice
+    the weight, to the level above. Uses O(k) memory for rank error about
+    1.7 / k, and sketches merge level by level. Compaction offsets come from
+    a seeded generator, so results are reproducible.
+    """
+
+    def __init__(self, k: int = DEFAULT_KLL_K, seed: int = 0):
+        self.k = k
+        self.compactors: List[List[float]] = [[]]
+        self.size = 0
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._rng = random.Random(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _compress(self):
+        while self.size >= self._max_size():
+            for level, items in enumerate(self.compactors):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    items.sort()
+                    promoted = items[self._rng.randint(0, 1)::2]
+                    self.compactors[level + 1].extend(promoted)
+                    self.size += len(promoted) - len(items)
+                    self.compactors[level] = []
+                    break
+
+    def update(self, value: float):
+        self.compactors[0].append(value)
+        self.size += 1
+        self.count += 1
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+        if self.size >= self._max_size():
+            self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.size = sum(map(len, self.compactors))
+        self.count += other.count
+        for bound in (other.min, other.max):
+            if bound is not None:
+                self.min = bound if self.min is None or bound < self.min else self.min
+                self.max = bound if self.max is None or bound > self.max else self.max
+        self._compress()
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        """Approximate values at each rank fraction in `qs`; exact at 0 and 1."""
+        weighted = sorted((value, 1 << level) for level, items in enumerate(self.compactors) for value in items)
+        total = sum(weight for _, weight in weighted)
+        results = []
+        for q in qs:
+            if not weighted:
+                results.append(None)
+            elif q <= 0:
+                results.append(self.min)
+            elif q >= 1:
+                results.append(self.max)
+            else:
+                target = q * total
+                cumulative = 0
+                for value, weight in weighted:
+                    cumulative += weight
+                    if cumulative >= target:
+                        results.append(value)
+                        break
+        return results
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"k": self.k, "count": self.count, "min": self.min, "max": self.max, "compactors": self.compactors}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "KLLSketch":
+        sketch = cls(state["k"])
+        sketch.compactors = [list(items) for items in state["compactors"]] or [[]]
+        sketch.size = sum(map(len, sketch.compactors))
+        sketch.count = state["count"]
+        sketch.min, sketch.max = state["min"], state["max"]
+        return sketch
+
+
+def suggested_max_length(tokens_p99: Optional[float]) -> Optional[int]:
+    """The 99th percentile token length, rounded up to a multiple of `MAX_LENGTH_MULTIPLE`."""
+    if tokens_p99 is None:
+        return None
+    return int(math.ceil(max(tokens_p99, 1) / MAX_LENGTH_MULTIPLE) * MAX_LENGTH_MULTIPLE)
+
+
+class GroupSketch:
+    """Example count, distinct examples and character/token length quantiles of one group of examples."""
+
+    def __init__(self, precision: int = DEFAULT_HLL_PRECISION, k: int = DEFAULT_KLL_K):
+        self.count = 0
+        self.distinct = HyperLogLog(precision)
+        self.chars = KLLSketch(k)
+        self.tokens = KLLSketch(k)
+        self.total_chars = 0
+        self.total_tokens = 0
+
+    def add(self, text: str, num_tokens: int):
+        self.count += 1
+        self.distinct.add(text)
+        self.chars.update(len(text))
+        self.tokens.update(num_tokens)
+        self.total_chars += len(text)
+        self.total_tokens += num_tokens
+
+    def merge(self, other: "GroupSketch"):
+        self.count += other.count
+        self.distinct.merge(other.distinct)
+        self.chars.merge(other.chars)
+        self.tokens.merge(other.tokens)
+        self.total_chars += other.total_chars
+        self.total_tokens += other.total_tokens
+
+    def summary(self, quantiles: Iterable[float] = REPORT_QUANTILES) -> Dict[str, Any]:
+        quantiles = list(quantiles)
+
+        def lengths(sketch: KLLSketch, total: int) -> Dict[str, Any]:
+            values = dict(zip((f"p{q * 100:g}" for q in quantiles), sketch.quantiles(quantiles)))
+            return dict(values, min=sketch.min, max=sketch.max, mean=total / self.count if self.count else None)
+
+        tokens = lengths(self.tokens, self.total_tokens)
+        return {
+            "examples": self.count,
+            "distinct_examples": min(self.count, round(self.distinct.estimate())),
+            "chars": lengths(self.chars, self.total_chars),
+            "tokens": tokens,
+            "total_tokens": self.total_tokens,
+            "suggested_max_length": suggested_max_length(self.tokens.quantiles([0.99])[0]),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "distinct": self.distinct.to_dict(), "chars": self.chars.to_dict(),
+                "tokens": self.tokens.to_dict(), "total_chars": self.total_chars, "total_tokens": self.total_tokens}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "GroupSketch":
+        sketch = cls()
+        sketch.count = state["count"]
+        sketch.distinct = HyperLogLog.from_dict(state["distinct"])
+        sketch.chars = KLLSketch.from_dict(state["chars"])
+        sketch.tokens = KLLSketch.from_dict(state["tokens"])
+        sketch.total_chars = state["total_chars"]
+        sketch.total_tokens = state["total_tokens"]
+        return sketch
+
+
+class SynthesisSketches:
+    """
+    Streaming statistics of synthesized examples, per agent type and language.
+
+    Each (agent type, language) group keeps a `GroupSketch`. Sketches from
+    worker shards or checkpoint segments merge into one, and `report()`
+    gives per-agent totals, per-language breakdowns and a suggested
+    `max_length` for training. Token lengths are the examples' stored
+    "token_count" where they have one, otherwise they come from
+    `token_counter`, e.g. a tokenizer's `encode`, or are approximated.
+    """
+
+    def __init__(self,
+                 token_counter: Optional[Callable[[str], int]] = None,
+                 precision: int = DEFAULT_HLL_PRECISION,
+                 k: int = DEFAULT_KLL_K):
+        """
+        Args:
+            token_counter (Optional[Callable[[str], int]]): Tokens in a text. Defaults to
+                                                            `approximate_token_count`.
+            precision (int): HyperLogLog precision; 2**precision bytes per group.
+            k (int): KLL accuracy parameter; rank error is about 1.7 / k.
+        """
+        self.token_counter = token_counter or approximate_token_count
+        self.tokens_approximate = token_counter is None
+        self.precision = precision
+        self.k = k
+        self.groups: Dict[str, Dict[str, GroupSketch]] = collections.defaultdict(dict)
+
+    def empty_copy(self) -> "SynthesisSketches":
+        """New, empty sketches with the same settings, e.g. for a worker whose sketches are merged back."""
+        return SynthesisSketches(None if self.tokens_approximate else self.token_counter, self.precision, self.k)
+
+    def observe(self, example: Dict[str, Any], agent_type: Optional[str] = None):
+        """Adds one example, under its agent type and language unless `agent_type` is given."""
+        agent_type = agent_type or example.get("agent_type") or "unknown"
+        language = str(example.get("language") or UNKNOWN_LANGUAGE).lower()
+        group = self.groups[agent_type].get(language)
+        if group is None:
+            group = self.groups[agent_type][language] = GroupSketch(self.precision, self.k)
+        text = example_text(example)
+        num_tokens = example.get("token_count")  # Stored by a `TokenLengthAnnotator`.
+        group.add(text, num_tokens if isinstance(num_tokens, int) else self.token_counter(text))
+
+    def observe_all(self, examples: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+        """Observes examples as they pass through, unchanged."""
+        for example in examples:
+            self.observe(example)
+            yield example
+
+    def merge(self, other: "SynthesisSketches"):
+        for agent_type, languages in other.groups.items():
+            for language, group in languages.items():
+                if language in self.groups[agent_type]:
+                    self.groups[agent_type][language].merge(group)
+                else:
+                    self.groups[agent_type][language] = GroupSketch.from_dict(group.to_dict())
+
+    def report(self, quantiles: Iterable[float] = REPORT_QUANTILES) -> Dict[str, Any]:
+        """Per agent type: a summary over all languages, per-language summaries and counts."""
+        quantiles = list(quantiles)
+        agents = {}
+        for agent_type, languages in sorted(self.groups.items()):
+            total = GroupSketch(self.precision, self.k)
+            for group in languages.values():
+                total.merge(group)
+            agents[agent_type] = dict(
+                total.summary(quantiles),
+                language_counts={language: group.count for language, group in
+                                 sorted(languages.items(), key=lambda item: -item[1].count)},
+                languages={language: group.summary(quantiles) for language, group in sorted(languages.items())},
+            )
+        return {"tokens_approximate": self.tokens_approximate, "agents": agents}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"precision": self.precision, "k": self.k, "tokens_approximate": self.tokens_approximate,
+                "groups": {agent_type: {language: group.to_dict() for language, group in languages.items()}
+                           for agent_type, languages in self.groups.items()}}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any], token_counter: Optional[Callable[[str], int]] = None
+                  ) -> "SynthesisSketches":
+        sketches = cls(token_counter, state["precision"], state["k"])
+        sketches.tokens_approximate = state["tokens_approximate"]
+        for agent_type, languages in state["groups"].items():
+            for language, group in languages.items():
+                sketches.groups[agent_type][language] = GroupSketch.from_dict(group)
+        return sketches
+
+    def write_report(self, path: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Writes the report, with the mergeable sketch state under "sketches", as JSON. Returns the report."""
+        report = dict(self.report(), metadata=metadata or {}, sketches=self.to_dict())
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, path)
+        return report
+
+
+def load_report(path: str) -> SynthesisSketches:
+    """The mergeable sketches of a report written by `write_report`."""
+    with open(path) as f:
+        return SynthesisSketches.from_dict(json.load(f)["sketches"])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Merge synthesis statistics reports and summarize them.")
+    parser.add_argument("reports", nargs="+", help="Reports written during synthesis (*.stats.json).")
+    parser.add_argument("--output", type=str, default=None, help="Write the merged report here.")
+    args = parser.parse_args(argv)
+
+    merged = load_report(args.reports[0])
+    for path in args.reports[1:]:
+        merged.merge(load_report(path))
+    report = merged.write_report(args.output, {"merged_from": args.reports}) if args.output else merged.report()
+    for agent_type, summary in report["agents"].items():
+        tokens = summary["tokens"]
+        print(f"{agent_type}: {summary['examples']} examples (~{summary['distinct_examples']} distinct), "
+              f"tokens p50={tokens['p50']} p99={tokens['p99']} max={tokens['max']}, "
+              f"suggested max_length={summary['suggested_max_length']}")
+        print("  languages: " + ", ".join(f"{language}={count}" for language, count in
+                                          summary["language_counts"].items()))
+    if args.output:
+        print(f"Merged report written to {args.output}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Synthesis Statistics Sketch Benchmark
+
+Streams synthetic examples with long-tailed lengths and a known share of
+duplicates through `SynthesisSketches`, once in a single stream and once
+split across shards whose serialized sketches are merged, as the worker pool
+and checkpoints do. Compares the sketched token-length quantiles and
+distinct counts with exact values computed from all lengths and texts.
+
+Usage:
+    python -m src.training.sketches_benchmark --examples 200000 --shards 8 --output sketches_bench.json
+
+Results are written as JSON; see `benchmarking`. The error bounds are tested
+in tests/test_sketches.py.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from ..core.benchmarking import benchmark_main, environment
+from .sketches import DEFAULT_KLL_K, REPORT_QUANTILES, SynthesisSketches, example_text
+
+_WORDS = ("def", "return", "self", "value", "(", ")", ":", "=", "+", "items", "for", "in", "if", "None", ",")
+_LANGUAGES = ("python", "javascript", "go", "rust")
+
+
+def make_examples(num_examples: int, duplicate_rate: float = 0.1, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Examples whose completions have log-normally distributed lengths. A
+    `duplicate_rate` share repeats an earlier example exactly.
+    """
+    rng = random.Random(seed)
+    examples = []
+    for index in range(num_examples):
+        if examples and rng.random() < duplicate_rate:
+            examples.append(rng.choice(examples))
+            continue
+        length = max(1, int(rng.lognormvariate(4.5, 0.9)))
+        examples.append({
+            "agent_type": "tanuki-coder",
+            "language": rng.choice(_LANGUAGES),
+            "prompt": f"Task {index}",
+            "completion": " ".join(rng.choice(_WORDS) for _ in range(length)),
+        })
+    return examples
+
+
+def _rank_errors(sketched: List[Optional[float]], exact_sorted: np.ndarray) -> Dict[str, float]:
+    """How far, as a rank fraction, each sketched quantile lies from its target rank."""
+    errors = {}
+    for q, value in zip(REPORT_QUANTILES, sketched):
+        low = np.searchsorted(exact_sorted, value, side="left") / len(exact_sorted)
+        high = np.searchsorted(exact_sorted, value, side="right") / len(exact_sorted)
+        # Tied values cover a range of ranks; the error is the distance to that range.
+        errors[f"p{q * 100:g}"] = float(max(low - q, q - high, 0.0))
+    return errors
+
+
+def _accuracy(sketches: SynthesisSketches, exact_tokens: np.ndarray, exact_distinct: int) -> Dict[str, Any]:
+    summary = sketches.report()["agents"]["tanuki-coder"]
+    rank_errors = _rank_errors([summary["tokens"][f"p{q * 100:g}"] for q in REPORT_QUANTILES], exact_tokens)
+    return {
+        "examples": summary["examples"],
+        "tokens": summary["tokens"],
+        "distinct_examples": summary["distinct_examples"],
+        "distinct_relative_error": abs(summary["distinct_examples"] - exact_distinct) / exact_distinct,
+        "rank_errors": rank_errors,
+        "max_rank_error": max(rank_errors.values()),
+        "state_bytes": len(json.dumps(sketches.to_dict())),
+    }
+
+
+def run_benchmark(num_examples: int = 200000,
+                  num_shards: int = 8,
+                  duplicate_rate: float = 0.1,
+                  k: int = DEFAULT_KLL_K,
+                  seed: int = 0) -> Dict[str, Any]:
+    """
+    Sketches one example stream whole and in `num_shards` merged shards.
+
+    Returns:
+        Dict[str, Any]: Environment info, the configuration, exact values and both runs' accuracy.
+    """
+    examples = make_examples(num_examples, duplicate_rate, seed)
+    texts = [example_text(example) for example in examples]
+
+    template = SynthesisSketches(k=k)
+    exact_tokens = np.sort(np.array([template.token_counter(text) for text in texts]))
+    exact_distinct = len(set(texts))
+    exact_bytes = sum(len(text.encode("utf-8")) for text in set(texts)) + exact_tokens.nbytes
+
+    single = template.empty_copy()
+    start = time.perf_counter()
+    for example in examples:
+        single.observe(example)
+    observe_s = time.perf_counter() - start
+
+    merged = template.empty_copy()
+    for shard in range(num_shards):
+        sketches = template.empty_copy()
+        for example in examples[shard::num_shards]:
+            sketches.observe(example)
+        # Shards travel between processes and checkpoints as their serialized state.
+        merged.merge(SynthesisSketches.from_dict(json.loads(json.dumps(sketches.to_dict()))))
+
+    exact = {f"p{q * 100:g}": float(np.quantile(exact_tokens, q, method="inverted_cdf")) for q in REPORT_QUANTILES}
+    return {
+        "environment": environment(),
+        "config": {
+            "num_examples": num_examples,
+            "num_shards": num_shards,
+            "duplicate_rate": duplicate_rate,
+            "k": k,
+            "seed": seed,
+        },
+        "exact": {"tokens": exact, "distinct_examples": exact_distinct, "state_bytes": exact_bytes},
+        "single": _accuracy(single, exact_tokens, exact_distinct),
+        "merged": _accuracy(merged, exact_tokens, exact_distinct),
+        "observe_examples_per_s": num_examples / observe_s if observe_s > 0 else 0.0,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--examples", type=int, default=200000, dest="num_examples")
+    parser.add_argument("--shards", type=int, default=8, dest="num_shards")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--k", type=int, default=DEFAULT_KLL_K)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def report(results: Dict[str, Any]):
+    exact = results["exact"]
+    print(f"exact: p50={exact['tokens']['p50']:.0f} p99={exact['tokens']['p99']:.0f} tokens, "
+          f"{exact['distinct_examples']} distinct")
+    for name in ("single", "merged"):
+        run = results[name]
+        print(f"{name}: p50={run['tokens']['p50']} p99={run['tokens']['p99']} tokens, "
+              f"~{run['distinct_examples']} distinct ({run['distinct_relative_error']:.2%} off), "
+              f"max rank error {run['max_rank_error']:.4f}, {run['state_bytes']} bytes of state")
+    print(f"observe: {results['observe_examples_per_s']:.0f} examples/s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return benchmark_main(run_benchmark, argv, "Benchmark the accuracy of synthesis statistics sketches.",
+                          "sketches_bench.json", add_arguments, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
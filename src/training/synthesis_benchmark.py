@@ -0,0 +1,186 @@
+"""
+Synthesis Pipeline Memory and Throughput Benchmark
+
+Generates a synthetic local copy of `bigcode/the-stack-v2` records, then runs
+`DataSynthesisPipeline.generate_and_store_react_data` over it at several
+sample counts, each in a fresh child process. The child samples its own RSS
+while the pipeline runs, so the peak growth of a small run and a large run can
+be compared: a streaming pipeline stays flat, one that materializes the
+dataset grows with it.
+
+Usage:
+    python -m src.training.synthesis_benchmark --sizes 5000,50000 --agent-type tanuki-coder \\
+        --output synthesis_bench.json
+
+Results are written as JSON; see `benchmarking`. tests/test_synthesis_memory.py
+asserts that the growth stays bounded.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+import psutil
+
+from ..core.benchmarking import benchmark_main, comma_separated, environment
+from .data_synthesis import DataSynthesisPipeline
+
+SOURCE_DATASET = "bigcode/the-stack-v2"
+WARMUP_SAMPLES = 100
+
+
+def write_synthetic_stack(path: str, num_records: int, mean_content_bytes: int = 2048, seed: int = 0) -> int:
+    """
+    Writes `num_records` the-stack-v2-style records (hexsha, content, lang, path) as JSONL.
+
+    Returns:
+        int: Bytes written.
+    """
+    rng = random.Random(seed)
+    written = 0
+    with open(path, "w") as f:
+        for i in range(num_records):
+            body_lines = max(1, int(rng.expovariate(1.0) * mean_content_bytes / 32))
+            content = (f'def function_{i}(x):\n    """Returns x transformed by step {i}."""\n'
+                       + "".join(f"    x = x + {rng.randint(0, 999)}\n" for _ in range(body_lines))
+                       + "    return x\n")
+            line = json.dumps({
+                "hexsha": f"{rng.getrandbits(160):040x}",
+                "content": content,
+                "lang": "Python",
+                "path": f"pkg/module_{i}.py",
+            }) + "\n"
+            f.write(line)
+            written += len(line)
+    return written
+
+
+def _sample_peak_rss(process: psutil.Process, stop: threading.Event, peak: List[int], interval_s: float):
+    while not stop.wait(interval_s):
+        peak[0] = max(peak[0], process.memory_info().rss)
+
+
+def _measure_child(data_files: str, agent_type: str, num_samples: int, output_dir: str,
+                   interval_s: float, results: "multiprocessing.Queue"):
+    """
+    Runs one pipeline pass while sampling RSS; puts a result dict on `results`.
+
+    A short warm-up pass runs first, so the modules the pipeline imports
+    lazily (datasets, pyarrow, tokenizers) are in the baseline, not the growth.
+    """
+    try:
+        process = psutil.Process()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            DataSynthesisPipeline(output_dir=os.path.join(output_dir, "warmup")).generate_and_store_react_data(
+                SOURCE_DATASET, agent_type, num_samples=min(WARMUP_SAMPLES, num_samples), data_files=data_files)
+        pipeline = DataSynthesisPipeline(output_dir=output_dir)
+        baseline = process.memory_info().rss
+        peak = [baseline]
+        stop = threading.Event()
+        sampler = threading.Thread(target=_sample_peak_rss, args=(process, stop, peak, interval_s), daemon=True)
+        sampler.start()
+        start = time.perf_counter()
+        # tqdm and the pipeline's progress prints would drown the report.
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            count = pipeline.generate_and_store_react_data(SOURCE_DATASET, agent_type, num_samples=num_samples,
+                                                           data_files=data_files)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        sampler.join()
+        peak[0] = max(peak[0], process.memory_info().rss)
+        results.put({
+            "num_samples": num_samples,
+            "stored": count,
+            "seconds": elapsed,
+            "samples_per_s": count / elapsed if elapsed > 0 else 0.0,
+            "rss_baseline_mb": baseline / 1024**2,
+            "rss_peak_mb": peak[0] / 1024**2,
+            "rss_growth_mb": (peak[0] - baseline) / 1024**2,
+        })
+    except Exception as e:
+        results.put({"num_samples": num_samples, "error": f"{type(e).__name__}: {e}"})
+
+
+def measure_run(data_files: str, agent_type: str, num_samples: int, output_dir: str,
+                interval_s: float = 0.005) -> Dict[str, Any]:
+    """Runs the pipeline over `num_samples` records in a fresh process and returns its RSS and throughput."""
+    # A fresh process per run keeps allocator state from earlier runs out of the measurement.
+    context = multiprocessing.get_context("fork" if sys.platform.startswith("linux") else "spawn")
+    results = context.Queue()
+    child = context.Process(target=_measure_child,
+                            args=(data_files, agent_type, num_samples, output_dir, interval_s, results))
+    child.start()
+    result = results.get()
+    child.join()
+    return result
+
+
+def run_benchmark(sizes: Optional[List[int]] = None,
+                  agent_type: str = "tanuki-coder",
+                  mean_content_bytes: int = 2048,
+                  work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Runs the pipeline at each size over one synthetic dataset holding `max(sizes)` records.
+
+    Returns:
+        Dict[str, Any]: Environment info, the configuration, per-size results and, across
+                        runs, how much more the largest run's peak RSS grew than the smallest's.
+    """
+    sizes = sorted(sizes or [5000, 50000])
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="synthesis_bench_")
+    try:
+        data_file = os.path.join(work_dir, "the-stack-v2.jsonl")
+        dataset_bytes = write_synthetic_stack(data_file, sizes[-1], mean_content_bytes)
+        runs = [measure_run(data_file, agent_type, size, os.path.join(work_dir, f"out_{size}")) for size in sizes]
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    measured = [run for run in runs if "error" not in run]
+    return {
+        "environment": environment(),
+        "config": {
+            "sizes": sizes,
+            "agent_type": agent_type,
+            "mean_content_bytes": mean_content_bytes,
+            "dataset_mb": dataset_bytes / 1024**2,
+        },
+        "runs": runs,
+        "rss_growth_delta_mb": measured[-1]["rss_growth_mb"] - measured[0]["rss_growth_mb"] if measured else None,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--sizes", type=comma_separated(int), default=[5000, 50000], help="Comma-separated sample counts.")
+    parser.add_argument("--agent-type", type=str, default="tanuki-coder")
+    parser.add_argument("--mean-content-bytes", type=int, default=2048)
+    parser.add_argument("--work-dir", type=str, default=None, help="Keep the dataset and outputs here.")
+
+
+def report(results: Dict[str, Any]):
+    for run in results["runs"]:
+        if "error" in run:
+            print(f"{run['num_samples']:>10} samples: {run['error']}")
+            continue
+        print(f"{run['num_samples']:>10} samples: {run['samples_per_s']:.0f} samples/s, "
+              f"peak RSS growth {run['rss_growth_mb']:.1f}MB")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return benchmark_main(run_benchmark, argv, "Benchmark synthesis pipeline memory use and throughput.",
+                          "synthesis_bench.json", add_arguments, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
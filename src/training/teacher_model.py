@@ -1,10 +1,11 @@
 import os
-import json
 import time
 from typing import Dict, Any, List, Optional
 from transformers import AutoModelForCausalLM, AutoTokenizer
 from tqdm import tqdm
 
+from .writers import store_records
+
 class TeacherModel:
     """
     Sets up and uses a teacher model (e.g., DeepSeek-Coder-33B-Instruct) for inference
@@ -92,7 +93,8 @@ class TeacherModel:
     def generate_and_store_reward_data(self,
                                        raw_data_samples: List[Dict[str, Any]],
                                        output_file_path: str,
-                                       percentage_to_process: float = 0.02 # 1-2% as per task
+                                       percentage_to_process: float = 0.02, # 1-2% as per task
+                                       versioned: bool = False
                                       ):
         """
         Generates high-quality reward examples for a subset of the most complex data
@@ -100,8 +102,10 @@ class TeacherModel:
 
         Args:
             raw_data_samples (List[Dict[str, Any]]): A list of raw data samples (e.g., from data synthesis).
-            output_file_path (str): Path to store the generated reward data (JSONL format).
+            output_file_path (str): Path to store the generated reward data. The extension picks the
+                                    format: .jsonl, .jsonl.zst, .parquet or .arrow.
             percentage_to_process (float): The percentage of data samples to process.
+            versioned (bool): Publish a new content-addressed version instead of replacing the file.
         """
         if not raw_data_samples:
             print("No raw data samples provided for reward generation.")
@@ -127,18 +131,20 @@ class TeacherModel:
             else:
                 print(f"Skipping reward example for sample {i} due to error: {reward_example['message']}")
 
-        self._store_data(reward_examples, output_file_path)
-        print(f"Successfully generated and stored {len(reward_examples)} reward examples in '{output_file_path}'.")
+        stored_path = self._store_data(reward_examples, output_file_path, versioned)
+        print(f"Successfully generated and stored {len(reward_examples)} reward examples in '{stored_path}'.")
 
-    def _store_data(self, data: List[Dict[str, Any]], file_path: str):
+    def _store_data(self, data: List[Dict[str, Any]], file_path: str, versioned: bool = False) -> str:
         """
-        Stores the generated data in a JSONL format.
+        Stores the generated data in the format given by the file extension (JSONL by default).
+
+        Returns:
+            str: The path written, inside a new version directory if `versioned`.
         """
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "w") as f:
-            for entry in data:
-                f.write(json.dumps(entry) + "\n")
-        print(f"Data stored to {file_path}.")
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        stored = store_records(data, file_path, versioned=versioned)
+        print(f"Data stored to {stored['path']}.")
+        return stored["path"]
 
 if __name__ == "__main__":
     # Example usage
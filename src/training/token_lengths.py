@@ -0,0 +1,191 @@
+import bisect
+import collections
+import hashlib
+import time
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Sequence, Union
+
+from .parallel_synthesis import chunked
+from .sketches import TEXT_FIELDS, example_text
+
+OVERLONG_POLICIES = ("split", "drop")
+DEFAULT_LENGTH_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+DEFAULT_CACHE_SIZE = 100000
+
+
+def load_tokenizer(name_or_path: str) -> Any:
+    """Loads a Hugging Face tokenizer by model id or local path."""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(name_or_path)
+
+
+class TokenLengthAnnotator:
+    """
+    Stores the token count of each synthesized example under the training tokenizer.
+
+    Examples are tokenized in batches, which fast tokenizers encode in
+    parallel, and counts are cached by a digest of the example's text, so a
+    text seen before is not tokenized again. Each example gets "token_count",
+    including the special tokens the tokenizer adds, and "length_bucket", the
+    smallest bucket boundary that holds it, so training can group batches by
+    length without tokenizing first.
+
+    Examples longer than `max_length` are handled here rather than truncated
+    silently in training. "split" cuts their text into consecutive windows of
+    at most `max_length` tokens, each stored as its own example: the
+    original's fields, with its text fields cleared and the window in
+    "text". "drop" discards them. Every annotated example has "text", "part"
+    and "num_parts" (None, 0 and 1 for a whole example without "text"), so
+    whole and split examples share one set of fields, and one schema in
+    columnar output.
+    """
+
+    def __init__(self,
+                 tokenizer: Union[str, Any],
+                 max_length: int = 512,
+                 overlong: str = "split",
+                 buckets: Sequence[int] = DEFAULT_LENGTH_BUCKETS,
+                 batch_size: int = 256,
+                 cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+        Args:
+            tokenizer (Union[str, Any]): A Hugging Face tokenizer, or the model id or path to load one from.
+            max_length (int): Longest example, in tokens, that training takes whole.
+            overlong (str): "split" or "drop" examples longer than `max_length`.
+            buckets (Sequence[int]): Length bucket boundaries; those at or above `max_length`
+                                     are replaced by `max_length` itself.
+            batch_size (int): Examples tokenized together.
+            cache_size (int): Token counts of recent texts kept, by digest.
+        """
+        if overlong not in OVERLONG_POLICIES:
+            raise ValueError(f"Unknown overlong policy '{overlong}'. Available: {', '.join(OVERLONG_POLICIES)}")
+        if isinstance(tokenizer, str):
+            tokenizer = load_tokenizer(tokenizer)
+        self.tokenizer = tokenizer
+        self.tokenizer_name = getattr(tokenizer, "name_or_path", None) or type(tokenizer).__name__
+        self.num_special_tokens = (tokenizer.num_special_tokens_to_add()
+                                   if hasattr(tokenizer, "num_special_tokens_to_add") else 0)
+        if max_length <= self.num_special_tokens:
+            raise ValueError(f"max_length must exceed the {self.num_special_tokens} special tokens the tokenizer adds.")
+        self.max_length = max_length
+        self.overlong = overlong
+        self.buckets = sorted({bucket for bucket in buckets if bucket < max_length} | {max_length})
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache: Dict[bytes, int] = collections.OrderedDict()
+        self.stats = {"seen": 0, "stored": 0, "tokenized": 0, "cache_hits": 0, "overlong": 0, "split": 0,
+                      "parts": 0, "dropped": 0, "total_tokens": 0, "elapsed_s": 0.0}
+        self.bucket_counts: Dict[int, int] = collections.Counter()
+
+    def config(self) -> Dict[str, Any]:
+        """The settings that determine the annotated output, e.g. for a checkpoint's configuration."""
+        return {"tokenizer": self.tokenizer_name, "max_length": self.max_length, "overlong": self.overlong,
+                "buckets": self.buckets}
+
+    def _encode(self, texts: List[str]) -> List[List[int]]:
+        # verbose=False: texts longer than the model's limit are expected here.
+        return self.tokenizer(texts, add_special_tokens=False, verbose=False)["input_ids"]
+
+    def _cached(self, digest: bytes) -> Optional[int]:
+        count = self._cache.get(digest)
+        if count is not None:
+            self._cache.move_to_end(digest)
+        return count
+
+    def _remember(self, digest: bytes, count: int):
+        self._cache[digest] = count
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def count_tokens(self, text: str) -> int:
+        """Tokens in `text` as training sees it, special tokens included. Cached."""
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        count = self._cached(digest)
+        if count is None:
+            count = len(self._encode([text])[0]) + self.num_special_tokens
+            self._remember(digest, count)
+        return count
+
+    def length_bucket(self, token_count: int) -> int:
+        """The smallest bucket boundary at or above `token_count` (at most `max_length`)."""
+        return self.buckets[min(bisect.bisect_left(self.buckets, token_count), len(self.buckets) - 1)]
+
+    def _annotated(self, example: Dict[str, Any], token_count: int, text: Optional[str] = None,
+                   part: int = 0, num_parts: int = 1) -> Dict[str, Any]:
+        return dict(example, text=text if text is not None else example.get("text"), part=part,
+                    num_parts=num_parts, token_count=token_count, length_bucket=self.length_bucket(token_count))
+
+    def _split(self, example: Dict[str, Any], ids: List[int]) -> List[Dict[str, Any]]:
+        """Cuts an overlong example's tokens into windows that fit `max_length`, special tokens included."""
+        window = self.max_length - self.num_special_tokens
+        pieces = []
+        start = 0
+        while start < len(ids):
+            end = min(start + window, len(ids))
+            text = self.tokenizer.decode(ids[start:end])
+            count = len(self._encode([text])[0]) + self.num_special_tokens
+            # Re-encoding a decoded window can merge tokens differently at its edges; shrink it until it fits.
+            while count > self.max_length and end - start > 1:
+                end = max(start + 1, end - (count - self.max_length))
+                text = self.tokenizer.decode(ids[start:end])
+                count = len(self._encode([text])[0]) + self.num_special_tokens
+            pieces.append((text, count))
+            start = end
+        # The window replaces all of the original's text; its other fields (tool calls, metadata) are kept.
+        fields = dict(example, **{field: None for field in TEXT_FIELDS if field in example})
+        return [self._annotated(fields, count, text=text, part=part, num_parts=len(pieces))
+                for part, (text, count) in enumerate(pieces)]
+
+    def annotate_batch(self, examples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Annotates one batch of examples. Returns them in order, with overlong ones split or dropped."""
+        start = time.perf_counter()
+        texts = [example_text(example) for example in examples]
+        digests = [hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest() for text in texts]
+        counts = [self._cached(digest) for digest in digests]
+        misses = [index for index, count in enumerate(counts) if count is None]
+        overlong_ids: Dict[int, List[int]] = {}
+        if misses:
+            for index, ids in zip(misses, self._encode([texts[index] for index in misses])):
+                counts[index] = len(ids) + self.num_special_tokens
+                self._remember(digests[index], counts[index])
+                if counts[index] > self.max_length:
+                    overlong_ids[index] = ids
+
+        annotated = []
+        for index, (example, count) in enumerate(zip(examples, counts)):
+            if count <= self.max_length:
+                annotated.append(self._annotated(example, count))
+                continue
+            self.stats["overlong"] += 1
+            if self.overlong == "drop":
+                self.stats["dropped"] += 1
+                continue
+            # Only counts are cached; a cached overlong text is tokenized again to split it.
+            ids = overlong_ids[index] if index in overlong_ids else self._encode([texts[index]])[0]
+            parts = self._split(example, ids)
+            self.stats["split"] += 1
+            self.stats["parts"] += len(parts)
+            annotated.extend(parts)
+
+        for example in annotated:
+            self.bucket_counts[example["length_bucket"]] += 1
+            self.stats["total_tokens"] += example["token_count"]
+        self.stats["seen"] += len(examples)
+        self.stats["stored"] += len(annotated)
+        self.stats["tokenized"] += len(misses)
+        self.stats["cache_hits"] += len(examples) - len(misses)
+        self.stats["elapsed_s"] += time.perf_counter() - start
+        return annotated
+
+    def annotate(self, examples: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yields annotated examples in stream order, tokenizing `batch_size` at a time."""
+        for batch in chunked(examples, self.batch_size):
+            yield from self.annotate_batch(batch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns counts, the cache hit rate, examples per bucket and throughput."""
+        stats = dict(self.stats)
+        stats["buckets"] = {bucket: self.bucket_counts[bucket] for bucket in self.buckets}
+        stats["cache_hit_rate"] = stats["cache_hits"] / stats["seen"] if stats["seen"] else 0.0
+        stats["mean_tokens"] = stats["total_tokens"] / stats["stored"] if stats["stored"] else 0.0
+        stats["examples_per_s"] = stats["seen"] / stats["elapsed_s"] if stats["elapsed_s"] else 0.0
+        return stats
@@ -0,0 +1,175 @@
+"""
+Token-Length Annotation Benchmark
+
+Annotates synthetic examples with long-tailed lengths with their token
+counts, tokenizing one example at a time and in batches, then again with
+the counts cached, as a second agent or rerun would see them. Compares the
+tokens a training run computes per batch when every example is padded to
+`max_length` (the previous behaviour), when random batches are padded to
+their longest example, and when batches are grouped by the stored lengths,
+and counts the tokens silently truncated before and after annotation.
+
+Without --tokenizer, a byte-level BPE tokenizer is trained on the examples.
+
+Usage:
+    python -m src.training.token_lengths_benchmark --examples 20000 --max-length 256 --output token_lengths_bench.json
+
+Results are written as JSON; see `benchmarking`. That annotated examples fit
+`max_length` and their counts match the tokenizer's, cached or not, is
+tested in tests/test_token_lengths.py.
+"""
+
+import argparse
+import random
+import sys
+import time
+from typing import Dict, Any, List, Optional
+
+from ..core.benchmarking import benchmark_main, environment
+from .sketches import example_text
+from .sketches_benchmark import make_examples
+from .token_lengths import TokenLengthAnnotator, load_tokenizer
+
+# Batches of this many batches are sorted by length together, as transformers' LengthGroupedSampler does.
+_MEGABATCH_MULTIPLIER = 50
+
+
+def train_tokenizer(texts: List[str], vocab_size: int = 8000) -> Any:
+    """A byte-level BPE tokenizer trained on `texts`, which adds a BOS token like most causal LMs."""
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, processors, trainers
+    from transformers import PreTrainedTokenizerFast
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(texts, trainers.BpeTrainer(
+        vocab_size=vocab_size, special_tokens=["<s>", "</s>"], initial_alphabet=pre_tokenizers.ByteLevel.alphabet()))
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="<s> $A", special_tokens=[("<s>", tokenizer.token_to_id("<s>"))])
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, bos_token="<s>", eos_token="</s>")
+
+
+def padded_tokens(lengths: List[int], batch_size: int, pad_to: Optional[int] = None,
+                  group_by_length: bool = False, seed: int = 0) -> int:
+    """
+    Tokens computed for `lengths` in shuffled batches padded to `pad_to`, or
+    to each batch's longest example. With `group_by_length`, megabatches of
+    the shuffled order are sorted by length before they are cut into batches.
+    """
+    order = list(range(len(lengths)))
+    random.Random(seed).shuffle(order)
+    if group_by_length:
+        megabatch = batch_size * _MEGABATCH_MULTIPLIER
+        order = [index for start in range(0, len(order), megabatch)
+                 for index in sorted(order[start:start + megabatch], key=lambda index: -lengths[index])]
+    total = 0
+    for start in range(0, len(order), batch_size):
+        batch = [lengths[index] for index in order[start:start + batch_size]]
+        total += len(batch) * (pad_to if pad_to is not None else max(batch))
+    return total
+
+
+def _timed_annotation(annotator: TokenLengthAnnotator, examples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Annotates `examples`. The stats count this call only, though the annotator's cache persists."""
+    before = dict(annotator.stats)
+    start = time.perf_counter()
+    annotated = list(annotator.annotate(examples))
+    wall_s = time.perf_counter() - start
+    stats = {key: annotator.stats[key] - before[key] for key in before}
+    stats["cache_hit_rate"] = stats["cache_hits"] / stats["seen"] if stats["seen"] else 0.0
+    return {"annotated": annotated, "wall_s": wall_s,
+            "examples_per_s": len(examples) / wall_s if wall_s > 0 else 0.0, "stats": stats}
+
+
+def run_benchmark(num_examples: int = 20000,
+                  max_length: int = 256,
+                  train_batch_size: int = 8,
+                  duplicate_rate: float = 0.1,
+                  tokenizer: Optional[str] = None,
+                  seed: int = 0) -> Dict[str, Any]:
+    """
+    Annotates one example stream per-example, batched and cached, and
+    estimates the padding and truncation each way of batching implies.
+
+    Returns:
+        Dict[str, Any]: Environment info, the configuration, per-run throughput and padding.
+    """
+    examples = make_examples(num_examples, duplicate_rate, seed)
+    texts = [example_text(example) for example in examples]
+    start = time.perf_counter()
+    tokenizer_obj = load_tokenizer(tokenizer) if tokenizer else train_tokenizer(texts)
+    tokenizer_s = time.perf_counter() - start
+
+    def annotator(**options: Any) -> TokenLengthAnnotator:
+        return TokenLengthAnnotator(tokenizer_obj, max_length=max_length, **options)
+
+    per_example = _timed_annotation(annotator(batch_size=1, cache_size=0), examples)
+    batched = annotator()
+    first = _timed_annotation(batched, examples)
+    replay = _timed_annotation(batched, examples)  # e.g. a rerun, or a second pass over the same examples.
+    dropped = _timed_annotation(annotator(overlong="drop"), examples)
+
+    full_lengths = [len(ids) for ids in tokenizer_obj(texts, verbose=False)["input_ids"]]
+    truncated_lengths = [min(length, max_length) for length in full_lengths]
+    split_lengths = [example["token_count"] for example in first["annotated"]]
+    schemes = {
+        "pad_to_max_length": (truncated_lengths, {"pad_to": max_length}),
+        "dynamic": (truncated_lengths, {}),
+        "group_by_length": (split_lengths, {"group_by_length": True}),
+    }
+    padding = {}
+    for name, (lengths, options) in schemes.items():
+        tokens = padded_tokens(lengths, train_batch_size, seed=seed, **options)
+        padding[name] = {"tokens": tokens, "padding_ratio": 1 - sum(lengths) / tokens}
+
+    runs = {name: {key: value for key, value in run.items() if key != "annotated"}
+            for name, run in (("per_example", per_example), ("batched", first), ("cached", replay),
+                              ("drop", dropped))}
+    return {
+        "environment": environment(),
+        "config": {
+            "num_examples": num_examples,
+            "max_length": max_length,
+            "train_batch_size": train_batch_size,
+            "duplicate_rate": duplicate_rate,
+            "tokenizer": tokenizer or "trained byte-level BPE",
+            "tokenizer_s": tokenizer_s,
+            "seed": seed,
+        },
+        "runs": runs,
+        "batching_speedup": first["examples_per_s"] / per_example["examples_per_s"]
+        if per_example["examples_per_s"] else 0.0,
+        "cache_speedup": replay["examples_per_s"] / first["examples_per_s"] if first["examples_per_s"] else 0.0,
+        "overlong_examples": sum(length > max_length for length in full_lengths),
+        "tokens_truncated_without_annotation": sum(full_lengths) - sum(truncated_lengths),
+        "padding": padding,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--examples", type=int, default=20000, dest="num_examples")
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--train-batch-size", type=int, default=8)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--tokenizer", type=str, default=None, help="Model id or path of the tokenizer to use.")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def report(results: Dict[str, Any]):
+    for name, run in results["runs"].items():
+        stats = run["stats"]
+        print(f"{name}: {run['examples_per_s']:.0f} examples/s, stored {stats['stored']} of {stats['seen']} "
+              f"({stats['split']} split, {stats['dropped']} dropped, {stats['cache_hit_rate']:.0%} cached)")
+    print(f"batching: {results['batching_speedup']:.1f}x, cache: {results['cache_speedup']:.1f}x; "
+          f"{results['overlong_examples']} overlong examples would lose "
+          f"{results['tokens_truncated_without_annotation']} tokens to truncation")
+    for name, padding in results["padding"].items():
+        print(f"{name}: {padding['tokens']} tokens computed, {padding['padding_ratio']:.1%} padding")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return benchmark_main(run_benchmark, argv, "Benchmark token-length annotation of synthesized examples.",
+                          "token_lengths_bench.json", add_arguments, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
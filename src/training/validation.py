@@ -0,0 +1,223 @@
+import asyncio
+import collections
+import os
+import posixpath
+import time
+import warnings
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from .parallel_synthesis import chunked
+from .writers import encode_json
+
+VALIDATION_MODES = ("compile", "execute")
+
+# Languages the sandbox runs, by the extension of the file an example writes.
+EXTENSION_LANGUAGES = {
+    ".py": "python",
+    ".js": "javascript",
+    ".java": "java",
+    ".cpp": "cpp",
+    ".cc": "cpp",
+    ".go": "go",
+    ".rs": "rust",
+}
+
+# Compiles stdin without running it, for a Python compile check inside the sandbox.
+_PYTHON_COMPILE_PROGRAM = "import sys\ncompile(sys.stdin.read(), 'solution.py', 'exec', dont_inherit=True)\n"
+_MAX_DETAIL_CHARS = 500
+
+
+def example_code(example: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """
+    The (language, code) an example writes with its first `write_file` tool
+    call to a file in a sandbox language, or None if it writes no code.
+    """
+    for call in example.get("tool_calls") or []:
+        if call.get("tool") != "write_file" or not isinstance(call.get("content"), str):
+            continue
+        language = EXTENSION_LANGUAGES.get(posixpath.splitext(str(call.get("path", "")))[1])
+        if language is not None:
+            return language, call["content"]
+    return None
+
+
+def compile_python(code: str) -> Optional[str]:
+    """Compiles `code` in-process without running it. Returns the error, or None if it compiles."""
+    try:
+        with warnings.catch_warnings():
+            # e.g. invalid escape sequences: compile() would print these for every example.
+            warnings.simplefilter("ignore")
+            compile(code, "solution.py", "exec", dont_inherit=True)
+    except SyntaxError as e:
+        return f"{type(e).__name__}: {e.msg} (line {e.lineno})"
+    except (ValueError, RecursionError, MemoryError, OverflowError) as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def _detail(result: Dict[str, Any]) -> str:
+    """The last lines of a failed run's stderr, where the error usually is."""
+    text = (result.get("stderr") or result.get("stdout") or "").strip()
+    return text[-_MAX_DETAIL_CHARS:]
+
+
+class ExampleValidator:
+    """
+    Filters synthesized examples down to those whose code compiles (or runs).
+
+    Examples are validated in batches. Python code is first compiled
+    in-process with `compile()`, which rejects syntax errors without the
+    sandbox. In "compile" mode that is the whole check for Python; other
+    languages, and every example in "execute" mode, are then run in the
+    sandbox, at most `concurrency` at a time and each with its own timeout.
+    Examples that write no code in a sandbox language pass through unchecked.
+
+    Only the code's own failures reject an example. When the sandbox
+    reports an infrastructure error for an execution (e.g. a Docker API
+    failure), that example passes through unchecked and is counted in
+    "sandbox_errors"; when the whole batch fails to run, the error is raised.
+
+    Rejected examples are appended to `rejects_path` as JSON lines with the
+    reason ("syntax_error", "compile_error", "runtime_error" or "timeout"),
+    the stage that rejected them and the error output. A resumed
+    checkpointed run validates its interrupted segment again, so its rejects
+    can appear twice there.
+    """
+
+    def __init__(self,
+                 sandbox: Optional[Any] = None,
+                 mode: str = "compile",
+                 concurrency: int = 8,
+                 timeout_s: int = 10,
+                 batch_size: int = 64,
+                 python_fast_path: bool = True,
+                 rejects_path: Optional[str] = None,
+                 cpu_limit: Optional[str] = "0.5",
+                 memory_limit: Optional[str] = "128m"):
+        """
+        Args:
+            sandbox (Optional[Any]): A `CodeExecutionSandbox` (e.g. with the "process" backend).
+                                     Without one, only Python is checked, with `compile()`.
+            mode (str): "compile" checks that code compiles; "execute" also runs it.
+            concurrency (int): Maximum sandbox executions in flight.
+            timeout_s (int): Time limit per example in the sandbox, in seconds.
+            batch_size (int): Examples validated together; bounds the memory held back.
+            python_fast_path (bool): Compile Python in-process before (or, in "compile"
+                                     mode, instead of) using the sandbox.
+            rejects_path (Optional[str]): JSONL file rejected examples are appended to.
+            cpu_limit (Optional[str]): CPU limit for sandbox executions.
+            memory_limit (Optional[str]): Memory limit for sandbox executions.
+        """
+        if mode not in VALIDATION_MODES:
+            raise ValueError(f"Unknown validation mode '{mode}'. Available: {', '.join(VALIDATION_MODES)}")
+        self.sandbox = sandbox
+        self.mode = mode
+        self.concurrency = concurrency
+        self.timeout_s = timeout_s
+        self.batch_size = batch_size
+        self.python_fast_path = python_fast_path
+        self.rejects_path = rejects_path
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.stats = {"seen": 0, "no_code": 0, "unchecked": 0, "compiled_in_process": 0, "sandboxed": 0,
+                      "sandbox_errors": 0, "accepted": 0, "rejected": 0, "elapsed_s": 0.0}
+        self.reasons: Dict[str, int] = collections.Counter()
+
+    def _sandbox_request(self, language: str, code: str) -> Dict[str, Any]:
+        request = {"language": language, "code": code, "cpu_limit": self.cpu_limit,
+                   "memory_limit": self.memory_limit, "timeout": self.timeout_s}
+        if self.mode == "compile" and language == "python":
+            # Compile without running it, so the check has no side effects.
+            request.update(code=_PYTHON_COMPILE_PROGRAM, inputs=code)
+        return request
+
+    def _sandbox_rejection(self, language: str, result: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """The (reason, detail) of a failed sandbox run, or None if it passed."""
+        if result.get("timeout"):
+            return "timeout", f"Exceeded {self.timeout_s}s."
+        if result.get("exit_code") == 0:
+            return None
+        if self.mode == "compile" and language == "python":
+            return "syntax_error", _detail(result)
+        return ("compile_error" if result.get("compile_error") else "runtime_error"), _detail(result)
+
+    def _run_sandbox(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Failing to run the batch at all says nothing about the code; it is not turned into rejections.
+        return asyncio.run(self.sandbox.execute_batch(requests, concurrency=self.concurrency))
+
+    def _validate_batch(self, examples: List[Dict[str, Any]]) -> List[Optional[Tuple[str, str, str]]]:
+        """Returns, per example, None if accepted or (reason, stage, detail) if rejected."""
+        verdicts: List[Optional[Tuple[str, str, str]]] = [None] * len(examples)
+        pending: List[Tuple[int, str]] = []  # (index, language) of examples for the sandbox
+        requests = []
+        for index, example in enumerate(examples):
+            code = example_code(example)
+            if code is None:
+                self.stats["no_code"] += 1
+                continue
+            language, source = code
+            if language == "python" and self.python_fast_path:
+                self.stats["compiled_in_process"] += 1
+                error = compile_python(source)
+                if error is not None:
+                    verdicts[index] = ("syntax_error", "compile", error)
+                    continue
+                if self.mode == "compile":
+                    continue
+            if self.sandbox is None:
+                self.stats["unchecked"] += 1
+                continue
+            pending.append((index, language))
+            requests.append(self._sandbox_request(language, source))
+
+        if requests:
+            self.stats["sandboxed"] += len(requests)
+            for (index, language), result in zip(pending, self._run_sandbox(requests)):
+                if result.get("sandbox_error"):
+                    self.stats["sandbox_errors"] += 1
+                    self.stats["unchecked"] += 1
+                    continue
+                rejection = self._sandbox_rejection(language, result)
+                if rejection is not None:
+                    verdicts[index] = (rejection[0], "sandbox", rejection[1])
+        return verdicts
+
+    def _write_rejects(self, rejects: List[Dict[str, Any]]):
+        if not rejects or not self.rejects_path:
+            return
+        os.makedirs(os.path.dirname(self.rejects_path) or ".", exist_ok=True)
+        with open(self.rejects_path, "ab") as f:
+            f.write(b"".join(encode_json(reject) + b"\n" for reject in rejects))
+
+    def validate_batch(self, examples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Validates one batch of examples. Returns the accepted ones, in order."""
+        start = time.perf_counter()
+        verdicts = self._validate_batch(examples)
+        accepted, rejects = [], []
+        for example, verdict in zip(examples, verdicts):
+            if verdict is None:
+                accepted.append(example)
+                continue
+            reason, stage, detail = verdict
+            self.reasons[reason] += 1
+            rejects.append({"reason": reason, "stage": stage, "detail": detail, "example": example})
+        self._write_rejects(rejects)
+        self.stats["seen"] += len(examples)
+        self.stats["accepted"] += len(accepted)
+        self.stats["rejected"] += len(rejects)
+        self.stats["elapsed_s"] += time.perf_counter() - start
+        return accepted
+
+    def validate(self, examples: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Yields the examples that pass validation, in stream order, `batch_size` at a time."""
+        for batch in chunked(examples, self.batch_size):
+            yield from self.validate_batch(batch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns counts, rejections by reason, the rejection rate of checked examples and throughput."""
+        stats = dict(self.stats)
+        checked = stats["seen"] - stats["no_code"] - stats["unchecked"]
+        stats["reasons"] = dict(self.reasons)
+        stats["rejection_rate"] = stats["rejected"] / checked if checked else 0.0
+        stats["examples_per_s"] = stats["seen"] / stats["elapsed_s"] if stats["elapsed_s"] else 0.0
+        return stats
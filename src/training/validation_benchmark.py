@@ -0,0 +1,151 @@
+"""
+Example Validation Benchmark
+
+Builds python-dev examples from mined synthetic functions and breaks a known
+share of them: syntax errors, functions that raise when run, and programs
+that never finish. Validates the batch with the in-process `compile()` fast
+path alone, with the sandbox alone at concurrency 1 and `--concurrency`, and
+in "execute" mode, using the sandbox's local "process" backend.
+
+Usage:
+    python -m src.training.validation_benchmark --examples 400 --concurrency 8 --output validation_bench.json
+
+Results are written as JSON; see `benchmarking`. That each mode rejects
+exactly the broken examples is tested in tests/test_validation.py.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, Any, List, Optional
+
+from ..core.benchmarking import benchmark_main, environment
+from ..core.sandbox import CodeExecutionSandbox
+from .data_synthesis import python_dev_example
+from .function_mining import mine_functions
+from .function_mining_benchmark import _python_file
+from .validation import ExampleValidator
+
+
+def make_examples(num_examples: int, broken_rate: float = 0.2, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Python-dev examples of mined synthetic functions. A `broken_rate` share is
+    broken, in equal parts, by a syntax error, a raise on import, or an
+    endless loop; each example's "breakage" field says which ("" if none).
+    """
+    rng = random.Random(seed)
+    examples = []
+    index = 0
+    while len(examples) < num_examples:
+        counts = {"functions": 0, "documented": 0}
+        for function in mine_functions(_python_file(rng, index, counts)):
+            if len(examples) == num_examples:
+                break
+            if function["source"].startswith("@"):
+                continue  # The decorator's import lives outside the function.
+            breakage = rng.choice(["syntax_error", "raises", "hangs"]) if rng.random() < broken_rate else ""
+            if breakage == "syntax_error":
+                function["source"] = function["source"].replace("):", ")", 1)
+            elif breakage == "raises":
+                function["source"] += "\nraise RuntimeError('broken example')\n"
+            elif breakage == "hangs":
+                function["source"] += "\nwhile True:\n    pass\n"
+            example = python_dev_example(function)
+            example["breakage"] = breakage
+            examples.append(example)
+        index += 1
+    return examples
+
+
+def _run(examples: List[Dict[str, Any]], rejects_path: str, **options: Any) -> Dict[str, Any]:
+    validator = ExampleValidator(rejects_path=rejects_path, **options)
+    start = time.perf_counter()
+    for _ in validator.validate(examples):
+        pass
+    wall_s = time.perf_counter() - start
+    return dict(validator.get_stats(), wall_s=wall_s,
+                examples_per_wall_s=len(examples) / wall_s if wall_s > 0 else 0.0)
+
+
+def run_benchmark(num_examples: int = 400,
+                  broken_rate: float = 0.2,
+                  concurrency: int = 8,
+                  timeout_s: int = 2,
+                  seed: int = 0,
+                  work_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Validates one example batch four ways: compile fast path, sandbox-only
+    compile at concurrency 1 and `concurrency`, and sandboxed execution.
+
+    Returns:
+        Dict[str, Any]: Environment info, the configuration and per-run stats.
+    """
+    own_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="validation_bench_")
+    sandbox = CodeExecutionSandbox(backend="process")
+    try:
+        examples = make_examples(num_examples, broken_rate, seed)
+        # The hanging examples dominate execute mode; keep its batch small.
+        runnable = examples[:max(1, num_examples // 4)]
+        runs = {
+            "fast_path": _run(examples, os.path.join(work_dir, "fast_path.jsonl")),
+            "sandbox_serial": _run(examples, os.path.join(work_dir, "sandbox_serial.jsonl"), sandbox=sandbox,
+                                   python_fast_path=False, concurrency=1, timeout_s=timeout_s),
+            "sandbox_parallel": _run(examples, os.path.join(work_dir, "sandbox_parallel.jsonl"), sandbox=sandbox,
+                                     python_fast_path=False, concurrency=concurrency, timeout_s=timeout_s),
+            "execute": _run(runnable, os.path.join(work_dir, "execute.jsonl"), sandbox=sandbox, mode="execute",
+                            concurrency=concurrency, timeout_s=timeout_s),
+        }
+    finally:
+        sandbox.close()
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    breakages = {kind: sum(example["breakage"] == kind for example in examples)
+                 for kind in ("syntax_error", "raises", "hangs")}
+    parallel_s = runs["sandbox_parallel"]["wall_s"]
+    return {
+        "environment": environment(),
+        "config": {
+            "num_examples": num_examples,
+            "execute_examples": len(runnable),
+            "broken_rate": broken_rate,
+            "concurrency": concurrency,
+            "timeout_s": timeout_s,
+            "seed": seed,
+        },
+        "breakages": breakages,
+        "runs": runs,
+        "fast_path_speedup": parallel_s / runs["fast_path"]["wall_s"] if runs["fast_path"]["wall_s"] > 0 else 0.0,
+        "concurrency_speedup": runs["sandbox_serial"]["wall_s"] / parallel_s if parallel_s > 0 else 0.0,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--examples", type=int, default=400, dest="num_examples")
+    parser.add_argument("--broken-rate", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=int, default=2, dest="timeout_s", help="Per-example sandbox timeout in seconds.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", type=str, default=None, help="Keep the rejects files here.")
+
+
+def report(results: Dict[str, Any]):
+    for name, run in results["runs"].items():
+        print(f"{name}: rejected {run['rejected']} of {run['seen']} ({run['rejection_rate']:.1%}), "
+              f"{run['examples_per_wall_s']:.0f} examples/s")
+    print(f"compile() fast path: {results['fast_path_speedup']:.0f}x the parallel sandbox; "
+          f"sandbox concurrency {results['config']['concurrency']}: {results['concurrency_speedup']:.1f}x")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    return benchmark_main(run_benchmark, argv, "Benchmark sandbox validation of synthesized examples.",
+                          "validation_bench.json", add_arguments, report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,504 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Type
+
+DEFAULT_BUFFER_BYTES = 1024 * 1024
+DEFAULT_ROW_GROUP_SIZE = 10000
+LATEST_FILE = "LATEST"
+VERSION_MANIFEST_FILE = "manifest.json"
+
+
+try:
+    import orjson
+except ImportError:  # Optional; encode_json falls back to the stdlib encoder.
+    orjson = None
+
+
+def encode_json(record: Dict[str, Any]) -> bytes:
+    """
+    Encodes a record as compact UTF-8 JSON, with orjson when it is installed.
+
+    The stdlib fallback produces the same bytes for plain JSON data, so output
+    (and its content hash) does not depend on which encoder was available.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(record)
+        except TypeError:
+            pass  # e.g. non-string keys, which the stdlib encoder coerces.
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class RecordWriter(ABC):
+    """
+    Writes a stream of dict records to one file, buffering encoded output.
+
+    Writers are context managers; `close()` flushes and finalizes the file
+    and returns the number of records written.
+    """
+
+    extension = ""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self.closed = False
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @abstractmethod
+    def write(self, record: Dict[str, Any]):
+        """Buffers one record."""
+
+    def write_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Writes every record of an iterable. Returns how many were written."""
+        start = self.count
+        for record in records:
+            self.write(record)
+        return self.count - start
+
+    @abstractmethod
+    def _finish(self):
+        """Flushes buffered records and finalizes the file."""
+
+    def close(self) -> int:
+        if not self.closed:
+            self.closed = True
+            self._finish()
+        return self.count
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class JSONLWriter(RecordWriter):
+    """JSON Lines, encoded into a byte buffer and written in `buffer_bytes` blocks."""
+
+    extension = ".jsonl"
+
+    def __init__(self, path: str, buffer_bytes: int = DEFAULT_BUFFER_BYTES):
+        super().__init__(path)
+        self.buffer_bytes = buffer_bytes
+        self._buffer = bytearray()
+        self._file = self._open()
+
+    def _open(self):
+        return open(self.path, "wb")
+
+    def write(self, record: Dict[str, Any]):
+        self._buffer += encode_json(record)
+        self._buffer += b"\n"
+        self.count += 1
+        if len(self._buffer) >= self.buffer_bytes:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+
+    def _finish(self):
+        self._flush()
+        self._file.close()
+
+
+class ZstdJSONLWriter(JSONLWriter):
+    """zstd-compressed JSON Lines (requires `zstandard`)."""
+
+    extension = ".jsonl.zst"
+
+    def __init__(self, path: str, level: int = 3, threads: int = 0, buffer_bytes: int = DEFAULT_BUFFER_BYTES):
+        self.level = level
+        self.threads = threads
+        super().__init__(path, buffer_bytes)
+
+    def _open(self):
+        import zstandard
+        # Closing the stream writer ends the frame and closes the file.
+        return zstandard.ZstdCompressor(level=self.level, threads=self.threads).stream_writer(open(self.path, "wb"))
+
+
+class _ArrowBatchWriter(RecordWriter):
+    """
+    Base for columnar writers (requires `pyarrow` 14 or later).
+
+    The schema is inferred from the records. Nested values (dicts and lists)
+    are stored as JSON text, so records whose nested shapes differ, like the
+    tool calls of different agents, still share one schema. With
+    `encode_nested=False` they keep native Arrow list and struct types, for
+    records of a fixed shape that must read back unchanged.
+
+    A batch with fields the file does not have yet, or with values in a
+    column that was all nulls so far, closes the file written so far as a
+    segment and starts the next under the widened schema. On close, if there
+    is more than one segment, they are rewritten batch by batch into one
+    file with the widest schema, missing fields filled with nulls. Fields
+    whose types cannot be unified (e.g. int and string) raise a ValueError.
+    """
+
+    def __init__(self, path: str, batch_size: int = DEFAULT_ROW_GROUP_SIZE, encode_nested: bool = True):
+        super().__init__(path)
+        import pyarrow
+        self.pa = pyarrow
+        self.batch_size = batch_size
+        self.encode_nested = encode_nested
+        self.schema = None
+        self._rows: List[Dict[str, Any]] = []
+        self._segments: List[str] = []  # Files written under earlier, narrower schemas.
+
+    def write(self, record: Dict[str, Any]):
+        if not self.encode_nested:
+            self._rows.append(record)
+        else:
+            self._rows.append({key: encode_json(value).decode("utf-8") if isinstance(value, (dict, list)) else value
+                               for key, value in record.items()})
+        self.count += 1
+        if len(self._rows) >= self.batch_size:
+            self._flush()
+
+    def _fits(self, schema: Any) -> bool:
+        """Whether a batch with the inferred `schema` can be written under the current schema."""
+        for field in schema:
+            index = self.schema.get_field_index(field.name)
+            if index == -1:
+                return False
+            current = self.schema.field(index).type
+            if current != field.type and not self.pa.types.is_null(field.type):
+                return False
+        return True
+
+    def _unify(self, schemas: List[Any]) -> Any:
+        try:
+            return self.pa.unify_schemas(schemas, promote_options="permissive")
+        except (self.pa.ArrowInvalid, self.pa.ArrowTypeError) as e:
+            raise ValueError(f"Records written to {self.path} have conflicting field types: {e}") from e
+
+    def _conform(self, table: Any, schema: Any) -> Any:
+        """`table` with `schema`'s columns, in order: cast where needed, all-null where missing."""
+        columns = [table.column(field.name).cast(field.type) if field.name in table.column_names
+                   else self.pa.nulls(table.num_rows, field.type) for field in schema]
+        return self.pa.Table.from_arrays(columns, schema=schema)
+
+    def _flush(self):
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        # Every field of the batch, in first-seen order; from_pylist would take only the first row's.
+        fields = dict.fromkeys(field for row in rows for field in row)
+        table = self.pa.Table.from_pydict({field: [row.get(field) for row in rows] for field in fields})
+        if self.schema is None:
+            self.schema = table.schema
+            self._open(self.schema)
+        elif not self._fits(table.schema):
+            schema = self._unify([self.schema, table.schema])
+            self._close_file()
+            segment = f"{self.path}.segment-{len(self._segments)}"
+            os.replace(self.path, segment)
+            self._segments.append(segment)
+            self.schema = schema
+            self._open(self.schema)
+        self._write_table(self._conform(table, self.schema))
+
+    @abstractmethod
+    def _open(self, schema: Any):
+        """Opens the underlying file writer at `self.path` once the schema is known."""
+
+    @abstractmethod
+    def _write_table(self, table: Any):
+        """Writes one buffered batch."""
+
+    @abstractmethod
+    def _close_file(self):
+        """Closes the underlying file writer."""
+
+    @abstractmethod
+    def _read_segment(self, path: str) -> Iterator[Any]:
+        """Yields the record batches of a closed segment file."""
+
+    def _merge_segments(self):
+        """Rewrites the segments and the last file into `self.path` under the last, widest schema."""
+        last = f"{self.path}.segment-{len(self._segments)}"
+        os.replace(self.path, last)
+        self._segments.append(last)
+        self._open(self.schema)
+        try:
+            for segment in self._segments:
+                for batch in self._read_segment(segment):
+                    self._write_table(self._conform(self.pa.Table.from_batches([batch]), self.schema))
+            self._close_file()
+        finally:
+            for segment in self._segments:
+                os.remove(segment)
+            self._segments = []
+
+    def _finish(self):
+        self._flush()
+        if self.schema is None:
+            # No records: still leave a valid, empty file behind.
+            self.schema = self.pa.schema([])
+            self._open(self.schema)
+        self._close_file()
+        if self._segments:
+            self._merge_segments()
+
+
+class ParquetWriter(_ArrowBatchWriter):
+    """Parquet with one row group per `row_group_size` records."""
+
+    extension = ".parquet"
+
+    def __init__(self, path: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE, compression: str = "zstd",
+                 encode_nested: bool = True):
+        self.compression = compression
+        super().__init__(path, row_group_size, encode_nested)
+
+    def _open(self, schema: Any):
+        import pyarrow.parquet
+        self._writer = pyarrow.parquet.ParquetWriter(self.path, schema, compression=self.compression)
+
+    def _write_table(self, table: Any):
+        self._writer.write_table(table, row_group_size=self.batch_size)
+
+    def _close_file(self):
+        self._writer.close()
+
+    def _read_segment(self, path: str) -> Iterator[Any]:
+        import pyarrow.parquet
+        yield from pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=self.batch_size)
+
+
+class ArrowWriter(_ArrowBatchWriter):
+    """Arrow IPC file format, uncompressed so readers can memory-map it (see `open_arrow`)."""
+
+    extension = ".arrow"
+
+    def _open(self, schema: Any):
+        self._sink = self.pa.OSFile(self.path, "wb")
+        self._writer = self.pa.ipc.new_file(self._sink, schema)
+
+    def _write_table(self, table: Any):
+        self._writer.write_table(table, max_chunksize=self.batch_size)
+
+    def _close_file(self):
+        self._writer.close()
+        self._sink.close()
+
+    def _read_segment(self, path: str) -> Iterator[Any]:
+        with self.pa.memory_map(path) as source:
+            reader = self.pa.ipc.open_file(source)
+            for index in range(reader.num_record_batches):
+                yield reader.get_batch(index)
+
+
+WRITERS: Dict[str, Type[RecordWriter]] = {
+    "jsonl": JSONLWriter,
+    "jsonl.zst": ZstdJSONLWriter,
+    "parquet": ParquetWriter,
+    "arrow": ArrowWriter,
+}
+
+
+def format_for_path(path: str, default: str = "jsonl") -> str:
+    """Infers an output format from a file name's extension."""
+    for output_format, writer_cls in sorted(WRITERS.items(), key=lambda item: -len(item[1].extension)):
+        if path.endswith(writer_cls.extension):
+            return output_format
+    return default
+
+
+def strip_extension(path: str) -> str:
+    """Removes a known output extension (including ".jsonl.zst") from a path."""
+    extension = WRITERS[format_for_path(path)].extension
+    return path[:-len(extension)] if path.endswith(extension) else os.path.splitext(path)[0]
+
+
+def create_writer(output_format: str, path: str, **options: Any) -> RecordWriter:
+    """Instantiates a registered writer by name, e.g. create_writer("parquet", path, row_group_size=5000)."""
+    writer_cls = WRITERS.get(output_format)
+    if writer_cls is None:
+        raise ValueError(f"Unknown output format '{output_format}'. Available: {', '.join(WRITERS)}")
+    return writer_cls(path, **options)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class VersionedOutput:
+    """
+    A content-addressed version directory for one dataset.
+
+    Files are written into a staging directory under `root/name/`. On commit
+    the directory is renamed to the first 16 hex digits of a hash over its
+    files, a manifest with per-file sizes, record counts and checksums is
+    added, and `root/name/LATEST` is pointed at it. Rerunning with identical
+    output reuses the existing version; prior versions are never overwritten.
+    """
+
+    def __init__(self, root: str, name: str):
+        self.dataset_dir = os.path.join(root, name)
+        self.staging_dir = os.path.join(self.dataset_dir, f".staging-{uuid.uuid4().hex}")
+        os.makedirs(self.staging_dir)
+        self.counts: Dict[str, int] = {}
+        self.version: Optional[str] = None
+        self.path: Optional[str] = None
+
+    def path_for(self, file_name: str) -> str:
+        """Where to write `file_name` before the commit."""
+        return os.path.join(self.staging_dir, file_name)
+
+    def record_count(self, file_name: str, count: int):
+        """Records how many records a file holds, for the manifest."""
+        self.counts[file_name] = count
+
+    def commit(self, metadata: Optional[Dict[str, Any]] = None) -> str:
+        """Publishes the staged files. Returns the version directory."""
+        files = []
+        digest = hashlib.sha256()
+        for file_name in sorted(os.listdir(self.staging_dir)):
+            file_path = os.path.join(self.staging_dir, file_name)
+            checksum = file_sha256(file_path)
+            digest.update(f"{file_name}\0{checksum}\0".encode("utf-8"))
+            files.append({"path": file_name, "bytes": os.path.getsize(file_path), "sha256": checksum,
+                          "count": self.counts.get(file_name)})
+        self.version = digest.hexdigest()[:16]
+        self.path = os.path.join(self.dataset_dir, self.version)
+
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.staging_dir)  # Identical content is already published.
+        else:
+            manifest = dict(metadata or {}, version=self.version, created_at=time.time(), files=files)
+            with open(os.path.join(self.staging_dir, VERSION_MANIFEST_FILE), "w") as f:
+                json.dump(manifest, f, indent=2)
+            os.rename(self.staging_dir, self.path)
+
+        latest_tmp = os.path.join(self.dataset_dir, f".{LATEST_FILE}.{uuid.uuid4().hex}")
+        with open(latest_tmp, "w") as f:
+            f.write(self.version + "\n")
+        os.replace(latest_tmp, os.path.join(self.dataset_dir, LATEST_FILE))
+        return self.path
+
+    def abort(self):
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def __enter__(self) -> "VersionedOutput":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and self.version is None:
+            self.commit()
+        elif exc_type is not None:
+            self.abort()
+
+
+def latest_version(root: str, name: str) -> Optional[str]:
+    """Returns the directory of the latest committed version of a dataset, or None."""
+    try:
+        with open(os.path.join(root, name, LATEST_FILE)) as f:
+            return os.path.join(root, name, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def dataset_files(path: str) -> List[str]:
+    """
+    The record files of a stored dataset, in order: `path` itself if it is a
+    file, otherwise the shards or files listed by the manifest of a shard or
+    version directory, or of the latest version of a versioned dataset.
+    """
+    if not os.path.isdir(path):
+        return [path]
+    if os.path.exists(os.path.join(path, LATEST_FILE)):
+        path = latest_version(os.path.dirname(os.path.normpath(path)), os.path.basename(os.path.normpath(path)))
+    with open(os.path.join(path, VERSION_MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    return [os.path.join(path, entry["path"]) for entry in manifest.get("shards") or manifest.get("files") or []]
+
+
+def temporary_path(file_path: str) -> str:
+    """A hidden, unique path next to `file_path` to write to before renaming it into place."""
+    return os.path.join(os.path.dirname(file_path) or ".", f".{os.path.basename(file_path)}.{uuid.uuid4().hex}")
+
+
+def store_records(records: Iterable[Dict[str, Any]],
+                  file_path: str,
+                  output_format: Optional[str] = None,
+                  versioned: bool = False,
+                  **writer_options: Any) -> Dict[str, Any]:
+    """
+    Writes records to `file_path` with the writer for `output_format` (inferred from the extension if None).
+
+    Unversioned output is written to a temporary file and renamed into place,
+    so an interrupted run never leaves a truncated file. Versioned output goes
+    into a `VersionedOutput` directory named after the file.
+
+    Returns:
+        Dict[str, Any]: The final `path`, record `count` and `version` (None if unversioned).
+    """
+    output_format = output_format or format_for_path(file_path)
+    if not versioned:
+        tmp_path = temporary_path(file_path)
+        try:
+            with create_writer(output_format, tmp_path, **writer_options) as writer:
+                writer.write_many(records)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return {"path": file_path, "count": writer.count, "version": None}
+
+    file_name = os.path.basename(file_path)
+    with VersionedOutput(os.path.dirname(file_path) or ".", os.path.basename(strip_extension(file_path))) as version:
+        with create_writer(output_format, version.path_for(file_name), **writer_options) as writer:
+            writer.write_many(records)
+        version.record_count(file_name, writer.count)
+        version_dir = version.commit({"format": output_format})
+    return {"path": os.path.join(version_dir, file_name), "count": writer.count, "version": version.version}
+
+
+def open_arrow(path: str) -> Any:
+    """Memory-maps an Arrow IPC file written by `ArrowWriter` and returns it as a zero-copy `pyarrow.Table`."""
+    import pyarrow
+    return pyarrow.ipc.open_file(pyarrow.memory_map(path, "r")).read_all()
+
+
+def iter_records(path: str, batch_size: int = DEFAULT_ROW_GROUP_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Streams records back from any supported format, one dict at a time.
+
+    Columnar formats yield their columns as stored; nested values come back as
+    JSON text.
+    """
+    output_format = format_for_path(path)
+    if output_format == "jsonl":
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif output_format == "jsonl.zst":
+        import zstandard
+        with open(path, "rb") as raw:
+            with io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw), encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+    elif output_format == "parquet":
+        import pyarrow.parquet
+        for batch in pyarrow.parquet.ParquetFile(path, memory_map=True).iter_batches(batch_size=batch_size):
+            yield from batch.to_pylist()
+    else:
+        for batch in open_arrow(path).to_batches(max_chunksize=batch_size):
+            yield from batch.to_pylist()
@@ -0,0 +1,14 @@
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# `src/__init__.py` re-exports the whole system, including modules that need
+# a GPU stack. Register the package without running it, so each test imports
+# only the modules it exercises.
+if "src" not in sys.modules:
+    package = types.ModuleType("src")
+    package.__path__ = [os.path.join(ROOT, "src")]
+    sys.modules["src"] = package
@@ -0,0 +1,145 @@
+import collections
+import contextlib
+import copy
+import io
+import threading
+
+import pytest
+
+for module in ("torch", "transformers", "peft"):
+    pytest.importorskip(module)
+
+import torch  # noqa: E402
+from peft import LoraConfig, get_peft_model  # noqa: E402
+from transformers import GPT2Config, GPT2LMHeadModel  # noqa: E402
+
+from src.core.base import AgentType, BaseAgent, LoRAAdapterManager  # noqa: E402
+from src.core.resource_management import AdapterLoaderUnloader  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def adapters(tmp_path_factory):
+    """A tiny GPT-2 base model and three LoRA adapters of equal size saved for it."""
+    torch.manual_seed(0)
+    base_model = GPT2LMHeadModel(GPT2Config(n_layer=2, n_embd=64, n_head=4, vocab_size=500, n_positions=64,
+                                            bos_token_id=0, eos_token_id=0)).eval()
+    base_path = tmp_path_factory.mktemp("adapters")
+    for name in ("a", "b", "c"):
+        lora_model = get_peft_model(copy.deepcopy(base_model), LoraConfig(
+            r=4, lora_alpha=8, target_modules=["c_attn"], fan_in_fan_out=True, task_type="CAUSAL_LM"))
+        lora_model.save_pretrained(str(base_path / name))
+    return base_model, str(base_path)
+
+
+def test_loader_budget_never_evicts_adapters_in_use(adapters):
+    base_model, base_path = adapters
+    loader = AdapterLoaderUnloader(copy.deepcopy(base_model), None)
+    # Room for two adapters in VRAM, though the manager's cache would take all three.
+    loader.vram_budget_gb = 2.5 * loader._get_adapter_size_gb(f"{base_path}/a")
+    manager = LoRAAdapterManager(base_path, loader=loader, cache_size=3)
+    assert not loader.auto_evict
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert manager.load_adapter("agent-1", "a")
+        assert manager.load_adapter("agent-2", "b")
+        # Both resident adapters are in use: the load is refused rather than evicting one of them.
+        assert not manager.load_adapter("agent-3", "c")
+        assert set(loader.get_loaded_adapters()) == {f"{base_path}/a", f"{base_path}/b"}
+        assert manager.get_residency_stats()["rejected"] == 1
+
+        # Once agent-1 lets go of its adapter, the manager evicts it to make room.
+        assert manager.switch_adapter("agent-1", "c")
+        assert set(loader.get_loaded_adapters()) == {f"{base_path}/b", f"{base_path}/c"}
+        assert manager.get_residency_stats()["evictions"] == 1
+
+
+def test_unmanaged_loader_serves_hits_from_cache_and_evicts_lru(adapters):
+    base_model, base_path = adapters
+    loader = AdapterLoaderUnloader(copy.deepcopy(base_model), None, max_cache_size=2, vram_budget_gb=float("inf"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        first = loader.load_adapter(f"{base_path}/a")
+        assert loader.load_adapter(f"{base_path}/a") is first
+        loader.load_adapter(f"{base_path}/b")
+        loader.load_adapter(f"{base_path}/c")
+    assert list(loader.get_loaded_adapters()) == [f"{base_path}/b", f"{base_path}/c"]
+
+
+def test_switch_adapter_rebinds_the_agent(adapters):
+    base_model, base_path = adapters
+    loader = AdapterLoaderUnloader(copy.deepcopy(base_model), None)
+    manager = LoRAAdapterManager(base_path, loader=loader, cache_size=2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name in ("a", "b", "a"):
+            assert manager.switch_adapter("agent-1", name)
+    stats = manager.get_residency_stats()
+    assert manager.get_loaded_adapters() == {"agent-1": f"{base_path}/a"}
+    assert (stats["switches"], stats["misses"], stats["hits"], stats["pinned"]) == (3, 2, 1, 1)
+
+
+class BlockingLoader:
+    """Loads an adapter only once the test releases it, counting loads per path."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.loading = threading.Event()
+        self.loads = collections.Counter()
+
+    def load_adapter(self, adapter_path):
+        self.loads[adapter_path] += 1
+        self.loading.set()
+        assert self.release.wait(10)
+        return f"handle:{adapter_path}"
+
+    def unload_adapter(self, adapter_path):
+        pass
+
+
+def test_loads_run_outside_the_manager_lock():
+    loader = BlockingLoader()
+    manager = LoRAAdapterManager("adapters", loader=loader, cache_size=3)
+    loader.release.set()
+    assert manager.load_adapter("agent-1", "resident")
+    loader.release.clear()
+
+    results = {}
+    waiters = [threading.Thread(target=lambda name=name: results.update({name: manager.load_adapter(name, "slow")}))
+               for name in ("agent-2", "agent-3")]
+    waiters[0].start()
+    assert loader.loading.wait(10)
+    waiters[1].start()
+    # While "slow" loads, resident adapters are still served and stats can be read.
+    assert manager.load_adapter("agent-4", "resident")
+    assert manager.get_residency_stats()["resident"] == 1
+    assert not manager.is_resident("adapters/slow")
+
+    loader.release.set()
+    for waiter in waiters:
+        waiter.join(10)
+    assert results == {"agent-2": True, "agent-3": True}
+    # The second acquirer waited for the first load instead of loading the adapter again.
+    assert loader.loads["adapters/slow"] == 1
+    assert manager.get_residency_stats()["adapters"]["adapters/slow"]["ref_count"] == 2
+
+
+class ManagedAgent(BaseAgent):
+    def execute(self, task, context):
+        return {}
+
+    def get_capabilities(self):
+        return []
+
+    def get_required_tools(self):
+        return []
+
+
+def test_agent_load_state_follows_the_manager_binding():
+    manager = LoRAAdapterManager("adapters", cache_size=2)
+    agent = ManagedAgent("agent-1", AgentType.CORE_PYTHON)
+    agent.adapter_manager = manager
+
+    assert agent.load_adapter("adapters/a") and agent.is_loaded()
+    # Rebound by the manager directly, e.g. by a switch for the same agent name: still loaded.
+    assert manager.load_adapter("agent-1", "b")
+    assert agent.is_loaded()
+    manager.unload_adapter("agent-1")
+    assert not agent.is_loaded()
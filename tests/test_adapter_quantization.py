@@ -0,0 +1,91 @@
+import contextlib
+import copy
+import io
+import os
+
+import pytest
+
+for module in ("torch", "transformers", "peft", "safetensors"):
+    pytest.importorskip(module)
+
+import torch  # noqa: E402
+from peft import LoraConfig, PeftModel, get_peft_model  # noqa: E402
+from transformers import GPT2Config, GPT2LMHeadModel  # noqa: E402
+
+from src.core.adapter_quantization import (  # noqa: E402
+    MAX_ABS_LOGIT_DIFF, QUANTIZED_ADAPTER_FILE, dequantize_tensor, load_quantized_adapter, quantize_adapter, quantize_tensor)
+from src.core.resource_management import AdapterLoaderUnloader  # noqa: E402
+
+FORMATS = ("int8", "fp8")
+# Worst relative error per element: half an int8 step of the row's absmax, or fp8 e4m3's 3 mantissa bits.
+ELEMENT_ERROR = {"int8": 0.5 / 127, "fp8": 2 ** -4}
+
+
+def _require(quant_dtype):
+    if quant_dtype == "fp8" and not hasattr(torch, "float8_e4m3fn"):
+        pytest.skip("This torch build has no float8_e4m3fn.")
+
+
+@pytest.mark.parametrize("quant_dtype", FORMATS)
+def test_quantize_tensor_error_is_bounded_per_row(quant_dtype):
+    _require(quant_dtype)
+    weight = torch.randn(16, 64, generator=torch.Generator().manual_seed(0)) * torch.logspace(-3, 1, 16)[:, None]
+    restored = dequantize_tensor(*quantize_tensor(weight, quant_dtype))
+    absmax = weight.abs().amax(dim=1, keepdim=True)
+    bound = ELEMENT_ERROR[quant_dtype] * (absmax if quant_dtype == "int8" else weight.abs()) + 1e-6 * absmax
+    assert ((restored - weight).abs() <= bound).all()
+
+
+@pytest.fixture(scope="module")
+def adapter(tmp_path_factory):
+    """A tiny GPT-2 base model, a LoRA adapter with random weights saved in full precision, and its logits."""
+    torch.manual_seed(0)
+    base_model = GPT2LMHeadModel(GPT2Config(n_layer=2, n_embd=128, n_head=4, vocab_size=1000, n_positions=128,
+                                            bos_token_id=0, eos_token_id=0)).eval()
+    lora_model = get_peft_model(copy.deepcopy(base_model), LoraConfig(
+        r=16, lora_alpha=32, target_modules=["c_attn", "c_proj"], fan_in_fan_out=True, task_type="CAUSAL_LM"))
+    with torch.no_grad():
+        for name, param in lora_model.named_parameters():
+            if "lora_B" in name:
+                param.normal_(std=0.02)
+    path = str(tmp_path_factory.mktemp("adapter") / "full")
+    lora_model.save_pretrained(path)
+    input_ids = torch.randint(0, 1000, (2, 32))
+    with torch.no_grad():
+        reference = PeftModel.from_pretrained(copy.deepcopy(base_model), path).eval()(input_ids).logits
+    return base_model, path, input_ids, reference
+
+
+@pytest.mark.parametrize("quant_dtype", FORMATS)
+def test_quantized_adapter_logits_within_tolerance(adapter, tmp_path, quant_dtype):
+    _require(quant_dtype)
+    base_model, full_path, input_ids, reference = adapter
+    quantized_path = str(tmp_path / quant_dtype)
+    quantize_adapter(full_path, quantized_path, quant_dtype)
+    assert load_quantized_adapter(quantized_path).quant_dtype == quant_dtype
+
+    loader = AdapterLoaderUnloader(copy.deepcopy(base_model), None, prefer_quantized=True)
+    with contextlib.redirect_stdout(io.StringIO()), torch.no_grad():
+        logits = loader.load_adapter(quantized_path).eval()(input_ids).logits
+
+    max_abs_diff = (logits - reference).abs().max().item()
+    assert 0 < max_abs_diff <= MAX_ABS_LOGIT_DIFF[quant_dtype]
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.bfloat16])
+def test_quantized_adapter_is_charged_at_its_dequantized_size(adapter, tmp_path, dtype):
+    base_model, full_path, _, _ = adapter
+    quantized_path = str(tmp_path / "int8")
+    with contextlib.redirect_stdout(io.StringIO()):
+        quantize_adapter(full_path, quantized_path, "int8")
+    loaded = load_quantized_adapter(quantized_path).dequantize(dtype)
+    expected_gb = sum(tensor.numel() * tensor.element_size() for tensor in loaded.values()) / 1024**3
+
+    for keep_in_host_ram in (False, True):
+        loader = AdapterLoaderUnloader(copy.deepcopy(base_model).to(dtype), None, prefer_quantized=True,
+                                       keep_quantized_in_host_ram=keep_in_host_ram)
+        with contextlib.redirect_stdout(io.StringIO()):
+            loader.load_adapter(quantized_path)
+        assert loader.get_current_vram_usage_by_adapters() == pytest.approx(expected_gb)
+        assert loader.get_current_vram_usage_by_adapters() > os.path.getsize(
+            os.path.join(quantized_path, QUANTIZED_ADAPTER_FILE)) / 1024**3
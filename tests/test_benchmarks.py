@@ -0,0 +1,78 @@
+"""Smoke runs of the benchmarks at tiny sizes: each writes its results JSON. What they measure is tested elsewhere."""
+import contextlib
+import importlib
+import io
+import json
+
+import pytest
+
+BENCHMARKS = {
+    "src.core.adapter_benchmark": (("torch", "transformers", "peft", "psutil"),
+                                   ["--num-adapters", "3", "--ranks", "4", "--repeats", "1"]),
+    "src.core.sandbox_benchmark": (("docker",),
+                                   ["--backends", "fake", "--languages", "python", "--repeats", "1",
+                                    "--concurrency", "1,2", "--fanout-requests", "2", "--stdin-bytes", "10",
+                                    "--output-bytes", "10", "--container-start-latency", "0", "--exec-latency", "0"]),
+    "src.training.cache_benchmark": (("datasets",), ["--records", "200", "--num-samples", "100",
+                                                     "--mean-content-bytes", "64"]),
+    "src.training.dedup_benchmark": (("numpy",), ["--docs", "50", "--workers", "0", "--exact-backends", "memory"]),
+    "src.training.function_mining_benchmark": (("datasets",), ["--files", "50", "--workers", "1",
+                                                               "--max-file-kb", "16"]),
+    "src.training.mixture_benchmark": (("pyarrow", "zstandard"), ["--records", "400", "--shuffle-buffer", "20",
+                                                                  "--window", "100"]),
+    "src.training.resume_benchmark": (("datasets",), ["--samples", "500", "--checkpoint-every", "100", "--kills", "1"]),
+    "src.training.sketches_benchmark": (("numpy",), ["--examples", "200", "--shards", "2"]),
+    "src.training.synthesis_benchmark": (("datasets", "psutil"), ["--sizes", "10,20", "--mean-content-bytes", "64"]),
+    "src.training.token_lengths_benchmark": (("numpy", "tokenizers", "transformers"),
+                                             ["--examples", "200", "--max-length", "64"]),
+    "src.training.validation_benchmark": (("docker",), ["--examples", "8", "--concurrency", "2", "--timeout", "1"]),
+}
+
+
+@pytest.mark.parametrize("module_name", sorted(BENCHMARKS))
+def test_benchmark_writes_results(module_name, tmp_path):
+    requirements, argv = BENCHMARKS[module_name]
+    for requirement in requirements:
+        pytest.importorskip(requirement)
+    module = importlib.import_module(module_name)
+    output = tmp_path / "results.json"
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert module.main(argv + ["--output", str(output)]) == 0
+    with open(output) as f:
+        results = json.load(f)
+    assert results["environment"]["python"]
+
+
+def test_a_reported_regression_fails_the_run(tmp_path):
+    from src.core.benchmarking import benchmark_main
+
+    def add_arguments(parser):
+        parser.add_argument("--latency", type=float, default=1.0)
+        parser.add_argument("--limit", type=float, default=2.0)
+
+    def check(results, limit):
+        return [f"latency {results['latency']} exceeds {limit}"] if results["latency"] > limit else []
+
+    output = str(tmp_path / "results.json")
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert benchmark_main(lambda latency: {"latency": latency}, ["--output", output], "", output,
+                              add_arguments, check=check, check_options=("limit",)) == 0
+        assert benchmark_main(lambda latency: {"latency": latency}, ["--latency", "3", "--output", output], "", output,
+                              add_arguments, check=check, check_options=("limit",)) == 1
+    with open(output) as f:
+        assert json.load(f)["regressions"] == ["latency 3.0 exceeds 2.0"]
+
+
+def test_adapter_regressions_against_thresholds_and_baseline():
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    pytest.importorskip("peft")
+    pytest.importorskip("psutil")
+    from src.core.adapter_benchmark import check_regressions
+
+    results = {"metrics": {"cold_load_ms": {"p50": 10.0}, "switch_ms": {"p50": 20.0}}}
+    assert check_regressions(results, {"cold_load_ms.p50": 50.0}) == []
+    assert len(check_regressions(results, {"cold_load_ms.p50": 5.0})) == 1
+    baseline = {"metrics": {"cold_load_ms": {"p50": 9.0}, "switch_ms": {"p50": 10.0}}}
+    assert check_regressions(results, {}, baseline, tolerance=0.25) == [
+        "switch_ms.p50=20.000 regressed more than 25% from baseline 10.000"]
@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("datasets")
+
+from src.training.data_synthesis import (DataSynthesisPipeline, extract_docstring,  # noqa: E402
+                                         synthesize_python_development_data)
+from src.training.validation import ExampleValidator  # noqa: E402
+from src.training.writers import iter_records  # noqa: E402
+
+FUNCTIONS_PER_FILE = 3
+
+
+def _python_file(index):
+    return "".join(f'def function_{index}_{number}(x):\n    """Returns x plus {number}."""\n    return x + {number}\n\n\n'
+                   for number in range(FUNCTIONS_PER_FILE))
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "source.jsonl"
+    with open(path, "w") as f:
+        for index in range(10):
+            f.write(json.dumps({"hexsha": f"{index:040x}", "content": _python_file(index), "lang": "Python",
+                                "path": f"pkg/module_{index}.py"}) + "\n")
+    return str(path)
+
+
+def _fan_out(pipeline, data_file, **options):
+    return pipeline.generate_fanout_react_data("bigcode/the-stack-v2", agent_types=["tanuki-python-dev"],
+                                               num_samples=-1, data_files=data_file, **options)
+
+
+def test_fanout_quota_truncates_multi_example_records(tmp_path, data_file):
+    output_dir = tmp_path / "out"
+    stats = _fan_out(DataSynthesisPipeline(str(output_dir)), data_file, quotas={"tanuki-python-dev": 5})
+
+    assert stats["tanuki-python-dev"]["stored"] == 5
+    assert stats["tanuki-python-dev"]["sampled"] == 2
+    assert os.listdir(output_dir) == ["tanuki-python-dev_train_react_data.jsonl"]
+    assert len(list(iter_records(str(output_dir / "tanuki-python-dev_train_react_data.jsonl")))) == 5
+
+
+def test_interrupted_fanout_leaves_no_partial_file(tmp_path, data_file):
+    output_dir = tmp_path / "out"
+    pipeline = DataSynthesisPipeline(str(output_dir))
+    stream = pipeline.iter_dataset
+
+    def failing_stream(*args, **kwargs):
+        for position, sample in enumerate(stream(*args, **kwargs)):
+            if position == 4:
+                raise RuntimeError("stream failed")
+            yield sample
+
+    pipeline.iter_dataset = failing_stream
+    with pytest.raises(RuntimeError, match="stream failed"):
+        _fan_out(pipeline, data_file)
+    assert os.listdir(output_dir) == []
+
+
+def test_fanout_validates_full_batches(tmp_path, data_file):
+    batches = []
+
+    class RecordingValidator(ExampleValidator):
+        def validate_batch(self, examples):
+            batches.append(len(examples))
+            return super().validate_batch(examples)
+
+    validator = RecordingValidator(batch_size=8)
+    stats = _fan_out(DataSynthesisPipeline(str(tmp_path / "out"), validator=validator), data_file)
+
+    assert stats["tanuki-python-dev"]["stored"] == 10 * FUNCTIONS_PER_FILE
+    assert sum(batches) == 10 * FUNCTIONS_PER_FILE
+    assert all(size >= 8 for size in batches[:-1])
+    assert validator.get_stats()["compiled_in_process"] == 10 * FUNCTIONS_PER_FILE
+
+
+def test_fanout_validation_batches_stop_at_the_quota(tmp_path, data_file):
+    batches = []
+
+    class RecordingValidator(ExampleValidator):
+        def validate_batch(self, examples):
+            batches.append(len(examples))
+            return super().validate_batch(examples)
+
+    stats = _fan_out(DataSynthesisPipeline(str(tmp_path / "out"), validator=RecordingValidator(batch_size=64)),
+                     data_file, quotas={"tanuki-python-dev": 5})
+
+    assert stats["tanuki-python-dev"]["stored"] == 5
+    assert batches == [6]
+
+
+def test_undocumented_code_has_no_docstring_to_build_from(tmp_path):
+    undocumented = "def add(x, y):\n    return x + y\n"
+    assert extract_docstring(undocumented) == ""
+    assert DataSynthesisPipeline(str(tmp_path))._extract_docstring(undocumented) == ""
+    assert synthesize_python_development_data({"content": undocumented}) is None
+    assert extract_docstring(_python_file(0)) == "Returns x plus 0."
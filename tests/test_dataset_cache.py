@@ -0,0 +1,63 @@
+import contextlib
+import io
+import itertools
+import os
+
+import pytest
+
+pytest.importorskip("datasets")
+
+from src.training.data_synthesis import DataSynthesisPipeline  # noqa: E402
+from src.training.dataset_cache import DatasetCache, matches_filters, stream_dataset  # noqa: E402
+from src.training.synthesis_benchmark import SOURCE_DATASET, write_synthetic_stack  # noqa: E402
+
+NUM_RECORDS = 3000
+NUM_SAMPLES = 2000
+FILTERS = {"lang": "Python"}
+
+
+@pytest.fixture(scope="module")
+def data_file(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("source") / "the-stack-v2.jsonl")
+    write_synthetic_stack(path, NUM_RECORDS, mean_content_bytes=256)
+    return path
+
+
+def _streamed(data_file, num_samples, filters):
+    records = (record for record in stream_dataset(SOURCE_DATASET, "train", data_file)
+               if matches_filters(record, filters))
+    return list(itertools.islice(records, num_samples))
+
+
+@pytest.mark.parametrize("filters", [None, FILTERS])
+def test_replay_equals_stream(data_file, tmp_path, filters):
+    cache = DatasetCache(str(tmp_path / "cache"), shard_size=500, batch_size=128)
+    manifest = cache.materialize(stream_dataset(SOURCE_DATASET, "train", data_file), SOURCE_DATASET, "train",
+                                 NUM_SAMPLES, filters, data_file)
+    replayed = list(cache.replay(manifest, NUM_SAMPLES))
+    assert len(replayed) == NUM_SAMPLES
+    assert replayed == _streamed(data_file, NUM_SAMPLES, filters)
+
+
+def test_offline_serves_cached_prefix_and_raises_on_miss(data_file, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    with contextlib.redirect_stdout(io.StringIO()):
+        DatasetCache(cache_dir).load(SOURCE_DATASET, "train", NUM_SAMPLES, FILTERS, data_file)
+    offline = DatasetCache(cache_dir, offline=True)
+    prefix = list(offline.load(SOURCE_DATASET, "train", NUM_SAMPLES // 2, FILTERS, data_file))
+    assert prefix == _streamed(data_file, NUM_SAMPLES // 2, FILTERS)
+    with pytest.raises(FileNotFoundError):
+        offline.load(SOURCE_DATASET, "train", NUM_SAMPLES, {"lang": "no-such-language"}, data_file)
+
+
+def test_offline_synthesis_matches_materializing_run(data_file, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    outputs = []
+    for name, offline in (("online", False), ("offline", True)):
+        pipeline = DataSynthesisPipeline(str(tmp_path / name), dataset_cache=DatasetCache(cache_dir, offline=offline))
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            pipeline.generate_and_store_react_data(SOURCE_DATASET, "tanuki-coder", num_samples=NUM_SAMPLES,
+                                                   data_files=data_file, filters=FILTERS)
+        with open(os.path.join(str(tmp_path / name), "tanuki-coder_train_react_data.jsonl"), "rb") as f:
+            outputs.append(f.read())
+    assert outputs[0] and outputs[0] == outputs[1]
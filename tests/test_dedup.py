@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.training.dedup import Deduplicator, MinHasher  # noqa: E402
+from src.training.dedup_benchmark import synthetic_corpus  # noqa: E402
+
+NUM_DOCS = 2000
+
+
+def _jaccard(hasher, a, b):
+    a, b = set(hasher.shingle_hashes(a).tolist()), set(hasher.shingle_hashes(b).tolist())
+    return len(a & b) / len(a | b)
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return list(synthetic_corpus(NUM_DOCS))
+
+
+@pytest.fixture(scope="module")
+def kept_ids(corpus):
+    deduplicator = Deduplicator()
+    kept = {sample["id"] for sample in deduplicator.filter(iter(corpus))}
+    deduplicator.close()
+    return kept
+
+
+@pytest.mark.parametrize("exact_backend, num_workers", [("memory", 2), ("sqlite", 0), ("sqlite", 2)])
+def test_results_do_not_depend_on_workers_or_backend(corpus, kept_ids, tmp_path, exact_backend, num_workers):
+    exact_path = str(tmp_path / "digests.sqlite") if exact_backend == "sqlite" else None
+    deduplicator = Deduplicator(exact_backend=exact_backend, exact_path=exact_path, num_workers=num_workers)
+    assert {sample["id"] for sample in deduplicator.filter(iter(corpus))} == kept_ids
+    deduplicator.close()
+
+
+def test_every_exact_copy_and_no_original_is_removed(corpus, kept_ids):
+    for sample in corpus:
+        if sample["kind"] == "exact":
+            assert sample["id"] not in kept_ids
+        elif sample["kind"] == "original":
+            assert sample["id"] in kept_ids
+
+
+def test_near_copies_are_removed_by_similarity(corpus, kept_ids):
+    hasher = MinHasher()
+    similar = dissimilar = 0
+    for sample in corpus:
+        if sample["kind"] != "near":
+            continue
+        similarity = _jaccard(hasher, sample["content"], corpus[sample["duplicate_of"]]["content"])
+        # Far from the 0.8 threshold, the LSH estimate decides the same way as the exact Jaccard.
+        if similarity >= 0.9:
+            similar += 1
+            assert sample["id"] not in kept_ids
+        elif similarity < 0.6:
+            dissimilar += 1
+            assert sample["id"] in kept_ids
+    assert similar and dissimilar
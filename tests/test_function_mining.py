@@ -0,0 +1,67 @@
+import contextlib
+import io
+import json
+import os
+
+import pytest
+
+pytest.importorskip("datasets")
+
+from src.training.data_synthesis import DataSynthesisPipeline  # noqa: E402
+from src.training.function_mining import FunctionMiner  # noqa: E402
+from src.training.function_mining_benchmark import write_function_corpus  # noqa: E402
+from src.training.writers import iter_records  # noqa: E402
+
+NUM_FILES = 300
+MAX_FILE_BYTES = 16 * 1024
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("corpus") / "the-stack-v2.jsonl")
+    expected = write_function_corpus(path, NUM_FILES, MAX_FILE_BYTES)
+    with open(path) as f:
+        samples = [{"id": record["hexsha"], "content": record["content"], "language": record["lang"],
+                    "path": record["path"]} for record in map(json.loads, f)]
+    return path, samples, expected
+
+
+def _mine(samples, **options):
+    miner = FunctionMiner(max_file_bytes=MAX_FILE_BYTES, **options)
+    examples = [(example["source_id"], example["qualname"], example["lineno"]) for example in miner.mine(samples)]
+    return examples, miner.get_stats()
+
+
+def test_miner_finds_every_function(corpus):
+    _, samples, expected = corpus
+    examples, stats = _mine(samples)
+    assert len(examples) == expected["functions"]
+    assert stats["tokenize"] == expected["python2"]
+    assert stats["too_large"] == expected["too_large"]
+    assert stats["skipped_language"] == expected["other_language"]
+    assert stats["bytes"] == expected["bytes"]
+
+
+def test_miner_keeps_documented_functions(corpus):
+    _, samples, expected = corpus
+    examples, _ = _mine(samples, require_docstring=True)
+    assert len(examples) == expected["documented"]
+
+
+def test_pool_output_matches_in_process(corpus):
+    _, samples, _ = corpus
+    assert _mine(samples, num_workers=2, chunk_size=16)[0] == _mine(samples)[0]
+
+
+def test_python_dev_strategy_stores_one_example_per_documented_function(corpus, tmp_path):
+    path, _, expected = corpus
+    pipeline = DataSynthesisPipeline(str(tmp_path))
+    pipeline.function_miner = FunctionMiner(max_file_bytes=MAX_FILE_BYTES, require_docstring=True,
+                                            source_fn=pipeline.function_miner.source_fn)
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        stored = pipeline.generate_and_store_react_data("bigcode/the-stack-v2", "tanuki-python-dev", num_samples=-1,
+                                                        data_files=path)
+    examples = list(iter_records(os.path.join(str(tmp_path), "tanuki-python-dev_train_react_data.jsonl")))
+    assert stored == len(examples) == expected["documented"]
+    assert all(example["function"] for example in examples)
+    assert pipeline.function_miner.get_stats()["too_large"] == expected["too_large"]
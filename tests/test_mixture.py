@@ -0,0 +1,72 @@
+import tracemalloc
+
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("zstandard")
+
+from src.training.mixture import WeightedMixtureReader  # noqa: E402
+from src.training.mixture_benchmark import in_memory_mixture, share_deviation, write_sources  # noqa: E402
+from src.training.writers import dataset_files, iter_records  # noqa: E402
+
+NUM_RECORDS = 10000
+WEIGHTS = {"tanuki-coder": 0.4, "tanuki-debugger": 0.3, "tanuki-reviewer": 0.3}
+
+
+@pytest.fixture(scope="module")
+def sources(tmp_path_factory):
+    return write_sources(str(tmp_path_factory.mktemp("sources")), NUM_RECORDS)
+
+
+def _mixture(sources, **options):
+    return WeightedMixtureReader(sources, WEIGHTS, shuffle_buffer_size=200, **options)
+
+
+def _order(records):
+    return [(record["agent_type"], record["id"]) for record in records]
+
+
+def test_order_is_reproducible_and_differs_by_epoch(sources):
+    mixture = _mixture(sources)
+    first = _order(mixture)
+    assert _order(mixture) == first
+    mixture.set_epoch(1)
+    assert _order(mixture) != first
+
+
+@pytest.mark.parametrize("epoch", [0, 1])
+def test_first_exhausted_repeats_no_record(sources, epoch):
+    mixture = _mixture(sources)
+    mixture.set_epoch(epoch)
+    order = _order(mixture)
+    assert len(set(order)) == len(order)
+
+
+def test_all_exhausted_covers_every_record(sources):
+    every = {(record["agent_type"], record["id"]) for path in sources.values()
+             for file_path in dataset_files(path) for record in iter_records(file_path)}
+    assert set(_order(_mixture(sources, stopping_strategy="all_exhausted"))) == every
+
+
+def test_num_examples_is_exact(sources):
+    assert len(_order(_mixture(sources, num_examples=NUM_RECORDS))) == NUM_RECORDS
+
+
+@pytest.mark.parametrize("options", [{}, {"num_examples": NUM_RECORDS}])
+def test_shares_follow_the_weights(sources, options):
+    assert share_deviation(_order(_mixture(sources, **options)), WEIGHTS) <= 0.02
+
+
+def _peak_bytes(build):
+    tracemalloc.start()
+    for _ in build():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+@pytest.mark.parametrize("options", [{}, {"stopping_strategy": "all_exhausted"}, {"num_examples": NUM_RECORDS}])
+def test_streaming_memory_is_a_fraction_of_loading_everything(sources, options):
+    in_memory = _peak_bytes(lambda: in_memory_mixture(sources))
+    assert _peak_bytes(lambda: _mixture(sources, **options)) <= 0.25 * in_memory
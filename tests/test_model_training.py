@@ -0,0 +1,74 @@
+import pytest
+
+for module in ("torch", "transformers", "peft", "datasets", "tokenizers"):
+    pytest.importorskip(module)
+
+import transformers.trainer  # noqa: E402
+from transformers import AutoModelForCausalLM, LlamaConfig  # noqa: E402
+
+from src.training import model_training  # noqa: E402
+from src.training.token_lengths import TokenLengthAnnotator  # noqa: E402
+from src.training.token_lengths_benchmark import train_tokenizer  # noqa: E402
+from src.training.writers import store_records  # noqa: E402
+
+WORDS = ("def", "return", "self", "value", "items", "for", "in", "if", "None", "result")
+
+
+def _examples(count):
+    return [{"agent_type": "tanuki-coder", "prompt": f"Task {index}",
+             "completion": " ".join(WORDS[(index + word) % len(WORDS)] for word in range(3 + 7 * (index % 5)))}
+            for index in range(count)]
+
+
+@pytest.fixture(scope="module")
+def base_model(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("base_model"))
+    tokenizer = train_tokenizer([" ".join(WORDS)] * 20, vocab_size=300)
+    tokenizer.save_pretrained(path)
+    config = LlamaConfig(vocab_size=len(tokenizer), hidden_size=32, intermediate_size=64, num_hidden_layers=1,
+                         num_attention_heads=2, num_key_value_heads=2, max_position_embeddings=128)
+    AutoModelForCausalLM.from_config(config).save_pretrained(path)
+    return path, tokenizer
+
+
+@pytest.fixture
+def sampler_lengths(monkeypatch):
+    """The lengths each LengthGroupedSampler the Trainer builds is given (None when it measures them)."""
+    recorded = []
+
+    class RecordingSampler(transformers.trainer.LengthGroupedSampler):
+        def __init__(self, *args, lengths=None, **kwargs):
+            recorded.append(lengths)
+            super().__init__(*args, lengths=lengths, **kwargs)
+
+    monkeypatch.setattr(transformers.trainer, "LengthGroupedSampler", RecordingSampler)
+    return recorded
+
+
+def _train(base_model, dataset_path, tmp_path):
+    model_training.train_lora_adapter(base_model, dataset_path, "test-adapter", output_dir=str(tmp_path / "adapters"),
+                                      training_output_dir=str(tmp_path / "trained"), max_length=64)
+    return tmp_path / "adapters" / "test-adapter"
+
+
+def test_stored_token_counts_group_batches(base_model, tmp_path, sampler_lengths):
+    model_path, tokenizer = base_model
+    annotated = list(TokenLengthAnnotator(tokenizer, max_length=64).annotate(_examples(16)))
+    dataset_path = str(tmp_path / "train.jsonl")
+    store_records(annotated, dataset_path)
+
+    adapter = _train(model_path, dataset_path, tmp_path)
+
+    assert sampler_lengths == [[example["token_count"] for example in annotated]]
+    assert (adapter / "adapter_config.json").exists()
+
+
+def test_text_datasets_are_measured_by_the_sampler(base_model, tmp_path, sampler_lengths):
+    model_path, _ = base_model
+    dataset_path = tmp_path / "train.txt"
+    dataset_path.write_text("".join(f"def f_{index}(): return {index}\n" for index in range(8)))
+
+    adapter = _train(model_path, str(dataset_path), tmp_path)
+
+    assert sampler_lengths == [None]
+    assert (adapter / "adapter_config.json").exists()
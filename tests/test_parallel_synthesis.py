@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("datasets")
+
+from src.training.data_synthesis import DataSynthesisPipeline, python_dev_source  # noqa: E402
+from src.training.function_mining import FunctionMiner  # noqa: E402
+from src.training.parallel_synthesis import MANIFEST_FILE  # noqa: E402
+from src.training.writers import encode_json, file_sha256, iter_records  # noqa: E402
+
+NUM_FILES = 12
+FUNCTIONS_PER_FILE = 3
+AGENT_TYPE = "tanuki-python-dev"
+
+
+def _python_file(index):
+    return "".join(f'def function_{index}_{number}(x):\n    """Returns x plus {number}."""\n    return x + {number}\n\n\n'
+                   for number in range(FUNCTIONS_PER_FILE))
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "source.jsonl"
+    with open(path, "w") as f:
+        for index in range(NUM_FILES):
+            f.write(json.dumps({"hexsha": f"{index:040x}", "content": _python_file(index), "lang": "Python",
+                                "path": f"pkg/module_{index}.py"}) + "\n")
+    return str(path)
+
+
+def _generate(pipeline, data_file, **options):
+    return pipeline.generate_and_store_react_data("bigcode/the-stack-v2", AGENT_TYPE, num_samples=-1,
+                                                  data_files=data_file, num_workers=2, chunk_size=2, **options)
+
+
+def _shards(output_dir):
+    shard_dir = os.path.join(output_dir, f"{AGENT_TYPE}_train_react_data")
+    with open(os.path.join(shard_dir, MANIFEST_FILE)) as f:
+        return shard_dir, json.load(f)
+
+
+def _examples(shard_dir, manifest):
+    return [encode_json(record) for shard in manifest["shards"]
+            for record in iter_records(os.path.join(shard_dir, shard["path"]))]
+
+
+def test_ordered_and_unordered_runs_store_the_same_examples(tmp_path, data_file):
+    _generate(DataSynthesisPipeline(str(tmp_path / "unordered")), data_file)
+    _generate(DataSynthesisPipeline(str(tmp_path / "ordered")), data_file, ordered=True)
+
+    unordered = _examples(*_shards(str(tmp_path / "unordered")))
+    ordered_dir, ordered_manifest = _shards(str(tmp_path / "ordered"))
+    ordered = _examples(ordered_dir, ordered_manifest)
+
+    assert len(ordered_manifest["shards"]) == 1
+    assert len(ordered) == NUM_FILES * FUNCTIONS_PER_FILE
+    assert sorted(unordered) == sorted(ordered)
+
+    serial_dir = tmp_path / "serial"
+    DataSynthesisPipeline(str(serial_dir)).generate_and_store_react_data(
+        "bigcode/the-stack-v2", AGENT_TYPE, num_samples=-1, data_files=data_file)
+    assert ordered == [encode_json(record)
+                       for record in iter_records(str(serial_dir / f"{AGENT_TYPE}_train_react_data.jsonl"))]
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_manifest_matches_the_shards(tmp_path, data_file, ordered):
+    count = _generate(DataSynthesisPipeline(str(tmp_path)), data_file, ordered=ordered)
+    shard_dir, manifest = _shards(str(tmp_path))
+
+    assert count == manifest["total_examples"] == NUM_FILES * FUNCTIONS_PER_FILE
+    assert manifest["total_samples"] == NUM_FILES
+    assert sorted(name for name in os.listdir(shard_dir) if name != MANIFEST_FILE) == \
+        [shard["path"] for shard in manifest["shards"]]
+    for shard in manifest["shards"]:
+        path = os.path.join(shard_dir, shard["path"])
+        assert shard["count"] == len(list(iter_records(path)))
+        assert shard["bytes"] == os.path.getsize(path)
+        assert shard["sha256"] == file_sha256(path)
+    assert sum(shard["count"] for shard in manifest["shards"]) == count
+
+    workers = manifest["workers"]
+    assert workers and sum(worker["samples"] for worker in workers.values()) == NUM_FILES
+    for worker in workers.values():
+        assert worker["samples_per_s"] > 0
+
+
+def test_workers_use_the_pipeline_function_miner(tmp_path, data_file):
+    # A file size limit below every source file leaves nothing to mine.
+    miner = FunctionMiner(max_file_bytes=16, require_docstring=True, source_fn=python_dev_source)
+    assert _generate(DataSynthesisPipeline(str(tmp_path), function_miner=miner), data_file) == 0
+
+
+@pytest.mark.parametrize("options", [{"output_format": "parquet"}, {"versioned": True}])
+def test_parallel_runs_reject_settings_their_shards_cannot_honor(tmp_path, data_file, options):
+    pipeline = DataSynthesisPipeline(str(tmp_path), **options)
+    with pytest.raises(ValueError, match="num_workers=0"):
+        _generate(pipeline, data_file)
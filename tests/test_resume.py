@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("datasets")
+
+from src.training.resume_benchmark import run_benchmark  # noqa: E402
+
+
+@pytest.mark.parametrize("dedup, output_format", [(True, "jsonl"), (False, "parquet")])
+def test_killed_runs_resume_to_identical_output(tmp_path, dedup, output_format):
+    if output_format == "parquet":
+        pytest.importorskip("pyarrow")
+    results = run_benchmark(num_samples=2000, checkpoint_every=200, kills=2, dedup=dedup,
+                            output_format=output_format, work_dir=str(tmp_path))
+    assert results["identical"]
+    for interruption in results["interruptions"]:
+        assert interruption["interrupted"]
+        assert interruption["checkpoint_position"] >= interruption["target_position"]
@@ -0,0 +1,436 @@
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import sys
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("docker")
+
+import docker.errors  # noqa: E402
+
+from src.core.disk_cache import DiskLRUCache  # noqa: E402
+from src.core.sandbox import CodeExecutionSandbox  # noqa: E402
+from src.core.sandbox_benchmark import bench_responder, workload  # noqa: E402
+from src.core.sandbox_fakes import FakeDockerClient  # noqa: E402
+from src.core.sandbox_images import SandboxImageManager  # noqa: E402
+from src.core.sandbox_pool import ContainerPool  # noqa: E402
+
+DOCKERFILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "Dockerfile")
+BACKENDS = ("fake", "fake_pool", "process", "forkserver")
+MAX_OUTPUT_BYTES = 4096
+# Room for three of the fake client's results, which take 84 bytes each.
+RESULT_CACHE_ENTRIES = 3
+RESULT_CACHE_BYTES = RESULT_CACHE_ENTRIES * 100
+
+
+def make_sandbox(backend):
+    if backend in ("fake", "fake_pool"):
+        client = FakeDockerClient(container_start_latency_s=0, exec_latency_s=0, exec_overhead_s=0,
+                                  responder=bench_responder(0))
+        return CodeExecutionSandbox(dockerfile_path=DOCKERFILE, client=client, max_output_bytes=MAX_OUTPUT_BYTES,
+                                    pool_size=2 if backend == "fake_pool" else 0)
+    if not sys.platform.startswith("linux"):
+        pytest.skip("The local process backends run on Linux.")
+    options = {"python_forkserver": True} if backend == "forkserver" else {}
+    return CodeExecutionSandbox(backend="process", backend_options=options, max_output_bytes=MAX_OUTPUT_BYTES)
+
+
+@pytest.fixture(params=BACKENDS)
+def sandbox(request):
+    sandbox = make_sandbox(request.param)
+    yield sandbox
+    sandbox.close()
+
+
+def test_program_reads_all_of_stdin(sandbox):
+    stdin = "x" * 100000
+    result = sandbox.execute_code("python", workload("python", "count_stdin"), inputs=stdin, timeout=30)
+    assert result["exit_code"] == 0
+    assert result["stdout"].strip() == str(len(stdin))
+
+
+def test_output_is_capped(sandbox):
+    result = sandbox.execute_code("python", workload("python", "emit", 10 * MAX_OUTPUT_BYTES), timeout=30)
+    assert result["exit_code"] == 0
+    assert result["truncated"]
+    assert result["stdout"].startswith("x" * MAX_OUTPUT_BYTES + "\n[... output truncated")
+
+
+def test_batch_results_come_back_in_request_order(sandbox):
+    code = workload("python", "count_stdin")
+    requests = [{"language": "python", "code": code, "inputs": "x" * i, "timeout": 30} for i in range(8)]
+    results = asyncio.run(sandbox.execute_batch(iter(requests), concurrency=4))
+    assert [result["stdout"].strip() for result in results] == [str(i) for i in range(8)]
+
+
+def test_daemonized_descendant_does_not_hang_the_run():
+    if not sys.platform.startswith("linux"):
+        pytest.skip("The local process backend runs on Linux.")
+    from src.core.sandbox_backends import OUTPUT_DRAIN_GRACE_S, LocalProcessBackend
+    # The child leaves the process group and keeps the inherited stdout pipe open.
+    code = "import os, time\nif os.fork() == 0:\n    os.setsid()\n    time.sleep(10)\n    os._exit(0)\nprint('done')\n"
+    start = time.monotonic()
+    result = LocalProcessBackend(use_network_namespace=False).execute("python", code, timeout=30)
+    assert result["stdout"] == "done"
+    assert time.monotonic() - start < OUTPUT_DRAIN_GRACE_S + 5
+
+
+@pytest.mark.parametrize("language, code", [("python", "print(1)"), ("javascript", "console.log(1)")])
+def test_cancelled_ids_are_forgotten_when_the_run_finishes(language, code):
+    if not sys.platform.startswith("linux"):
+        pytest.skip("The local process backends run on Linux.")
+    if language == "javascript" and not shutil.which("node"):
+        pytest.skip("node is not installed.")
+    from src.core.sandbox_backends import LocalProcessBackend
+    backend = LocalProcessBackend(use_network_namespace=False, python_forkserver=True)
+    try:
+        # Cancelled before it starts, so both the backend and the fork server record the id.
+        assert not backend.cancel("run-1")
+        assert backend.execute(language, code, execution_id="run-1")["cancelled"]
+        assert not backend._cancelled_executions
+        assert not backend.forkserver._cancelled_executions
+    finally:
+        backend.close()
+
+
+def test_building_one_languages_image_does_not_block_other_pools():
+    client = FakeDockerClient(container_start_latency_s=0, exec_latency_s=0, exec_overhead_s=0)
+    sandbox = CodeExecutionSandbox(dockerfile_path=DOCKERFILE, client=client, pool_size=1, per_language_images=True)
+    try:
+        python_pool = sandbox._get_pool("python", "0.5", "128m")
+        client.build_latency_s = 2.0
+        building = threading.Thread(target=sandbox._get_pool, args=("cpp", "0.5", "128m"))
+        building.start()
+        time.sleep(0.2)
+        start = time.monotonic()
+        assert sandbox._get_pool("python", "0.5", "128m") is python_pool
+        assert time.monotonic() - start < 1.0
+        building.join()
+    finally:
+        sandbox.close()
+
+
+def program_responder(runs):
+    """Records each program run and acts on a marker comment in its source."""
+    def respond(command, files, stdin):
+        source = b"".join(files.values())
+        runs.append(source)
+        if b"# oom" in source:
+            return b"", b"Killed", 137, 0
+        if b"# hang" in source:
+            return b"", b"", 0, 60
+        if b"# daemon_error" in source:
+            raise docker.errors.APIError("daemon went away")
+        if b"# random" in source:
+            return f"{len(runs)}\n".encode(), b"", 0, 0
+        return b"ok\n", b"", 0, 0
+    return respond
+
+
+@pytest.fixture
+def cached_sandbox(tmp_path):
+    runs = []
+    client = FakeDockerClient(container_start_latency_s=0, exec_latency_s=0, exec_overhead_s=0,
+                              responder=program_responder(runs))
+    sandbox = CodeExecutionSandbox(dockerfile_path=DOCKERFILE, client=client, pool_size=1,
+                                   result_cache_dir=str(tmp_path / "results"), result_cache_max_bytes=RESULT_CACHE_BYTES)
+    sandbox.runs = runs
+    yield sandbox
+    sandbox.close()
+
+
+def test_repeated_runs_are_served_from_the_result_cache(cached_sandbox):
+    first = cached_sandbox.execute_code("python", "print('ok')")
+    second = cached_sandbox.execute_code("python", "print('ok')")
+
+    assert not first["result_cache"]["hit"]
+    assert second["result_cache"]["hit"]
+    assert second["stdout"] == first["stdout"] == "ok"
+    assert len(cached_sandbox.runs) == 1
+
+
+@pytest.mark.parametrize("code, flag", [("# hang", "timeout"), ("# oom", None), ("# daemon_error", "sandbox_error"),
+                                        ("# cancelled", "cancelled")])
+def test_incomplete_runs_are_never_cached(cached_sandbox, code, flag):
+    execution_id = None
+    if flag == "cancelled":
+        execution_id = "run-1"
+        cached_sandbox.cancel_execution(execution_id)
+    result = cached_sandbox.execute_code("python", code, timeout=1, execution_id=execution_id)
+
+    if flag is None:  # Killed from outside, as by the OOM killer.
+        assert result["exit_code"] == 137 and not result["timeout"]
+    else:
+        assert result[flag]
+    assert cached_sandbox.result_cache.get_stats()["entries"] == 0
+    assert not cached_sandbox.execute_code("python", code, timeout=1)["result_cache"]["hit"]
+    assert len(cached_sandbox.runs) == 2
+
+
+def test_nondeterministic_runs_bypass_the_result_cache(cached_sandbox):
+    outputs = [cached_sandbox.execute_code("python", "# random", nondeterministic=True) for _ in range(2)]
+
+    assert [result["stdout"] for result in outputs] == ["1", "2"]
+    assert all("result_cache" not in result for result in outputs)
+    assert cached_sandbox.result_cache.get_stats()["entries"] == 0
+
+
+def test_result_cache_evicts_least_recently_used_results(cached_sandbox):
+    for number in range(RESULT_CACHE_ENTRIES + 1):
+        cached_sandbox.execute_code("python", f"print({number})")
+    stats = cached_sandbox.result_cache.get_stats()
+
+    assert stats["evictions"] == 1
+    assert stats["entries"] == RESULT_CACHE_ENTRIES
+    assert stats["bytes"] <= RESULT_CACHE_BYTES
+    assert cached_sandbox.execute_code("python", f"print({RESULT_CACHE_ENTRIES})")["result_cache"]["hit"]
+    assert not cached_sandbox.execute_code("python", "print(0)")["result_cache"]["hit"]
+
+
+CPP_PROGRAM = "#include <iostream>\nint main() { std::cout << \"ok\"; }\n"
+
+
+def compiling_sandbox(client, cache_dir, image_name="tanuki-sandbox"):
+    return CodeExecutionSandbox(image_name=image_name, dockerfile_path=DOCKERFILE, client=client,
+                                compile_cache_dir=str(cache_dir))
+
+
+def recording_client(commands):
+    def respond(command, files, stdin):
+        commands.append(command)
+        return b"ok\n", b"", 0, 0
+    return FakeDockerClient(container_start_latency_s=0, exec_latency_s=0, exec_overhead_s=0, responder=respond)
+
+
+def compilations(commands):
+    return sum("g++" in command for command in commands)
+
+
+def test_compile_cache_compiles_each_program_once(tmp_path):
+    commands = []
+    sandbox = compiling_sandbox(recording_client(commands), tmp_path / "compiled")
+    try:
+        first = sandbox.execute_code("cpp", CPP_PROGRAM, inputs="1")
+        second = sandbox.execute_code("cpp", CPP_PROGRAM, inputs="2")
+        other = sandbox.execute_code("cpp", CPP_PROGRAM + "// changed\n")
+    finally:
+        sandbox.close()
+
+    assert [result["compile_cache"]["hit"] for result in (first, second, other)] == [False, True, False]
+    assert compilations(commands) == 2
+    assert second["stdout"] == "ok"
+    stats = other["compile_cache"]
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+    assert {"compile_time_s", "time_saved_s", "total_time_saved_s"} <= set(stats)
+
+
+def test_compile_cache_entries_are_keyed_by_toolchain(tmp_path):
+    commands = []
+    client = recording_client(commands)
+    cache_dir = tmp_path / "compiled"
+    results = []
+    # The second image has a new digest, as after a compiler upgrade; the third reuses the first.
+    for image_name in ("tanuki-sandbox", "tanuki-sandbox-upgraded", "tanuki-sandbox"):
+        sandbox = compiling_sandbox(client, cache_dir, image_name)
+        try:
+            results.append(sandbox.execute_code("cpp", CPP_PROGRAM))
+        finally:
+            sandbox.close()
+
+    assert [result["compile_cache"]["hit"] for result in results] == [False, False, True]
+    assert compilations(commands) == 2
+
+
+def test_disk_cache_evicts_least_recently_used_entries(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=30)
+    for key in "abc":
+        cache.put(key, key.encode() * 10)
+    assert cache.get("a") is not None
+    cache.put("d", b"d" * 10)
+    cache.put("e", b"e" * 31)  # Larger than the whole cache; never stored.
+
+    assert "b" not in cache and "e" not in cache
+    assert all(key in cache for key in "acd")
+    stats = cache.get_stats()
+    assert (stats["evictions"], stats["entries"], stats["bytes"]) == (1, 3, 30)
+    # A new process rebuilds its index from the entries on disk.
+    reopened = DiskLRUCache(str(tmp_path), max_bytes=30).get_stats()
+    assert (reopened["entries"], reopened["bytes"]) == (3, 30)
+
+
+@pytest.fixture
+def echo_sandbox():
+    """Runs every program as `cat`, failing on the input "fail", and records the commands."""
+    commands = []
+
+    def respond(command, files, stdin):
+        commands.append(command)
+        if stdin == b"fail":
+            return b"", b"failed", 1, 0
+        return stdin, b"", 0, 0
+
+    client = FakeDockerClient(container_start_latency_s=0, exec_latency_s=0, exec_overhead_s=0, responder=respond)
+    sandbox = CodeExecutionSandbox(dockerfile_path=DOCKERFILE, client=client, pool_size=1)
+    sandbox.commands = commands
+    yield sandbox
+    sandbox.close()
+
+
+def test_execute_many_compiles_once_for_all_inputs(echo_sandbox):
+    results = list(echo_sandbox.execute_many("cpp", CPP_PROGRAM, ["a", "b", "c"]))
+
+    assert [(result["index"], result["stdout"]) for result in results] == [(0, "a"), (1, "b"), (2, "c")]
+    assert compilations(echo_sandbox.commands) == 1
+
+
+@pytest.mark.parametrize("stop_on_first_failure, expected", [(True, [0, 1]), (False, [0, 1, 2])])
+def test_execute_many_can_stop_on_the_first_failure(echo_sandbox, stop_on_first_failure, expected):
+    results = list(echo_sandbox.execute_many("python", "print(input())", ["a", "fail", "c"],
+                                             stop_on_first_failure=stop_on_first_failure))
+
+    assert [result["index"] for result in results] == expected
+    assert [result["exit_code"] for result in results] == [0, 1, 0][:len(expected)]
+
+
+def test_execute_many_compares_expected_outputs(echo_sandbox):
+    results = list(echo_sandbox.execute_many("python", "print(input())", ["a", "b", "c", "fail"],
+                                             expected_outputs=["a\n", "x", None, None]))
+
+    assert [result["passed"] for result in results] == [True, False, True, False]
+
+    results = list(echo_sandbox.execute_many("python", "print(input())", ["a", "b", "c"],
+                                             expected_outputs=["a", "x", "c"], stop_on_first_failure=True))
+    # A mismatch counts as a failure even though the program exited cleanly.
+    assert [(result["exit_code"], result["passed"]) for result in results] == [(0, True), (0, False)]
+
+
+def test_execute_many_releases_its_container_when_closed_early(echo_sandbox):
+    results = echo_sandbox.execute_many("python", "print(input())", ["a", "b", "c"])
+    assert next(results)["stdout"] == "a"
+    results.close()
+
+    stats = echo_sandbox._get_pool("python", "0.5", "128m").get_stats()
+    assert stats["acquired"] == 1
+    assert stats["reused"] + stats["discarded"] == 1
+    # Only the first case ran.
+    assert sum("stdin_" in command for command in echo_sandbox.commands) == 1
+
+
+def make_pool(**options):
+    client = FakeDockerClient(container_start_latency_s=0, exec_latency_s=0, exec_overhead_s=0)
+    return ContainerPool(client, "tanuki-sandbox", size=1, **options)
+
+
+@pytest.mark.parametrize("policy, outcome, reused", [
+    ("recycle", {}, True),
+    ("recycle", {"failed": True}, True),
+    ("recycle", {"timed_out": True}, False),
+    ("discard_on_error", {}, True),
+    ("discard_on_error", {"failed": True}, False),
+    ("discard_on_error", {"timed_out": True}, False),
+    ("single_use", {}, False),
+    ("single_use", {"failed": True}, False),
+])
+def test_isolation_policy_decides_whether_a_container_is_reused(policy, outcome, reused):
+    pool = make_pool(isolation_policy=policy)
+    try:
+        container = pool.acquire()
+        assert pool.should_recycle(container, **outcome) == reused
+        pool.release(container, **outcome)
+
+        assert pool.get_stats()["reused" if reused else "discarded"] == 1
+        assert container.killed.is_set() != reused  # Removing a fake container kills it.
+        assert (pool.acquire() is container) == reused
+    finally:
+        pool.close()
+
+
+def test_containers_are_recycled_after_max_reuses():
+    pool = make_pool(isolation_policy="recycle", max_reuses=3)
+    try:
+        containers = []
+        for _ in range(3):
+            container = pool.acquire()
+            containers.append(container)
+            pool.release(container)
+
+        # The third execution used the container up.
+        assert containers[0] is containers[1] is containers[2]
+        assert containers[0].killed.is_set()
+        stats = pool.get_stats()
+        assert (stats["reused"], stats["discarded"]) == (2, 1)
+        assert pool.acquire() is not containers[0]
+    finally:
+        pool.close()
+
+
+def test_unknown_isolation_policy_is_rejected():
+    with pytest.raises(ValueError, match="Unknown isolation policy"):
+        make_pool(isolation_policy="sometimes")
+
+
+def ensure_image(client, context):
+    images = SandboxImageManager(client, "tanuki-sandbox", str(context / "Dockerfile"))
+    tag = images.ensure_base_image()
+    return tag, images.get_metrics()["base"]["built"]
+
+
+def test_images_are_rebuilt_only_when_their_build_context_changes(tmp_path):
+    client = FakeDockerClient(container_start_latency_s=0, exec_latency_s=0, exec_overhead_s=0)
+    (tmp_path / "Dockerfile").write_text("FROM python:3.11-slim\nCOPY requirements.txt /\n")
+    (tmp_path / "requirements.txt").write_text("numpy\n")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        tag, built = ensure_image(client, tmp_path)
+        assert built
+        # Files the build ignores leave the tag alone.
+        (tmp_path / "__pycache__").mkdir()
+        (tmp_path / "__pycache__" / "module.cpython-311.pyc").write_bytes(b"\0")
+        assert ensure_image(client, tmp_path) == (tag, False)
+
+        (tmp_path / "Dockerfile").write_text("FROM python:3.12-slim\nCOPY requirements.txt /\n")
+        new_tag, built = ensure_image(client, tmp_path)
+        assert built and new_tag != tag
+        assert new_tag.startswith("tanuki-sandbox:")
+
+        (tmp_path / "requirements.txt").write_text("numpy\npandas\n")
+        context_tag, built = ensure_image(client, tmp_path)
+        assert built and context_tag not in (tag, new_tag)
+    assert client.images.build_count == 3
+
+
+def _running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_fork_server_kills_what_a_finished_program_left_running():
+    if not sys.platform.startswith("linux"):
+        pytest.skip("The fork server runs on Linux.")
+    from src.core.python_forkserver import PythonForkServer
+    server = PythonForkServer(preload_modules=[])
+    # The grandchild stays in the program's process group and outlives it.
+    code = ("import subprocess, sys\n"
+            "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'],\n"
+            "                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)\n"
+            "print(child.pid)\n")
+    try:
+        result = server.execute(code, timeout=30, execution_id="run-1")
+        assert result["exit_code"] == 0
+        grandchild = int(result["stdout"])
+        deadline = time.monotonic() + 5
+        while _running(grandchild) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not _running(grandchild)
+        assert not server.cancel("run-1")
+    finally:
+        server.close()
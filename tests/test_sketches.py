@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.training.sketches_benchmark import run_benchmark  # noqa: E402
+
+NUM_EXAMPLES = 20000
+
+
+@pytest.fixture(scope="module")
+def results():
+    return run_benchmark(num_examples=NUM_EXAMPLES, num_shards=4)
+
+
+@pytest.mark.parametrize("run", ["single", "merged"])
+def test_every_example_is_counted(results, run):
+    assert results[run]["examples"] == NUM_EXAMPLES
+
+
+@pytest.mark.parametrize("run", ["single", "merged"])
+def test_quantiles_are_within_two_percent_in_rank(results, run):
+    assert results[run]["max_rank_error"] <= 0.02
+
+
+@pytest.mark.parametrize("run", ["single", "merged"])
+def test_distinct_count_is_within_five_percent(results, run):
+    assert results[run]["distinct_relative_error"] <= 0.05
@@ -0,0 +1,18 @@
+import pytest
+
+for module in ("datasets", "psutil"):
+    pytest.importorskip(module)
+
+from src.training.synthesis_benchmark import run_benchmark  # noqa: E402
+
+
+def test_peak_rss_does_not_grow_with_the_number_of_samples(tmp_path):
+    # Both runs read whole JSON chunks, so their working sets match; holding the records the larger run
+    # reads on top (15000 of ~8KB) would add well over a quarter of the dataset's size.
+    results = run_benchmark(sizes=[5000, 20000], mean_content_bytes=8192, work_dir=str(tmp_path))
+    small, large = results["runs"]
+    assert "error" not in small and "error" not in large
+    assert (small["stored"], large["stored"]) == (5000, 20000)
+    # Each child warms up first, so lazy imports (hundreds of MB) are not counted as growth.
+    assert small["rss_growth_mb"] < 128
+    assert results["rss_growth_delta_mb"] < 0.25 * results["config"]["dataset_mb"]
@@ -0,0 +1,87 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("tokenizers")
+pytest.importorskip("transformers")
+
+from src.training.sketches import example_text  # noqa: E402
+from src.training.sketches_benchmark import make_examples  # noqa: E402
+from src.training.token_lengths import TokenLengthAnnotator  # noqa: E402
+from src.training.token_lengths_benchmark import train_tokenizer  # noqa: E402
+from src.training.writers import iter_records, store_records  # noqa: E402
+
+WORDS = ("def", "return", "self", "value", "items", "for", "in", "if", "None", "result")
+
+
+def _example(index, num_words):
+    return {
+        "agent_type": "tanuki-coder",
+        "prompt": f"Task {index}",
+        "thought": "Write it.",
+        "tool_calls": [{"tool": "python_executor", "input": "print(1)"}],
+        "final_answer": " ".join(WORDS[(index + word) % len(WORDS)] for word in range(num_words)),
+    }
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    return train_tokenizer([example_text(_example(index, 50)) for index in range(200)], vocab_size=500)
+
+
+def test_split_parts_share_the_whole_examples_fields(tokenizer):
+    annotator = TokenLengthAnnotator(tokenizer, max_length=32, batch_size=4)
+    examples = [_example(index, 5) for index in range(6)] + [_example(6, 200)]
+    annotated = list(annotator.annotate(examples))
+
+    whole, parts = annotated[:6], annotated[6:]
+    assert len(parts) > 1
+    assert {frozenset(example) for example in annotated} == {frozenset(whole[0])}
+    assert all(example["token_count"] <= 32 for example in annotated)
+    assert [part["part"] for part in parts] == list(range(len(parts)))
+    assert all(part["num_parts"] == len(parts) and part["tool_calls"] == examples[6]["tool_calls"]
+               and part["final_answer"] is None for part in parts)
+    assert all(example["token_count"] == annotator.count_tokens(example_text(example)) for example in annotated)
+
+
+@pytest.mark.parametrize("extension", (".parquet", ".arrow", ".jsonl"))
+def test_split_parts_store_after_whole_examples(tokenizer, tmp_path, extension):
+    pytest.importorskip("pyarrow")
+    annotator = TokenLengthAnnotator(tokenizer, max_length=32)
+    annotated = list(annotator.annotate([_example(index, 5) for index in range(6)] + [_example(6, 200)]))
+    path = str(tmp_path / f"annotated{extension}")
+    options = {"row_group_size": 2} if extension == ".parquet" else {}
+    assert store_records(annotated, path, **options)["count"] == len(annotated)
+    assert [record["token_count"] for record in iter_records(path)] == [
+        example["token_count"] for example in annotated]
+
+
+@pytest.fixture(scope="module")
+def long_tailed():
+    examples = make_examples(2000)
+    return examples, train_tokenizer([example_text(example) for example in examples], vocab_size=2000)
+
+
+def _counts(annotator, examples):
+    return [(example["text"], example["token_count"]) for example in annotator.annotate(examples)]
+
+
+def test_counts_fit_max_length_and_match_the_tokenizer(long_tailed):
+    examples, tokenizer = long_tailed
+    annotator = TokenLengthAnnotator(tokenizer, max_length=64)
+    annotated = list(annotator.annotate(examples))
+
+    assert annotator.get_stats()["split"] > 0
+    assert all(example["token_count"] <= 64 for example in annotated)
+    assert all(example["token_count"] == len(tokenizer(example_text(example))["input_ids"]) for example in annotated)
+    dropping = TokenLengthAnnotator(tokenizer, max_length=64, overlong="drop")
+    assert all(example["token_count"] <= 64 for example in dropping.annotate(examples))
+
+
+def test_cached_and_per_example_counts_match_batched_ones(long_tailed):
+    examples, tokenizer = long_tailed
+    batched = TokenLengthAnnotator(tokenizer, max_length=64)
+    first = _counts(batched, examples)
+
+    assert _counts(batched, examples) == first
+    assert batched.get_stats()["cache_hits"] >= len(examples)
+    assert _counts(TokenLengthAnnotator(tokenizer, max_length=64, batch_size=1, cache_size=0), examples) == first
@@ -0,0 +1,90 @@
+import json
+import sys
+
+import pytest
+
+from src.training.validation import ExampleValidator
+
+
+def _example(language_extension, content):
+    return {"tool_calls": [{"tool": "write_file", "path": f"solution{language_extension}", "content": content}]}
+
+
+class FailingSandbox:
+    async def execute_batch(self, requests, concurrency=None):
+        raise ConnectionError("sandbox unreachable")
+
+
+class InfrastructureErrorSandbox:
+    """Reports an infrastructure error for the first request and runs the rest."""
+
+    async def execute_batch(self, requests, concurrency=None):
+        results = [{"exit_code": 0, "timeout": False, "stdout": "", "stderr": ""} for _ in requests]
+        results[0].update(exit_code=1, stderr="Docker API Error: 500", sandbox_error=True)
+        return results
+
+
+def test_python_syntax_errors_are_rejected_in_process():
+    validator = ExampleValidator()
+    accepted = validator.validate_batch([_example(".py", "x = 1\n"), _example(".py", "def f(:\n"), {"text": "no code"}])
+
+    assert accepted == [_example(".py", "x = 1\n"), {"text": "no code"}]
+    assert validator.get_stats()["reasons"] == {"syntax_error": 1}
+
+
+def test_a_failed_sandbox_batch_raises_instead_of_rejecting():
+    validator = ExampleValidator(sandbox=FailingSandbox())
+    with pytest.raises(ConnectionError):
+        validator.validate_batch([_example(".js", "console.log(1)")])
+    assert validator.get_stats()["rejected"] == 0
+
+
+def test_sandbox_infrastructure_errors_leave_examples_unchecked():
+    validator = ExampleValidator(sandbox=InfrastructureErrorSandbox())
+    examples = [_example(".js", "console.log(1)"), _example(".go", "package main")]
+
+    assert validator.validate_batch(examples) == examples
+    stats = validator.get_stats()
+    assert (stats["sandbox_errors"], stats["unchecked"], stats["rejected"]) == (1, 1, 0)
+
+
+# How each kind of broken example is expected to be rejected, per mode.
+EXPECTED_REASONS = {
+    "compile": {"syntax_error": "syntax_error"},
+    "execute": {"syntax_error": "syntax_error", "raises": "runtime_error", "hangs": "timeout"},
+}
+
+
+@pytest.mark.parametrize("mode, sandboxed, num_examples", [
+    ("compile", False, 60),
+    ("compile", True, 30),
+    ("execute", True, 12),
+])
+def test_exactly_the_broken_examples_are_rejected(tmp_path, mode, sandboxed, num_examples):
+    from src.training.validation_benchmark import make_examples
+
+    options = {}
+    if sandboxed:
+        pytest.importorskip("docker")
+        if not sys.platform.startswith("linux"):
+            pytest.skip("The local process backend runs on Linux.")
+        from src.core.sandbox import CodeExecutionSandbox
+        options = {"sandbox": CodeExecutionSandbox(backend="process"), "python_fast_path": mode == "execute",
+                   "concurrency": 4, "timeout_s": 1}
+    examples = make_examples(num_examples, broken_rate=0.5)
+    rejects_path = str(tmp_path / "rejects.jsonl")
+    validator = ExampleValidator(mode=mode, rejects_path=rejects_path, **options)
+    try:
+        accepted = list(validator.validate(examples))
+    finally:
+        if sandboxed:
+            options["sandbox"].close()
+
+    expected = EXPECTED_REASONS[mode]
+    assert accepted == [example for example in examples if example["breakage"] not in expected]
+    with open(rejects_path) as f:
+        rejects = [json.loads(line) for line in f]
+    assert [(reject["example"]["breakage"], reject["reason"]) for reject in rejects] == \
+        [(example["breakage"], expected[example["breakage"]]) for example in examples
+         if example["breakage"] in expected]
+    assert validator.get_stats()["rejected"] == len(rejects)
@@ -0,0 +1,135 @@
+import json
+import os
+
+import pytest
+
+from src.training.writers import (LATEST_FILE, VERSION_MANIFEST_FILE, create_writer, dataset_files, iter_records,
+                                  latest_version, store_records)
+
+pytest.importorskip("pyarrow")
+
+COLUMNAR_FORMATS = ("parquet", "arrow")
+# Records per row group (Parquet) or record batch (Arrow).
+BATCH_OPTION = {"parquet": "row_group_size", "arrow": "batch_size"}
+
+
+def _mixed_records():
+    """Records whose shape changes between row groups of two."""
+    return [
+        # Row group 1: "source_path" and "language" are all None, no "tool_calls".
+        {"id": 0, "text": "a", "source_path": None, "language": None},
+        {"id": 1, "text": "b", "source_path": None, "language": None},
+        # Row group 2: values for the all-None fields, and a new field.
+        {"id": 2, "text": "c", "source_path": "pkg/mod.py", "language": "python",
+         "tool_calls": [{"name": "run", "args": {"cmd": "ls"}}]},
+        {"id": 3, "text": "d", "source_path": None, "language": "go", "score": 1},
+        # Row group 3: a field missing, an int field now holding floats.
+        {"id": 4, "source_path": "b.py", "score": 0.5},
+        {"id": 5, "text": "f", "part": 1, "num_parts": 2},
+    ]
+
+
+@pytest.mark.parametrize("output_format", COLUMNAR_FORMATS)
+def test_mixed_shape_records_across_row_groups(tmp_path, output_format):
+    records = _mixed_records()
+    path = str(tmp_path / f"mixed.{output_format}")
+    with create_writer(output_format, path, **{BATCH_OPTION[output_format]: 2}) as writer:
+        writer.write_many(records)
+
+    assert writer.count == len(records)
+    assert os.listdir(tmp_path) == [f"mixed.{output_format}"]
+    read = list(iter_records(path))
+    fields = {field for record in records for field in record}
+    assert all(set(record) == fields for record in read)
+    for original, stored in zip(records, read):
+        expected = {field: None for field in fields}
+        expected.update(original)
+        if expected["tool_calls"] is not None:
+            # Nested values are stored as JSON text.
+            stored["tool_calls"] = json.loads(stored["tool_calls"])
+        assert stored == expected
+
+
+@pytest.mark.parametrize("output_format", COLUMNAR_FORMATS)
+def test_uniform_records_are_not_rewritten(tmp_path, output_format):
+    records = [{"id": index, "text": str(index)} for index in range(5)]
+    path = str(tmp_path / f"uniform.{output_format}")
+    result = store_records(records, path, **{BATCH_OPTION[output_format]: 2})
+    assert result["count"] == 5
+    assert list(iter_records(path)) == records
+
+
+@pytest.mark.parametrize("output_format", COLUMNAR_FORMATS)
+def test_conflicting_field_types_raise(tmp_path, output_format):
+    path = str(tmp_path / f"conflict.{output_format}")
+    with pytest.raises(ValueError, match="conflicting field types"):
+        with create_writer(output_format, path, **{BATCH_OPTION[output_format]: 1}) as writer:
+            writer.write_many([{"id": 1}, {"id": "one"}])
+
+
+def _versions(dataset_dir):
+    return sorted(name for name in os.listdir(dataset_dir) if name != LATEST_FILE)
+
+
+def _manifest(version_dir):
+    with open(os.path.join(version_dir, VERSION_MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def test_identical_output_reuses_its_version(tmp_path):
+    records = [{"id": index, "text": str(index)} for index in range(5)]
+    first = store_records(records, str(tmp_path / "data.jsonl"), versioned=True)
+    second = store_records(records, str(tmp_path / "data.jsonl"), versioned=True)
+
+    assert second["version"] == first["version"]
+    assert second["path"] == first["path"]
+    assert _versions(tmp_path / "data") == [first["version"]]
+    assert latest_version(str(tmp_path), "data") == os.path.dirname(first["path"])
+
+
+def test_changed_output_adds_a_version_and_never_overwrites_earlier_ones(tmp_path):
+    old_records = [{"id": index, "text": str(index)} for index in range(5)]
+    new_records = old_records + [{"id": 5, "text": "5"}]
+    old = store_records(old_records, str(tmp_path / "data.jsonl"), versioned=True)
+    old_dir = os.path.dirname(old["path"])
+    old_manifest = _manifest(old_dir)
+
+    new = store_records(new_records, str(tmp_path / "data.jsonl"), versioned=True)
+    assert new["version"] != old["version"]
+    assert latest_version(str(tmp_path), "data") == os.path.dirname(new["path"])
+    assert [record for path in dataset_files(str(tmp_path / "data")) for record in iter_records(path)] == new_records
+    assert list(iter_records(old["path"])) == old_records
+    assert _manifest(old_dir) == old_manifest
+
+    # Going back to the earlier content repoints LATEST at the existing version, untouched.
+    assert store_records(old_records, str(tmp_path / "data.jsonl"), versioned=True)["version"] == old["version"]
+    assert latest_version(str(tmp_path), "data") == old_dir
+    assert _manifest(old_dir) == old_manifest
+    assert _versions(tmp_path / "data") == sorted([old["version"], new["version"]])
+
+
+def test_an_aborted_versioned_write_leaves_no_staging_directory(tmp_path):
+    committed = store_records([{"id": 0}], str(tmp_path / "data.jsonl"), versioned=True)
+
+    def failing_records():
+        yield {"id": 1}
+        raise RuntimeError("stream failed")
+
+    with pytest.raises(RuntimeError, match="stream failed"):
+        store_records(failing_records(), str(tmp_path / "data.jsonl"), versioned=True)
+    assert _versions(tmp_path / "data") == [committed["version"]]
+    assert latest_version(str(tmp_path), "data") == os.path.dirname(committed["path"])
+
+
+def test_zstd_jsonl_round_trips(tmp_path):
+    pytest.importorskip("zstandard")
+    records = [{"id": index, "text": "x" * index, "tool_calls": [{"name": "run", "args": {"n": index}}]}
+               for index in range(200)]
+    path = str(tmp_path / "data.jsonl.zst")
+    # A small buffer makes the writer flush many times into one frame.
+    result = store_records(records, path, buffer_bytes=256)
+
+    assert result["count"] == len(records)
+    with open(path, "rb") as f:
+        assert f.read(4) == b"\x28\xb5\x2f\xfd"  # zstd frame magic
+    assert list(iter_records(path)) == records